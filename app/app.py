@@ -1,31 +1,53 @@
 # app/app.py
 # -*- coding: utf-8 -*-
 
-import os
-import io
 import json
+import os
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import pandas as pd
 import streamlit as st
 from supabase import create_client, Client
-from postgrest.exceptions import APIError  # <-- nowy import
 
-def qexec(q):
-    """
-    Bezpieczne wykonanie zapytań supabase-py v2.
-    Zwraca listę (resp.data), a w razie błędu rzuca RuntimeError.
-    """
-    try:
-        resp = q.execute()
-        return resp.data or []
-    except APIError as e:
-        # APIError pochodzi z PostgREST – ma message, code itd.
-        raise RuntimeError(f"DB error: {getattr(e, 'message', str(e))}") from e
-    except Exception as e:
-        raise RuntimeError(f"DB error: {e}") from e
+from dora_audit import dashboard, outbox, trends
+from dora_audit.archive import ARCHIVE_URL, list_archived_sessions, load_archived_session
+from dora_audit.autosave import DraftAutosaver
+from dora_audit.bulk_import import import_history
+from dora_audit.cache import NS_PREVIEW, NS_WHITELIST, exports_ns, get_shared_cache
+from dora_audit.conditions import compile_rules
+from dora_audit.draft_migration import migrate_drafts
+from dora_audit.exports import get_export_scheduler
+from dora_audit.prefetch import Prefetch
+from dora_audit.profiling import get_profiler
+from dora_audit.ranking import percentile_caption, percentile_for, record_submission
+from dora_audit.replica import ReadRouter, replica_client_from_env, session_client_from_env
+from dora_audit.sessions import BANDS, DATE_FIELDS, SessionFilter, estimate_count, search_sessions
+from dora_audit.throttle import WriteLimiter, WriteThrottled
+from dora_audit.whitelist import import_whitelist, whitelist_page
+from dora_audit.core import (
+    qexec,
+    get_or_create_survey,
+    set_active_version,
+    save_new_version,
+    load_active_version,
+    list_versions,
+    get_version,
+    wide_row_for_session,
+    session_answer_rows,
+    parse_uploaded_file,
+    build_pdf_for_session,
+    result_badge,
+    compute_total_score,
+    max_total_score,
+    load_session_with_answers,
+    csv_user_sessions,
+    csv_single_session_answers,
+    save_session,
+)
 
 # =============================================================================
 #  UI: CSS + lekkie komponenty w stylu /site (ui_topbar, ui_header, ui_card)
@@ -71,6 +93,16 @@ def ui_button(label: str, href: str = "#", kind: str = "primary"):
     st.markdown(f"""<a class="{cls}" href="{href}">{label}</a>""",
                 unsafe_allow_html=True)
 
+@contextmanager
+def ui_card_block(title: str = ""):
+    """Karta jako kontener na elementy Streamlit (``with ui.card(...)``)."""
+    with st.container(border=True):
+        if title:
+            st.markdown(f"#### {title}")
+        yield
+
+ui = SimpleNamespace(header=ui_header, card=ui_card_block)
+
 # =============================================================================
 #  Hash → Query bridge (obsługa magic-linka z fragmentem #)
 # =============================================================================
@@ -101,7 +133,14 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", "").strip()
 APP_BASE_URL      = os.getenv("APP_BASE_URL", "http://localhost:8501").strip()
 SITE_BASE_URL     = os.getenv("SITE_BASE_URL", "http://localhost:8080").strip()
 
-SURVEY_NAME = "DORA Audit"   # nazwa produktu/ankiety (1 wpis w 'surveys')
+# Autozapis szkicu: domyślny stan przełącznika (debounce i ponowienia – dora_audit.autosave)
+AUTOSAVE_ENABLED    = os.getenv("AUTOSAVE_ENABLED", "1").strip() not in ("0", "false", "no", "")
+
+# Współdzielony cache (dora_audit.cache): TTL wpisów whitelisty
+WHITELIST_CACHE_TTL_S = float(os.getenv("WHITELIST_CACHE_TTL_S", "60"))
+
+# Eksporty admina w tle (dora_audit.exports): co ile odświeżać pasek postępu
+EXPORT_POLL_S = float(os.getenv("EXPORT_POLL_S", "2"))
 
 @st.cache_resource(show_spinner=False)
 def supa() -> Client:
@@ -109,6 +148,41 @@ def supa() -> Client:
         raise RuntimeError("Brak SUPABASE_URL / SUPABASE_ANON_KEY w środowisku.")
     return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+# =============================================================================
+#  Zasoby procesu: dyspozytor webhooków, limity zapisów, odczyty z repliki
+# =============================================================================
+@st.cache_resource(show_spinner=False)
+def webhook_dispatcher() -> Optional[outbox.WebhookDispatcher]:
+    """Jeden wątek dyspozytora webhooków na proces (None, gdy brak WEBHOOK_URL)."""
+    if not outbox.enabled():
+        return None
+    return outbox.WebhookDispatcher(outbox.dispatcher_client()).start()
+
+@st.cache_resource(show_spinner=False)
+def write_limiter() -> WriteLimiter:
+    """Limity zapisów ankiety (dora_audit.throttle) – wspólne dla wszystkich sesji procesu."""
+    return WriteLimiter()
+
+@st.cache_resource(show_spinner=False)
+def read_router() -> ReadRouter:
+    """Odczyty raportowe na replice (dora_audit.replica); bez SUPABASE_REPLICA_URL – główna baza."""
+    return ReadRouter(supa(), replica_client_from_env(), session_for=replica_client_from_env)
+
+def reads(user_email: Optional[str] = None) -> Client:
+    """Klient dla eksportów, list i analityki: replika albo główna baza (opóźnienie, świeży zapis user_email)."""
+    return read_router().for_read(user_email, st.session_state.get("access_token"))
+
+def _profiled(action: str):
+    """Etykieta akcji dla profilera CPU (dora_audit.profiling); wyłączony – bez kosztu."""
+    return get_profiler().capture(st.session_state.get("profile_page", "—"), action)
+
+@contextmanager
+def _write_slot(user_email: str, label: str, action: str):
+    """Stan „zapisywanie…” na czas oczekiwania w kolejce i samego zapisu."""
+    with st.spinner(label), _profiled(action):
+        with write_limiter().slot(user_email):
+            yield
+
 # =============================================================================
 #  Query params helpers
 # =============================================================================
@@ -226,13 +300,7 @@ def _enforce_allowed_email(client: Client):
         st.error("Nie udało się ustalić adresu e-mail użytkownika.")
         st.stop()
 
-    rows = qexec(
-        client.table("allowed_emails")
-              .select("email")
-              .eq("email", email)
-              .limit(1)
-    )
-    if not rows:
+    if not _whitelist_entry(client, email):
         ui_card(
             "⛔ Brak dostępu",
             f"<p class='muted'>Adres <b>{email}</b> nie znajduje się na liście dozwolonych użytkowników.</p>",
@@ -240,409 +308,27 @@ def _enforce_allowed_email(client: Client):
         )
         st.stop()
 
-def is_admin(client: Client, email: str) -> bool:
-    if not email:
-        return False
-    rows = qexec(
-        client.table("allowed_emails")
-              .select("is_admin")
-              .eq("email", email)
-              .limit(1)
-    )
-    return bool(rows and rows[0].get("is_admin"))
-
-# =============================================================================
-#  Ankiety / wersje (survey + survey_versions)
-# =============================================================================
-def _get_or_create_survey(client: Client) -> Dict[str, Any]:
-    # 1) Spróbuj odczytać istniejącą
-    rows = qexec(
-        client.table("surveys")
-              .select("*")
-              .eq("name", SURVEY_NAME)
-              .limit(1)
-    )
-    if rows:
-        return rows[0]
-
-    # 2) Wstaw nową
-    ins_rows = qexec(
-        client.table("surveys").insert({"name": SURVEY_NAME})
-    )
-    if ins_rows:
-        return ins_rows[0]
-
-    # (race condition fallback) – odczytaj ponownie
-    rows2 = qexec(
-        client.table("surveys")
-              .select("*")
-              .eq("name", SURVEY_NAME)
-              .limit(1)
-    )
-    if not rows2:
-        raise RuntimeError("Survey utworzony, ale nie udało się go odczytać.")
-    return rows2[0]
-
-def _next_version_number(client: Client, survey_id: str) -> int:
-    rows = qexec(
-        client.table("survey_versions")
-              .select("version")
-              .eq("survey_id", survey_id)
-              .order("version", desc=True)
-              .limit(1)
-    )
-    if rows:
-        return int(rows[0]["version"]) + 1
-    return 1
-
-def _set_active_version(client: Client, survey_id: str, version_id: str) -> None:
-    # Wyłącz wszystkie
-    qexec(
-        client.table("survey_versions")
-              .update({"is_active": False})
-              .eq("survey_id", survey_id)
-    )
-    # Włącz wskazaną
-    qexec(
-        client.table("survey_versions")
-              .update({"is_active": True})
-              .eq("id", version_id)
-    )
-
-def _save_new_version(
-    client: Client,
-    survey_id: str,
-    content: Dict[str, Any],
-    threshold_green: int,
-    threshold_amber: int,
-    created_by: str,
-    set_active: bool,
-) -> Dict[str, Any]:
-    version_no = _next_version_number(client, survey_id)
-
-    ins_rows = qexec(
-        client.table("survey_versions").insert({
-            "survey_id":       survey_id,
-            "version":         version_no,
-            "content":         content,
-            "threshold_green": int(threshold_green),
-            "threshold_amber": int(threshold_amber),
-            "created_by":      created_by,
-            "is_active":       False,
-        })
-    )
-
-    if ins_rows:
-        ver = ins_rows[0]
-    else:
-        # fallback: odczytaj świeżo zapisaną wersję
+def _whitelist_entry(client: Client, email: str) -> Optional[Dict[str, Any]]:
+    """
+    Wpis allowed_emails (email, is_admin) ze współdzielonego cache – jedno zapytanie
+    na dostęp i rolę. Brak wpisu nie jest cachowany (nowi klienci z checkoutu od razu wchodzą).
+    """
+    def _load() -> Optional[Dict[str, Any]]:
         rows = qexec(
-            client.table("survey_versions")
-                  .select("*")
-                  .eq("survey_id", survey_id)
-                  .eq("version", version_no)
+            client.table("allowed_emails")
+                  .select("email, is_admin")
+                  .eq("email", email)
                   .limit(1)
         )
-        if not rows:
-            raise RuntimeError("Wersja zapisana, ale nie udało się jej odczytać.")
-        ver = rows[0]
+        return rows[0] if rows else None
+    return get_shared_cache().get_or_load(NS_WHITELIST, email, _load,
+                                          ttl=WHITELIST_CACHE_TTL_S, client=client)
 
-    if set_active:
-        _set_active_version(client, survey_id, ver["id"])
-        ver["is_active"] = True
-
-    return ver
-
-def _load_active_version(client: Client) -> Optional[Dict[str, Any]]:
-    survey = _get_or_create_survey(client)
-    rows = qexec(
-        client.table("survey_versions")
-              .select("*")
-              .eq("survey_id", survey["id"])
-              .eq("is_active", True)
-              .limit(1)
-    )
-    if rows:
-        return rows[0]
-    return None
-
-def _list_versions(client: Client) -> List[Dict[str, Any]]:
-    survey = _get_or_create_survey(client)
-    rows = qexec(
-        client.table("survey_versions")
-              .select("id, version, created_at, threshold_green, threshold_amber, is_active, created_by")
-              .eq("survey_id", survey["id"])
-              .order("version", desc=True)
-    )
-    return rows
-
-
-def _score_answer(q: Dict[str, Any], value) -> float:
-    """Liczy punktację dla pojedynczego pytania zgodnie z typem."""
-    t = q.get("type")
-    if t == "single":
-        # value = etykieta; szukamy opcji i bierzemy jej score
-        for opt in q.get("options", []):
-            if opt.get("label") == value:
-                return float(opt.get("score", 0))
-        return 0.0
-    elif t == "multi":
-        # value = lista etykiet; sumujemy score opcji
-        total = 0.0
-        selected = value or []
-        for opt in q.get("options", []):
-            if opt.get("label") in selected:
-                total += float(opt.get("score", 0))
-        return total
-    elif t == "scale":
-        # value = liczba; przelicznik na punkty
-        mn = q.get("min", 1)
-        step_score = float(q.get("score_per_step", 0))
-        try:
-            return max(0.0, (float(value) - float(mn)) * step_score)
-        except Exception:
-            return 0.0
-    return 0.0
-
-import io
-
-def _answers_map(answers: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """question_id -> value (już rozpakowane)"""
-    out: Dict[str, Any] = {}
-    for a in answers or []:
-        out[a["question_id"]] = (a.get("answer") or {}).get("value")
-    return out
-
-def _wide_row_for_session(version: Dict[str, Any],
-                          session: Dict[str, Any],
-                          answers: List[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
-    """Zwraca: (nagłówki, wartości) dla jednej sesji."""
-    qs_by_id = _questions_by_id(version)
-    qids = list(qs_by_id.keys())            # kolejność jak w wersji
-    amap = _answers_map(answers)
-
-    def v2str(q, v):
-        if q.get("type") == "multi":
-            return "|".join(v or [])
-        return "" if v is None else str(v)
-
-    headers = ["session_id", "user_email", "status", "score", "submitted_at"] + qids
-    row = [
-        session.get("id",""),
-        session.get("user_email",""),
-        session.get("status",""),
-        session.get("score",""),
-        (session.get("submitted_at") or "").replace("T"," ")[:19],
-    ] + [ v2str(qs_by_id[qid], amap.get(qid)) for qid in qids ]
-    return headers, row
-
-# =============================================================================
-#  Parsowanie uploadu (CSV / JSON)
-# =============================================================================
-def _parse_uploaded_file(upl) -> Dict[str, Any]:
-    """
-    Zwraca dict (content) gotowy do zapisania w JSONB.
-    CSV -> records; JSON -> dowolny obiekt/array.
-    """
-    if upl is None:
-        raise ValueError("Nie wybrano pliku.")
-    name = upl.name.lower()
-    raw = upl.read()
-    if name.endswith(".csv"):
-        df = pd.read_csv(io.BytesIO(raw))
-        return {"type": "csv", "records": json.loads(df.to_json(orient="records"))}
-    else:
-        try:
-            data = json.loads(raw.decode("utf-8"))
-        except Exception:
-            text = raw.decode("utf-8")
-            rows = [json.loads(line) for line in text.splitlines() if line.strip()]
-            data = rows
-        return {"type": "json", "data": data}
-
-def csv_user_sessions(client, user_email: str) -> bytes:
-    rows = qexec(
-        client.table("survey_sessions")
-        .select("id, survey_version_id, status, score, created_at, submitted_at")
-        .eq("user_email", user_email)
-        .order("created_at", desc=True)
-    ) or []
-
-    buf = io.StringIO()
-    w = csv.writer(buf)
-    w.writerow(["id","version_id","status","score","created_at","submitted_at"])
-    for r in rows:
-        w.writerow([r.get("id"), r.get("survey_version_id"), r.get("status"),
-                    r.get("score"), r.get("created_at"), r.get("submitted_at")])
-    return buf.getvalue().encode("utf-8")
-
-def csv_single_session_answers(client, session_id: str) -> Tuple[str, bytes]:
-    session, answers, version = _load_session_with_answers(client, session_id)
-    if not session or not version:
-        return ("session_answers.csv", b"id,NO_DATA\n")
-    qb = _questions_by_id(version)
-    # Kolejność według wersji
-    qids = list(qb.keys())
-
-    # Mapa odpowiedzi
-    amap = {a["question_id"]: a["answer"] for a in answers}
-
-    buf = io.StringIO()
-    w = csv.writer(buf)
-    header = ["session_id","user_email","status","score","submitted_at"] + qids
-    w.writerow(header)
-
-    def _val_to_str(q, val):
-        if q.get("type") == "multi":
-            return "|".join(val or [])
-        return "" if val is None else str(val)
-
-    row = [
-        session["id"],
-        session.get("user_email",""),
-        session.get("status",""),
-        session.get("score",""),
-        session.get("submitted_at",""),
-    ] + [_val_to_str(qb[qid], (amap.get(qid) or {}).get("value")) for qid in qids]
-
-    w.writerow(row)
-    fname = f"answers_{session['id']}.csv"
-    return (fname, buf.getvalue().encode("utf-8"))
-
-def admin_csv_all_sessions_for_version(client, version_id: str) -> Tuple[bytes, bytes]:
-    # sessions summary
-    sessions = qexec(
-        client.table("survey_sessions")
-        .select("id, user_email, status, score, created_at, submitted_at")
-        .eq("survey_version_id", version_id)
-        .order("created_at")
-    ) or []
-
-    buf_s = io.StringIO(); ws = csv.writer(buf_s)
-    ws.writerow(["id","user_email","status","score","created_at","submitted_at"])
-    for s in sessions:
-        ws.writerow([s["id"], s["user_email"], s["status"], s["score"], s["created_at"], s["submitted_at"]])
-    sessions_csv = buf_s.getvalue().encode("utf-8")
-
-    # answers wide (kolumny = pytania)
-    version = _get_version(client, version_id)
-    qb = _questions_by_id(version)
-    qids = list(qb.keys())
-
-    # Zbuduj mapę: session_id -> {qid: value}
-    answers = qexec(
-        client.table("survey_answers")
-        .select("session_id, question_id, answer")
-        .in_("session_id", [s["id"] for s in sessions] or ["00000000-0000-0000-0000-000000000000"])
-    ) or []
-    amap: Dict[str, Dict[str, Any]] = {}
-    for a in answers:
-        sid = a["session_id"]; qid = a["question_id"]; val = (a["answer"] or {}).get("value")
-        amap.setdefault(sid, {})[qid] = val
-
-    def _val_to_str(q, val):
-        if q.get("type") == "multi":
-            return "|".join(val or [])
-        return "" if val is None else str(val)
-
-    buf_a = io.StringIO(); wa = csv.writer(buf_a)
-    wa.writerow(["session_id","user_email","status","score","submitted_at"] + qids)
-    for s in sessions:
-        row = [s["id"], s["user_email"], s["status"], s["score"], s["submitted_at"]]
-        for qid in qids:
-            row.append(_val_to_str(qb[qid], amap.get(s["id"], {}).get(qid)))
-        wa.writerow(row)
-    answers_csv = buf_a.getvalue().encode("utf-8")
-
-    return sessions_csv, answers_csv
-
-def _build_pdf_for_session(version: Dict[str, Any],
-                           session: Dict[str, Any],
-                           answers: List[Dict[str, Any]],
-                           thr_g: int, thr_a: int) -> bytes:
-    """
-    Szybki PDF przez reportlab (bez wkhtml/Weasy). Prosty układ: nagłówek, metadane, wynik, lista Q/A.
-    """
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from reportlab.lib.units import mm
-        from reportlab.lib.styles import getSampleStyleSheet
-        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-        from reportlab.lib.enums import TA_LEFT
-    except Exception as e:
-        # Gdyby brakowało biblioteki, zwróć „fałszywy PDF” z podpowiedzią.
-        return f"Reportlab not available: {e}".encode("utf-8")
-
-    buf = io.BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4,
-                            leftMargin=18*mm, rightMargin=18*mm,
-                            topMargin=18*mm, bottomMargin=18*mm)
-    styles = getSampleStyleSheet()
-    styleH = styles["Heading1"]; styleH.alignment = TA_LEFT
-    styleP = styles["BodyText"]
-
-    flow = []
-    title = f"DORA Audit — Sesja {session.get('id','')[:8]}"
-    flow.append(Paragraph(title, styleH))
-    flow.append(Spacer(1, 6))
-
-    # Metadane
-    md = [
-        ["Użytkownik", session.get("user_email","")],
-        ["Status", session.get("status","")],
-        ["Wersja", f"v{version.get('version','')}"],
-        ["Wysłano", (session.get("submitted_at") or "").replace("T"," ")[:19]],
-    ]
-    t_md = Table(md, hAlign="LEFT", colWidths=[40*mm, 110*mm])
-    t_md.setStyle(TableStyle([
-        ("GRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
-        ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
-        ("ALIGN",(0,0),(-1,-1),"LEFT"),
-        ("VALIGN",(0,0),(-1,-1),"MIDDLE"),
-    ]))
-    flow.append(t_md)
-    flow.append(Spacer(1, 8))
-
-    # Wynik + badge
-    score = session.get("score")
-    if score is not None:
-        label, color = _result_badge(float(score), thr_g, thr_a)
-        # prosta „łatka” z kolorem
-        flow.append(Paragraph(f"Wynik: <b>{score:g}</b> — {label}", styleP))
-        flow.append(Spacer(1, 6))
-
-    # Tabela pytań i odpowiedzi
-    qs_by_id = _questions_by_id(version)
-    amap = _answers_map(answers)
-    rows = [["#", "Pytanie", "Odpowiedź", "Punkty"]]
-    idx = 1
-    for qid, q in qs_by_id.items():
-        val = amap.get(qid)
-        txt = ""
-        if q.get("type") == "multi":
-            txt = ", ".join(val or [])
-        else:
-            txt = "" if val in (None,"") else str(val)
-        # „punkty” jeśli liczysz per pytanie
-        try:
-            pts = _score_answer(q, val)
-        except Exception:
-            pts = ""
-        rows.append([idx, q.get("text",""), txt, pts])
-        idx += 1
-
-    t = Table(rows, repeatRows=1, colWidths=[10*mm, 90*mm, 60*mm, 20*mm])
-    t.setStyle(TableStyle([
-        ("GRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
-        ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-    ]))
-    flow.append(t)
-
-    doc.build(flow)
-    return buf.getvalue()
+def is_admin(client: Client, email: str) -> bool:
+    if not email:
+        return False
+    row = _whitelist_entry(client, email)
+    return bool(row and row.get("is_admin"))
 
 # =============================================================================
 #  Widoki: User / Admin
@@ -656,7 +342,7 @@ def render_login_required():
 
 def render_user_panel(client: Client, email: str):
     ui_header("📋 Moje ankiety", f"Zalogowano jako: {email}")
-    active = _load_active_version(client)
+    active = load_active_version(client)
     if active:
         ui_card(
             f"Aktywna wersja: v{active['version']}",
@@ -665,34 +351,63 @@ def render_user_panel(client: Client, email: str):
         )
         c1, c2 = st.columns(2)
         with c1:
-            st.button("➕ Rozpocznij nową ankietę", type="primary", use_container_width=True)
+            if st.button("➕ Rozpocznij nową ankietę", type="primary", use_container_width=True):
                 st.session_state.pop("resume_session_id", None)
-                render_take_survey(client=supa(), user_email=current_email)
-                st.stop()
+                st.session_state.pop("form_session_id", None)       # nowy formularz = nowe id sesji
+                st.session_state["taking_survey"] = True
         with c2:
-            st.button("⤴️ Wróć do ostatniej ankiety", use_container_width=True)
-                # jeśli ktoś kliknął "Wznów"
-                if st.session_state.get("resume_session_id"):
-                    render_take_survey(supa(), current_email, session_id=st.session_state["resume_session_id"])
-                    st.stop()
-                    
-        render_my_attempts(supa(), current_email)
+            if st.button("⤴️ Wróć do ostatniej ankiety", use_container_width=True):
+                st.session_state["taking_survey"] = True
+                if not st.session_state.get("resume_session_id"):
+                    try:
+                        draft_id = dashboard.load_summary(client, email).get("open_draft_id")
+                    except RuntimeError:
+                        draft_id = None
+                    if draft_id:
+                        st.session_state["resume_session_id"] = draft_id
+
+        # jeśli ktoś kliknął "Rozpocznij" / "Wznów"
+        if st.session_state.get("taking_survey") or st.session_state.get("resume_session_id"):
+            render_take_survey(client, email, session_id=st.session_state.get("resume_session_id"))
+            return
+
+        # jedno zapytanie na stronę startową: podsumowanie zasila i kafelki, i listę podejść
+        try:
+            summary = dashboard.load_summary(client, email)
+        except Exception as e:
+            st.warning(f"Nie udało się pobrać podsumowania: {e}")
+            summary = None
+        if summary is not None:
+            render_dashboard_summary(summary)
+        render_my_attempts(client, email, summary)
 
     else:
         ui_card("Brak aktywnej wersji ankiety", "<p class='muted'>Skontaktuj się z administratorem.</p>")
 
-def _result_badge(score: float, thr_green: int, thr_amber: int) -> Tuple[str, str]:
-    """
-    Zwraca (label, color) dla wyniku.
-    green: score >= thr_green
-    amber: score >= thr_amber
-    red:   w pozostałych przypadkach
-    """
-    if score >= thr_green:
-        return ("Green", "#2ecc71")
-    if score >= thr_amber:
-        return ("Amber", "#f1c40f")
-    return ("Red", "#e74c3c")
+_BAND_ICONS = {"Green": "🟢", "Amber": "🟡", "Red": "🔴"}
+
+def render_dashboard_summary(summary: Dict[str, Any]):
+    """Strona startowa z jednego wiersza user_dashboard (dora_audit.dashboard): wyniki, szkic, wykres podejść."""
+    def _score(key: str) -> str:
+        score = summary.get(f"{key}_score")
+        if score is None:
+            return "—"
+        band = summary.get(f"{key}_band") or ""
+        return f"{_BAND_ICONS.get(band, '')} {score:.0f} pkt".strip()
+
+    with ui.card("Podsumowanie"):
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Ostatni wynik", _score("latest"), help=summary.get("latest_band"))
+        c2.metric("Najlepszy wynik", _score("best"), help=summary.get("best_band"))
+        c3.metric("Wysłane podejścia", summary.get("attempts") or 0)
+        draft_id = summary.get("open_draft_id")
+        if draft_id:
+            st.button("✏️ Wznów otwarty szkic", key="dashboard_resume_draft",
+                      on_click=_set_state, args=("resume_session_id", draft_id))
+        history = summary.get("history") or []
+        if len(history) > 1:
+            st.line_chart([{"wysłano": (h.get("at") or "")[:16].replace("T", " "), "wynik": h.get("score")}
+                           for h in history], x="wysłano", y="wynik", height=200)
 
 def _load_draft_answers(client, session_id: str) -> Dict[str, Any]:
     ans = qexec(
@@ -702,22 +417,82 @@ def _load_draft_answers(client, session_id: str) -> Dict[str, Any]:
     )
     return {row["question_id"]: row["answer"] for row in ans}
 
-def _compute_total_score(questions: List[Dict[str, Any]], filled: Dict[str, Any]) -> float:
-    total = 0.0
-    for q in questions:
-        qid = q.get("id")
-        payload = filled.get(qid)
-        if not payload:
-            continue
-        total += _score_answer(q, payload.get("value"))
-    return total
+def _own_client() -> Client:
+    """
+    Klient głównej bazy z tokenem tej sesji Streamlit – dla zapisów w tle. Wspólny
+    supa() dostaje set_session przy każdym rerunie każdej karty, więc wątek
+    autozapisu zapisywałby z tokenem tego, kto zalogował się ostatni.
+    """
+    token = st.session_state.get("access_token")
+    cached = st.session_state.get("own_client")
+    if cached is None or cached[0] != token:          # odświeżony token – nowy klient
+        cached = (token, session_client_from_env(token))
+        st.session_state["own_client"] = cached
+    return cached[1]
+
+def _job_client(user_email: str) -> Client:
+    """
+    Klient dla zadania w tle (eksport): replika albo główna baza, zawsze z tokenem
+    tej sesji – wspólny supa() zmieniłby w trakcie zadania sesję, a RLS obcięłoby wynik.
+    """
+    client = reads(user_email)
+    return _own_client() if client is read_router().primary else client
+
+def _get_autosaver(active: Dict[str, Any], user_email: str, session_id: str) -> DraftAutosaver:
+    """
+    Jeden bufor na sesję Streamlit, wersję ankiety i id sesji (trzymany w session_state).
+    Zatrzymany bufor (odmowa zapisu, limit błędów) zostaje – pokazuje powód zamiast ponawiać.
+    """
+    saver: Optional[DraftAutosaver] = st.session_state.get("draft_autosaver")
+    client = _own_client()
+    if saver is None or saver.version_id != active["id"] or saver.session_id != session_id:
+        if saver is not None:
+            saver.close()
+        saver = DraftAutosaver(client, active, user_email, session_id, limiter=write_limiter())
+        st.session_state["draft_autosaver"] = saver
+    saver.client = client
+    return saver
+
+def _form_session_id() -> str:
+    """Id nowej sesji nadawane przy otwarciu formularza; szkic i wysyłka to upserty po nim."""
+    if "form_session_id" not in st.session_state:
+        st.session_state["form_session_id"] = str(uuid.uuid4())
+    return st.session_state["form_session_id"]
+
+def _question_visibility(version: Dict[str, Any], questions: List[Dict[str, Any]],
+                         prefill: Dict[str, Any], session_id: Optional[str]) -> Optional[Set[str]]:
+    """
+    Widoczne pytania wg reguł show_if (None = wersja bez reguł).
+    Graf reguł kompilowany raz na wersję; między rerunami przeliczamy tylko
+    pytania zależne od odpowiedzi, które się zmieniły.
+    """
+    graph = compile_rules(questions)
+    if not graph.conditional:
+        return None
+    values: Dict[str, Any] = {}
+    for idx, q in enumerate(questions, start=1):
+        qid = q.get("id") or f"q{idx}"
+        key = f"q_{q.get('type')}_{qid}"
+        values[qid] = st.session_state[key] if key in st.session_state else (prefill.get(qid) or {}).get("value")
+
+    state = st.session_state.get("show_if_state")
+    if not state or state["scope"] != (version["id"], session_id):
+        visible = graph.visible(values)
+    else:
+        changed = [qid for qid, v in values.items() if state["values"].get(qid) != v]
+        visible = graph.update(state["visible"], values, changed) if changed else state["visible"]
+    st.session_state["show_if_state"] = {"scope": (version["id"], session_id), "values": values, "visible": visible}
+    return visible
 
 def render_take_survey(client: Client, user_email: str, session_id: Optional[str] = None):
     """
     - bez session_id: tworzy nową sesję DRAFT przy 'Zapisz szkic' albo SUBMITTED przy 'Wyślij' (jak poprzednio),
     - z session_id: wznawia; pre-fill z survey_answers; można zapisać szkic lub wysłać.
+    - autozapis: zmiany trafiają do bufora DraftAutosaver i są zapisywane w tle.
+    Id nowej sesji nadaje formularz (_form_session_id), a zapisy to upserty po
+    nim (save_session) – rerun ani ponowienie nie tworzą drugiej sesji.
     """
-    active = _load_active_version(client)
+    active = load_active_version(client)
     ui.header("Wypełnij ankietę")
 
     if not active:
@@ -740,12 +515,27 @@ def render_take_survey(client: Client, user_email: str, session_id: Optional[str
         st.write(f"**Wersja**: {active.get('version')}  •  **Progi**: GREEN ≥ {thr_green}, AMBER ≥ {thr_amber}")
         if session_id:
             st.info(f"Wznawiasz szkic: `{session_id}`")
+        # Autozapis wymaga widżetów poza st.form – tylko wtedy zmiana wywołuje rerun
+        autosave = st.toggle("Autozapis szkicu", value=AUTOSAVE_ENABLED, key="autosave_enabled")
+
+    form_id = session_id or _form_session_id()
+    saver: Optional[DraftAutosaver] = None
+    if autosave:
+        saver = _get_autosaver(active, user_email, form_id)
+    else:
+        st.session_state.pop("draft_autosaver", None)
 
-    with st.form(key=f"survey_form_{session_id or 'new'}"):
+    # show_if: w trybie formularza widoczność odświeża się po zapisie szkicu (st.form nie robi rerunu)
+    visible = _question_visibility(active, questions, prefill, form_id)
+
+    form_ctx = st.container() if autosave else st.form(key=f"survey_form_{form_id}")
+    with form_ctx:
         answers_payload: Dict[str, Any] = {}
 
         for idx, q in enumerate(questions, start=1):
             qid   = q.get("id") or f"q{idx}"
+            if visible is not None and qid not in visible:
+                continue
             qtype = q.get("type")
             qtext = q.get("text", f"Pytanie {idx}")
             st.markdown(f"**{idx}. {qtext}**")
@@ -756,7 +546,7 @@ def render_take_survey(client: Client, user_email: str, session_id: Optional[str
             if qtype == "single":
                 labels = [opt.get("label") for opt in q.get("options", [])]
                 val = st.radio(
-                    label="",
+                    label=qtext, label_visibility="collapsed",
                     options=labels,
                     index=(labels.index(default_val) if default_val in labels else 0) if labels else None,
                     key=f"q_single_{qid}"
@@ -767,7 +557,7 @@ def render_take_survey(client: Client, user_email: str, session_id: Optional[str
                 labels = [opt.get("label") for opt in q.get("options", [])]
                 def_list = [v for v in (default_val or []) if v in labels]
                 val = st.multiselect(
-                    label="",
+                    label=qtext, label_visibility="collapsed",
                     options=labels,
                     default=def_list,
                     key=f"q_multi_{qid}"
@@ -789,7 +579,8 @@ def render_take_survey(client: Client, user_email: str, session_id: Optional[str
                 answers_payload[qid] = {"type": "scale", "value": val}
 
             elif qtype == "text":
-                val = st.text_area("", value=(default_val or ""), key=f"q_text_{qid}")
+                val = st.text_area(qtext, value=(default_val or ""), key=f"q_text_{qid}",
+                                   label_visibility="collapsed")
                 answers_payload[qid] = {"type": "text", "value": val}
             else:
                 st.info(f"(pominięto nieznany typ `{qtype}`)")
@@ -797,49 +588,57 @@ def render_take_survey(client: Client, user_email: str, session_id: Optional[str
             st.divider()
 
         c1, c2 = st.columns([0.5, 0.5])
-        save_draft = c1.form_submit_button("Zapisz szkic", use_container_width=True)
-        submitted  = c2.form_submit_button("Wyślij ankietę", type="primary", use_container_width=True)
+        if autosave:
+            save_draft = c1.button("Zapisz szkic", use_container_width=True)
+            submitted  = c2.button("Wyślij ankietę", type="primary", use_container_width=True)
+        else:
+            save_draft = c1.form_submit_button("Zapisz szkic", use_container_width=True)
+            submitted  = c2.form_submit_button("Wyślij ankietę", type="primary", use_container_width=True)
+
+    # --- autozapis: kolejkuj zmiany; ręczny zapis/wysyłka najpierw opróżnia bufor
+    if saver is not None:
+        saver.queue(answers_payload)
+        if save_draft or submitted:
+            saver.close()       # ostatnia próba; zapis poniżej i tak obejmuje cały formularz
+            st.session_state.pop("draft_autosaver", None)
+        if saver.flushes:
+            st.session_state["resume_session_id"] = saver.session_id
+            read_router().note_write(user_email)    # „Moje podejścia” zobaczą szkic od razu
+        if saver.closed and saver.last_error:
+            st.warning(f"Autozapis: {saver.last_error}")
+        elif saver.last_error:
+            st.caption(f"⚠️ Autozapis: {saver.last_error} (ponowimy za chwilę)")
+        elif saver.pending_count:
+            st.caption("💾 Autozapis: zapisywanie…")
+        elif saver.last_saved_at:
+            st.caption(f"✅ Autozapis: zapisano {saver.last_saved_at.strftime('%H:%M:%S')} UTC")
 
     # --- zapis szkicu: upsert odpowiedzi + status='draft'
     if save_draft:
         try:
-            # jeżeli brak session_id – twórz draft (bez score na siłę; ale policzymy, by user widział podgląd)
-            if not session_id:
-                ses = qexec(
-                    client.table("survey_sessions").insert({
-                        "survey_version_id": active["id"],
-                        "user_email": user_email,
-                        "status": "draft",
-                        "score": _compute_total_score(questions, answers_payload),
-                    }).select("*").single()
-                )
-                session_id = ses["id"]
-            else:
-                # aktualizuj sesję (draft)
-                qexec(
-                    client.table("survey_sessions")
-                    .update({"status": "draft", "score": _compute_total_score(questions, answers_payload)})
-                    .eq("id", session_id)
-                )
-
-            # upsert odpowiedzi (unikat: session_id + question_id)
-            upsert_rows = []
-            for q in questions:
-                qid = q.get("id")
-                upsert_rows.append({
-                    "session_id": session_id,
-                    "question_id": qid,
-                    "answer": answers_payload.get(qid, {"type": q.get("type"), "value": None})
-                })
-            if upsert_rows:
-                qexec(
-                    client.table("survey_answers")
-                    .upsert(upsert_rows, on_conflict="session_id,question_id")
-                )
+            with _write_slot(user_email, "Zapisywanie szkicu…", "draft_save"):
+                # upsert sesji + odpowiedzi po id z formularza (jedno wywołanie, bezpieczne do ponowienia)
+                written = save_session(client, {
+                    "id": form_id,
+                    "survey_version_id": active["id"],
+                    "user_email": user_email,
+                    "status": "draft",
+                    "score": compute_total_score(questions, answers_payload, visible),
+                    "submitted_at": None,
+                }, _answer_rows(form_id, questions, answers_payload))
+                if not written:
+                    raise RuntimeError("Ta ankieta została już wysłana albo przeniesiona do nowej wersji – "
+                                       "szkicu nie zapisano. Otwórz ją ponownie w „Moje podejścia”.")
+                read_router().note_write(user_email)
+                if not session_id:
+                    dashboard.record_draft(client, user_email, form_id)
 
             with ui.card("Szkic zapisany"):
                 st.success("Możesz wrócić do szkicu w sekcji **Moje podejścia**.")
-            st.session_state["resume_session_id"] = session_id
+            st.session_state["resume_session_id"] = form_id
+        except WriteThrottled as e:
+            with ui.card("Szkic nie został zapisany"):
+                st.warning(str(e))
         except Exception as e:
             with ui.card("Błąd zapisu szkicu"):
                 st.error(str(e))
@@ -848,67 +647,102 @@ def render_take_survey(client: Client, user_email: str, session_id: Optional[str
     # --- submit: finalny zapis (status submitted), przelicz wynik, dopisz submitted_at
     if submitted:
         try:
-            total_score = _compute_total_score(questions, answers_payload)
-
-            if not session_id:
-                ses = qexec(
-                    client.table("survey_sessions").insert({
-                        "survey_version_id": active["id"],
-                        "user_email": user_email,
-                        "status": "submitted",
-                        "score": total_score,
-                        "submitted_at": datetime.utcnow().isoformat() + "Z",
-                    }).select("*").single()
-                )
-                session_id = ses["id"]
-            else:
-                qexec(
-                    client.table("survey_sessions").update({
-                        "status": "submitted",
-                        "score": total_score,
-                        "submitted_at": datetime.utcnow().isoformat() + "Z",
-                    }).eq("id", session_id)
-                )
-
-            # upsert odpowiedzi (by nadpisać ostatnie zmiany z formularza)
-            upsert_rows = []
-            for q in questions:
-                qid = q.get("id")
-                upsert_rows.append({
-                    "session_id": session_id,
-                    "question_id": qid,
-                    "answer": answers_payload.get(qid, {"type": q.get("type"), "value": None})
-                })
-            if upsert_rows:
-                qexec(client.table("survey_answers").upsert(upsert_rows, on_conflict="session_id,question_id"))
-
-            label, color = _result_badge(total_score, thr_green, thr_amber)
+            with _write_slot(user_email, "Wysyłanie ankiety…", "submit"):
+                total_score = compute_total_score(questions, answers_payload, visible)
+                submitted_at = datetime.utcnow().isoformat() + "Z"
+
+                session_id = form_id
+                session = {
+                    "id": session_id,
+                    "survey_version_id": active["id"],
+                    "user_email": user_email,
+                    "status": "submitted",
+                    "score": total_score,
+                    "submitted_at": submitted_at,
+                }
+                label, color = result_badge(total_score, thr_green, thr_amber)
+                # webhook: wiersz outboxa w tej samej transakcji co sesja – wysyła wątek dyspozytora
+                event = outbox.submission_event(session, active, label)
+                written = save_session(client, session, _answer_rows(session_id, questions, answers_payload), event)
+                if not written:
+                    raise RuntimeError("Ta ankieta została już wysłana – odpowiedzi pozostały bez zmian.")
+                read_router().note_write(user_email)    # read-your-writes: lista podejść z głównej bazy
+
+            # ankieta już zapisana (slot zwolniony): dalsze kroki są idempotentne po id sesji,
+            # a ich błąd nie cofa wysyłki – tylko ostrzeżenie
+            followup_error = None
+            try:
+                # eksporty tej wersji są już nieaktualne (wszystkie repliki); rozkład wyników – przyrostowo
+                get_shared_cache().bump(exports_ns(active["id"]), client)
+                record_submission(active["id"], session_id, total_score)
+                trends.record_submission(active, session_id, answers_payload)
+                dashboard.record_submit(client, user_email, {"id": session_id, "score": total_score,
+                                                             "submitted_at": submitted_at}, active)
+                dispatcher = webhook_dispatcher() if event else None
+                if dispatcher is not None:
+                    dispatcher.notify()
+            except Exception as e:
+                followup_error = str(e)
             with ui.card("Wynik"):
-                st.write(f"**Twój wynik:** {total_score:.0f} pkt")
+                st.write(f"**Twój wynik:** {total_score:.0f} / {max_total_score(questions, visible=visible):.0f} pkt")
                 st.markdown(
                     f'<div style="display:inline-block;padding:6px 12px;border-radius:8px;background:{color};color:#000;font-weight:700">{label}</div>',
                     unsafe_allow_html=True
                 )
+                _render_percentile(client, active["id"], total_score)
                 st.success("Odpowiedzi zapisane. Dziękujemy!")
+                if followup_error:
+                    st.warning(f"Nie udało się odświeżyć podsumowań po wysyłce: {followup_error}")
             # po submit możesz wyczyścić znacznik resume:
             st.session_state.pop("resume_session_id", None)
+            st.session_state.pop("form_session_id", None)
+            st.session_state.pop("taking_survey", None)
+        except WriteThrottled as e:
+            with ui.card("Ankieta nie została wysłana"):
+                st.warning(str(e))
         except Exception as e:
             with ui.card("Błąd wysyłki"):
                 st.error(str(e))
         return
 
+def _answer_rows(session_id: str, questions: List[Dict[str, Any]],
+                 answers_payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Wiersz survey_answers na każde pytanie wersji (brak odpowiedzi = value None)."""
+    rows = []
+    for idx, q in enumerate(questions, start=1):
+        qid = q.get("id") or f"q{idx}"
+        rows.append({"session_id": session_id, "question_id": qid,
+                     "answer": answers_payload.get(qid, {"type": q.get("type"), "value": None})})
+    return rows
+
+def _render_percentile(client: Client, version_id: str, score: float) -> None:
+    """Percentyl na tle wysłanych sesji wersji (dora_audit.ranking); błąd nie blokuje widoku."""
+    try:
+        result = percentile_for(client, version_id, score)
+    except Exception:
+        return
+    if result is not None:
+        st.caption(percentile_caption(*result))
+
+@st.fragment
 def render_session_view(client, session_id: str):
-    session, answers, version = _load_session_with_answers(client, session_id)
+    session, answers, version = load_session_with_answers(client, session_id)
+    archived = False
+    if not session:
+        # sesja przeniesiona do zimnego archiwum – odczyt tylko do podglądu
+        session, answers, version = load_archived_session(client, session_id)
+        archived = session is not None
     if not session:
         with ui.card("Brak sesji"):
             st.error("Nie znaleziono sesji.")
         return
 
-    qb = _questions_by_id(version) if version else {}
     thr_g = int(version.get("threshold_green", 80)) if version else 80
     thr_a = int(version.get("threshold_amber", 60)) if version else 60
 
     ui.header("Podgląd sesji")
+    if archived:
+        st.info("Sesja zarchiwizowana – tylko do odczytu.")
     with ui.card("Informacje"):
         c1, c2, c3, c4 = st.columns([0.3,0.3,0.2,0.2])
         c1.write(f"**Status:** {session['status']}")
@@ -917,153 +751,172 @@ def render_session_view(client, session_id: str):
         c4.write((session.get("submitted_at") or "").replace("T"," ")[:19])
 
         if session.get("score") is not None:
-            label, color = _result_badge(float(session["score"]), thr_g, thr_a)
+            label, color = result_badge(float(session["score"]), thr_g, thr_a)
             st.markdown(
                 f'<div style="display:inline-block;margin-top:6px;padding:6px 12px;border-radius:8px;background:{color};color:#000;font-weight:700">{label}</div>',
                 unsafe_allow_html=True
             )
+            if session.get("status") == "submitted":
+                _render_percentile(client, session["survey_version_id"], float(session["score"]))
 
     with ui.card("Odpowiedzi"):
         if not answers:
             st.info("Brak odpowiedzi (pusty szkic).")
             return
-
-        # Mapka odpowiedzi
-        ans_map = {a["question_id"]: a["answer"] for a in answers}
-
-        for idx, (qid, q) in enumerate(qb.items(), start=1):
-            a = ans_map.get(qid, {})
-            val = a.get("value")
-            t = q.get("type")
-            st.markdown(f"**{idx}. {q.get('text','(pytanie)')}**")
-            if t == "multi":
-                st.write(", ".join(val or []))
-            else:
-                st.write(val if val not in (None, "") else "—")
-
-            # Pokaż punktację per pytanie (jeśli liczona)
-            try:
-                pts = _score_answer(q, val)
-                st.caption(f"Punkty: {pts:g}")
-            except Exception:
-                pass
-
-            st.divider()
+        preview = _session_preview(version, session, answers, thr_g, thr_a)
+        rows = preview["rows"]
+        if not rows:
+            st.info("Brak wersji ankiety – nie można pokazać pytań.")
+        else:
+            # jedna wirtualizowana tabela zamiast 4 elementów na pytanie
+            st.dataframe(rows, use_container_width=True, hide_index=True,
+                         column_config={"Pytanie": st.column_config.TextColumn(width="large"),
+                                        "Punkty": st.column_config.NumberColumn(format="%g"),
+                                        "Maks.": st.column_config.NumberColumn(format="%g")})
+            st.caption(f"Pytań: {len(rows)} · punkty: {sum(r['Punkty'] for r in rows):g}"
+                       f" / {sum(r['Maks.'] for r in rows):g}")
 
         # --- Tabelkowy „pivot” (kolumny = pytania)
     with ui.card("Tabela odpowiedzi (pivot)"):
         if not version:
             st.info("Brak wersji ankiety – nie można zbudować tabeli.")
         else:
-            headers, row = _wide_row_for_session(version, session, answers)
+            headers, row = wide_row_for_session(version, session, answers)
             # prosty „DataFrame” bez Pandas – Streamlit łyka listę rekordów:
             records = [dict(zip(headers, row))]
             st.dataframe(records, use_container_width=True, hide_index=True)
 
     # --- PDF
     with ui.card("Eksport PDF"):
-        try:
-            pdf_bytes = _build_pdf_for_session(version, session, answers, thr_g, thr_a)
+        if preview["pdf"] is None:
+            st.warning(f"Nie udało się zbudować PDF: {preview['pdf_error']}")
+        else:
             st.download_button(
                 "Pobierz PDF",
-                data=pdf_bytes,
+                data=preview["pdf"],
                 file_name=f"session_{session['id'][:8]}.pdf",
                 mime="application/pdf",
                 use_container_width=True
             )
+
+def _session_preview(version, session, answers, thr_g: int, thr_a: int) -> Dict[str, Any]:
+    """
+    Tabela odpowiedzi i PDF podglądu. Wysłana sesja się nie zmienia, więc oba
+    budujemy raz i trzymamy we współdzielonym cache (klucz: id + czas wysłania
+    + wynik); szkic – za każdym razem, bo odpowiedzi jeszcze się zmieniają.
+    """
+    def build() -> Dict[str, Any]:
+        rows = session_answer_rows(version, answers) if version else []
+        try:
+            with _profiled("pdf"):
+                pdf, error = build_pdf_for_session(version, session, answers, thr_g, thr_a), None
         except Exception as e:
-            st.warning(f"Nie udało się zbudować PDF: {e}")
+            pdf, error = None, str(e)
+        return {"rows": rows, "pdf": pdf, "pdf_error": error}
+
+    if session.get("status") != "submitted":
+        return build()
+    key = f"{session['id']}:{session.get('submitted_at')}:{session.get('score')}"
+    return get_shared_cache().get_or_load(NS_PREVIEW, key, build)
 
 
-def render_my_attempts(client, user_email: str):
+def _set_state(key: str, value: Any) -> None:
+    """on_click: zmiana stanu przed rerunem fragmentu – bez st.rerun() całej aplikacji."""
+    st.session_state[key] = value
+
+def render_my_attempts(client, user_email: str, summary: Optional[Dict[str, Any]] = None):
     ui.header("Moje podejścia")
-    rows = qexec(
-        client.table("survey_sessions")
-        .select("id, status, score, created_at, submitted_at")
-        .eq("user_email", user_email)
-        .order("created_at", desc=True)
-        .limit(50)
-    )
+    _attempts_panel(client, user_email, summary)
+    _my_sessions_export_card(user_email)
+
+def _summary_attempts(summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Wiersze listy podejść z podsumowania: otwarty szkic + ostatnie wysyłki (najnowsze pierwsze)."""
+    rows = [{"id": h["id"], "status": "submitted", "score": h.get("score"),
+             "created_at": None, "submitted_at": h.get("at")}
+            for h in reversed(summary.get("history") or [])]
+    if summary.get("open_draft_id"):
+        rows.insert(0, {"id": summary["open_draft_id"], "status": "draft", "score": None,
+                        "created_at": None, "submitted_at": None})
+    return rows
+
+@st.fragment
+def _attempts_panel(client, user_email: str, summary: Optional[Dict[str, Any]] = None):
+    """Lista podejść + podgląd: kliknięcia przeliczają tylko ten fragment (bez auth/nawigacji)."""
+    if summary is None or st.toggle("Pokaż wszystkie podejścia", key="show_all_attempts"):
+        # pełna lista z repliki, chyba że użytkownik właśnie coś zapisał; podgląd sesji – zawsze z głównej bazy
+        rows = qexec(
+            reads(user_email).table("survey_sessions")
+            .select("id, status, score, created_at, submitted_at")
+            .eq("user_email", user_email)
+            .order("created_at", desc=True)
+            .limit(50)
+        )
+    else:
+        # domyślnie bez zapytania – z wiersza podsumowania (ostatnie dashboard.HISTORY_LEN wysyłek)
+        rows = _summary_attempts(summary)
 
     if not rows:
         with ui.card("Brak podejść"):
             st.write("Nie masz jeszcze żadnych sesji.")
-        return
-
-    with ui.card("Lista podejść"):
-        for r in rows:
-            cols = st.columns([0.5, 0.5, 0.7, 0.7, 0.3, 0.3, 0.3])
-            cols[0].write(f"**{r['status']}**")
-            cols[1].write(f"score: {r['score'] if r['score'] is not None else '-'}")
-            cols[2].write(r.get("created_at", "")[:19].replace("T", " "))
-            cols[3].write((r.get("submitted_at") or "")[:19].replace("T", " "))
-            if r["status"] == "draft":
-                if cols[4].button("Wznów", key=f"resume_{r['id']}"):
-                    st.session_state["resume_session_id"] = r["id"]
-                    st.rerun()
-            else:
-                cols[4].write("—")
-            # w pętli listy podejść:
-            if cols[5].button("Podgląd", key=f"view_{r['id']}"):
-                st.session_state["view_session_id"] = r["id"]
-                st.rerun()
-            # po podglądzie / wznowieniu:
-            if r["status"] == "submitted":
-                if cols[6].button("CSV", key=f"csv_{r['id']}"):
-                    name, data = csv_single_session_answers(supa(), r["id"])
-                    st.download_button("Pobierz CSV odpowiedzi", data=data, file_name=name, mime="text/csv")
+    else:
+        with ui.card("Lista podejść"):
+            for r in rows:
+                cols = st.columns([0.5, 0.5, 0.7, 0.7, 0.3, 0.3, 0.3])
+                cols[0].write(f"**{r['status']}**")
+                cols[1].write(f"score: {r['score'] if r['score'] is not None else '-'}")
+                cols[2].write((r.get("created_at") or "")[:19].replace("T", " "))
+                cols[3].write((r.get("submitted_at") or "")[:19].replace("T", " "))
+                if r["status"] == "draft":
+                    if cols[4].button("Wznów", key=f"resume_{r['id']}"):
+                        st.session_state["resume_session_id"] = r["id"]
+                        st.rerun()      # cała aplikacja – zmiana widoku na ankietę
+                else:
+                    cols[4].write("—")
+                cols[5].button("Podgląd", key=f"view_{r['id']}",
+                               on_click=_set_state, args=("view_session_id", r["id"]))
+                # po podglądzie / wznowieniu:
+                if r["status"] == "submitted":
+                    if cols[6].button("CSV", key=f"csv_{r['id']}"):
+                        name, data = csv_single_session_answers(supa(), r["id"])
+                        st.download_button("Pobierz CSV odpowiedzi", data=data, file_name=name, mime="text/csv")
+
+    # archiwum czytamy dopiero na życzenie – bez dodatkowego zapytania na każdym rerunie
+    if ARCHIVE_URL and st.checkbox("Pokaż zarchiwizowane podejścia", key="show_archived"):
+        with ui.card("Archiwum"):
+            try:
+                archived = list_archived_sessions(client, user_email)
+            except Exception as e:
+                st.warning(f"Nie udało się pobrać archiwum: {e}")
+                archived = []
+            if not archived:
+                st.caption("Brak zarchiwizowanych sesji.")
+            for r in archived:
+                cols = st.columns([0.5, 0.5, 0.7, 0.7, 0.3])
+                cols[0].write(f"**{r['status']}**")
+                cols[1].write(f"score: {r['score'] if r['score'] is not None else '-'}")
+                cols[2].write((r.get("created_at") or "")[:19].replace("T", " "))
+                cols[3].write((r.get("submitted_at") or "")[:19].replace("T", " "))
+                cols[4].button("Podgląd", key=f"view_arch_{r['session_id']}",
+                               on_click=_set_state, args=("view_session_id", r["session_id"]))
 
     view_id = st.session_state.get("view_session_id")
     if view_id:
         render_session_view(supa(), view_id)
 
+@st.fragment
+def _my_sessions_export_card(user_email: str):
     with ui.card("Eksport moich sesji"):
-    if st.button("Pobierz listę moich sesji (CSV)"):
-        data = csv_user_sessions(supa(), user_email)
-        st.download_button("Pobierz sessions.csv", data=data, file_name="my_sessions.csv", mime="text/csv")
-
+        if st.button("Pobierz listę moich sesji (CSV)"):
+            data = csv_user_sessions(reads(user_email), user_email)
+            st.download_button("Pobierz sessions.csv", data=data, file_name="my_sessions.csv", mime="text/csv")
 
-import csv, io
-from typing import Dict, Any, List, Optional, Tuple
 
-def _get_version(client, version_id: str) -> Optional[Dict[str, Any]]:
-    row = qexec(
-        client.table("survey_versions")
-        .select("*")
-        .eq("id", version_id)
-        .single()
-    )
-    return row or None
-
-def _questions_by_id(version: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
-    content = version.get("content") or {}
-    qs = content.get("questions", []) or []
-    return {q.get("id") or f"q{idx}": q for idx, q in enumerate(qs, start=1)}
-
-def _load_session_with_answers(client, session_id: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
-    """Zwraca: (session, answers[], version)"""
-    session = qexec(
-        client.table("survey_sessions")
-        .select("*")
-        .eq("id", session_id)
-        .single()
-    )
-    if not session:
-        return None, [], None
-    answers = qexec(
-        client.table("survey_answers")
-        .select("question_id, answer")
-        .eq("session_id", session_id)
-        .order("question_id")
-    ) or []
-    version = _get_version(client, session["survey_version_id"])
-    return session, answers, version
-
-
-def render_versions_admin_block(client: Client):
+@st.fragment
+def render_versions_admin_block(client: Client, prefetched: Optional[Prefetch] = None):
     st.subheader("Wersje ankiety")
+    prefetched = prefetched or Prefetch()
     try:
-        rows = _list_versions(client)
+        rows = prefetched.take("versions", lambda: list_versions(client))
     except Exception as e:
         st.error(f"Nie udało się pobrać wersji: {e}")
         return
@@ -1083,24 +936,57 @@ def render_versions_admin_block(client: Client):
     })[["ver", "GREEN", "AMBER", "aktywna", "autor", "utworzono", "id"]]
     st.dataframe(df, use_container_width=True, hide_index=True)
 
+    migration = st.session_state.pop("draft_migration_result", None)
+    if migration is not None:
+        _render_draft_migration_result(migration)
+
     st.caption("Akcje:")
+    migrate = st.checkbox("Przenieś otwarte szkice do aktywowanej wersji", value=True, key="migrate_drafts_on_activate",
+                          help="Odpowiedzi przechodzą na pytania o tym samym id albo wg mapy pytań wersji "
+                               "(Trendy między wersjami); pozostałe pokaże raport.")
     cols = st.columns(min(4, len(rows)))
-    survey = _get_or_create_survey(client)
+    survey = prefetched.take("survey", lambda: get_or_create_survey(client))
     for idx, v in enumerate(rows):
         with cols[idx % len(cols)]:
             label = f"Ustaw aktywną: v{v['ver'] if 'ver' in v else v['version']}"
             disabled = bool(v.get("is_active"))
             if st.button(label, key=f"set_active_{v['id']}", disabled=disabled):
                 try:
-                    _set_active_version(client, survey_id=survey["id"], version_id=v["id"])
-                    st.success(f"Aktywowano wersję v{v.get('ver', v['version'])}.")
-                    st.rerun()
+                    set_active_version(client, survey_id=survey["id"], version_id=v["id"])
                 except Exception as e:
                     st.error(f"Nie udało się aktywować wersji: {e}")
+                    continue
+                if migrate:
+                    _migrate_drafts_to(client, get_version(client, v["id"]))
+                st.rerun()      # cała aplikacja: baner aktywnej wersji i ankieta użytkowników
+
+def _migrate_drafts_to(client: Client, version: Dict[str, Any]) -> None:
+    """Po aktywacji (lista wersji albo zapis nowej): szkice na nową wersję; wynik pokaże lista wersji po rerunie."""
+    try:
+        with st.spinner("Przenoszenie szkiców…"):
+            st.session_state["draft_migration_result"] = migrate_drafts(client, version)
+    except Exception as e:
+        st.session_state["draft_migration_result"] = str(e)
+
+def _render_draft_migration_result(result) -> None:
+    if isinstance(result, str):
+        st.warning(f"Wersja aktywna, ale szkiców nie przeniesiono: {result}. "
+                   "Ponów: `python -m dora_audit migrate-drafts <version_id>`.")
+        return
+    st.success(f"Przeniesiono szkice: {result.migrated} z {result.drafts} "
+               f"(odpowiedzi: {result.answers}).")
+    if result.unmappable_count:
+        st.warning(f"Nieprzeniesione odpowiedzi: {result.unmappable_count}"
+                   + (f" (pokazano {len(result.unmappable)})" if len(result.unmappable) < result.unmappable_count else ""))
+        st.dataframe([{**r, "value": json.dumps(r["value"], ensure_ascii=False)} for r in result.unmappable],
+                     use_container_width=True, hide_index=True)
 
 def render_admin_upload_block(client: Client, current_email: str):
     st.subheader("Wgraj nową ankietę")
     st.caption("Załaduj plik CSV/JSON i ustaw progi „green/amber”.")
+    saved = st.session_state.pop("upload_result", None)
+    if saved:
+        st.success(saved)
 
     upl = st.file_uploader("Plik ankiety", type=["csv", "json"])
     col_g, col_a, col_chk = st.columns([1,1,1])
@@ -1110,33 +996,34 @@ def render_admin_upload_block(client: Client, current_email: str):
         amber = st.number_input("Próg AMBER (%)", min_value=0, max_value=100, value=60, step=1)
     with col_chk:
         set_active = st.checkbox("Ustaw jako aktywną", value=True)
+        migrate = st.checkbox("Przenieś otwarte szkice", value=True, disabled=not set_active,
+                              key="migrate_drafts_on_upload")
 
     if st.button("💾 Zapisz nową wersję", type="primary"):
         if not upl:
             st.error("Nie wybrano pliku.")
             return
         try:
-            survey = _get_or_create_survey(client)
-            parsed: Dict[str, Any] = _parse_uploaded_file(upl)
-            ver = _save_new_version(
-                client,
-                survey_id=survey["id"],
-                content=parsed,
-                threshold_green=int(green),
-                threshold_amber=int(amber),
-                created_by=current_email,
-                set_active=set_active,
-            )
-            st.success(f"Zapisano wersję v{ver['version']} (active={ver['is_active']}).")
+            with _profiled("upload"):
+                survey = get_or_create_survey(client)
+                parsed: Dict[str, Any] = parse_uploaded_file(upl)
+                ver = save_new_version(
+                    client,
+                    survey_id=survey["id"],
+                    content=parsed,
+                    threshold_green=int(green),
+                    threshold_amber=int(amber),
+                    created_by=current_email,
+                    set_active=set_active,
+                )
         except Exception as e:
             st.error(f"❌ Nie udało się zapisać nowej wersji: {e}")
-
-def _whitelist_all(client: Client) -> List[Dict[str, Any]]:
-    return qexec(
-        client.table("allowed_emails")
-              .select("email, created_at, source, is_admin")
-              .order("created_at", desc=True)
-    )
+            return
+        st.session_state["upload_result"] = f"Zapisano wersję v{ver['version']} (active={ver['is_active']})."
+        if ver.get("is_active") and migrate:
+            _migrate_drafts_to(client, ver)
+        # odczyty panelu (dora_audit.prefetch) wystartowały przed zapisem – baner i lista wersji od nowa
+        st.rerun()
 
 def _whitelist_add_user(client: Client, email: str) -> None:
     email = email.strip().lower()
@@ -1147,6 +1034,7 @@ def _whitelist_add_user(client: Client, email: str) -> None:
             on_conflict="email"
         )
     )
+    get_shared_cache().bump(NS_WHITELIST, client)
 
 def _whitelist_add_admin(client: Client, email: str) -> None:
     email = email.strip().lower()
@@ -1156,6 +1044,7 @@ def _whitelist_add_admin(client: Client, email: str) -> None:
             on_conflict="email"
         )
     )
+    get_shared_cache().bump(NS_WHITELIST, client)
 
 def _whitelist_remove_admin(client: Client, email: str) -> None:
     email = email.strip().lower()
@@ -1164,8 +1053,171 @@ def _whitelist_remove_admin(client: Client, email: str) -> None:
               .update({"is_admin": False})
               .eq("email", email)
     )
+    get_shared_cache().bump(NS_WHITELIST, client)
+
+def _sessions_prev() -> None:
+    st.session_state["admin_sessions_cursors"].pop()
+
+def _sessions_next(cursor: Tuple[str, str]) -> None:
+    st.session_state["admin_sessions_cursors"].append(cursor)
+
+def _admin_version_options(client: Client) -> List[Dict[str, Any]]:
+    """Ostatnie wersje do list wyboru (przeglądarka sesji, eksport)."""
+    return qexec(
+        client.table("survey_versions")
+        .select("id, version, is_active, threshold_green, threshold_amber, created_at")
+        .order("created_at", desc=True)
+        .limit(100)
+    ) or []
 
-def render_admin_whitelist_block(client: Client):
+@st.fragment
+def render_admin_sessions_block(client: Client, prefetched: Optional[Prefetch] = None):
+    """Przeglądarka sesji: filtry w bazie (dora_audit.sessions), keyset, podgląd w render_session_view."""
+    st.subheader("Sesje")
+    try:
+        versions = (prefetched or Prefetch()).take("version_options", lambda: _admin_version_options(client))
+    except Exception as e:
+        st.error(f"Nie udało się pobrać wersji: {e}")
+        return
+    by_id = {v["id"]: v for v in versions}
+    date_labels = {"created_at": "utworzenia", "submitted_at": "wysłania"}
+
+    with st.form("admin_sessions_filters"):
+        c1, c2, c3 = st.columns(3)
+        version_id = c1.selectbox("Wersja", [None] + list(by_id),
+                                  format_func=lambda i: "wszystkie" if i is None else f"v{by_id[i]['version']}")
+        status = c2.selectbox("Status", [None, "submitted", "draft"],
+                              format_func=lambda x: "wszystkie" if x is None else x)
+        band = c3.selectbox("Pasmo RAG", [None, *BANDS], format_func=lambda x: "wszystkie" if x is None else x,
+                            help="Progi wybranej wersji – wymaga wyboru wersji.")
+        c4, c5, c6 = st.columns(3)
+        score_min = c4.number_input("Wynik od", value=None, step=1.0)
+        score_max = c5.number_input("Wynik do", value=None, step=1.0)
+        email_prefix = c6.text_input("E-mail (prefiks)", placeholder="jan.k")
+        c7, c8, c9 = st.columns(3)
+        date_field = c7.selectbox("Data", DATE_FIELDS, format_func=date_labels.get)
+        date_from = c8.date_input("Od", value=None)
+        date_to = c9.date_input("Do", value=None)
+        searched = st.form_submit_button("Szukaj")
+
+    if searched:
+        st.session_state["admin_sessions_filter"] = SessionFilter(
+            version_id=version_id, status=status, score_min=score_min, score_max=score_max, band=band,
+            date_from=date_from, date_to=date_to, date_field=date_field, email_prefix=email_prefix,
+        )
+        st.session_state["admin_sessions_cursors"] = [None]
+        st.session_state.pop("admin_sessions_count", None)
+        st.session_state.pop("admin_view_session_id", None)
+    flt: Optional[SessionFilter] = st.session_state.get("admin_sessions_filter")
+    if flt is None:
+        st.caption("Ustaw filtry i kliknij „Szukaj”.")
+        return
+
+    version = by_id.get(flt.version_id) if flt.version_id else None
+    cursors = st.session_state["admin_sessions_cursors"]
+    try:
+        if "admin_sessions_count" not in st.session_state:     # raz na zestaw filtrów
+            st.session_state["admin_sessions_count"] = estimate_count(reads(), flt, version=version)
+        rows, next_cursor = search_sessions(reads(), flt, after=cursors[-1], version=version)
+    except (RuntimeError, ValueError) as e:
+        st.error(str(e))
+        return
+
+    st.caption(f"ok. {st.session_state['admin_sessions_count']} sesji • strona {len(cursors)}")
+    for r in rows:
+        v = by_id.get(r["survey_version_id"]) or {}
+        band_label = "—"
+        if r.get("score") is not None and v:
+            band_label, _ = result_badge(float(r["score"]), int(v.get("threshold_green", 80)),
+                                         int(v.get("threshold_amber", 60)))
+        cols = st.columns([0.8, 1.2, 0.3, 0.5, 0.4, 0.4, 0.4])
+        cols[0].write((r.get(flt.date_field) or r.get("created_at") or "")[:19].replace("T", " "))
+        cols[1].write(r.get("user_email", ""))
+        cols[2].write(f"v{v['version']}" if v else "—")
+        cols[3].write(r["status"])
+        cols[4].write("-" if r.get("score") is None else f"{r['score']:g}")
+        cols[5].write(band_label)
+        cols[6].button("Otwórz", key=f"admin_open_{r['id']}",
+                       on_click=_set_state, args=("admin_view_session_id", r["id"]))
+    if not rows:
+        st.info("Brak sesji dla tych filtrów.")
+
+    p_prev, _, p_next = st.columns([1, 2, 1])
+    p_prev.button("← Poprzednia", disabled=len(cursors) == 1, key="admin_sessions_prev", on_click=_sessions_prev)
+    p_next.button("Następna →", disabled=next_cursor is None, key="admin_sessions_next",
+                  on_click=_sessions_next, args=(next_cursor,))
+
+    view_id = st.session_state.get("admin_view_session_id")
+    if view_id:
+        st.button("Zamknij podgląd", key="admin_close_view",
+                  on_click=_set_state, args=("admin_view_session_id", None))
+        render_session_view(client, view_id)
+
+@st.fragment
+def render_admin_trends_block(client: Client):
+    """Trendy per sekcja / pytanie między wersjami (dora_audit.trends) + mapa pytań; ładowane na życzenie."""
+    st.subheader("Trendy dojrzałości")
+    if not st.toggle("Pokaż trendy między wersjami", key="trends_show"):
+        return
+    try:
+        agg = trends.get_aggregates(reads())
+    except Exception as e:
+        st.error(f"Nie udało się policzyć trendów: {e}")
+        return
+
+    sections = agg.section_table()
+    if sections.empty:
+        st.caption("Brak wysłanych sesji.")
+    else:
+        st.caption(f"Średni % punktów w odpowiedziach, {agg.sessions} wysłanych sesji.")
+        st.line_chart(sections.T, height=240)
+        st.dataframe(sections, use_container_width=True)
+        with st.expander("Per pytanie"):
+            st.dataframe(agg.question_table(), use_container_width=True)
+
+    with st.expander("Mapa pytań między wersjami"):
+        st.caption("Dla pytań, które w nowej wersji zmieniły id: {\"id_w_tej_wersji\": \"id_we_wcześniejszej\"}. "
+                   "Pytania bez wpisu zachowują swoje id.")
+        try:
+            versions = trends.load_versions(client)
+        except Exception as e:
+            st.error(f"Nie udało się pobrać wersji: {e}")
+            return
+        if len(versions) < 2:
+            st.caption("Mapa ma sens od drugiej wersji.")
+            return
+        later = versions[1:]
+        idx = st.selectbox("Wersja", options=list(range(len(later))), key="trends_map_version",
+                           format_func=lambda i: f"v{later[i]['version']}")
+        version = later[idx]
+        text = st.text_area("Mapa (JSON)", value=json.dumps(version.get("question_map") or {}, ensure_ascii=False),
+                            key=f"trends_map_{version['id']}")
+        if st.button("Zapisz mapę", key="trends_map_save"):
+            try:
+                mapping = json.loads(text or "{}")
+                trends.validate_question_map(mapping, version, [v for v in versions if v["version"] < version["version"]])
+                trends.save_question_map(client, version["id"], mapping)
+                st.success("Zapisano – trendy zostaną przeliczone.")
+            except (ValueError, RuntimeError) as e:
+                st.error(f"❌ {e}")
+
+def _whitelist_prev() -> None:
+    st.session_state["whitelist_cursors"].pop()
+
+def _whitelist_next(cursor: str) -> None:
+    st.session_state["whitelist_cursors"].append(cursor)
+
+def _whitelist_view() -> Tuple[str, bool, Optional[str]]:
+    """(zapytanie, tylko admini, kursor) listy z poprzedniego renderu – do odczytu z wyprzedzeniem."""
+    query = st.session_state.get("whitelist_query", "")
+    admins_only = bool(st.session_state.get("whitelist_admins_only", False))
+    cursors = st.session_state.get("whitelist_cursors") or [None]
+    if st.session_state.get("whitelist_filters") != (query.strip().lower(), admins_only):
+        cursors = [None]
+    return query, admins_only, cursors[-1]
+
+@st.fragment
+def render_admin_whitelist_block(client: Client, email: str, prefetched: Optional[Prefetch] = None):
     st.subheader("Whitelist / Administratorzy")
 
     new_email = st.text_input("Dodaj adres e-mail", placeholder="user@firma.com")
@@ -1175,6 +1227,7 @@ def render_admin_whitelist_block(client: Client):
         if st.button("Dodaj do whitelisty (user)", type="secondary", disabled=not new_email):
             try:
                 _whitelist_add_user(client, new_email)
+                read_router().note_write(email)
                 st.success(f"Dodano do whitelisty: {new_email}")
             except Exception as e:
                 st.error(str(e))
@@ -1183,6 +1236,7 @@ def render_admin_whitelist_block(client: Client):
         if st.button("Dodaj jako administratora", type="secondary", disabled=not new_email):
             try:
                 _whitelist_add_admin(client, new_email)
+                read_router().note_write(email)
                 st.success(f"Nadano uprawnienia admin: {new_email}")
             except Exception as e:
                 st.error(str(e))
@@ -1191,26 +1245,91 @@ def render_admin_whitelist_block(client: Client):
         if st.button("Usuń uprawnienia admin", type="secondary", disabled=not new_email):
             try:
                 _whitelist_remove_admin(client, new_email)
+                read_router().note_write(email)
                 st.success(f"Usunięto uprawnienia admin: {new_email}")
             except Exception as e:
                 st.error(str(e))
 
+    with st.expander("Import zbiorczy (CSV / TXT)"):
+        st.caption("CSV z kolumną `email` (opcjonalnie `role`: user/admin) albo TXT – jeden adres w linii. "
+                   "Adresy są normalizowane i deduplikowane; import nie odbiera uprawnień admina.")
+        wl_file = st.file_uploader("Plik z adresami", type=["csv", "txt"], key="whitelist_import_file")
+        c_role, c_dry = st.columns([1, 1])
+        default_role = c_role.selectbox("Rola dla wierszy bez roli", ["user", "admin"], key="whitelist_import_role")
+        dry_run = c_dry.checkbox("Tylko podgląd (dry-run)", value=True, key="whitelist_import_dry")
+        if st.button("Importuj", type="primary", disabled=wl_file is None, key="whitelist_import_go"):
+            try:
+                plan = import_whitelist(client, wl_file.name, wl_file.getvalue(),
+                                        default_admin=(default_role == "admin"), dry_run=dry_run)
+                if not dry_run:
+                    get_shared_cache().bump(NS_WHITELIST, client)
+                    read_router().note_write(email)
+                summ = plan.summary()
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("Dodane", summ["added"], help=f"w tym admini: {summ['added_admins']}")
+                m2.metric("Bez zmian", summ["unchanged"])
+                m3.metric("Awansowane na admina", summ["promoted"])
+                m4.metric("Niepoprawne", summ["invalid"])
+                if plan.invalid:
+                    st.warning("Pominięto niepoprawne adresy: " + ", ".join(plan.invalid[:20])
+                               + (" …" if len(plan.invalid) > 20 else ""))
+                if dry_run:
+                    st.info("Podgląd – nic nie zapisano. Odznacz „dry-run”, aby zaimportować.")
+                else:
+                    st.success("Import zakończony.")
+            except Exception as e:
+                st.error(f"Import nie powiódł się: {e}")
+
     st.divider()
     st.caption("Lista dozwolonych adresów")
+    c_q, c_adm = st.columns([3, 1])
+    wl_query = c_q.text_input("Szukaj", placeholder="prefiks adresu (jan.k) albo domena (@firma.pl)",
+                              key="whitelist_query")
+    admins_only = c_adm.checkbox("Tylko admini", key="whitelist_admins_only")
+
+    # keyset: stos kursorów poprzednich stron; zmiana filtrów wraca na 1. stronę
+    filters = (wl_query.strip().lower(), admins_only)
+    if st.session_state.get("whitelist_filters") != filters:
+        st.session_state["whitelist_filters"] = filters
+        st.session_state["whitelist_cursors"] = [None]
+    cursors: List[Optional[str]] = st.session_state["whitelist_cursors"]
+
+    view = (wl_query, admins_only, cursors[-1])
     try:
-        rows = _whitelist_all(client)
-        st.dataframe(rows, use_container_width=True)
+        rows, next_cursor = (prefetched or Prefetch()).take(
+            ("whitelist", view), lambda: whitelist_page(reads(email), wl_query, admins_only, after=cursors[-1]))
     except Exception as e:
         st.error(str(e))
+        return
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    p_prev, p_info, p_next = st.columns([1, 2, 1])
+    p_prev.button("← Poprzednia", disabled=len(cursors) == 1, key="whitelist_prev", on_click=_whitelist_prev)
+    p_info.caption(f"Strona {len(cursors)} • {len(rows)} wpisów")
+    p_next.button("Następna →", disabled=next_cursor is None, key="whitelist_next",
+                  on_click=_whitelist_next, args=(next_cursor,))
 
 def render_admin_panel(client: Client, email: str):
     ui_header("👑 Panel administracyjny", f"Zalogowano jako: {email}")
+    # niezależne odczyty bloków startują razem (dora_audit.prefetch); bloki odbierają wyniki
+    wl_query, wl_admins, wl_cursor = _whitelist_view()
+    version_options = lambda: _admin_version_options(client)
+    reader = reads(email)
+    prefetched = Prefetch({
+        "active": lambda: load_active_version(client),
+        "versions": lambda: list_versions(client),
+        "survey": lambda: get_or_create_survey(client),
+        "version_options": version_options,
+        "export_versions": version_options,
+        ("whitelist", (wl_query, wl_admins, wl_cursor)):
+            lambda: whitelist_page(reader, wl_query, wl_admins, after=wl_cursor),
+    })
     render_admin_upload_block(client, email)
 
     st.divider()
     st.subheader("Aktywna wersja")
     try:
-        active = _load_active_version(client)
+        active = prefetched.take("active", lambda: load_active_version(client))
         if active:
             st.success(f"v{active['version']} | green={active['threshold_green']} | amber={active['threshold_amber']}")
         else:
@@ -1220,34 +1339,218 @@ def render_admin_panel(client: Client, email: str):
 
     st.divider()
     st.caption("Poniżej znajdziesz wszystkie zapisane wersje ankiety. Kliknij przycisk, aby ustawić wersję aktywną.")
-    render_versions_admin_block(client)
+    render_versions_admin_block(client, prefetched)
+
+    st.divider()
+    render_admin_sessions_block(client, prefetched)
 
     st.divider()
-    render_admin_whitelist_block(client)
+    render_admin_trends_block(client)
 
+    st.divider()
+    render_admin_whitelist_block(client, email, prefetched)
+
+    render_admin_export_block(client, email, prefetched)
+
+    st.divider()
+    render_admin_history_import_block(client)
+
+    if outbox.enabled():
+        st.divider()
+        render_admin_webhooks_block(client)
+
+    st.divider()
+    render_admin_profiling_block()
+
+def _webhooks_retry(client: Client) -> None:
+    n = outbox.retry_failed(client)
+    dispatcher = webhook_dispatcher()
+    if dispatcher is not None:
+        dispatcher.notify()
+    st.session_state["webhooks_msg"] = f"Przywrócono do kolejki: {n}."
+
+@st.fragment
+def render_admin_webhooks_block(client: Client):
+    """Status dostarczania webhooków (outbox) + ponowienie nieudanych."""
+    st.subheader("Webhooki")
+    dispatcher = webhook_dispatcher()
+    try:
+        counts = outbox.status_counts(client)
+        events = outbox.recent_events(client, limit=20)
+    except Exception as e:
+        st.error(f"Nie udało się pobrać outboxa: {e}")
+        return
+
+    msg = st.session_state.pop("webhooks_msg", None)
+    if msg:
+        st.success(msg)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Oczekujące", counts["pending"])
+    c2.metric("Dostarczone", counts["delivered"])
+    c3.metric("Nieudane", counts["failed"])
+    if dispatcher is not None:
+        last = dispatcher.last_run_at.strftime("%H:%M:%S") if dispatcher.last_run_at else "—"
+        st.caption(f"Dyspozytor: ostatni cykl {last} UTC • błąd: {dispatcher.last_error or 'brak'}")
+
+    if events:
+        st.dataframe(
+            [{"utworzono": (e.get("created_at") or "")[:19].replace("T", " "), "status": e["status"],
+              "próby": e["attempts"], "sesja": e["session_id"], "email": e["user_email"],
+              "następna próba": (e.get("next_attempt_at") or "")[:19].replace("T", " ")
+                                if e["status"] == "pending" else "",
+              "błąd": e.get("last_error") or ""} for e in events],
+            use_container_width=True, hide_index=True,
+        )
+    else:
+        st.caption("Brak zdarzeń.")
+
+    b1, b2 = st.columns(2)
+    b1.button("Ponów nieudane", disabled=not counts["failed"], key="webhooks_retry",
+              on_click=_webhooks_retry, args=(client,))
+    if b2.button("Wyślij teraz", disabled=dispatcher is None, key="webhooks_kick"):
+        dispatcher.notify()
+
+def _profiling_toggle() -> None:
+    get_profiler().enabled = bool(st.session_state.get("profiling_enabled"))
+
+@st.fragment
+def render_admin_profiling_block():
+    """Profilowanie CPU (dora_audit.profiling): przełącznik na proces + najwolniejsze przechwycenia."""
+    prof = get_profiler()
+    st.subheader("Profilowanie CPU")
+    st.session_state["profiling_enabled"] = prof.enabled
+    st.toggle("Profiluj reruny i akcje (cały proces)", key="profiling_enabled", on_change=_profiling_toggle)
+    st.caption(f"Przechwycone: {prof.stats['captured']} • pominięte (próbkowanie): {prof.stats['sampled_out']} "
+               f"• pominięte (inny rerun profilowany): {prof.stats['busy']}")
+
+    captures = prof.slowest()
+    if not captures:
+        st.caption("Brak przechwyceń – włącz profilowanie i odśwież stronę albo wykonaj akcję.")
+        return
+    tab_slow, tab_tags, tab_funcs = st.tabs(["Najwolniejsze", "Strony / akcje", "Funkcje"])
+    with tab_slow:
+        st.dataframe([c.summary() for c in captures], use_container_width=True, hide_index=True)
+        idx = st.selectbox("Szczegóły przechwycenia", range(len(captures)), key="profiling_pick",
+                           format_func=lambda i: f"{captures[i].tag} – {captures[i].wall_ms:.0f} ms")
+        st.code(captures[idx].stats_text(), language="text")
+    with tab_tags:
+        st.dataframe(prof.tag_summary(), use_container_width=True, hide_index=True)
+    with tab_funcs:
+        st.dataframe(prof.hot_functions(), use_container_width=True, hide_index=True)
+    st.button("Wyczyść", key="profiling_clear", on_click=prof.clear)
+
+@st.fragment
+def render_admin_export_block(client: Client, email: str, prefetched: Optional[Prefetch] = None):
+    """Eksport wersji jako zadanie w tle (dora_audit.exports) + lista „Moje eksporty”."""
+    scheduler = get_export_scheduler()
     with ui.card("Eksport (Admin)"):
-    versions = qexec(
-        client.table("survey_versions")
-        .select("id, version, is_active, created_at")
-        .order("created_at", desc=True)
-        .limit(100)
-    ) or []
+        versions = (prefetched or Prefetch()).take("export_versions", lambda: _admin_version_options(client))
 
+        if not versions:
+            st.info("Brak wersji.")
+        else:
+            lbls = [f"v{v['version']} ({'active' if v['is_active'] else v['created_at'][:10]})" for v in versions]
+            chosen = st.selectbox("Wybierz wersję do eksportu", options=list(range(len(versions))), format_func=lambda i: lbls[i])
+            if st.button("Zleć eksport (sessions.csv + answers_wide.csv)", key="export_submit"):
+                try:
+                    scheduler.submit(_job_client(email), email, versions[chosen]["id"], f"v{versions[chosen]['version']}")
+                    st.success("Eksport w kolejce – pliki pojawią się w sekcji „Moje eksporty”.")
+                except RuntimeError as e:
+                    st.warning(str(e))
+
+    jobs = scheduler.jobs_for(email)
+    if any(j.active for j in jobs):
+        _export_progress(email)
+    finished = [j for j in jobs if not j.active]
+    if finished:
+        with ui.card("Moje eksporty"):
+            for job in finished:
+                c1, c2, c3, c4 = st.columns([0.35, 0.25, 0.25, 0.15])
+                c1.write(f"**{job.version_label}** • {job.created_at[:19].replace('T', ' ')}")
+                if job.status == "done":
+                    for col, name in ((c2, "sessions.csv"), (c3, "answers_wide.csv")):
+                        col.download_button(name, data=scheduler.artifact(job, name).read_bytes(),
+                                            file_name=f"{name[:-4]}_{job.version_label}.csv", mime="text/csv",
+                                            key=f"export_dl_{job.id}_{name}")
+                else:
+                    c2.write("anulowany" if job.status == "cancelled" else f"błąd: {job.error}")
+                c4.button("Usuń", key=f"export_del_{job.id}",
+                          on_click=scheduler.delete, args=(job.id, email))
+
+@st.fragment
+def render_admin_history_import_block(client: Client):
+    """Import historycznych ocen z answers_wide.csv (dora_audit.bulk_import); wersje ładowane dopiero po wyborze pliku."""
+    st.subheader("Import historycznych ocen")
+    st.caption("Plik w układzie answers_wide.csv (jak eksport wersji): session_id, user_email, status, "
+               "submitted_at + kolumna na pytanie. Wyniki są liczone od nowa; przerwany import wznawia się "
+               "od ostatniej zapisanej porcji po ponownym wgraniu tego samego pliku.")
+    upl = st.file_uploader("answers_wide.csv", type=["csv"], key="history_import_file")
+    if not upl:
+        return
+    try:
+        versions = list_versions(client)
+    except Exception as e:
+        st.error(f"Nie udało się pobrać wersji: {e}")
+        return
     if not versions:
         st.info("Brak wersji.")
-    else:
-        lbls = [f"v{v['version']} ({'active' if v['is_active'] else v['created_at'][:10]})" for v in versions]
-        chosen = st.selectbox("Wybierz wersję do eksportu", options=list(range(len(versions))), format_func=lambda i: lbls[i])
-        ver_id = versions[chosen]["id"]
+        return
+    chosen = st.selectbox("Wersja docelowa", options=list(range(len(versions))), key="history_import_version",
+                          format_func=lambda i: f"v{versions[i]['version']}" + (" (active)" if versions[i]["is_active"] else ""))
+    mapping_text = st.text_area("Mapa kolumn (JSON, opcjonalnie)", key="history_import_map",
+                                placeholder='{"Rejestr aktywów": "q1"}')
+    b1, b2 = st.columns(2)
+    check = b1.button("Sprawdź plik", key="history_import_check")
+    run = b2.button("Importuj", type="primary", key="history_import_run")
+    if not (check or run):
+        return
 
-        c1, c2 = st.columns([0.5,0.5])
-        if c1.button("Pobierz sessions.csv"):
-            s_csv, _ = admin_csv_all_sessions_for_version(client, ver_id)
-            st.download_button("Pobierz sessions.csv", data=s_csv, file_name=f"sessions_{versions[chosen]['version']}.csv", mime="text/csv")
+    raw = upl.getvalue()
+    total = max(1, raw.count(b"\n") - 1)
+    bar = st.progress(0.0, text="Import…") if run else None
+    try:
+        mapping = json.loads(mapping_text) if mapping_text.strip() else None
+        version = get_version(client, versions[chosen]["id"])
+        with _profiled("history_import"):
+            report = import_history(
+                client, version, raw, mapping=mapping, dry_run=not run,
+                progress=(lambda rows, done: bar.progress(min(1.0, rows / total), text=f"Zapisano {done} sesji…"))
+                         if bar else None,
+            )
+    except (ValueError, RuntimeError) as e:
+        st.error(f"❌ Import nie powiódł się: {e}")
+        return
 
-        if c2.button("Pobierz answers_wide.csv"):
-            _, a_csv = admin_csv_all_sessions_for_version(client, ver_id)
-            st.download_button("Pobierz answers_wide.csv", data=a_csv, file_name=f"answers_wide_{versions[chosen]['version']}.csv", mime="text/csv")
+    if run:
+        msg = f"Zaimportowano {report.imported} sesji w {report.chunks} porcjach."
+        if report.resumed_from:
+            msg += f" Wznowiono od wiersza {report.resumed_from + 1}."
+        st.success(msg)
+    else:
+        st.info(f"Wierszy: {report.rows}, do zaimportowania: {report.imported}, odrzuconych: {report.invalid_count}.")
+    if report.unmapped_columns:
+        st.warning("Kolumny bez pytania (pominięte): " + ", ".join(report.unmapped_columns))
+    if report.missing_questions:
+        st.caption("Pytania bez kolumny (puste odpowiedzi): " + ", ".join(report.missing_questions))
+    if report.unknown_values:
+        st.caption("Wartości spoza opcji pytania: " +
+                   ", ".join(f"{qid}: {n}" for qid, n in report.unknown_values.most_common()))
+    if report.invalid_rows:
+        st.dataframe([{"wiersz": n, "powód": reason} for n, reason in report.invalid_rows],
+                     use_container_width=True, hide_index=True)
+
+@st.fragment(run_every=EXPORT_POLL_S)
+def _export_progress(email: str):
+    """Postęp zadań w toku – odświeżany co EXPORT_POLL_S bez rerunu panelu (tylko odczyt z dysku)."""
+    scheduler = get_export_scheduler()
+    active = [j for j in scheduler.jobs_for(email) if j.active]
+    if not active:
+        st.rerun()      # zadania skończyły się – pełny rerun pokaże pliki do pobrania
+    for job in active:
+        c1, c2 = st.columns([0.85, 0.15])
+        label = "w kolejce" if job.status == "queued" else f"{job.done} / {job.total} sesji"
+        c1.progress(job.progress, text=f"Eksport {job.version_label}: {label}")
+        c2.button("Anuluj", key=f"export_cancel_{job.id}", on_click=scheduler.cancel, args=(job.id, email))
 
 # =============================================================================
 #  Sidebar: Sesja / Wylogowanie
@@ -1303,9 +1606,11 @@ page = st.sidebar.radio(
     ["Moje ankiety"] + (["Panel administracyjny"] if user_is_admin else [])
 )
 
-if page == "Panel administracyjny":
-    render_admin_panel(client, current_email)
-else:
-    render_user_panel(client, current_email)
+st.session_state["profile_page"] = page
+with get_profiler().capture(page):
+    if page == "Panel administracyjny":
+        render_admin_panel(client, current_email)
+    else:
+        render_user_panel(client, current_email)
 
 session_bar(client)
@@ -0,0 +1,41 @@
+# app/dora_audit/__init__.py
+# -*- coding: utf-8 -*-
+"""
+DORA Audit — logika bez UI (punktacja, parsowanie, eksporty, PDF) i CLI.
+UI Streamlit (app.py) korzysta z tych samych funkcji.
+"""
+from .core import (
+    SURVEY_NAME,
+    qexec,
+    client_from_env,
+    score_answer,
+    compute_total_score,
+    max_total_score,
+    compute_scores,
+    result_badge,
+    parse_uploaded_file,
+    questions_by_id,
+    answers_map,
+    csv_user_sessions,
+    csv_single_session_answers,
+    admin_csv_all_sessions_for_version,
+    build_pdf_for_session,
+)
+
+__all__ = [
+    "SURVEY_NAME",
+    "qexec",
+    "client_from_env",
+    "score_answer",
+    "compute_total_score",
+    "max_total_score",
+    "compute_scores",
+    "result_badge",
+    "parse_uploaded_file",
+    "questions_by_id",
+    "answers_map",
+    "csv_user_sessions",
+    "csv_single_session_answers",
+    "admin_csv_all_sessions_for_version",
+    "build_pdf_for_session",
+]
@@ -0,0 +1,6 @@
+# app/dora_audit/__main__.py
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,298 @@
+# app/dora_audit/archive.py
+# -*- coding: utf-8 -*-
+"""
+Archiwizacja starych sesji do zimnego magazynu.
+
+Sesje wersji wycofanych (is_active = false) i/lub starsze niż okno retencji
+są zapisywane porcjami do plików gzip JSONL – osobno per wersja:
+
+    sessions/<version_id>/version.json          kopia wersji (pytania, progi)
+    sessions/<version_id>/<stempel>-<n>.jsonl.gz  {"session": {...}, "answers": [...]} w linii
+
+a potem usuwane z survey_sessions (odpowiedzi kaskadowo, migracja 0001 –
+jedno polecenie, więc sesja nie zostaje bez odpowiedzi). W bazie zostaje tylko
+wąski wiersz indeksu archived_sessions (migracja 0003) – wystarcza do listy
+„Moje podejścia” i do znalezienia pliku, z którego render_session_view
+odczytuje sesję (tylko do odczytu).
+
+Magazyn: DORA_ARCHIVE_URL = file:///ścieżka albo s3://bucket/prefiks
+(S3 / zgodne – boto3, endpoint z DORA_ARCHIVE_S3_ENDPOINT). Bez
+DORA_ARCHIVE_URL archiwizacja jest wyłączona. Zadanie usuwa cudze sesje,
+więc CLI musi działać z kluczem, który omija RLS (service role).
+
+Kolejność kroków (plik → indeks → usunięcie) sprawia, że przerwane zadanie
+można po prostu uruchomić ponownie: sesja, która ma już wiersz indeksu, nie
+jest zapisywana drugi raz (indeks wskazuje pierwszy plik), tylko usuwana.
+Najwyżej sesja przerwana przed zapisem indeksu trafi do dwóch plików.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import NS_ARCHIVE, NS_TRENDS, exports_ns, get_shared_cache, ranking_ns
+from .core import qexec
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+ARCHIVE_URL = os.getenv("DORA_ARCHIVE_URL", "").strip()
+ARCHIVE_S3_ENDPOINT = os.getenv("DORA_ARCHIVE_S3_ENDPOINT", "").strip() or None
+ARCHIVE_BATCH_SIZE = int(os.getenv("DORA_ARCHIVE_BATCH_SIZE", "500"))
+PAGE_SIZE = 1000            # domyślny limit wierszy PostgREST
+
+# =============================================================================
+#  Magazyny
+# =============================================================================
+class LocalArchiveStore:
+    """Katalog na dysku (wolumen hosta)."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def write(self, key: str, data: bytes) -> None:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)       # plik pojawia się w całości albo wcale
+
+    def read(self, key: str) -> bytes:
+        return (self.root / key).read_bytes()
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+
+class S3ArchiveStore:
+    """Bucket S3 lub zgodny (MinIO, R2…) – boto3 ładowane leniwie."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("Archiwum s3:// wymaga pakietu boto3.") from e
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._s3 = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def write(self, key: str, data: bytes) -> None:
+        self._s3.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def read(self, key: str) -> bytes:
+        return self._s3.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._s3.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception:
+            return False
+
+
+def open_store(url: Optional[str] = None):
+    """Magazyn z URL (domyślnie DORA_ARCHIVE_URL); None, gdy archiwum nie jest skonfigurowane."""
+    url = (url if url is not None else ARCHIVE_URL).strip()
+    if not url:
+        return None
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[5:].partition("/")
+        return S3ArchiveStore(bucket, prefix, endpoint_url=ARCHIVE_S3_ENDPOINT)
+    return LocalArchiveStore(url[7:] if url.startswith("file://") else url)
+
+# =============================================================================
+#  Zadanie archiwizacji
+# =============================================================================
+@dataclass
+class ArchiveReport:
+    sessions: int = 0
+    answers: int = 0
+    files: List[str] = field(default_factory=list)
+    dry_run: bool = False
+
+    def summary(self) -> Dict[str, Any]:
+        return {"sessions": self.sessions, "answers": self.answers,
+                "files": len(self.files), "dry_run": self.dry_run}
+
+def _version_dir(version_id: str) -> str:
+    return f"sessions/{version_id}"
+
+def _paged(make_query: Callable[[], Any], page: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Wszystkie wiersze zapytania porcjami range() (PostgREST obcina do ~1000)."""
+    rows: List[Dict[str, Any]] = []
+    while True:
+        chunk = qexec(make_query().range(len(rows), len(rows) + page - 1))
+        rows.extend(chunk)
+        if len(chunk) < page:
+            return rows
+
+def retired_version_ids(client: Client) -> List[str]:
+    return [r["id"] for r in qexec(
+        client.table("survey_versions").select("id").eq("is_active", False)
+    )]
+
+def _candidates(client: Client, version_ids: Optional[List[str]], before: Optional[str],
+                after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    q = client.table("survey_sessions").select("*")
+    if version_ids is not None:
+        q = q.in_("survey_version_id", version_ids)
+    if before:
+        q = q.lt("created_at", before)
+    if after_id:
+        q = q.gt("id", after_id)
+    return qexec(q.order("id").limit(limit))
+
+def _load_answers(client: Client, session_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    rows = _paged(lambda: client.table("survey_answers")
+                                .select("session_id, question_id, answer")
+                                .in_("session_id", session_ids)
+                                .order("session_id")
+                                .order("question_id"))
+    out: Dict[str, List[Dict[str, Any]]] = {sid: [] for sid in session_ids}
+    for r in rows:
+        out[r["session_id"]].append({"question_id": r["question_id"], "answer": r["answer"]})
+    return out
+
+def _ensure_version_copy(client: Client, store, version_id: str) -> None:
+    key = f"{_version_dir(version_id)}/version.json"
+    if store.exists(key):
+        return
+    rows = qexec(client.table("survey_versions").select("*").eq("id", version_id).limit(1))
+    if rows:
+        store.write(key, json.dumps(rows[0], ensure_ascii=False, default=str).encode("utf-8"))
+
+def _write_batch(store, version_id: str, sessions: List[Dict[str, Any]],
+                 answers: Dict[str, List[Dict[str, Any]]]) -> str:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    key = f"{_version_dir(version_id)}/{stamp}-{len(sessions)}.jsonl.gz"
+    lines = (json.dumps({"session": s, "answers": answers.get(s["id"], [])},
+                        ensure_ascii=False, default=str) for s in sessions)
+    store.write(key, gzip.compress(("\n".join(lines) + "\n").encode("utf-8")))
+    return key
+
+def archive_sessions(client: Client, store, retired: bool = True,
+                     older_than_days: Optional[int] = None, dry_run: bool = False,
+                     batch_size: int = ARCHIVE_BATCH_SIZE) -> ArchiveReport:
+    """
+    Przenosi do archiwum sesje wersji wycofanych (retired) i/lub starsze niż
+    older_than_days (dowolnej wersji). dry_run tylko liczy.
+    """
+    if not retired and older_than_days is None:
+        raise ValueError("Podaj kryterium: wycofane wersje i/lub okno retencji.")
+    report = ArchiveReport(dry_run=dry_run)
+    before = ((datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+              if older_than_days is not None else None)
+
+    # dwa przebiegi: wersje wycofane (bez względu na wiek) oraz okno retencji (wszystkie wersje)
+    passes: List[Tuple[Optional[List[str]], Optional[str]]] = []
+    if retired:
+        ids = retired_version_ids(client)
+        if ids:
+            passes.append((ids, None))
+    if before:
+        passes.append((None, before))
+
+    touched_versions = set()
+    for version_ids, cutoff in passes:
+        after_id: Optional[str] = None
+        while True:
+            batch = _candidates(client, version_ids, cutoff, after_id, batch_size)
+            if not batch:
+                break
+            after_id = batch[-1]["id"]
+            session_ids = [s["id"] for s in batch]
+            answers = _load_answers(client, session_ids)
+            report.sessions += len(batch)
+            report.answers += sum(len(a) for a in answers.values())
+            if dry_run:
+                continue
+
+            # po przerwanym przebiegu: sesje z wierszem indeksu są już w pliku – tylko do usunięcia
+            indexed = {r["session_id"] for r in qexec(
+                client.table("archived_sessions").select("session_id").in_("session_id", session_ids))}
+            by_version: Dict[str, List[Dict[str, Any]]] = {}
+            for s in batch:
+                if s["id"] not in indexed:
+                    by_version.setdefault(s["survey_version_id"], []).append(s)
+            archived_at = datetime.now(timezone.utc).isoformat()
+            index_rows = []
+            for vid, sessions in by_version.items():
+                _ensure_version_copy(client, store, vid)
+                key = _write_batch(store, vid, sessions, answers)
+                report.files.append(key)
+                touched_versions.add(vid)
+                index_rows += [{
+                    "session_id": s["id"], "survey_version_id": vid,
+                    "user_email": s.get("user_email"), "status": s.get("status"),
+                    "score": s.get("score"), "created_at": s.get("created_at"),
+                    "submitted_at": s.get("submitted_at"),
+                    "archive_key": key, "archived_at": archived_at,
+                } for s in sessions]
+
+            if index_rows:
+                # istniejący wiersz indeksu (i jego archive_key) wygrywa
+                qexec(client.table("archived_sessions").upsert(index_rows, on_conflict="session_id",
+                                                               ignore_duplicates=True))
+            qexec(client.table("survey_sessions").delete().in_("id", session_ids))
+
+    cache = get_shared_cache()
+    for vid in touched_versions:
+        cache.bump(exports_ns(vid), client)
+        cache.bump(ranking_ns(vid), client)
+    if touched_versions:
+        cache.bump(NS_TRENDS, client)
+    return report
+
+# =============================================================================
+#  Odczyt (render_session_view)
+# =============================================================================
+def _read_archived(store, key: str, session_id: str) -> Optional[Dict[str, Any]]:
+    for line in gzip.decompress(store.read(key)).decode("utf-8").splitlines():
+        if session_id in line:
+            rec = json.loads(line)
+            if rec["session"]["id"] == session_id:
+                return rec
+    return None
+
+def load_archived_session(client: Client, session_id: str, store=None
+                          ) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """(session, answers, version) z archiwum albo (None, [], None). Wynik cache'owany – archiwum się nie zmienia."""
+    store = store if store is not None else open_store()
+    if store is None:
+        return None, [], None
+
+    def _load() -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+        rows = qexec(
+            client.table("archived_sessions")
+                  .select("survey_version_id, archive_key")
+                  .eq("session_id", session_id)
+                  .limit(1)
+        )
+        if not rows:
+            return None
+        rec = _read_archived(store, rows[0]["archive_key"], session_id)
+        if rec is None:
+            return None
+        vkey = f"{_version_dir(rows[0]['survey_version_id'])}/version.json"
+        version = json.loads(store.read(vkey)) if store.exists(vkey) else None
+        return rec["session"], rec["answers"], version
+
+    hit = get_shared_cache().get_or_load(NS_ARCHIVE, session_id, _load)
+    return hit if hit else (None, [], None)
+
+def list_archived_sessions(client: Client, user_email: str, limit: int = 50) -> List[Dict[str, Any]]:
+    return qexec(
+        client.table("archived_sessions")
+              .select("session_id, survey_version_id, status, score, created_at, submitted_at")
+              .eq("user_email", user_email)
+              .order("created_at", desc=True)
+              .limit(limit)
+    )
@@ -0,0 +1,219 @@
+# app/dora_audit/autosave.py
+# -*- coding: utf-8 -*-
+"""
+Autozapis szkicu ankiety (write-behind) – bez zależności od Streamlit.
+
+queue() tylko odkłada zmienione odpowiedzi; wątek w tle zapisuje je, gdy przez
+AUTOSAVE_DEBOUNCE_S nie było nowych zmian. Kolejne edycje tego samego pytania
+nadpisują się w buforze, więc trafiają do bazy jako jeden wiersz w jednym
+zbiorczym zapisie – core.save_session() po id sesji nadanym przy otwarciu
+formularza (pierwszy zapis tworzy szkic). Zapis idzie z wątku w tle, więc
+`client` musi mieć własną sesję właściciela szkicu (replica.session_client_from_env),
+nie wspólnego klienta aplikacji, którego token zmienia się z każdym rerunem.
+
+Nieudany zapis wraca do bufora i jest ponawiany z wykładniczym odstępem
+(debounce · 2^(n-1), najwyżej AUTOSAVE_BACKOFF_MAX_S). Po AUTOSAVE_MAX_FAILURES
+kolejnych błędach (np. trwały brak uprawnień) autozapis się poddaje – zmiany
+zostają w formularzu, można je zapisać przyciskiem. Odmowa zapisu (sesja
+wysłana albo przeniesiona do innej wersji) kończy autozapis od razu.
+
+Zegar jest wstrzykiwany (clock), a background=False wyłącza wątek – testy
+sterują zapisem przez tick().
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from . import dashboard
+from .core import compute_total_score, save_session
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+    from .throttle import WriteLimiter
+
+AUTOSAVE_DEBOUNCE_S = float(os.getenv("AUTOSAVE_DEBOUNCE_S", "2.0"))
+AUTOSAVE_IDLE_S = float(os.getenv("AUTOSAVE_IDLE_S", "900"))
+AUTOSAVE_BACKOFF_MAX_S = float(os.getenv("AUTOSAVE_BACKOFF_MAX_S", "60"))
+AUTOSAVE_MAX_FAILURES = int(os.getenv("AUTOSAVE_MAX_FAILURES", "8"))
+
+REFUSED = ("Szkic zmienił się poza tym formularzem (wysłany albo przeniesiony "
+           "do nowej wersji ankiety) – autozapis wyłączony.")
+
+
+class DraftAutosaver:
+    """Bufor write-behind dla jednej sesji ankiety."""
+
+    def __init__(self, client: Client, version: Dict[str, Any], user_email: str,
+                 session_id: str, debounce_s: Optional[float] = None,
+                 limiter: Optional[WriteLimiter] = None,
+                 backoff_max_s: Optional[float] = None, max_failures: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic, background: bool = True):
+        self.client = client
+        self.limiter = limiter
+        self.version_id = version["id"]
+        self.questions: List[Dict[str, Any]] = (version.get("content") or {}).get("questions", [])
+        self.user_email = user_email
+        self.session_id = session_id
+        self.debounce_s = AUTOSAVE_DEBOUNCE_S if debounce_s is None else debounce_s
+        self.backoff_max_s = AUTOSAVE_BACKOFF_MAX_S if backoff_max_s is None else backoff_max_s
+        self.max_failures = AUTOSAVE_MAX_FAILURES if max_failures is None else max_failures
+
+        self.last_saved_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.flushes = 0
+        self.failures = 0                     # kolejne nieudane zapisy (zeruje udany)
+
+        self._clock = clock
+        self._background = background
+        self._latest: Dict[str, Any] = {}     # pełny obraz odpowiedzi (do wyniku)
+        self._pending: Dict[str, Any] = {}    # qid -> payload czekający na zapis
+        self._seeded = False
+        self._last_change = 0.0
+        self._retry_at = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- API dla skryptu Streamlit -------------------------------------------
+    def queue(self, answers_payload: Dict[str, Any]) -> int:
+        """Porównuje stan formularza z buforem i kolejkuje różnice. Zwraca liczbę zmian."""
+        with self._cond:
+            if self._closed:
+                return 0
+            if not self._seeded:
+                # pierwszy render = stan wyjściowy (prefill), nic nie zapisujemy
+                self._latest = dict(answers_payload)
+                self._seeded = True
+                return 0
+            changed = 0
+            for qid, payload in answers_payload.items():
+                if self._latest.get(qid) != payload:
+                    self._latest[qid] = payload
+                    self._pending[qid] = payload
+                    changed += 1
+            if changed:
+                self._last_change = self._clock()
+                if self._background:
+                    self._ensure_worker()
+                self._cond.notify()
+            return changed
+
+    @property
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def next_flush_in(self) -> Optional[float]:
+        """Sekundy do następnego zapisu (debounce albo backoff po błędzie); None = nic do zapisania."""
+        with self._cond:
+            return self._wait_s()
+
+    def tick(self) -> bool:
+        """Zapis, jeśli minął debounce / backoff – krok wątku w tle (i testów)."""
+        wait = self.next_flush_in()
+        if wait is None or wait > 0:
+            return False
+        return self.flush()
+
+    def flush(self) -> bool:
+        """Zapisuje bufor natychmiast (wywoływane też przez wątek w tle)."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                latest = dict(self._latest)
+                client = self.client          # app podmienia klienta po odświeżeniu tokenu
+            if not batch:
+                return False
+            try:
+                # autozapis jest już zdebouncowany – bez kubełka, ale w globalnej kolejce zapisów
+                with (self.limiter.slot(self.user_email, rate_limited=False) if self.limiter else nullcontext()):
+                    # id nadany przy otwarciu formularza – ponowiony zapis nie tworzy drugiego szkicu
+                    written = save_session(
+                        client,
+                        {"id": self.session_id, "survey_version_id": self.version_id,
+                         "user_email": self.user_email, "status": "draft",
+                         "score": compute_total_score(self.questions, latest), "submitted_at": None},
+                        [{"session_id": self.session_id, "question_id": qid, "answer": payload}
+                         for qid, payload in batch.items()],
+                    )
+                    if not written:
+                        self.last_error = REFUSED
+                        self._stop()
+                        return False
+                    if not self.flushes:
+                        dashboard.record_draft(client, self.user_email, self.session_id)
+            except Exception as e:
+                self._failed(batch, e)
+                return False
+            self.last_error = None
+            self.last_saved_at = datetime.utcnow()
+            self.failures = 0
+            self.flushes += 1
+            return True
+
+    def close(self) -> None:
+        """Dopisuje resztę bufora (jedna próba) i zatrzymuje wątek (np. przed wysłaniem ankiety)."""
+        self.flush()
+        self._stop()
+
+    # --- błędy -----------------------------------------------------------------
+    def backoff_s(self, failures: int) -> float:
+        """Odstęp przed ponowieniem po `failures` kolejnych błędach."""
+        return min(self.backoff_max_s, self.debounce_s * (2 ** max(0, failures - 1)))
+
+    def _failed(self, batch: Dict[str, Any], exc: Exception) -> None:
+        with self._cond:
+            # oddaj niezapisane zmiany do bufora (nowsze edycje mają pierwszeństwo)
+            for qid, payload in batch.items():
+                self._pending.setdefault(qid, payload)
+            self.failures += 1
+            self._retry_at = self._clock() + self.backoff_s(self.failures)
+            if self.failures >= self.max_failures:
+                self.last_error = (f"Autozapis wstrzymany po {self.failures} nieudanych próbach: {exc}. "
+                                   "Zapisz szkic przyciskiem.")
+                self._closed = True
+            else:
+                self.last_error = str(exc)
+            self._cond.notify()
+
+    def _stop(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    # --- wątek w tle -----------------------------------------------------------
+    def _wait_s(self) -> Optional[float]:
+        if self._closed or not self._pending:
+            return None
+        due = max(self._last_change + self.debounce_s, self._retry_at if self.failures else 0.0)
+        return due - self._clock()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="draft-autosave", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                wait = self._wait_s()
+                if wait is None:
+                    # bezczynny wątek kończy się; queue() uruchomi go ponownie
+                    if self._closed or not self._cond.wait(AUTOSAVE_IDLE_S):
+                        return
+                    continue
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+            self.flush()
@@ -0,0 +1,304 @@
+# app/dora_audit/bulk_import.py
+# -*- coding: utf-8 -*-
+"""
+Import historycznych ocen z arkusza w układzie answers_wide.csv.
+
+Plik ma te same kolumny, które produkuje admin_csv_all_sessions_for_version
+(session_id, user_email, status, score, submitted_at + jedna kolumna na
+pytanie). Kolumny pytań są dopasowywane do id pytań wybranej wersji (dokładnie,
+potem bez wielkości liter) albo jawną mapą {kolumna: question_id}. Wartości
+multi rozdziela „|”, scale to liczba; wynik każdej sesji jest liczony od nowa
+(compute_total_score, z regułami show_if) – kolumna score z pliku jest ignorowana.
+
+Zapis idzie porcjami po IMPORT_CHUNK_SIZE sesji: jedna porcja = jedno
+wywołanie import_survey_sessions (migracja 0006 – sesje i odpowiedzi w jednej
+transakcji); na starszej bazie dwa upserty. Id sesji to uuid5(wersja, klucz
+wiersza), więc ponowny import tego samego pliku nadpisuje te same wiersze
+zamiast je dublować. Po każdej porcji stan trafia do pliku checkpointu
+(IMPORT_DIR/<sha pliku>-<wersja>.json): przerwany import wznawia się od
+pierwszej niezapisanej porcji.
+
+Import zapisuje sesje cudzych adresów – CLI musi działać z kluczem, który
+omija RLS (service role), a panel admina – z politykami dla adminów.
+
+    python -m dora_audit import-history answers_wide.csv <version_id> [--map map.json]
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import dashboard
+from .cache import NS_PREVIEW, NS_TRENDS, exports_ns, get_shared_cache, ranking_ns
+from .core import compute_total_score, missing_function, qexec, questions_by_id
+from .whitelist import normalize_email
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+IMPORT_CHUNK_SIZE = int(os.getenv("DORA_IMPORT_CHUNK_SIZE", "500"))
+IMPORT_DIR = os.getenv("DORA_IMPORT_DIR", os.path.join(tempfile.gettempdir(), "dora_audit_imports"))
+MAX_REPORTED_ERRORS = 200
+
+META_COLUMNS = ("session_id", "user_email", "status", "score", "submitted_at", "created_at")
+_NS = uuid.UUID("6f1c2a7e-54d4-4bb0-9a55-0d0b6c1e8f3a")     # przestrzeń uuid5 importu
+
+Progress = Callable[[int, int], None]      # (wiersze przetworzone, sesje zapisane)
+
+
+# =============================================================================
+#  Mapowanie kolumn i wartości
+# =============================================================================
+def map_columns(header: List[str], version: Dict[str, Any],
+                mapping: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], List[str], List[str]]:
+    """
+    Kolumny arkusza -> id pytań wersji. Zwraca ({kolumna: qid},
+    [kolumny bez pytania], [pytania bez kolumny]). Jawna mapa ma pierwszeństwo;
+    mapowanie na nieistniejące pytanie to błąd.
+    """
+    qids = list(questions_by_id(version))
+    by_lower = {q.lower(): q for q in qids}
+    mapping = mapping or {}
+    unknown = sorted(set(mapping.values()) - set(qids))
+    if unknown:
+        raise ValueError(f"Mapa kolumn wskazuje pytania spoza wersji: {', '.join(unknown)}")
+
+    cols: Dict[str, str] = {}
+    unmapped: List[str] = []
+    for col in header:
+        name = col.strip()
+        if name in mapping:
+            cols[col] = mapping[name]
+        elif name.lower() in META_COLUMNS:
+            continue
+        elif name in qids:
+            cols[col] = name
+        elif name.lower() in by_lower:
+            cols[col] = by_lower[name.lower()]
+        else:
+            unmapped.append(col)
+    dup = [q for q, n in Counter(cols.values()).items() if n > 1]
+    if dup:
+        raise ValueError(f"Kilka kolumn wskazuje to samo pytanie: {', '.join(sorted(dup))}")
+    missing = [q for q in qids if q not in cols.values()]
+    return cols, unmapped, missing
+
+def parse_value(q: Dict[str, Any], raw: str) -> Tuple[Any, bool]:
+    """Tekst komórki -> wartość odpowiedzi; drugi element: czy wartość pasuje do pytania."""
+    raw = (raw or "").strip()
+    if not raw:
+        return None, True
+    t = q.get("type")
+    labels = {o.get("label") for o in q.get("options", [])}
+    if t == "multi":
+        values = [v.strip() for v in raw.split("|") if v.strip()]
+        return values, all(v in labels for v in values)
+    if t == "scale":
+        try:
+            num = float(raw.replace(",", "."))
+        except ValueError:
+            return None, False
+        ok = float(q.get("min", 1)) <= num <= float(q.get("max", 5))
+        return (int(num) if num.is_integer() else num), ok
+    if t == "single":
+        return raw, raw in labels
+    return raw, True
+
+def _timestamp(raw: str) -> Optional[str]:
+    """'2024-03-01 10:05:00' / ISO z lub bez strefy -> ISO UTC; pusty -> None."""
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    dt = datetime.fromisoformat(raw.replace("Z", "+00:00").replace(" ", "T", 1))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+def session_id_for(version_id: str, key: str) -> str:
+    """Deterministyczne id importowanej sesji (ponowny import = te same wiersze)."""
+    return str(uuid.uuid5(_NS, f"{version_id}:{key}"))
+
+
+# =============================================================================
+#  Raport i checkpoint
+# =============================================================================
+@dataclass
+class ImportReport:
+    version_id: str
+    rows: int = 0                       # przetworzone wiersze danych (z pominiętymi przy wznowieniu)
+    imported: int = 0                   # sesje zapisane w tym uruchomieniu
+    resumed_from: int = 0               # wierszy pominiętych dzięki checkpointowi
+    chunks: int = 0
+    unmapped_columns: List[str] = field(default_factory=list)
+    missing_questions: List[str] = field(default_factory=list)
+    invalid_rows: List[Tuple[int, str]] = field(default_factory=list)     # (nr wiersza, powód)
+    invalid_count: int = 0
+    unknown_values: Counter = field(default_factory=Counter)              # qid -> liczba
+    done: bool = False
+
+    def reject(self, row_no: int, reason: str) -> None:
+        self.invalid_count += 1
+        if len(self.invalid_rows) < MAX_REPORTED_ERRORS:
+            self.invalid_rows.append((row_no, reason))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "resumed_from": self.resumed_from,
+            "chunks": self.chunks,
+            "invalid": self.invalid_count,
+            "unknown_values": sum(self.unknown_values.values()),
+            "unmapped_columns": len(self.unmapped_columns),
+            "missing_questions": len(self.missing_questions),
+            "done": self.done,
+        }
+
+
+def _checkpoint_path(directory: Path, digest: str, version_id: str) -> Path:
+    return directory / f"{digest[:16]}-{version_id}.json"
+
+def _load_checkpoint(path: Path) -> int:
+    try:
+        return int(json.loads(path.read_text(encoding="utf-8")).get("rows_done", 0))
+    except (OSError, ValueError):
+        return 0
+
+def _save_checkpoint(path: Path, rows_done: int, done: bool) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"rows_done": rows_done, "done": done,
+                               "updated_at": datetime.now(timezone.utc).isoformat()}), encoding="utf-8")
+    tmp.replace(path)
+
+
+# =============================================================================
+#  Import
+# =============================================================================
+def _write_chunk(client: Client, sessions: List[Dict[str, Any]], answers: List[Dict[str, Any]]) -> None:
+    try:
+        qexec(client.rpc("import_survey_sessions", {"p_sessions": sessions, "p_answers": answers}))
+    except RuntimeError as e:
+        if not missing_function(e):
+            raise
+        # brak funkcji (baza sprzed 0006) – dwa upserty; powtórzenie porcji jest bezpieczne
+        qexec(client.table("survey_sessions").upsert(sessions, on_conflict="id"))
+        qexec(client.table("survey_answers").upsert(answers, on_conflict="session_id,question_id"))
+
+def _data_rows(text: io.TextIOBase) -> Tuple[List[str], Iterator[Tuple[int, List[str]]]]:
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if not header:
+        raise ValueError("Pusty plik – brak nagłówka answers_wide.csv.")
+    return header, ((n, row) for n, row in enumerate(reader, start=1) if any(c.strip() for c in row))
+
+def import_history(client: Client, version: Dict[str, Any], raw: bytes,
+                   mapping: Optional[Dict[str, str]] = None, chunk_size: Optional[int] = None,
+                   checkpoint_dir: Optional[Path] = None, dry_run: bool = False,
+                   resume: bool = True, progress: Optional[Progress] = None) -> ImportReport:
+    """
+    Importuje plik (bajty answers_wide.csv) do wersji `version` (wiersz survey_versions).
+    dry_run – tylko mapowanie i walidacja, bez zapisu i checkpointu;
+    resume=False – od początku mimo checkpointu (upserty nadpiszą te same sesje).
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    version_id = version["id"]
+    questions = (version.get("content") or {}).get("questions", []) or []
+    qb = questions_by_id(version)
+
+    header, rows = _data_rows(io.StringIO(raw.decode("utf-8-sig")))
+    cols, unmapped, missing = map_columns(header, version, mapping)
+    if not cols:
+        raise ValueError("Żadna kolumna pliku nie pasuje do pytań wybranej wersji.")
+    idx = {c.strip().lower(): i for i, c in enumerate(header)}
+    if "user_email" not in idx:
+        raise ValueError("Brak kolumny user_email.")
+    q_idx = [(i, cols[c], qb[cols[c]]) for i, c in enumerate(header) if c in cols]
+
+    report = ImportReport(version_id, unmapped_columns=unmapped, missing_questions=missing)
+    ckpt = _checkpoint_path(Path(checkpoint_dir or IMPORT_DIR), hashlib.sha256(raw).hexdigest(), version_id)
+    start = _load_checkpoint(ckpt) if resume and not dry_run else 0
+    report.resumed_from = start
+
+    def cell(row: List[str], name: str) -> str:
+        i = idx.get(name)
+        return row[i] if i is not None and i < len(row) else ""
+
+    imported_at = datetime.now(timezone.utc).isoformat()
+    sessions: List[Dict[str, Any]] = []
+    answers: List[Dict[str, Any]] = []
+    last_row = start
+
+    def flush() -> None:
+        if sessions and not dry_run:
+            _write_chunk(client, sessions, answers)
+            dashboard.invalidate(client, sorted({s["user_email"] for s in sessions}))
+            report.chunks += 1
+            _save_checkpoint(ckpt, last_row, done=False)
+        report.imported += len(sessions)
+        sessions.clear()
+        answers.clear()
+        if progress:
+            progress(report.rows, report.imported)
+
+    for row_no, row in rows:
+        report.rows = row_no
+        if row_no <= start:
+            continue
+        email = normalize_email(cell(row, "user_email"))
+        if not email:
+            report.reject(row_no, f"niepoprawny adres: {cell(row, 'user_email')!r}")
+            continue
+        try:
+            submitted_at = _timestamp(cell(row, "submitted_at"))
+            created_at = _timestamp(cell(row, "created_at")) or submitted_at
+        except ValueError:
+            report.reject(row_no, f"niepoprawna data: {cell(row, 'submitted_at')!r}")
+            continue
+        status = cell(row, "status").strip().lower() or ("submitted" if submitted_at else "draft")
+        if status not in ("draft", "submitted"):
+            report.reject(row_no, f"nieznany status: {status!r}")
+            continue
+
+        sid = session_id_for(version_id, cell(row, "session_id").strip() or f"row:{row_no}:{email}")
+        filled: Dict[str, Any] = {}
+        for i, qid, q in q_idx:
+            value, ok = parse_value(q, row[i] if i < len(row) else "")
+            if not ok:
+                report.unknown_values[qid] += 1
+            filled[qid] = {"type": q.get("type"), "value": value}
+        # odpowiedzi na pytania bez kolumny – puste, jak przy wysyłce formularza
+        for qid in missing:
+            filled[qid] = {"type": qb[qid].get("type"), "value": None}
+
+        sessions.append({"id": sid, "survey_version_id": version_id, "user_email": email, "status": status,
+                         "score": compute_total_score(questions, filled),
+                         "created_at": created_at or imported_at, "submitted_at": submitted_at})
+        answers.extend({"session_id": sid, "question_id": qid, "answer": payload}
+                       for qid, payload in filled.items())
+        last_row = row_no
+        if len(sessions) >= chunk_size:
+            flush()
+
+    last_row = report.rows
+    flush()
+    report.done = True
+    if not dry_run:
+        _save_checkpoint(ckpt, report.rows, done=True)
+        if report.imported:
+            cache = get_shared_cache()
+            cache.bump(exports_ns(version_id), client)
+            cache.bump(ranking_ns(version_id), client)
+            cache.bump(NS_TRENDS, client)
+            cache.bump(NS_PREVIEW, client)     # ponowny import nadpisuje sesje o tych samych id
+    return report
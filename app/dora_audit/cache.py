@@ -0,0 +1,292 @@
+# app/dora_audit/cache.py
+# -*- coding: utf-8 -*-
+"""
+Współdzielony cache dla wszystkich replik aplikacji.
+
+Wpisy leżą w pliku SQLite (WAL) na wolumenie hosta, więc repliki uruchomione
+obok siebie (EC2 Instance/docker-compose.yml) rozgrzewają go raz, wspólnie.
+Unieważnianie działa przez licznik generacji per przestrzeń nazw:
+bump() podbija licznik, a wpisy zapisane pod starą generacją przestają być
+widoczne od razu – także dla pozostałych replik na tym hoście.
+
+Repliki na innych hostach dowiadują się o zmianie z wiersza licznika w Postgresie
+(migracja 0013), odpytywanego co najwyżej raz na
+DORA_CACHE_POLL_S (domyślnie 1 s) na host i przestrzeń nazw. Host pamięta
+ostatnią widzianą wartość licznika i unieważnia przestrzeń przy każdej jej
+zmianie – generacja lokalna i licznik w Postgresie są niezależne, więc lokalny
+bump bez dostępu do bazy nie zasłania późniejszych zmian z innych hostów.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+CACHE_PATH   = os.getenv("DORA_CACHE_PATH", os.path.join(tempfile.gettempdir(), "dora_audit_cache.sqlite3"))
+CACHE_POLL_S = float(os.getenv("DORA_CACHE_POLL_S", "1.0"))
+CACHE_TTL_S  = float(os.getenv("DORA_CACHE_TTL_S", "3600"))
+
+# Przestrzenie nazw
+NS_VERSIONS  = "versions"     # wiersze survey_versions (aktywna + po id)
+NS_WHITELIST = "whitelist"    # wpisy allowed_emails (dostęp + is_admin)
+NS_ARCHIVE   = "archive"      # sesje odczytane z archiwum (niezmienne)
+NS_TRENDS    = "trends"       # agregaty trendów między wersjami (dora_audit.trends)
+NS_PREVIEW   = "preview"      # podgląd wysłanej sesji: tabela odpowiedzi + PDF
+
+def exports_ns(version_id: str) -> str:
+    """Artefakty eksportu jednej wersji – unieważniane przy wysłaniu ankiety tej wersji."""
+    return f"exports:{version_id}"
+
+def ranking_ns(version_id: str) -> str:
+    """Posortowane wyniki wysłanych sesji wersji (dora_audit.ranking) – aktualizowane przyrostowo."""
+    return f"ranking:{version_id}"
+
+
+class SharedCache:
+    """
+    Cache klucz → wartość w SQLite, wersjonowany generacją przestrzeni nazw.
+    Wartości serializowane pickle – plik leży na zaufanym wolumenie aplikacji.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, poll_s: float = CACHE_POLL_S,
+                 default_ttl: float = CACHE_TTL_S):
+        self.path = path
+        self.poll_s = poll_s
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        with self._conn() as con:
+            con.executescript("""
+                create table if not exists generations (
+                    namespace  text primary key,
+                    generation integer not null default 0,
+                    checked_at real    not null default 0,
+                    remote     integer
+                );
+                create table if not exists entries (
+                    namespace  text not null,
+                    key        text not null,
+                    generation integer not null,
+                    expires_at real not null,
+                    value      blob not null,
+                    primary key (namespace, key)
+                );
+            """)
+            try:    # plik cache sprzed kolumny remote
+                con.execute("alter table generations add column remote integer")
+            except sqlite3.OperationalError:
+                pass
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            con.execute("pragma journal_mode=wal")
+            con.execute("pragma synchronous=normal")
+            self._local.con = con
+        return con
+
+    # --- generacje -------------------------------------------------------------
+    def generation(self, namespace: str, client: Optional[Client] = None) -> int:
+        """Bieżąca generacja; z `client` co poll_s sprawdza też licznik w Postgresie."""
+        con = self._conn()
+        row = con.execute("select generation, checked_at, remote from generations where namespace = ?",
+                          (namespace,)).fetchone()
+        gen, checked_at, seen = row if row else (0, 0.0, None)
+        now = time.time()
+        if client is None or now - checked_at < self.poll_s:
+            return gen
+
+        # znacznik checked_at ustawiamy od razu – kolejne repliki nie odpytują bazy w tym oknie
+        con.execute(
+            "insert into generations(namespace, generation, checked_at) values (?, ?, ?) "
+            "on conflict(namespace) do update set checked_at = excluded.checked_at",
+            (namespace, gen, now),
+        )
+        remote = _remote_generation(client, namespace)
+        if remote is not None and remote != seen:
+            return self._adopt(namespace, remote)
+        return gen
+
+    def bump(self, namespace: str, client: Optional[Client] = None) -> int:
+        """Unieważnia całą przestrzeń nazw (lokalnie i – z `client` – dla innych hostów)."""
+        remote = _remote_bump(client, namespace) if client is not None else None
+        con = self._conn()
+        con.execute("begin immediate")
+        try:
+            row = con.execute("select generation, remote from generations where namespace = ?",
+                              (namespace,)).fetchone()
+            gen = (row[0] if row else 0) + 1
+            # własny bump w Postgresie jest już „widziany”; bez niego zostaje poprzednia wartość
+            seen = remote if remote is not None else (row[1] if row else None)
+            con.execute(
+                "insert into generations(namespace, generation, checked_at, remote) values (?, ?, ?, ?) "
+                "on conflict(namespace) do update set generation = excluded.generation, "
+                "checked_at = excluded.checked_at, remote = excluded.remote",
+                (namespace, gen, time.time(), seen),
+            )
+            con.execute("delete from entries where namespace = ?", (namespace,))
+            con.execute("commit")
+        except Exception:
+            con.execute("rollback")
+            raise
+        return gen
+
+    def _adopt(self, namespace: str, remote: int) -> int:
+        """Licznik w Postgresie się zmienił (bump na innym hoście): nowa generacja lokalna."""
+        con = self._conn()
+        con.execute("begin immediate")
+        try:
+            gen, seen = con.execute("select generation, remote from generations where namespace = ?",
+                                    (namespace,)).fetchone()
+            if seen != remote:      # inna replika na hoście mogła już przyjąć tę zmianę
+                gen += 1
+                con.execute("update generations set generation = ?, remote = ? where namespace = ?",
+                            (gen, remote, namespace))
+                con.execute("delete from entries where namespace = ? and generation <> ?", (namespace, gen))
+            con.execute("commit")
+        except Exception:
+            con.execute("rollback")
+            raise
+        return gen
+
+    # --- wpisy -----------------------------------------------------------------
+    def get(self, namespace: str, key: str, client: Optional[Client] = None) -> Any:
+        gen = self.generation(namespace, client)
+        row = self._conn().execute(
+            "select value from entries where namespace = ? and key = ? and generation = ? and expires_at > ?",
+            (namespace, key, gen, time.time()),
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None,
+            generation: Optional[int] = None) -> None:
+        gen = self.generation(namespace) if generation is None else generation
+        expires = time.time() + (self.default_ttl if ttl is None else ttl)
+        self._conn().execute(
+            "insert or replace into entries(namespace, key, generation, expires_at, value) values (?, ?, ?, ?, ?)",
+            (namespace, key, gen, expires, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+        )
+
+    def update(self, namespace: str, key: str, fn: Callable[[Any], Any]) -> Any:
+        """
+        Atomowa modyfikacja istniejącego wpisu: fn(stara wartość) -> nowa (None = bez zmian).
+        Odczyt i zapis w jednej transakcji SQLite, więc repliki na hoście nie gubią zmian.
+        Brak wpisu = nic do zrobienia (następny odczyt załaduje stan z bazy). Zwraca nową wartość.
+        """
+        con = self._conn()
+        con.execute("begin immediate")
+        try:
+            row = con.execute(
+                "select value from entries where namespace = ? and key = ? and expires_at > ? and generation = "
+                "coalesce((select generation from generations where namespace = ?), 0)",
+                (namespace, key, time.time(), namespace),
+            ).fetchone()
+            value = fn(pickle.loads(row[0])) if row else None
+            if value is not None:
+                con.execute("update entries set value = ? where namespace = ? and key = ?",
+                            (pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), namespace, key))
+            con.execute("commit")
+        except Exception:
+            con.execute("rollback")
+            raise
+        return value
+
+    def get_or_load(self, namespace: str, key: str, loader: Callable[[], Any],
+                    ttl: Optional[float] = None, client: Optional[Client] = None) -> Any:
+        """
+        Zwraca wartość z cache albo woła loader() i zapisuje wynik (None nie jest cachowane).
+        Wynik trafia pod generację sprzed ładowania – bump() w trakcie go unieważnia.
+        """
+        gen = self.generation(namespace, client)
+        row = self._conn().execute(
+            "select value from entries where namespace = ? and key = ? and generation = ? and expires_at > ?",
+            (namespace, key, gen, time.time()),
+        ).fetchone()
+        if row:
+            return pickle.loads(row[0])
+        value = loader()
+        if value is not None:
+            self.set(namespace, key, value, ttl=ttl, generation=gen)
+        return value
+
+
+class NullCache(SharedCache):
+    """Cache wyłączony (DORA_CACHE_PATH=off): zawsze woła loader, bump nic nie robi lokalnie."""
+
+    def __init__(self):
+        self.path = None
+
+    def generation(self, namespace, client=None):
+        return 0
+
+    def bump(self, namespace, client=None):
+        if client is None:
+            return 0
+        return _remote_bump(client, namespace) or 0
+
+    def get(self, namespace, key, client=None):
+        return None
+
+    def set(self, namespace, key, value, ttl=None, generation=None):
+        pass
+
+    def update(self, namespace, key, fn):
+        return None
+
+    def get_or_load(self, namespace, key, loader, ttl=None, client=None):
+        return loader()
+
+
+# =============================================================================
+#  Licznik generacji w Postgresie (kanał unieważnień między hostami)
+# =============================================================================
+def _remote_generation(client: Client, namespace: str) -> Optional[int]:
+    from .core import qexec
+    try:
+        rows = qexec(
+            client.table("app_cache_generations")
+                  .select("generation")
+                  .eq("namespace", namespace)
+                  .limit(1)
+        )
+    except RuntimeError:
+        return None     # brak tabeli/uprawnień – zostajemy przy liczniku lokalnym
+    return int(rows[0]["generation"]) if rows else 0
+
+def _remote_bump(client: Client, namespace: str) -> Optional[int]:
+    from .core import qexec
+    try:
+        res = qexec(client.rpc("bump_cache_generation", {"p_namespace": namespace}))
+    except RuntimeError:
+        return None
+    if isinstance(res, list):
+        res = res[0] if res else None
+    if isinstance(res, dict):
+        res = next(iter(res.values()), None)
+    return int(res) if res is not None else None
+
+
+_shared: Optional[SharedCache] = None
+_shared_lock = threading.Lock()
+
+def get_shared_cache() -> SharedCache:
+    """Cache procesu (leniwie); DORA_CACHE_PATH=off wyłącza cache."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = NullCache() if CACHE_PATH.strip().lower() in ("", "off", "0") else SharedCache()
+    return _shared
+
+def configure_shared_cache(cache: Optional[SharedCache]) -> None:
+    """Podmienia cache procesu (testy, CLI); None = ponowna inicjalizacja z env."""
+    global _shared
+    with _shared_lock:
+        _shared = cache
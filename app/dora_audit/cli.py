@@ -0,0 +1,271 @@
+# app/dora_audit/cli.py
+# -*- coding: utf-8 -*-
+"""
+CLI dla zadań wsadowych (cron, CI) – bez uruchamiania Streamlit. Repozytorium
+nie instaluje pakietu (brak skryptu konsolowego), więc uruchamia się go jako
+moduł z katalogu app/:
+
+    python -m dora_audit score version.json answers.json
+    python -m dora_audit export <version_id> --out-dir exports/
+    python -m dora_audit pdf <session_id> -o session.pdf
+    python -m dora_audit import-survey ankieta.json --green 80 --amber 60 --activate
+    python -m dora_audit migrate [--dry-run]
+    python -m dora_audit archive --retired --older-than-days 730 [--dry-run]
+    python -m dora_audit webhooks [--once]
+    python -m dora_audit import-history answers_wide.csv <version_id> [--map map.json] [--dry-run]
+    python -m dora_audit migrate-drafts <version_id> [--map map.json] [--dry-run]
+
+Komendy bazodanowe używają SUPABASE_URL / SUPABASE_ANON_KEY ze środowiska,
+`migrate` – DATABASE_URL (bezpośrednie połączenie z Postgresem), `archive` –
+dodatkowo DORA_ARCHIVE_URL (file://… albo s3://…), `webhooks` – WEBHOOK_URL,
+WEBHOOK_TOKEN i SUPABASE_SERVICE_ROLE_KEY, `import-history` i
+`migrate-drafts` – klucza z uprawnieniami do cudzych sesji (service role).
+`export` czyta z repliki (SUPABASE_REPLICA_URL), gdy jest skonfigurowana i świeża.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import core
+
+
+def _load_json(path: str) -> Any:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+def _answers_payload(raw: Any) -> Dict[str, Any]:
+    """
+    Akceptuje {qid: value}, {qid: {"value": ...}} albo wiersze survey_answers
+    [{"question_id": ..., "answer": {"value": ...}}]. Zwraca qid -> {"value": ...}.
+    """
+    if isinstance(raw, list):
+        return {qid: {"value": v} for qid, v in core.answers_map(raw).items()}
+    out: Dict[str, Any] = {}
+    for qid, v in (raw or {}).items():
+        out[qid] = v if isinstance(v, dict) and "value" in v else {"value": v}
+    return out
+
+def cmd_score(args: argparse.Namespace) -> int:
+    version = _load_json(args.version)
+    content = version.get("content", version)   # wiersz survey_versions albo samo content
+    questions: List[Dict[str, Any]] = content.get("questions", [])
+    filled = _answers_payload(_load_json(args.answers))
+
+    total = core.compute_total_score(questions, filled)
+    label, _ = core.result_badge(total,
+                                 int(version.get("threshold_green", args.green)),
+                                 int(version.get("threshold_amber", args.amber)))
+    print(json.dumps({"score": total, "label": label}, ensure_ascii=False))
+    return 0
+
+def cmd_export(args: argparse.Namespace) -> int:
+    from .replica import read_client_from_env
+
+    client = read_client_from_env()     # replika (SUPABASE_REPLICA_URL), gdy świeża
+    version = core.get_version(client, args.version_id)
+    if not version:
+        raise RuntimeError(f"Nie znaleziono wersji {args.version_id}.")
+    sessions_csv, answers_csv = core.admin_csv_all_sessions_for_version(client, args.version_id)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, data in ((f"sessions_{version['version']}.csv", sessions_csv),
+                       (f"answers_wide_{version['version']}.csv", answers_csv)):
+        (out_dir / name).write_bytes(data)
+        print(out_dir / name)
+    return 0
+
+def cmd_pdf(args: argparse.Namespace) -> int:
+    client = core.client_from_env()
+    session, answers, version = core.load_session_with_answers(client, args.session_id)
+    if not session or not version:
+        raise RuntimeError(f"Nie znaleziono sesji {args.session_id}.")
+    pdf = core.build_pdf_for_session(version, session, answers,
+                                     int(version.get("threshold_green", 80)),
+                                     int(version.get("threshold_amber", 60)))
+    out = Path(args.output or f"session_{session['id'][:8]}.pdf")
+    out.write_bytes(pdf)
+    print(out)
+    return 0
+
+def cmd_import_survey(args: argparse.Namespace) -> int:
+    with open(args.file, "rb") as fh:
+        parsed = core.parse_uploaded_file(fh)
+    client = core.client_from_env()
+    survey = core.get_or_create_survey(client)
+    ver = core.save_new_version(
+        client,
+        survey_id=survey["id"],
+        content=parsed,
+        threshold_green=args.green,
+        threshold_amber=args.amber,
+        created_by=args.created_by,
+        set_active=args.activate,
+    )
+    print(json.dumps({"id": ver["id"], "version": ver["version"], "is_active": ver["is_active"]}))
+    return 0
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    from . import migrate
+
+    directory = Path(args.dir) if args.dir else migrate.MIGRATIONS_DIR
+    with migrate.connect(args.database_url) as conn:
+        if args.dry_run:
+            for _, path in migrate.pending(conn, directory):
+                print(f"pending {path.name}")
+            return 0
+        for name in migrate.migrate(conn, directory):
+            print(f"applied {name}")
+    return 0
+
+def cmd_archive(args: argparse.Namespace) -> int:
+    from . import archive
+
+    store = archive.open_store(args.store)
+    if store is None:
+        raise RuntimeError("Brak magazynu archiwum (DORA_ARCHIVE_URL lub --store).")
+    report = archive.archive_sessions(
+        core.client_from_env(), store,
+        retired=args.retired,
+        older_than_days=args.older_than_days,
+        dry_run=args.dry_run,
+        batch_size=args.batch_size,
+    )
+    print(json.dumps(report.summary()))
+    return 0
+
+def cmd_webhooks(args: argparse.Namespace) -> int:
+    from . import outbox
+
+    if not outbox.enabled():
+        raise RuntimeError("Brak WEBHOOK_URL w środowisku.")
+    dispatcher = outbox.WebhookDispatcher(outbox.dispatcher_client())
+    if args.once:
+        dispatcher.drain()
+        print(json.dumps(dict(dispatcher.stats)))
+        return 0 if dispatcher.last_error is None else 1
+    try:
+        dispatcher.run_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def cmd_import_history(args: argparse.Namespace) -> int:
+    from . import bulk_import
+
+    client = core.client_from_env()
+    version = core.get_version(client, args.version_id)
+    if not version:
+        raise RuntimeError(f"Nie znaleziono wersji {args.version_id}.")
+    mapping = _load_json(args.map) if args.map else None
+
+    def progress(rows: int, imported: int) -> None:
+        print(f"rows={rows} imported={imported}", file=sys.stderr)
+
+    report = bulk_import.import_history(
+        client, version, Path(args.file).read_bytes(),
+        mapping=mapping,
+        chunk_size=args.chunk_size,
+        checkpoint_dir=Path(args.checkpoint_dir) if args.checkpoint_dir else None,
+        dry_run=args.dry_run,
+        resume=not args.restart,
+        progress=progress,
+    )
+    print(json.dumps(report.summary()))
+    for row_no, reason in report.invalid_rows:
+        print(f"wiersz {row_no}: {reason}", file=sys.stderr)
+    return 0
+
+def cmd_migrate_drafts(args: argparse.Namespace) -> int:
+    from . import draft_migration
+
+    client = core.client_from_env()
+    version = core.get_version(client, args.version_id)
+    if not version:
+        raise RuntimeError(f"Nie znaleziono wersji {args.version_id}.")
+    report = draft_migration.migrate_drafts(
+        client, version,
+        mapping=_load_json(args.map) if args.map else None,
+        chunk_size=args.chunk_size,
+        dry_run=args.dry_run,
+    )
+    print(json.dumps(report.summary()))
+    for r in report.unmappable:
+        print(f"{r['session_id']} {r['user_email']} {r['question_id']}: {r['reason']}", file=sys.stderr)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m dora_audit", description="DORA Audit – narzędzia wsadowe.")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    s = sub.add_parser("score", help="policz wynik odpowiedzi względem wersji ankiety")
+    s.add_argument("version", help="JSON wersji (wiersz survey_versions lub samo content)")
+    s.add_argument("answers", help="JSON odpowiedzi ({qid: value} lub wiersze survey_answers)")
+    s.add_argument("--green", type=int, default=80, help="próg GREEN, gdy brak w wersji")
+    s.add_argument("--amber", type=int, default=60, help="próg AMBER, gdy brak w wersji")
+    s.set_defaults(func=cmd_score)
+
+    e = sub.add_parser("export", help="sessions.csv + answers_wide.csv dla wersji")
+    e.add_argument("version_id")
+    e.add_argument("--out-dir", default=".")
+    e.set_defaults(func=cmd_export)
+
+    d = sub.add_parser("pdf", help="raport PDF pojedynczej sesji")
+    d.add_argument("session_id")
+    d.add_argument("-o", "--output")
+    d.set_defaults(func=cmd_pdf)
+
+    i = sub.add_parser("import-survey", help="zapisz plik CSV/JSON jako nową wersję ankiety")
+    i.add_argument("file")
+    i.add_argument("--green", type=int, default=80)
+    i.add_argument("--amber", type=int, default=60)
+    i.add_argument("--activate", action="store_true", help="ustaw jako aktywną")
+    i.add_argument("--created-by", default="cli")
+    i.set_defaults(func=cmd_import_survey)
+
+    m = sub.add_parser("migrate", help="zastosuj migracje supabase_sql/migrations (DATABASE_URL)")
+    m.add_argument("--database-url", help="domyślnie $DATABASE_URL")
+    m.add_argument("--dir", help="katalog migracji (domyślnie supabase_sql/migrations)")
+    m.add_argument("--dry-run", action="store_true", help="tylko wypisz oczekujące migracje")
+    m.set_defaults(func=cmd_migrate)
+
+    a = sub.add_parser("archive", help="przenieś stare sesje do archiwum gzip JSONL (lokalnie / S3)")
+    a.add_argument("--retired", action="store_true", help="sesje wersji nieaktywnych")
+    a.add_argument("--older-than-days", type=int, help="sesje starsze niż N dni (każda wersja)")
+    a.add_argument("--store", help="domyślnie $DORA_ARCHIVE_URL")
+    a.add_argument("--batch-size", type=int, default=500)
+    a.add_argument("--dry-run", action="store_true", help="tylko policz")
+    a.set_defaults(func=cmd_archive)
+
+    w = sub.add_parser("webhooks", help="wyślij zaległe zdarzenia outboxa do WEBHOOK_URL")
+    w.add_argument("--once", action="store_true", help="jedno opróżnienie kolejki zamiast pętli")
+    w.set_defaults(func=cmd_webhooks)
+
+    h = sub.add_parser("import-history", help="zaimportuj historyczne sesje z answers_wide.csv")
+    h.add_argument("file")
+    h.add_argument("version_id")
+    h.add_argument("--map", help="JSON {kolumna: question_id} dla kolumn o innych nazwach")
+    h.add_argument("--chunk-size", type=int, help="sesji na porcję (domyślnie $DORA_IMPORT_CHUNK_SIZE)")
+    h.add_argument("--checkpoint-dir", help="domyślnie $DORA_IMPORT_DIR")
+    h.add_argument("--restart", action="store_true", help="od początku, mimo checkpointu")
+    h.add_argument("--dry-run", action="store_true", help="tylko mapowanie i walidacja")
+    h.set_defaults(func=cmd_import_history)
+
+    g = sub.add_parser("migrate-drafts", help="przenieś otwarte szkice innych wersji do wskazanej wersji")
+    g.add_argument("version_id")
+    g.add_argument("--map", help="JSON {id_w_tej_wersji: id_we_wcześniejszej} zamiast question_map wersji")
+    g.add_argument("--chunk-size", type=int, help="szkiców na porcję (domyślnie $DORA_MIGRATION_CHUNK_SIZE)")
+    g.add_argument("--dry-run", action="store_true", help="tylko raport, bez zapisu")
+    g.set_defaults(func=cmd_migrate_drafts)
+    return p
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (RuntimeError, ValueError, OSError) as e:
+        print(f"dora_audit: {e}", file=sys.stderr)
+        return 1
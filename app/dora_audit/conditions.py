@@ -0,0 +1,183 @@
+# app/dora_audit/conditions.py
+# -*- coding: utf-8 -*-
+"""
+Pytania warunkowe: reguła `show_if` w definicji pytania.
+
+    {"id": "q5", "type": "single", "text": "...",
+     "show_if": {"question": "q2", "equals": "Tak"}}
+
+Warunki na odpowiedzi innych pytań:
+    equals / not_equals  – wartość (single, scale, text)
+    in                   – wartość jest na liście
+    contains             – multi: zaznaczona opcja (lub lista – którakolwiek)
+    gt / gte / lt / lte  – scale
+    answered: true|false – czy pytanie ma odpowiedź
+Łączenie: {"all": [...]}, {"any": [...]}, {"not": {...}}.
+
+Reguły wersji kompilowane są raz do grafu zależności (pytanie -> pytania,
+które od niego zależą), z kolejnością topologiczną. Po zmianie odpowiedzi
+przeliczane są tylko pytania osiągalne w grafie od zmienionych. Odpowiedź
+na pytanie ukryte traktujemy jak brak odpowiedzi – także w regułach innych
+pytań, więc ukrycie propaguje się łańcuchowo.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+_OPS = ("equals", "not_equals", "in", "contains", "gt", "gte", "lt", "lte", "answered")
+
+def _answered(v: Any) -> bool:
+    return v not in (None, "", [])
+
+def _compile(rule: Dict[str, Any], known: Set[str], refs: Set[str]) -> Predicate:
+    if not isinstance(rule, dict):
+        raise ValueError(f"show_if: oczekiwano obiektu, jest {rule!r}")
+    if "all" in rule or "any" in rule:
+        parts = [_compile(r, known, refs) for r in rule.get("all") or rule.get("any") or []]
+        if "all" in rule:
+            return lambda vals: all(p(vals) for p in parts)
+        return lambda vals: any(p(vals) for p in parts)
+    if "not" in rule:
+        inner = _compile(rule["not"], known, refs)
+        return lambda vals: not inner(vals)
+
+    qid = rule.get("question")
+    if qid not in known:
+        raise ValueError(f"show_if: nieznane pytanie {qid!r}")
+    ops = [op for op in _OPS if op in rule]
+    if len(ops) != 1:
+        raise ValueError(f"show_if dla {qid!r}: podaj dokładnie jeden z {', '.join(_OPS)}")
+    op, arg = ops[0], rule[ops[0]]
+    refs.add(qid)
+
+    if op == "answered":
+        return lambda vals: _answered(vals.get(qid)) == bool(arg)
+    if op == "equals":
+        return lambda vals: vals.get(qid) == arg
+    if op == "not_equals":
+        return lambda vals: vals.get(qid) != arg
+    if op == "in":
+        allowed = list(arg or [])
+        return lambda vals: vals.get(qid) in allowed
+    if op == "contains":
+        wanted = set(arg if isinstance(arg, list) else [arg])
+        return lambda vals: bool(wanted & set(vals.get(qid) or []))
+
+    bound = float(arg)
+    cmp = {"gt": float.__gt__, "gte": float.__ge__, "lt": float.__lt__, "lte": float.__le__}[op]
+    def _num(vals: Dict[str, Any]) -> bool:
+        try:
+            return cmp(float(vals.get(qid)), bound)
+        except (TypeError, ValueError):
+            return False
+    return _num
+
+
+class ConditionGraph:
+    """Skompilowane reguły show_if jednej wersji ankiety."""
+
+    def __init__(self, questions: List[Dict[str, Any]]):
+        self.order: List[str] = [q.get("id") or f"q{i}" for i, q in enumerate(questions, start=1)]
+        known = set(self.order)
+        self.rules: Dict[str, Predicate] = {}
+        self.depends_on: Dict[str, Set[str]] = {}
+        self.dependents: Dict[str, Set[str]] = {qid: set() for qid in self.order}
+        for qid, q in zip(self.order, questions):
+            if q.get("show_if") is None:
+                continue
+            refs: Set[str] = set()
+            self.rules[qid] = _compile(q["show_if"], known, refs)
+            if qid in refs:
+                raise ValueError(f"show_if: pytanie {qid!r} zależy od samego siebie")
+            self.depends_on[qid] = refs
+            for ref in refs:
+                self.dependents[ref].add(qid)
+        self.topo = self._toposort()
+        self._rank = {qid: i for i, qid in enumerate(self.topo)}
+
+    def _toposort(self) -> List[str]:
+        pos = {qid: i for i, qid in enumerate(self.order)}
+        indeg = {qid: len(self.depends_on.get(qid, ())) for qid in self.order}
+        ready = [qid for qid in self.order if indeg[qid] == 0]
+        out: List[str] = []
+        while ready:
+            qid = ready.pop(0)
+            out.append(qid)
+            for dep in sorted(self.dependents[qid], key=pos.__getitem__):
+                indeg[dep] -= 1
+                if indeg[dep] == 0:
+                    ready.append(dep)
+        if len(out) != len(self.order):
+            cyc = sorted(q for q, n in indeg.items() if n > 0)
+            raise ValueError(f"show_if: cykl zależności między pytaniami {', '.join(cyc)}")
+        return out
+
+    @property
+    def conditional(self) -> bool:
+        return bool(self.rules)
+
+    def _eval(self, qids: Iterable[str], values: Dict[str, Any], visible: Set[str]) -> None:
+        for qid in sorted(qids, key=self._rank.__getitem__):
+            rule = self.rules.get(qid)
+            if rule is None:
+                continue
+            # odpowiedzi ukrytych pytań nie liczą się w regułach
+            if rule({k: values.get(k) for k in self.depends_on[qid] if k in visible}):
+                visible.add(qid)
+            else:
+                visible.discard(qid)
+
+    def visible(self, values: Dict[str, Any]) -> Set[str]:
+        """Pełna ewaluacja: zbiór widocznych pytań dla odpowiedzi {qid: value}."""
+        visible = set(self.order)
+        self._eval(self.rules, values, visible)
+        return visible
+
+    def affected(self, changed: Iterable[str]) -> Set[str]:
+        """Pytania z regułą osiągalne w grafie od zmienionych odpowiedzi."""
+        seen: Set[str] = set()
+        stack = list(changed)
+        while stack:
+            for dep in self.dependents.get(stack.pop(), ()):
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        return seen
+
+    def update(self, visible: Set[str], values: Dict[str, Any], changed: Iterable[str]) -> Set[str]:
+        """Przyrostowo: przelicza tylko pytania zależne od `changed`; zwraca nowy zbiór."""
+        out = set(visible)
+        self._eval(self.affected(changed), values, out)
+        return out
+
+
+_graphs: Dict[Tuple[Tuple[str, str], ...], ConditionGraph] = {}
+_graphs_lock = threading.Lock()
+
+def _rules_key(questions: List[Dict[str, Any]]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(
+        (q.get("id") or f"q{i}", json.dumps(q.get("show_if"), sort_keys=True) if q.get("show_if") is not None else "")
+        for i, q in enumerate(questions, start=1)
+    )
+
+def compile_rules(questions: List[Dict[str, Any]]) -> ConditionGraph:
+    """Graf reguł – kompilowany raz na zestaw pytań (wersję) w procesie."""
+    key = _rules_key(questions)
+    graph = _graphs.get(key)
+    if graph is None:
+        graph = ConditionGraph(questions)
+        with _graphs_lock:
+            if len(_graphs) > 256:
+                _graphs.clear()
+            _graphs[key] = graph
+    return graph
+
+def visible_ids(questions: List[Dict[str, Any]], values: Dict[str, Any]) -> Optional[Set[str]]:
+    """Widoczne pytania albo None, gdy wersja nie ma reguł (wszystkie widoczne)."""
+    if not any(q.get("show_if") is not None for q in questions):
+        return None
+    return compile_rules(questions).visible(values)
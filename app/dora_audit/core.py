@@ -0,0 +1,634 @@
+# app/dora_audit/core.py
+# -*- coding: utf-8 -*-
+"""
+Rdzeń DORA Audit bez zależności od Streamlit: dostęp do ankiet/wersji,
+punktacja, parsowanie uploadu, eksporty CSV i PDF.
+Importowany przez app.py (UI) oraz CLI (`python -m dora_audit`).
+"""
+from __future__ import annotations
+
+import os
+import io
+import csv
+import json
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from .cache import NS_VERSIONS, get_shared_cache
+from .conditions import compile_rules, visible_ids
+
+if TYPE_CHECKING:  # supabase/pandas ładujemy leniwie – CLI i testy startują szybciej
+    import pandas as pd
+    from supabase import Client
+
+SURVEY_NAME = "DORA Audit"   # nazwa produktu/ankiety (1 wpis w 'surveys')
+
+# Domyślne wagi odpowiedzi dla checklist (kolumna `answer`); None = N.A. (pomijane)
+DEFAULT_ANSWER_WEIGHTS: Dict[str, Optional[float]] = {"Yes": 1.0, "Partial": 0.5, "No": 0.0, "N.A.": None}
+
+def qexec(q):
+    """
+    Bezpieczne wykonanie zapytań supabase-py v2.
+    Zwraca listę (resp.data), a w razie błędu rzuca RuntimeError.
+    """
+    try:
+        resp = q.execute()
+        return resp.data or []
+    except Exception as e:
+        # APIError z PostgREST ma .message (code itd.); pozostałe wyjątki – str(e)
+        raise RuntimeError(f"DB error: {getattr(e, 'message', str(e))}") from e
+
+# brak funkcji SQL: PostgREST (schema cache) albo Postgres
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+def missing_function(exc: BaseException) -> bool:
+    """Błąd z qexec oznacza brak wywoływanej funkcji SQL (starsza baza) – a nie np. brak uprawnień."""
+    cause = exc.__cause__ or exc
+    return str(getattr(cause, "code", "") or "") in MISSING_FUNCTION_CODES
+
+def client_from_env() -> Client:
+    """Klient Supabase z SUPABASE_URL / SUPABASE_ANON_KEY (dla CLI i zadań wsadowych)."""
+    url = os.getenv("SUPABASE_URL", "").strip()
+    key = os.getenv("SUPABASE_ANON_KEY", "").strip()
+    if not url or not key:
+        raise RuntimeError("Brak SUPABASE_URL / SUPABASE_ANON_KEY w środowisku.")
+    from supabase import create_client
+    return create_client(url, key)
+
+# =============================================================================
+#  Ankiety / wersje (survey + survey_versions)
+# =============================================================================
+def get_or_create_survey(client: Client) -> Dict[str, Any]:
+    # 1) Spróbuj odczytać istniejącą
+    rows = qexec(
+        client.table("surveys")
+              .select("*")
+              .eq("name", SURVEY_NAME)
+              .limit(1)
+    )
+    if rows:
+        return rows[0]
+
+    # 2) Wstaw nową
+    ins_rows = qexec(
+        client.table("surveys").insert({"name": SURVEY_NAME})
+    )
+    if ins_rows:
+        return ins_rows[0]
+
+    # (race condition fallback) – odczytaj ponownie
+    rows2 = qexec(
+        client.table("surveys")
+              .select("*")
+              .eq("name", SURVEY_NAME)
+              .limit(1)
+    )
+    if not rows2:
+        raise RuntimeError("Survey utworzony, ale nie udało się go odczytać.")
+    return rows2[0]
+
+def next_version_number(client: Client, survey_id: str) -> int:
+    rows = qexec(
+        client.table("survey_versions")
+              .select("version")
+              .eq("survey_id", survey_id)
+              .order("version", desc=True)
+              .limit(1)
+    )
+    if rows:
+        return int(rows[0]["version"]) + 1
+    return 1
+
+def set_active_version(client: Client, survey_id: str, version_id: str) -> None:
+    # Wyłącz wszystkie
+    qexec(
+        client.table("survey_versions")
+              .update({"is_active": False})
+              .eq("survey_id", survey_id)
+    )
+    # Włącz wskazaną
+    qexec(
+        client.table("survey_versions")
+              .update({"is_active": True})
+              .eq("id", version_id)
+    )
+    # Powiadom pozostałe repliki (licznik generacji) – nowa wersja widoczna od razu
+    get_shared_cache().bump(NS_VERSIONS, client)
+
+def save_new_version(
+    client: Client,
+    survey_id: str,
+    content: Dict[str, Any],
+    threshold_green: int,
+    threshold_amber: int,
+    created_by: str,
+    set_active: bool,
+) -> Dict[str, Any]:
+    # reguły show_if sprawdzamy przed zapisem (nieznane pytania, cykle -> ValueError)
+    compile_rules((content or {}).get("questions") or [])
+    version_no = next_version_number(client, survey_id)
+
+    ins_rows = qexec(
+        client.table("survey_versions").insert({
+            "survey_id":       survey_id,
+            "version":         version_no,
+            "content":         content,
+            "threshold_green": int(threshold_green),
+            "threshold_amber": int(threshold_amber),
+            "created_by":      created_by,
+            "is_active":       False,
+        })
+    )
+
+    if ins_rows:
+        ver = ins_rows[0]
+    else:
+        # fallback: odczytaj świeżo zapisaną wersję
+        rows = qexec(
+            client.table("survey_versions")
+                  .select("*")
+                  .eq("survey_id", survey_id)
+                  .eq("version", version_no)
+                  .limit(1)
+        )
+        if not rows:
+            raise RuntimeError("Wersja zapisana, ale nie udało się jej odczytać.")
+        ver = rows[0]
+
+    if set_active:
+        set_active_version(client, survey_id, ver["id"])
+        ver["is_active"] = True
+
+    return ver
+
+def load_active_version(client: Client) -> Optional[Dict[str, Any]]:
+    """Aktywna wersja – ze współdzielonego cache, unieważnianego przez set_active_version."""
+    def _load() -> Optional[Dict[str, Any]]:
+        survey = get_or_create_survey(client)
+        rows = qexec(
+            client.table("survey_versions")
+                  .select("*")
+                  .eq("survey_id", survey["id"])
+                  .eq("is_active", True)
+                  .limit(1)
+        )
+        if rows:
+            return rows[0]
+        return None
+    return get_shared_cache().get_or_load(NS_VERSIONS, "active", _load, client=client)
+
+def list_versions(client: Client) -> List[Dict[str, Any]]:
+    survey = get_or_create_survey(client)
+    rows = qexec(
+        client.table("survey_versions")
+              .select("id, version, created_at, threshold_green, threshold_amber, is_active, created_by")
+              .eq("survey_id", survey["id"])
+              .order("version", desc=True)
+    )
+    return rows
+
+# =============================================================================
+#  Punktacja
+# =============================================================================
+def score_answer(q: Dict[str, Any], value) -> float:
+    """Liczy punktację dla pojedynczego pytania zgodnie z typem."""
+    t = q.get("type")
+    if t == "single":
+        # value = etykieta; szukamy opcji i bierzemy jej score
+        for opt in q.get("options", []):
+            if opt.get("label") == value:
+                return float(opt.get("score", 0))
+        return 0.0
+    elif t == "multi":
+        # value = lista etykiet; sumujemy score opcji
+        total = 0.0
+        selected = value or []
+        for opt in q.get("options", []):
+            if opt.get("label") in selected:
+                total += float(opt.get("score", 0))
+        return total
+    elif t == "scale":
+        # value = liczba; przelicznik na punkty
+        mn = q.get("min", 1)
+        step_score = float(q.get("score_per_step", 0))
+        try:
+            return max(0.0, (float(value) - float(mn)) * step_score)
+        except Exception:
+            return 0.0
+    return 0.0
+
+def max_score(q: Dict[str, Any]) -> float:
+    """Maksymalna liczba punktów pytania (mianownik wyniku)."""
+    t = q.get("type")
+    scores = [float(opt.get("score", 0)) for opt in q.get("options", [])]
+    if t == "single":
+        return max(scores, default=0.0)
+    if t == "multi":
+        return sum(s for s in scores if s > 0)
+    if t == "scale":
+        try:
+            return max(0.0, (float(q.get("max", 5)) - float(q.get("min", 1))) * float(q.get("score_per_step", 0)))
+        except (TypeError, ValueError):
+            return 0.0
+    return 0.0
+
+def _visible(questions: List[Dict[str, Any]], filled: Dict[str, Any],
+             visible: Optional[Set[str]]) -> Optional[Set[str]]:
+    if visible is not None:
+        return visible
+    return visible_ids(questions, {qid: (p or {}).get("value") for qid, p in filled.items()})
+
+def compute_total_score(questions: List[Dict[str, Any]], filled: Dict[str, Any],
+                        visible: Optional[Set[str]] = None) -> float:
+    """Suma punktów; pytania ukryte regułą show_if (dora_audit.conditions) nie liczą się."""
+    visible = _visible(questions, filled, visible)
+    total = 0.0
+    for q in questions:
+        qid = q.get("id")
+        if visible is not None and qid not in visible:
+            continue
+        payload = filled.get(qid)
+        if not payload:
+            continue
+        total += score_answer(q, payload.get("value"))
+    return total
+
+def max_total_score(questions: List[Dict[str, Any]], filled: Optional[Dict[str, Any]] = None,
+                    visible: Optional[Set[str]] = None) -> float:
+    """Maksimum do zdobycia w widocznych pytaniach."""
+    visible = _visible(questions, filled or {}, visible)
+    return sum(max_score(q) for q in questions if visible is None or q.get("id") in visible)
+
+def compute_scores(df: pd.DataFrame,
+                   weights_map: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, Any]:
+    """
+    Wynik procentowy checklisty (kolumny: section, question_id, weight, answer).
+    Odpowiedź mapowana przez weights_map na współczynnik 0..1; None (N.A.) nie liczy się
+    ani do licznika, ani do mianownika. Zwraca {"total": %, "by_section": {sekcja: %}}.
+    """
+    weights_map = DEFAULT_ANSWER_WEIGHTS if weights_map is None else weights_map
+    factor = df["answer"].map(weights_map)
+    applicable = df.assign(
+        factor=factor.astype(float),
+        weight=df["weight"].astype(float),
+    ).dropna(subset=["factor"])
+    applicable = applicable.assign(points=applicable["weight"] * applicable["factor"])
+
+    def _pct(points: float, weight: float) -> float:
+        return round(100.0 * points / weight, 2) if weight else 0.0
+
+    by_sec = applicable.groupby("section")[["points", "weight"]].sum()
+    by_section = {str(sec): _pct(r["points"], r["weight"]) for sec, r in by_sec.iterrows()}
+    # sekcje w całości N.A. też raportujemy (0%)
+    for sec in df["section"].unique():
+        by_section.setdefault(str(sec), 0.0)
+    return {
+        "total": _pct(applicable["points"].sum(), applicable["weight"].sum()),
+        "by_section": by_section,
+    }
+
+def result_badge(score: float, thr_green: int, thr_amber: int) -> Tuple[str, str]:
+    """
+    Zwraca (label, color) dla wyniku.
+    green: score >= thr_green
+    amber: score >= thr_amber
+    red:   w pozostałych przypadkach
+    """
+    if score >= thr_green:
+        return ("Green", "#2ecc71")
+    if score >= thr_amber:
+        return ("Amber", "#f1c40f")
+    return ("Red", "#e74c3c")
+
+# =============================================================================
+#  Parsowanie uploadu (CSV / JSON)
+# =============================================================================
+def parse_uploaded_file(upl) -> Dict[str, Any]:
+    """
+    Zwraca dict (content) gotowy do zapisania w JSONB.
+    CSV -> records; JSON -> dowolny obiekt/array.
+    """
+    if upl is None:
+        raise ValueError("Nie wybrano pliku.")
+    name = upl.name.lower()
+    raw = upl.read()
+    if name.endswith(".csv"):
+        import pandas as pd
+        df = pd.read_csv(io.BytesIO(raw))
+        return {"type": "csv", "records": json.loads(df.to_json(orient="records"))}
+    else:
+        try:
+            data = json.loads(raw.decode("utf-8"))
+        except Exception:
+            text = raw.decode("utf-8")
+            rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+            data = rows
+        return {"type": "json", "data": data}
+
+# =============================================================================
+#  Sesje / odpowiedzi
+# =============================================================================
+def get_version(client, version_id: str) -> Optional[Dict[str, Any]]:
+    def _load() -> Optional[Dict[str, Any]]:
+        row = qexec(
+            client.table("survey_versions")
+            .select("*")
+            .eq("id", version_id)
+            .single()
+        )
+        return row or None
+    return get_shared_cache().get_or_load(NS_VERSIONS, f"id:{version_id}", _load, client=client)
+
+def questions_by_id(version: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    content = version.get("content") or {}
+    qs = content.get("questions", []) or []
+    return {q.get("id") or f"q{idx}": q for idx, q in enumerate(qs, start=1)}
+
+def load_session_with_answers(client, session_id: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Zwraca: (session, answers[], version)"""
+    rows = qexec(
+        client.table("survey_sessions")
+        .select("*")
+        .eq("id", session_id)
+        .limit(1)
+    )
+    if not rows:
+        return None, [], None      # m.in. sesja przeniesiona do archiwum (dora_audit.archive)
+    session = rows[0]
+    answers = qexec(
+        client.table("survey_answers")
+        .select("question_id, answer")
+        .eq("session_id", session_id)
+        .order("question_id")
+    ) or []
+    version = get_version(client, session["survey_version_id"])
+    return session, answers, version
+
+def save_session(client: Client, session: Dict[str, Any], answers: List[Dict[str, Any]],
+                 event: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Idempotentny zapis sesji (id nadane przez aplikację) i jej odpowiedzi –
+    ponowienie po zerwanym połączeniu nie tworzy drugiej sesji. Jedno wywołanie
+    save_survey_session (migracja 0010, jedna transakcja); False, gdy sesja
+    jest już wysłana albo należy do kogoś innego – wtedy nic się nie zmienia.
+    Ponowiona wysyłka z tą samą treścią (pierwsza zapisała się, odpowiedź
+    zginęła) to True bez zapisu. `event` (outbox.submission_event) trafia do
+    submission_outbox w tej samej transakcji. Na bazie sprzed 0010 osobne
+    upserty, bez tej ochrony – tylko gdy funkcji naprawdę nie ma.
+    """
+    params: Dict[str, Any] = {"p_session": session, "p_answers": answers}
+    if event is not None:
+        params["p_event"] = event
+    try:
+        return bool(qexec(client.rpc("save_survey_session", params)))
+    except RuntimeError as e:
+        if not missing_function(e):
+            raise
+    qexec(client.table("survey_sessions").upsert(session, on_conflict="id"))
+    if answers:
+        qexec(client.table("survey_answers").upsert(answers, on_conflict="session_id,question_id"))
+    if event is not None:
+        from postgrest import ReturnMethod
+
+        qexec(client.table("submission_outbox").upsert(event, on_conflict="id", ignore_duplicates=True,
+                                                       returning=ReturnMethod.minimal))
+    return True
+
+def answers_map(answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """question_id -> value (już rozpakowane)"""
+    out: Dict[str, Any] = {}
+    for a in answers or []:
+        out[a["question_id"]] = (a.get("answer") or {}).get("value")
+    return out
+
+def wide_row_for_session(version: Dict[str, Any],
+                         session: Dict[str, Any],
+                         answers: List[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+    """Zwraca: (nagłówki, wartości) dla jednej sesji."""
+    qs_by_id = questions_by_id(version)
+    qids = list(qs_by_id.keys())            # kolejność jak w wersji
+    amap = answers_map(answers)
+
+    def v2str(q, v):
+        if q.get("type") == "multi":
+            return "|".join(v or [])
+        return "" if v is None else str(v)
+
+    headers = ["session_id", "user_email", "status", "score", "submitted_at"] + qids
+    row = [
+        session.get("id",""),
+        session.get("user_email",""),
+        session.get("status",""),
+        session.get("score",""),
+        (session.get("submitted_at") or "").replace("T"," ")[:19],
+    ] + [ v2str(qs_by_id[qid], amap.get(qid)) for qid in qids ]
+    return headers, row
+
+def session_answer_rows(version: Dict[str, Any],
+                        answers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Wiersze podglądu sesji: nr, pytanie, odpowiedź, punkty, maks. – jeden
+    przebieg po pytaniach widocznych wg show_if (ukryte nie dotyczyły respondenta).
+    """
+    qs_by_id = questions_by_id(version)
+    amap = answers_map(answers)
+    visible = visible_ids(list(qs_by_id.values()), amap)
+    rows: List[Dict[str, Any]] = []
+    for idx, (qid, q) in enumerate(qs_by_id.items(), start=1):
+        if visible is not None and qid not in visible:
+            continue
+        val = amap.get(qid)
+        if q.get("type") == "multi":
+            shown = ", ".join(val or [])
+        else:
+            shown = "" if val is None else str(val)
+        rows.append({"Nr": idx, "Pytanie": q.get("text", "(pytanie)"), "Odpowiedź": shown or "—",
+                     "Punkty": score_answer(q, val), "Maks.": max_score(q)})
+    return rows
+
+# =============================================================================
+#  Eksport CSV / PDF
+# =============================================================================
+def csv_user_sessions(client, user_email: str) -> bytes:
+    rows = qexec(
+        client.table("survey_sessions")
+        .select("id, survey_version_id, status, score, created_at, submitted_at")
+        .eq("user_email", user_email)
+        .order("created_at", desc=True)
+    ) or []
+
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["id","version_id","status","score","created_at","submitted_at"])
+    for r in rows:
+        w.writerow([r.get("id"), r.get("survey_version_id"), r.get("status"),
+                    r.get("score"), r.get("created_at"), r.get("submitted_at")])
+    return buf.getvalue().encode("utf-8")
+
+def csv_single_session_answers(client, session_id: str) -> Tuple[str, bytes]:
+    session, answers, version = load_session_with_answers(client, session_id)
+    if not session or not version:
+        return ("session_answers.csv", b"id,NO_DATA\n")
+    qb = questions_by_id(version)
+    # Kolejność według wersji
+    qids = list(qb.keys())
+
+    # Mapa odpowiedzi
+    amap = {a["question_id"]: a["answer"] for a in answers}
+
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    header = ["session_id","user_email","status","score","submitted_at"] + qids
+    w.writerow(header)
+
+    def _val_to_str(q, val):
+        if q.get("type") == "multi":
+            return "|".join(val or [])
+        return "" if val is None else str(val)
+
+    row = [
+        session["id"],
+        session.get("user_email",""),
+        session.get("status",""),
+        session.get("score",""),
+        session.get("submitted_at",""),
+    ] + [_val_to_str(qb[qid], (amap.get(qid) or {}).get("value")) for qid in qids]
+
+    w.writerow(row)
+    fname = f"answers_{session['id']}.csv"
+    return (fname, buf.getvalue().encode("utf-8"))
+
+def admin_csv_all_sessions_for_version(client, version_id: str) -> Tuple[bytes, bytes]:
+    # sessions summary
+    sessions = qexec(
+        client.table("survey_sessions")
+        .select("id, user_email, status, score, created_at, submitted_at")
+        .eq("survey_version_id", version_id)
+        .order("created_at")
+    ) or []
+
+    buf_s = io.StringIO(); ws = csv.writer(buf_s)
+    ws.writerow(["id","user_email","status","score","created_at","submitted_at"])
+    for s in sessions:
+        ws.writerow([s["id"], s["user_email"], s["status"], s["score"], s["created_at"], s["submitted_at"]])
+    sessions_csv = buf_s.getvalue().encode("utf-8")
+
+    # answers wide (kolumny = pytania)
+    version = get_version(client, version_id)
+    qb = questions_by_id(version)
+    qids = list(qb.keys())
+
+    # Zbuduj mapę: session_id -> {qid: value}
+    answers = qexec(
+        client.table("survey_answers")
+        .select("session_id, question_id, answer")
+        .in_("session_id", [s["id"] for s in sessions] or ["00000000-0000-0000-0000-000000000000"])
+    ) or []
+    amap: Dict[str, Dict[str, Any]] = {}
+    for a in answers:
+        sid = a["session_id"]; qid = a["question_id"]; val = (a["answer"] or {}).get("value")
+        amap.setdefault(sid, {})[qid] = val
+
+    def _val_to_str(q, val):
+        if q.get("type") == "multi":
+            return "|".join(val or [])
+        return "" if val is None else str(val)
+
+    buf_a = io.StringIO(); wa = csv.writer(buf_a)
+    wa.writerow(["session_id","user_email","status","score","submitted_at"] + qids)
+    for s in sessions:
+        row = [s["id"], s["user_email"], s["status"], s["score"], s["submitted_at"]]
+        for qid in qids:
+            row.append(_val_to_str(qb[qid], amap.get(s["id"], {}).get(qid)))
+        wa.writerow(row)
+    answers_csv = buf_a.getvalue().encode("utf-8")
+
+    return sessions_csv, answers_csv
+
+def build_pdf_for_session(version: Dict[str, Any],
+                          session: Dict[str, Any],
+                          answers: List[Dict[str, Any]],
+                          thr_g: int, thr_a: int) -> bytes:
+    """
+    Szybki PDF przez reportlab (bez wkhtml/Weasy). Prosty układ: nagłówek, metadane, wynik, lista Q/A.
+    """
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        from reportlab.lib import colors
+        from reportlab.lib.units import mm
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+        from reportlab.lib.enums import TA_LEFT
+    except Exception as e:
+        # Gdyby brakowało biblioteki, zwróć „fałszywy PDF” z podpowiedzią.
+        return f"Reportlab not available: {e}".encode("utf-8")
+
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=A4,
+                            leftMargin=18*mm, rightMargin=18*mm,
+                            topMargin=18*mm, bottomMargin=18*mm)
+    styles = getSampleStyleSheet()
+    styleH = styles["Heading1"]; styleH.alignment = TA_LEFT
+    styleP = styles["BodyText"]
+
+    flow = []
+    title = f"DORA Audit — Sesja {session.get('id','')[:8]}"
+    flow.append(Paragraph(title, styleH))
+    flow.append(Spacer(1, 6))
+
+    # Metadane
+    md = [
+        ["Użytkownik", session.get("user_email","")],
+        ["Status", session.get("status","")],
+        ["Wersja", f"v{version.get('version','')}"],
+        ["Wysłano", (session.get("submitted_at") or "").replace("T"," ")[:19]],
+    ]
+    t_md = Table(md, hAlign="LEFT", colWidths=[40*mm, 110*mm])
+    t_md.setStyle(TableStyle([
+        ("GRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
+        ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
+        ("ALIGN",(0,0),(-1,-1),"LEFT"),
+        ("VALIGN",(0,0),(-1,-1),"MIDDLE"),
+    ]))
+    flow.append(t_md)
+    flow.append(Spacer(1, 8))
+
+    # Wynik + badge
+    score = session.get("score")
+    if score is not None:
+        label, color = result_badge(float(score), thr_g, thr_a)
+        # prosta „łatka” z kolorem
+        flow.append(Paragraph(f"Wynik: <b>{score:g}</b> — {label}", styleP))
+        flow.append(Spacer(1, 6))
+
+    # Tabela pytań i odpowiedzi – tylko widoczne wg show_if (jak wynik i podgląd sesji)
+    qs_by_id = questions_by_id(version)
+    amap = answers_map(answers)
+    visible = visible_ids(list(qs_by_id.values()), amap)
+    rows = [["#", "Pytanie", "Odpowiedź", "Punkty"]]
+    for idx, (qid, q) in enumerate(qs_by_id.items(), start=1):
+        if visible is not None and qid not in visible:
+            continue
+        val = amap.get(qid)
+        txt = ""
+        if q.get("type") == "multi":
+            txt = ", ".join(val or [])
+        else:
+            txt = "" if val in (None,"") else str(val)
+        # „punkty” jeśli liczysz per pytanie
+        try:
+            pts = score_answer(q, val)
+        except Exception:
+            pts = ""
+        rows.append([idx, q.get("text",""), txt, pts])
+
+    t = Table(rows, repeatRows=1, colWidths=[10*mm, 90*mm, 60*mm, 20*mm])
+    t.setStyle(TableStyle([
+        ("GRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
+        ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
+        ("VALIGN", (0,0), (-1,-1), "TOP"),
+    ]))
+    flow.append(t)
+
+    doc.build(flow)
+    return buf.getvalue()
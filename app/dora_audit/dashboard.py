@@ -0,0 +1,165 @@
+# app/dora_audit/dashboard.py
+# -*- coding: utf-8 -*-
+"""
+Podsumowanie użytkownika na stronę startową (tabela user_dashboard, migracja 0007).
+
+Jeden wiersz na adres: ostatni i najlepszy wynik z pasmem RAG, liczba
+wysłanych podejść, otwarty szkic i krótka historia wyników (ostatnie
+HISTORY_LEN wysyłek – wystarcza na wykres bez dodatkowych zapytań).
+
+Wiersz utrzymuje aplikacja: record_submit() przy wysyłce (rpc
+record_dashboard_submit, migracja 0007 – jeden atomowy UPDATE, idempotentny
+po id sesji), record_draft() przy utworzeniu szkicu (jeden update). Brak
+wiersza – nowy użytkownik, import, ręczne usunięcie – oznacza odbudowę z
+survey_sessions przy najbliższym load_summary(). Błędy zapisu podsumowania
+nie blokują wysyłki: podsumowanie to dane pochodne, a invalidate() wymusza
+odbudowę.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from .core import missing_function, qexec, result_badge
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+HISTORY_LEN = int(os.getenv("DORA_DASHBOARD_HISTORY", "20"))
+REBUILD_LIMIT = 1000        # domyślny limit wierszy PostgREST
+
+_TABLE = "user_dashboard"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def band_for(score: Optional[float], version: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Pasmo RAG wyniku wg progów wersji (jak result_badge przy wysyłce)."""
+    if score is None:
+        return None
+    version = version or {}
+    return result_badge(float(score), int(version.get("threshold_green", 80)),
+                        int(version.get("threshold_amber", 60)))[0]
+
+def empty_summary(email: str) -> Dict[str, Any]:
+    return {"user_email": email, "attempts": 0,
+            "latest_session_id": None, "latest_score": None, "latest_band": None, "latest_at": None,
+            "best_session_id": None, "best_score": None, "best_band": None,
+            "open_draft_id": None, "history": []}
+
+def apply_submission(summary: Dict[str, Any], session: Dict[str, Any],
+                     version: Optional[Dict[str, Any]]) -> bool:
+    """
+    Dopisuje wysłaną sesję {id, score, submitted_at} do podsumowania (w miejscu).
+    False, gdy sesja już jest w historii (ponowienie).
+    """
+    sid = str(session["id"])
+    history: List[Dict[str, Any]] = list(summary.get("history") or [])
+    if any(h.get("id") == sid for h in history):
+        return False
+    score = float(session.get("score") or 0.0)
+    band = band_for(score, version)
+    at = session.get("submitted_at") or _now_iso()
+
+    history.append({"id": sid, "at": at, "score": score, "band": band,
+                    "v": (version or {}).get("version")})
+    history.sort(key=lambda h: h.get("at") or "")
+    summary["history"] = history[-HISTORY_LEN:]
+    summary["attempts"] = int(summary.get("attempts") or 0) + 1
+    if not summary.get("latest_at") or at >= summary["latest_at"]:
+        summary.update(latest_session_id=sid, latest_score=score, latest_band=band, latest_at=at)
+    if summary.get("best_score") is None or score > float(summary["best_score"]):
+        summary.update(best_session_id=sid, best_score=score, best_band=band)
+    if summary.get("open_draft_id") == sid:
+        summary["open_draft_id"] = None
+    return True
+
+def build_summary(email: str, sessions: Iterable[Dict[str, Any]],
+                  versions: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Podsumowanie od zera z wierszy survey_sessions (versions: id -> wiersz z progami)."""
+    summary = empty_summary(email)
+    drafts = []
+    for s in sorted(sessions, key=lambda r: r.get("submitted_at") or r.get("created_at") or ""):
+        if s.get("status") == "submitted":
+            apply_submission(summary, s, versions.get(s.get("survey_version_id")))
+        elif s.get("status") == "draft":
+            drafts.append(s)
+    if drafts:
+        summary["open_draft_id"] = max(drafts, key=lambda r: r.get("created_at") or "")["id"]
+    return summary
+
+def rebuild_summary(client: Client, email: str) -> Dict[str, Any]:
+    """Odbudowa z survey_sessions (+ progi wersji) i zapis wiersza."""
+    sessions = qexec(
+        client.table("survey_sessions")
+              .select("id, survey_version_id, status, score, created_at, submitted_at")
+              .eq("user_email", email)
+              .order("created_at", desc=True)
+              .limit(REBUILD_LIMIT)
+    ) or []
+    version_ids = sorted({s["survey_version_id"] for s in sessions if s.get("survey_version_id")})
+    versions: Dict[str, Dict[str, Any]] = {}
+    if version_ids:
+        versions = {v["id"]: v for v in qexec(
+            client.table("survey_versions")
+                  .select("id, version, threshold_green, threshold_amber")
+                  .in_("id", version_ids)
+        ) or []}
+    summary = build_summary(email, sessions, versions)
+    qexec(client.table(_TABLE).upsert({**summary, "updated_at": _now_iso()}, on_conflict="user_email"))
+    return summary
+
+def load_summary(client: Client, email: str) -> Dict[str, Any]:
+    """Wiersz podsumowania (jedno zapytanie); brak wiersza – odbudowa."""
+    rows = qexec(client.table(_TABLE).select("*").eq("user_email", email).limit(1))
+    if rows:
+        return rows[0]
+    return rebuild_summary(client, email)
+
+def record_submit(client: Client, email: str, session: Dict[str, Any],
+                  version: Optional[Dict[str, Any]]) -> bool:
+    """
+    Po wysyłce: dopisz sesję do podsumowania. False, gdy nic nie zmieniono –
+    brak wiersza (odbuduje go load_summary(), już z tą sesją), ponowienie albo błąd.
+    """
+    sid = str(session["id"])
+    score = float(session.get("score") or 0.0)
+    try:
+        try:
+            return bool(qexec(client.rpc("record_dashboard_submit", {
+                "p_email": email, "p_session_id": sid, "p_score": score,
+                "p_band": band_for(score, version), "p_at": session.get("submitted_at") or _now_iso(),
+                "p_version": (version or {}).get("version"), "p_history_len": HISTORY_LEN,
+            })))
+        except RuntimeError as e:
+            if not missing_function(e):
+                raise
+        # baza bez record_dashboard_submit: odczyt + upsert (równoległe wysyłki mogą się nadpisać)
+        rows = qexec(client.table(_TABLE).select("*").eq("user_email", email).limit(1))
+        if not rows or not apply_submission(rows[0], session, version):
+            return False
+        qexec(client.table(_TABLE).upsert({**rows[0], "updated_at": _now_iso()}, on_conflict="user_email"))
+        return True
+    except RuntimeError:
+        invalidate(client, [email])
+        return False
+
+def record_draft(client: Client, email: str, session_id: str) -> None:
+    """Po utworzeniu szkicu: ustaw otwarty szkic (bez wiersza – zrobi to odbudowa)."""
+    try:
+        qexec(client.table(_TABLE)
+                    .update({"open_draft_id": session_id, "updated_at": _now_iso()})
+                    .eq("user_email", email))
+    except RuntimeError:
+        invalidate(client, [email])
+
+def invalidate(client: Client, emails: List[str]) -> None:
+    """Usuwa podsumowania (np. po imporcie) – odbudują się przy następnym odczycie."""
+    if not emails:
+        return
+    try:
+        qexec(client.table(_TABLE).delete().in_("user_email", list(emails)))
+    except RuntimeError:
+        pass
@@ -0,0 +1,228 @@
+# app/dora_audit/draft_migration.py
+# -*- coding: utf-8 -*-
+"""
+Przeniesienie otwartych szkiców do nowo aktywowanej wersji ankiety.
+
+Szkic jest przypięty do survey_version_id, a wznowienie renderuje pytania
+aktywnej wersji – bez migracji stare odpowiedzi trafiłyby pod nowe pytania
+tylko przypadkiem. Jedno uruchomienie przenosi wszystkie szkice innych wersji:
+odpowiedź przechodzi na pytanie o tym samym kluczu trendu (trends.trend_keys –
+to samo id albo wpis question_map docelowej wersji; jawna mapa może go
+nadpisać), o ile zgadza się typ i opcja/zakres nadal istnieje. Wynik szkicu
+jest liczony od nowa (compute_total_score, z regułami show_if).
+
+Odpowiedzi bez odpowiednika w nowej wersji nie są przenoszone – trafiają do
+raportu (sesja, adres, pytanie, wartość, powód). Zapis idzie porcjami po
+MIGRATION_CHUNK_SIZE szkiców: jedna porcja = jedno wywołanie migrate_drafts
+(migracja 0009 – sesje i odpowiedzi w jednej transakcji, z pominięciem szkiców
+wysłanych w międzyczasie); na starszej bazie upsert sesji + wymiana odpowiedzi.
+
+    python -m dora_audit migrate-drafts <version_id> [--map map.json] [--dry-run]
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import exports_ns, get_shared_cache
+from .core import compute_total_score, missing_function, qexec, questions_by_id
+from .trends import load_versions, trend_keys, validate_question_map
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+MIGRATION_CHUNK_SIZE = int(os.getenv("DORA_MIGRATION_CHUNK_SIZE", "200"))
+ANSWERS_CHUNK = 100                 # sesji na zapytanie o odpowiedzi (in_)
+MAX_REPORTED = 500
+
+_SESSION_COLUMNS = "id, survey_version_id, user_email, status, score, created_at"
+
+Progress = Callable[[int, int], None]      # (szkice przetworzone, szkice przeniesione)
+
+
+@dataclass
+class DraftMigrationReport:
+    version_id: str
+    drafts: int = 0                     # szkice innych wersji
+    migrated: int = 0                   # przeniesione w tym uruchomieniu
+    answers: int = 0                    # przeniesione odpowiedzi
+    chunks: int = 0
+    unmappable: List[Dict[str, Any]] = field(default_factory=list)
+    unmappable_count: int = 0
+    dry_run: bool = False
+
+    def reject(self, session: Dict[str, Any], question_id: str, value: Any, reason: str) -> None:
+        self.unmappable_count += 1
+        if len(self.unmappable) < MAX_REPORTED:
+            self.unmappable.append({"session_id": session["id"], "user_email": session.get("user_email"),
+                                    "question_id": question_id, "value": value, "reason": reason})
+
+    def summary(self) -> Dict[str, Any]:
+        return {"drafts": self.drafts, "migrated": self.migrated, "answers": self.answers,
+                "chunks": self.chunks, "unmappable": self.unmappable_count, "dry_run": self.dry_run}
+
+
+# =============================================================================
+#  Mapowanie pytań i wartości
+# =============================================================================
+def question_routes(versions: List[Dict[str, Any]], target_id: str,
+                    mapping: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, str]]:
+    """
+    {version_id: {id_pytania: id_pytania_w_docelowej}} dla wszystkich wersji poza
+    docelową. mapping ({"q_nowe": "q_stare"}) zastępuje question_map docelowej wersji.
+    """
+    if mapping is not None:
+        versions = [dict(v, question_map=mapping) if v["id"] == target_id else v for v in versions]
+    keys = trend_keys(versions)
+    by_key = {key: qid for qid, key in keys.get(target_id, {}).items()}
+    return {vid: {qid: by_key[key] for qid, key in ks.items() if key in by_key}
+            for vid, ks in keys.items() if vid != target_id}
+
+def carry_value(old_q: Dict[str, Any], new_q: Dict[str, Any], value: Any) -> Tuple[Any, Optional[str]]:
+    """
+    (wartość dla nowego pytania, powód odrzucenia). Multi zachowuje istniejące
+    opcje – powód opisuje wtedy utracone; None jako wartość = nic do przeniesienia.
+    """
+    t, old_t = new_q.get("type"), old_q.get("type")
+    if old_t and t and old_t != t:
+        return None, f"zmieniony typ pytania ({old_t} → {t})"
+    labels = {o.get("label") for o in new_q.get("options", [])}
+    if t == "single":
+        return (value, None) if isinstance(value, str) and value in labels else (None, f"brak opcji „{value}”")
+    if t == "multi":
+        selected = value if isinstance(value, list) else [value]
+        kept = [v for v in selected if v in labels]
+        lost = [str(v) for v in selected if v not in labels]
+        return (kept or None), (f"brak opcji: {', '.join(lost)}" if lost else None)
+    if t == "scale":
+        try:
+            x = float(value)
+            ok = float(new_q.get("min", 1)) <= x <= float(new_q.get("max", 5))
+        except (TypeError, ValueError):
+            ok = False
+        return (value, None) if ok else (None, f"wartość {value} poza skalą")
+    return value, None
+
+def migrate_session(session: Dict[str, Any], answers: List[Dict[str, Any]],
+                    old_version: Optional[Dict[str, Any]], target: Dict[str, Any],
+                    routes: Dict[str, str], report: DraftMigrationReport) -> Tuple[float, List[Dict[str, Any]]]:
+    """Odpowiedzi szkicu w docelowej wersji + nowy wynik; nieprzeniesione trafiają do raportu."""
+    old_qs = questions_by_id(old_version) if old_version else {}
+    new_qs = questions_by_id(target)
+    payload: Dict[str, Dict[str, Any]] = {}
+    for a in answers:
+        qid, answer = a["question_id"], a.get("answer") or {}
+        value = answer.get("value")
+        if value in (None, "", []):
+            continue
+        new_qid = routes.get(qid)
+        if new_qid is None:
+            report.reject(session, qid, value, "brak pytania w nowej wersji")
+            continue
+        if new_qid in payload:
+            report.reject(session, qid, value, f"pytanie {new_qid} ma już odpowiedź")
+            continue
+        new_value, reason = carry_value(old_qs.get(qid, {}), new_qs[new_qid], value)
+        if reason:
+            report.reject(session, qid, value, reason)
+        if new_value is not None:
+            payload[new_qid] = {**answer, "type": new_qs[new_qid].get("type"), "value": new_value}
+    questions = (target.get("content") or {}).get("questions", []) or []
+    rows = [{"session_id": session["id"], "question_id": qid, "answer": p} for qid, p in payload.items()]
+    return compute_total_score(questions, payload), rows
+
+
+# =============================================================================
+#  Zapis
+# =============================================================================
+def _write_chunk(client: Client, version_id: str, sessions: List[Dict[str, Any]],
+                 answers: List[Dict[str, Any]]) -> int:
+    try:
+        return int(qexec(client.rpc("migrate_drafts", {
+            "p_version_id": version_id,
+            "p_sessions": [{"id": s["id"], "score": s["score"]} for s in sessions],
+            "p_answers": answers,
+        })) or 0)
+    except RuntimeError as e:
+        if not missing_function(e):
+            raise
+    # brak funkcji (baza sprzed 0009) – bez transakcji, ale powtórzenie porcji jest bezpieczne
+    ids = [s["id"] for s in sessions]
+    qexec(client.table("survey_sessions").upsert(
+        [{**s, "survey_version_id": version_id} for s in sessions], on_conflict="id"))
+    qexec(client.table("survey_answers").delete().in_("session_id", ids))
+    if answers:
+        qexec(client.table("survey_answers").upsert(answers, on_conflict="session_id,question_id"))
+    return len(sessions)
+
+def _draft_pages(client: Client, target_id: str, page: int):
+    """Szkice innych wersji stronami po id (przeniesione wypadają z filtra, stąd kursor)."""
+    after = None
+    while True:
+        q = (client.table("survey_sessions").select(_SESSION_COLUMNS)
+                   .eq("status", "draft").neq("survey_version_id", target_id)
+                   .order("id").limit(page))
+        if after:
+            q = q.gt("id", after)
+        rows = qexec(q) or []
+        if rows:
+            yield rows
+        if len(rows) < page:
+            return
+        after = rows[-1]["id"]
+
+def _answers_for(client: Client, session_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    out: Dict[str, List[Dict[str, Any]]] = {sid: [] for sid in session_ids}
+    for i in range(0, len(session_ids), ANSWERS_CHUNK):
+        for a in qexec(client.table("survey_answers").select("session_id, question_id, answer")
+                             .in_("session_id", session_ids[i:i + ANSWERS_CHUNK])) or []:
+            out[a["session_id"]].append(a)
+    return out
+
+def migrate_drafts(client: Client, target: Dict[str, Any], mapping: Optional[Dict[str, str]] = None,
+                   chunk_size: Optional[int] = None, dry_run: bool = False,
+                   progress: Optional[Progress] = None) -> DraftMigrationReport:
+    """
+    Przenosi wszystkie otwarte szkice innych wersji do `target` (wiersz survey_versions).
+    mapping – {"q_nowe": "q_stare"} zamiast question_map docelowej wersji;
+    dry_run – tylko raport, bez zapisu.
+    """
+    chunk_size = chunk_size or MIGRATION_CHUNK_SIZE
+    target_id = target["id"]
+    versions = load_versions(client)
+    if not any(v["id"] == target_id for v in versions):
+        versions.append(target)
+    if mapping is not None:
+        validate_question_map(mapping, target, [v for v in versions
+                                                if (v.get("version") or 0) < (target.get("version") or 0)])
+    by_id = {v["id"]: v for v in versions}
+    target = {**by_id[target_id], **target}
+    routes = question_routes(versions, target_id, mapping)
+
+    report = DraftMigrationReport(target_id, dry_run=dry_run)
+    touched = set()
+    for page in _draft_pages(client, target_id, chunk_size):
+        answers = _answers_for(client, [s["id"] for s in page])
+        sessions, rows = [], []
+        for s in page:
+            vid = s.get("survey_version_id")
+            score, new_rows = migrate_session(s, answers[s["id"]], by_id.get(vid), target,
+                                              routes.get(vid, {}), report)
+            sessions.append({**s, "score": score})
+            rows += new_rows
+            touched.add(vid)
+        report.drafts += len(page)
+        report.answers += len(rows)
+        if not dry_run:
+            report.migrated += _write_chunk(client, target_id, sessions, rows)
+            report.chunks += 1
+        if progress:
+            progress(report.drafts, report.migrated)
+
+    if report.migrated:
+        cache = get_shared_cache()
+        for vid in touched | {target_id}:
+            if vid:
+                cache.bump(exports_ns(vid), client)
+    return report
@@ -0,0 +1,320 @@
+# app/dora_audit/exports.py
+# -*- coding: utf-8 -*-
+"""
+Eksporty admina jako zadania w tle.
+
+Zlecenie eksportu wersji trafia do puli EXPORT_WORKERS wątków; skrypt
+Streamlit tylko je kolejkuje i pokazuje postęp. Zadanie czyta sesje porcjami
+(keyset po created_at, id) i dopisuje wiersze do plików CSV na dysku, więc
+pamięć nie rośnie z rozmiarem wersji, a między porcjami oddaje GIL
+(EXPORT_PAGE_PAUSE_S) – kilka eksportów naraz nie blokuje rerunów
+interaktywnych użytkowników.
+
+Stan zadania i pliki leżą w EXPORT_DIR/<job_id>/ (job.json, sessions.csv,
+answers_wide.csv), na wolumenie wspólnym dla replik na hoście: lista „Moje
+eksporty” przeżywa przeładowanie karty i restart, a pliki można pobrać
+później. Anulowanie to plik-znacznik `cancel` sprawdzany po każdej porcji
+(działa także z innej repliki). Zadanie bez postępu dłużej niż
+EXPORT_STALE_S (np. proces zabity w trakcie) jest pokazywane jako przerwane.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from .core import get_version, qexec, questions_by_id
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+EXPORT_DIR = os.getenv("DORA_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "dora_audit_exports"))
+EXPORT_WORKERS = int(os.getenv("DORA_EXPORT_WORKERS", "2"))
+EXPORT_MAX_PER_OWNER = int(os.getenv("DORA_EXPORT_MAX_PER_OWNER", "2"))
+EXPORT_PAGE_SIZE = int(os.getenv("DORA_EXPORT_PAGE_SIZE", "500"))
+EXPORT_PAGE_PAUSE_S = float(os.getenv("DORA_EXPORT_PAGE_PAUSE_S", "0.005"))
+EXPORT_STALE_S = float(os.getenv("DORA_EXPORT_STALE_S", "600"))
+EXPORT_RETENTION_DAYS = int(os.getenv("DORA_EXPORT_RETENTION_DAYS", "7"))
+ANSWERS_PAGE_SIZE = 1000    # domyślny limit wierszy PostgREST
+
+FILES = ("sessions.csv", "answers_wide.csv")
+ACTIVE = ("queued", "running")
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _val_to_str(q: Dict[str, Any], val: Any) -> str:
+    if q.get("type") == "multi":
+        return "|".join(val or [])
+    return "" if val is None else str(val)
+
+# =============================================================================
+#  Eksport porcjami do plików
+# =============================================================================
+def _session_pages(client: Client, version_id: str, page_size: int):
+    cursor = None
+    while True:
+        q = (client.table("survey_sessions")
+                   .select("id, user_email, status, score, created_at, submitted_at")
+                   .eq("survey_version_id", version_id))
+        if cursor:
+            created_at, sid = cursor
+            q = q.gte("created_at", created_at).or_(f'created_at.gt."{created_at}",id.gt."{sid}"')
+        rows = qexec(q.order("created_at").order("id").limit(page_size))
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+def _answers_for(client: Client, session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    start = 0
+    while True:
+        rows = qexec(
+            client.table("survey_answers")
+                  .select("session_id, question_id, answer")
+                  .in_("session_id", session_ids)
+                  .order("session_id").order("question_id")
+                  .range(start, start + ANSWERS_PAGE_SIZE - 1)
+        )
+        for a in rows:
+            out.setdefault(a["session_id"], {})[a["question_id"]] = (a["answer"] or {}).get("value")
+        if len(rows) < ANSWERS_PAGE_SIZE:
+            return out
+        start += ANSWERS_PAGE_SIZE
+
+def count_sessions(client: Client, version_id: str) -> int:
+    try:
+        resp = (client.table("survey_sessions").select("id", count="exact")
+                      .eq("survey_version_id", version_id).limit(1).execute())
+    except Exception as e:
+        raise RuntimeError(f"DB error: {getattr(e, 'message', str(e))}") from e
+    return resp.count or 0
+
+def export_version_files(client: Client, version_id: str, out_dir: Path,
+                         progress: Optional[Callable[[int, int], None]] = None,
+                         cancelled: Optional[Callable[[], bool]] = None,
+                         page_size: int = EXPORT_PAGE_SIZE) -> List[str]:
+    """
+    sessions.csv + answers_wide.csv wersji (te same kolumny co
+    core.admin_csv_all_sessions_for_version), zapisywane porcjami do out_dir.
+    """
+    version = get_version(client, version_id)
+    if not version:
+        raise RuntimeError(f"Nie znaleziono wersji {version_id}.")
+    qb = questions_by_id(version)
+    qids = list(qb.keys())
+    total = count_sessions(client, version_id)
+    done = 0
+    if progress:
+        progress(done, total)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / "sessions.csv", "w", newline="", encoding="utf-8") as fs, \
+         open(out_dir / "answers_wide.csv", "w", newline="", encoding="utf-8") as fa:
+        ws, wa = csv.writer(fs), csv.writer(fa)
+        ws.writerow(["id", "user_email", "status", "score", "created_at", "submitted_at"])
+        wa.writerow(["session_id", "user_email", "status", "score", "submitted_at"] + qids)
+        for page in _session_pages(client, version_id, page_size):
+            if cancelled and cancelled():
+                raise ExportCancelled()
+            amap = _answers_for(client, [s["id"] for s in page])
+            for s in page:
+                ws.writerow([s["id"], s["user_email"], s["status"], s["score"], s["created_at"], s["submitted_at"]])
+                vals = amap.get(s["id"], {})
+                wa.writerow([s["id"], s["user_email"], s["status"], s["score"], s["submitted_at"]]
+                            + [_val_to_str(qb[qid], vals.get(qid)) for qid in qids])
+            done += len(page)
+            if progress:
+                progress(done, max(total, done))
+            time.sleep(EXPORT_PAGE_PAUSE_S)     # oddaj GIL rerunom Streamlit
+    return list(FILES)
+
+# =============================================================================
+#  Zadania
+# =============================================================================
+@dataclass
+class ExportJob:
+    id: str
+    owner: str
+    version_id: str
+    version_label: str
+    status: str = "queued"          # queued / running / done / failed / cancelled
+    done: int = 0
+    total: int = 0
+    error: Optional[str] = None
+    files: List[str] = field(default_factory=list)
+    created_at: str = field(default_factory=_now_iso)
+    updated_at: str = field(default_factory=_now_iso)
+    finished_at: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE
+
+    @property
+    def progress(self) -> float:
+        return min(1.0, self.done / self.total) if self.total else (1.0 if self.status == "done" else 0.0)
+
+
+class ExportScheduler:
+    """Pula wątków eksportu + stan zadań na dysku (root/<job_id>/job.json)."""
+
+    def __init__(self, root: str = EXPORT_DIR, workers: int = EXPORT_WORKERS,
+                 max_per_owner: int = EXPORT_MAX_PER_OWNER, page_size: int = EXPORT_PAGE_SIZE):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_per_owner = max_per_owner
+        self.page_size = page_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    # --- stan na dysku ---------------------------------------------------------
+    def _dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def _save(self, job: ExportJob) -> None:
+        job.updated_at = _now_iso()
+        path = self._dir(job.id) / "job.json"
+        tmp = path.with_name("job.json.tmp")
+        tmp.write_text(json.dumps(asdict(job), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    def _load(self, path: Path) -> Optional[ExportJob]:
+        try:
+            job = ExportJob(**json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError, TypeError):
+            return None
+        if job.active and job.id not in self._futures:
+            age = datetime.now(timezone.utc) - datetime.fromisoformat(job.updated_at)
+            if age.total_seconds() > EXPORT_STALE_S:
+                job.status, job.error = "failed", "Eksport przerwany (restart aplikacji?)."
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        return self._load(self._dir(job_id) / "job.json")
+
+    def jobs_for(self, owner: str, limit: int = 20) -> List[ExportJob]:
+        """Zadania właściciela, najnowsze najpierw."""
+        jobs = [j for j in (self._load(p) for p in self.root.glob("*/job.json")) if j and j.owner == owner]
+        jobs.sort(key=lambda j: j.created_at, reverse=True)
+        return jobs[:limit]
+
+    def artifact(self, job: ExportJob, name: str) -> Path:
+        if name not in job.files:
+            raise KeyError(name)
+        return self._dir(job.id) / name
+
+    # --- API -------------------------------------------------------------------
+    def submit(self, client: Client, owner: str, version_id: str, version_label: str) -> ExportJob:
+        """Kolejkuje eksport; ten sam eksport w toku zwracany zamiast duplikatu."""
+        with self._lock:
+            active = [j for j in self.jobs_for(owner, limit=1000) if j.active]
+            same = next((j for j in active if j.version_id == version_id), None)
+            if same:
+                return same
+            if len(active) >= self.max_per_owner:
+                raise RuntimeError(f"Masz już {len(active)} eksport(y) w toku – poczekaj albo anuluj któryś.")
+            job = ExportJob(id=uuid.uuid4().hex, owner=owner, version_id=version_id, version_label=version_label)
+            self._dir(job.id).mkdir(parents=True)
+            self._save(job)
+            fut = self._pool.submit(self._run, client, job)
+            self._futures[job.id] = fut
+        fut.add_done_callback(lambda _f, jid=job.id: self._futures.pop(jid, None))
+        return job
+
+    def cancel(self, job_id: str, owner: str) -> bool:
+        job = self.get(job_id)
+        if not job or job.owner != owner or not job.active:
+            return False
+        (self._dir(job_id) / "cancel").touch()
+        return True
+
+    def delete(self, job_id: str, owner: str) -> bool:
+        job = self.get(job_id)
+        if not job or job.owner != owner or job.active:
+            return False
+        shutil.rmtree(self._dir(job_id), ignore_errors=True)
+        return True
+
+    def purge(self, older_than_days: int = EXPORT_RETENTION_DAYS) -> int:
+        """Usuwa zakończone zadania starsze niż N dni (z plikami)."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+        n = 0
+        for path in self.root.glob("*/job.json"):
+            job = self._load(path)
+            if job and not job.active and (job.finished_at or job.created_at) < cutoff:
+                shutil.rmtree(path.parent, ignore_errors=True)
+                n += 1
+        return n
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[ExportJob]:
+        fut = self._futures.get(job_id)
+        if fut is not None:
+            fut.exception(timeout)
+        return self.get(job_id)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    # --- wątek roboczy ---------------------------------------------------------
+    def _run(self, client: Client, job: ExportJob) -> None:
+        job_dir = self._dir(job.id)
+        cancel_flag = job_dir / "cancel"
+        try:
+            if cancel_flag.exists():
+                raise ExportCancelled()
+            job.status = "running"
+            self._save(job)
+
+            def _progress(done: int, total: int) -> None:
+                job.done, job.total = done, total
+                self._save(job)
+
+            job.files = export_version_files(client, job.version_id, job_dir, progress=_progress,
+                                             cancelled=cancel_flag.exists, page_size=self.page_size)
+            job.status = "done"
+        except ExportCancelled:
+            job.status = "cancelled"
+            for name in FILES:
+                (job_dir / name).unlink(missing_ok=True)
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.finished_at = _now_iso()
+            self._save(job)
+
+
+_scheduler: Optional[ExportScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_export_scheduler() -> ExportScheduler:
+    """Jedna pula eksportów na proces (EXPORT_DIR)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ExportScheduler()
+        return _scheduler
+
+def configure_export_scheduler(scheduler: Optional[ExportScheduler]) -> None:
+    """Podmiana puli (testy, inny katalog); None = utwórz domyślną przy następnym użyciu."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,78 @@
+# app/dora_audit/migrate.py
+# -*- coding: utf-8 -*-
+"""
+Wersjonowane migracje schematu (supabase_sql/migrations/NNNN_nazwa.sql).
+
+Każdy plik wykonywany jest raz, w kolejności numerów, we własnej transakcji;
+zastosowane wersje zapisuje tabela public.schema_migrations. Połączenie to
+zwykły URL Postgresa (DATABASE_URL, np. z ustawień projektu Supabase) –
+PostgREST nie wykonuje DDL. Wymaga pakietu psycopg (import leniwy).
+
+    python -m dora_audit migrate --database-url postgresql://...
+    python -m dora_audit migrate --dry-run
+"""
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+MIGRATIONS_DIR = Path(os.getenv(
+    "DORA_MIGRATIONS_DIR",
+    Path(__file__).resolve().parents[2] / "supabase_sql" / "migrations",
+))
+
+_NAME_RE = re.compile(r"^(\d{4})_[a-z0-9_]+\.sql$")
+
+def list_migrations(directory: Path = MIGRATIONS_DIR) -> List[Tuple[str, Path]]:
+    """[(wersja '0001', ścieżka)] posortowane; nazwy spoza wzorca NNNN_nazwa.sql są błędem."""
+    out = []
+    for path in sorted(Path(directory).glob("*.sql")):
+        m = _NAME_RE.match(path.name)
+        if not m:
+            raise ValueError(f"Niepoprawna nazwa migracji: {path.name} (oczekiwano NNNN_nazwa.sql)")
+        out.append((m.group(1), path))
+    versions = [v for v, _ in out]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Zduplikowany numer migracji w " + str(directory))
+    return out
+
+def connect(database_url: Optional[str] = None) -> Any:
+    url = database_url or os.getenv("DATABASE_URL", "")
+    if not url:
+        raise RuntimeError("Brak DATABASE_URL (URL połączenia z Postgresem).")
+    try:
+        import psycopg
+    except ImportError as e:
+        raise RuntimeError("Migracje wymagają pakietu psycopg (pip install 'psycopg[binary]').") from e
+    return psycopg.connect(url, autocommit=True)   # transakcje jawnie: conn.transaction()
+
+def applied_versions(conn: Any) -> List[str]:
+    with conn.transaction():
+        conn.execute("""
+            create table if not exists public.schema_migrations (
+              version    text primary key,
+              name       text not null,
+              applied_at timestamptz not null default now()
+            )
+        """)
+    return [r[0] for r in conn.execute("select version from public.schema_migrations order by version")]
+
+def pending(conn: Any, directory: Path = MIGRATIONS_DIR) -> List[Tuple[str, Path]]:
+    done = set(applied_versions(conn))
+    return [(v, p) for v, p in list_migrations(directory) if v not in done]
+
+def migrate(conn: Any, directory: Path = MIGRATIONS_DIR) -> List[str]:
+    """Stosuje brakujące migracje; zwraca nazwy zastosowanych plików."""
+    applied = []
+    for version, path in pending(conn, directory):
+        try:
+            with conn.transaction():
+                conn.execute(path.read_text(encoding="utf-8"))
+                conn.execute("insert into public.schema_migrations(version, name) values (%s, %s)",
+                             (version, path.name))
+        except Exception as e:   # psycopg.Error – jak qexec: RuntimeError z nazwą pliku
+            raise RuntimeError(f"Migracja {path.name} nie powiodła się: {e}") from e
+        applied.append(path.name)
+    return applied
@@ -0,0 +1,322 @@
+# app/dora_audit/outbox.py
+# -*- coding: utf-8 -*-
+"""
+Outbox zdarzeń + dyspozytor webhooków (WEBHOOK_URL / WEBHOOK_TOKEN).
+
+Wysyłka ankiety zapisuje tylko wiersz w submission_outbox (migracja 0004) –
+bez ruchu sieciowego w ścieżce submit. Wątek WebhookDispatcher
+(w aplikacji albo `python -m dora_audit webhooks`) co WEBHOOK_POLL_S zabiera
+porcję zaległych zdarzeń i wysyła je jednym POST-em:
+
+    {"events": [{"id": ..., "type": "session.submitted", "created_at": ...,
+                 "data": {...}}, ...]}
+
+Nagłówki: X-Dora-Timestamp oraz X-Dora-Signature = sha256=<HMAC-SHA256
+(WEBHOOK_TOKEN, "<timestamp>.<body>")>. Odpowiedź 2xx = cała porcja
+dostarczona; inaczej każde zdarzenie dostaje kolejną próbę po wykładniczym
+backoffie (z losowym rozrzutem), a po WEBHOOK_MAX_ATTEMPTS status 'failed'
+(admin może ponowić). Dostarczenie jest at-least-once – odbiorca deduplikuje
+po `id` zdarzenia (uuid5 z typu i id sesji, więc stały przy ponownej wysyłce).
+
+Zdarzenie wysyłki (submission_event) przekazuje się do core.save_session –
+save_survey_session (migracja 0010) dopisuje je w tej samej transakcji co
+sesję, więc wysłana ankieta zawsze ma swój wiersz, a ponowiona wysyłka nie
+tworzy drugiego (stałe id, on conflict do nothing). Tabela jest pod RLS:
+użytkownik może tylko dopisać własne zdarzenie, admin – czytać i ponawiać.
+enqueue_submission dopisuje ten sam wiersz osobnym insertem z return=minimal
+(zwrot wiersza wymagałby polityki SELECT) – tak samo core.save_session na bazie
+sprzed 0010. Dyspozytor używa SUPABASE_SERVICE_ROLE_KEY i funkcji
+claim_submission_outbox (dzierżawa porcji z `for update skip locked`, więc
+kilka replik aplikacji nie wysyła tego samego zdarzenia równolegle).
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .core import missing_function, qexec
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()
+WEBHOOK_TOKEN = os.getenv("WEBHOOK_TOKEN", "").strip()
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+WEBHOOK_BACKOFF_S = float(os.getenv("WEBHOOK_BACKOFF_S", "10"))
+WEBHOOK_BACKOFF_MAX_S = float(os.getenv("WEBHOOK_BACKOFF_MAX_S", "3600"))
+WEBHOOK_POLL_S = float(os.getenv("WEBHOOK_POLL_S", "5"))
+WEBHOOK_TIMEOUT_S = float(os.getenv("WEBHOOK_TIMEOUT_S", "10"))
+WEBHOOK_LEASE_S = int(os.getenv("WEBHOOK_LEASE_S", "120"))
+
+EVENT_SUBMITTED = "session.submitted"
+STATUSES = ("pending", "delivered", "failed")
+
+_TABLE = "submission_outbox"
+_EVENT_NS = uuid.UUID("4f1f3c56-0d2e-4a8c-9d0b-6a1d7c2e9b31")
+
+
+def enabled() -> bool:
+    return bool(WEBHOOK_URL)
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def event_id(event_type: str, session_id: str) -> str:
+    """Deterministyczne id zdarzenia – klucz deduplikacji po obu stronach."""
+    return str(uuid.uuid5(_EVENT_NS, f"{event_type}:{session_id}"))
+
+# =============================================================================
+#  Zapis zdarzenia (ścieżka submit)
+# =============================================================================
+def submission_event(session: Dict[str, Any], version: Dict[str, Any],
+                     label: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Wiersz zdarzenia session.submitted dla core.save_session (p_event) albo
+    None, gdy webhooki są wyłączone.
+    """
+    if not enabled():
+        return None
+    return {
+        "id": event_id(EVENT_SUBMITTED, session["id"]),
+        "event_type": EVENT_SUBMITTED,
+        "session_id": session["id"],
+        "user_email": session["user_email"],
+        "payload": {
+            "session_id": session["id"],
+            "user_email": session["user_email"],
+            "survey_version_id": version["id"],
+            "version": version.get("version"),
+            "score": session.get("score"),
+            "label": label,
+            "submitted_at": session.get("submitted_at"),
+        },
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": _now().isoformat(),
+    }
+
+def enqueue_submission(client: Client, session: Dict[str, Any], version: Dict[str, Any],
+                       label: Optional[str] = None) -> Optional[str]:
+    """
+    Dopisuje zdarzenie session.submitted osobnym zapytaniem (idempotentnie po
+    id sesji). Zwraca id zdarzenia albo None, gdy webhooki są wyłączone.
+    """
+    event = submission_event(session, version, label)
+    if event is None:
+        return None
+    from postgrest import ReturnMethod
+
+    qexec(client.table(_TABLE).upsert(event, on_conflict="id", ignore_duplicates=True,
+                                      returning=ReturnMethod.minimal))
+    return event["id"]
+
+# =============================================================================
+#  Podpis i wysyłka
+# =============================================================================
+def sign(body: bytes, timestamp: str, token: str) -> str:
+    mac = hmac.new(token.encode("utf-8"), timestamp.encode("ascii") + b"." + body, hashlib.sha256)
+    return "sha256=" + mac.hexdigest()
+
+def verify(body: bytes, timestamp: str, signature: str, token: str) -> bool:
+    """Weryfikacja po stronie odbiorcy (i w testach)."""
+    return hmac.compare_digest(sign(body, timestamp, token), signature or "")
+
+def backoff_s(attempts: int, base: float = WEBHOOK_BACKOFF_S, cap: float = WEBHOOK_BACKOFF_MAX_S) -> float:
+    """Opóźnienie przed próbą nr attempts+1: base·2^(attempts-1), z rozrzutem ±20%, max cap."""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+def _batch_body(rows: List[Dict[str, Any]]) -> bytes:
+    events = [{"id": r["id"], "type": r["event_type"], "created_at": r.get("created_at"),
+               "data": r["payload"]} for r in rows]
+    return json.dumps({"events": events}, ensure_ascii=False, default=str).encode("utf-8")
+
+def post_batch(url: str, token: str, rows: List[Dict[str, Any]],
+               timeout: float = WEBHOOK_TIMEOUT_S) -> None:
+    """POST porcji zdarzeń; wyjątek RuntimeError przy błędzie sieci lub statusie spoza 2xx."""
+    body = _batch_body(rows)
+    ts = str(int(time.time()))
+    headers = {"Content-Type": "application/json", "X-Dora-Timestamp": ts,
+               "User-Agent": "dora-audit-webhooks"}
+    if token:
+        headers["X-Dora-Signature"] = sign(body, ts, token)
+    req = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"HTTP {e.code}") from e
+    except (urllib.error.URLError, OSError) as e:
+        raise RuntimeError(f"Błąd połączenia: {getattr(e, 'reason', e)}") from e
+
+# =============================================================================
+#  Dyspozytor
+# =============================================================================
+def dispatcher_client() -> Client:
+    """Klient z kluczem service role (omija RLS outboxa); bez niego – klucz anon."""
+    url = os.getenv("SUPABASE_URL", "").strip()
+    key = (os.getenv("SUPABASE_SERVICE_ROLE_KEY", "").strip()
+           or os.getenv("SUPABASE_ANON_KEY", "").strip())
+    if not url or not key:
+        raise RuntimeError("Brak SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY w środowisku.")
+    from supabase import create_client
+    return create_client(url, key)
+
+def claim_due(client: Client, limit: int = WEBHOOK_BATCH_SIZE,
+              lease_s: int = WEBHOOK_LEASE_S) -> List[Dict[str, Any]]:
+    """Zaległe zdarzenia, zadzierżawione na lease_s (inne repliki ich nie wezmą)."""
+    try:
+        return qexec(client.rpc("claim_submission_outbox", {"p_limit": limit, "p_lease_s": lease_s}))
+    except RuntimeError as e:
+        if not missing_function(e):
+            raise           # chwilowy błąd – bez dzierżawy inne repliki wysłałyby tę samą porcję
+        # brak funkcji (starsza baza) – zwykły select; bezpieczne przy jednym dyspozytorze
+        return qexec(
+            client.table(_TABLE).select("*")
+                  .eq("status", "pending")
+                  .lte("next_attempt_at", _now().isoformat())
+                  .order("next_attempt_at")
+                  .limit(limit)
+        )
+
+class WebhookDispatcher:
+    """Wątek w tle: claim → POST → oznaczenie wyniku. dispatch_once() do testów i CLI."""
+
+    def __init__(self, client: Client, url: Optional[str] = None, token: Optional[str] = None,
+                 batch_size: int = WEBHOOK_BATCH_SIZE, max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+                 poll_s: float = WEBHOOK_POLL_S):
+        self.client = client
+        self.url = url if url is not None else WEBHOOK_URL
+        self.token = token if token is not None else WEBHOOK_TOKEN
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_s = poll_s
+
+        self.stats: Counter = Counter()          # delivered / retried / failed / batches
+        self.last_error: Optional[str] = None
+        self.last_run_at: Optional[datetime] = None
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def dispatch_once(self) -> int:
+        """Jedna porcja; zwraca liczbę dostarczonych zdarzeń."""
+        self.last_run_at = _now()
+        rows = claim_due(self.client, self.batch_size)
+        if not rows:
+            return 0
+        self.stats["batches"] += 1
+        ids = [r["id"] for r in rows]
+        try:
+            post_batch(self.url, self.token, rows)
+        except RuntimeError as e:
+            self.last_error = str(e)
+            self._mark_failed(rows, str(e))
+            return 0
+        self.last_error = None
+        qexec(self.client.table(_TABLE).update({
+            "status": "delivered",
+            "delivered_at": _now().isoformat(),
+            "last_error": None,
+        }).in_("id", ids))
+        self.stats["delivered"] += len(rows)
+        return len(rows)
+
+    def _mark_failed(self, rows: List[Dict[str, Any]], error: str) -> None:
+        # próby różnią się per zdarzenie, więc jeden update na wiersz (porcja jest mała)
+        for r in rows:
+            attempts = int(r.get("attempts") or 0) + 1
+            if attempts >= self.max_attempts:
+                patch = {"status": "failed", "attempts": attempts, "last_error": error}
+                self.stats["failed"] += 1
+            else:
+                retry_at = _now() + timedelta(seconds=backoff_s(attempts))
+                patch = {"attempts": attempts, "last_error": error,
+                         "next_attempt_at": retry_at.isoformat()}
+                self.stats["retried"] += 1
+            qexec(self.client.table(_TABLE).update(patch).eq("id", r["id"]))
+
+    def drain(self, max_batches: int = 100) -> int:
+        """Wysyła porcje, dopóki są zaległe (CLI --once)."""
+        total = 0
+        for _ in range(max_batches):
+            sent = self.dispatch_once()
+            total += sent
+            if sent < self.batch_size:
+                break
+        return total
+
+    # --- wątek w tle -----------------------------------------------------------
+    def start(self) -> "WebhookDispatcher":
+        """Pętla w wątku w tle (aplikacja)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="webhook-dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self) -> None:
+        """Po wysyłce ankiety: nie czekaj na kolejny cykl poll_s."""
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_forever(self) -> None:
+        """Pętla na pierwszym planie (CLI pod supervisorem / systemd); kończy ją stop() albo Ctrl+C."""
+        self._run()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                while self.dispatch_once() >= self.batch_size and not self._stop.is_set():
+                    pass
+            except Exception as e:      # błąd bazy – spróbuj w następnym cyklu
+                self.last_error = str(e)
+            self._wake.wait(self.poll_s)
+            self._wake.clear()
+
+# =============================================================================
+#  Panel admina
+# =============================================================================
+def status_counts(client: Client) -> Dict[str, int]:
+    """Liczba zdarzeń per status (count="exact" – bez pobierania wierszy)."""
+    out = {}
+    for status in STATUSES:
+        try:
+            resp = client.table(_TABLE).select("id", count="exact").eq("status", status).limit(1).execute()
+        except Exception as e:
+            raise RuntimeError(f"DB error: {getattr(e, 'message', str(e))}") from e
+        out[status] = resp.count or 0
+    return out
+
+def recent_events(client: Client, limit: int = 20, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    q = client.table(_TABLE).select(
+        "id, session_id, user_email, status, attempts, next_attempt_at, last_error, created_at, delivered_at"
+    )
+    if status:
+        q = q.eq("status", status)
+    return qexec(q.order("created_at", desc=True).limit(limit))
+
+def retry_failed(client: Client) -> int:
+    """Przywraca zdarzenia 'failed' do kolejki (nowa seria prób)."""
+    rows = qexec(client.table(_TABLE).update({
+        "status": "pending", "attempts": 0, "next_attempt_at": _now().isoformat(),
+    }).eq("status", "failed"))
+    return len(rows)
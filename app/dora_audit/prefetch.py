@@ -0,0 +1,66 @@
+# app/dora_audit/prefetch.py
+# -*- coding: utf-8 -*-
+"""
+Równoległe odczyty na starcie strony (panel admina).
+
+Niezależne zapytania startują razem na wspólnej puli wątków, a bloki strony
+odbierają gotowe wyniki – czas ładowania to najwolniejsze zapytanie, a nie
+suma wszystkich. Wynik odbiera się raz (take): bloki będące fragmentami
+Streamlit dostają przy własnym rerunie te same argumenty, więc przy kolejnym
+wywołaniu czytają bazę same i widzą świeże dane.
+
+Ten sam loader pod kilkoma kluczami to jedno zapytanie (np. lista wersji dla
+przeglądarki sesji i eksportu). Loadery działają w kopii kontekstu wywołującego
+(contextvars), więc widzą jego sesję klienta bazy.
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+PREFETCH_WORKERS = int(os.getenv("DORA_PREFETCH_WORKERS", "8"))
+
+
+class Prefetch:
+    """Wyniki loaderów uruchomionych od razu na puli; take() odbiera je raz."""
+
+    def __init__(self, loaders: Optional[Dict[Hashable, Callable[[], Any]]] = None,
+                 pool: Optional[ThreadPoolExecutor] = None):
+        self._futures: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        if not loaders:
+            return
+        pool = pool or get_prefetch_pool()
+        started: Dict[int, Future] = {}
+        for key, loader in loaders.items():
+            fut = started.get(id(loader))
+            if fut is None:
+                fut = started[id(loader)] = pool.submit(contextvars.copy_context().run, loader)
+            self._futures[key] = fut
+
+    def take(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Wynik pobrany z wyprzedzeniem (wyjątek loadera leci tutaj) albo loader() na miejscu."""
+        with self._lock:
+            fut = self._futures.pop(key, None)
+        return loader() if fut is None else fut.result()
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_prefetch_pool() -> ThreadPoolExecutor:
+    """Pula procesu (leniwie; rozmiar z DORA_PREFETCH_WORKERS)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="dora-prefetch")
+        return _pool
+
+def configure_prefetch_pool(pool: Optional[ThreadPoolExecutor]) -> None:
+    """Podmiana puli (testy); None = nowa z env przy następnym użyciu."""
+    global _pool
+    with _pool_lock:
+        _pool = pool
@@ -0,0 +1,207 @@
+# app/dora_audit/profiling.py
+# -*- coding: utf-8 -*-
+"""
+Opcjonalne profilowanie CPU rerunów i akcji (cProfile).
+
+Włączane przez DORA_PROFILE=1 albo przełącznik w panelu admina (na proces).
+Wyłączone kosztuje jedno sprawdzenie flagi na rerun. Włączone profiluje
+co PROFILE_SAMPLE_RATE-ty rerun (0..1, losowo) i zapamiętuje PROFILE_TOP_N
+najwolniejszych przechwyceń – kopiec ograniczonej wielkości, każde z
+PROFILE_FUNCS najdroższymi funkcjami (cumtime), więc pamięć jest stała.
+
+Przechwycenie ma etykietę strona / akcja. Akcja zgłoszona w trakcie
+profilowanego reruna (np. „pdf” w podglądzie sesji) tylko zmienia jego
+etykietę; poza rerunem (rerun fragmentu, wątek w tle) zaczyna własne
+przechwycenie. Naraz działa najwyżej jeden profiler w procesie – współbieżne
+reruny innych sesji są wtedy pomijane (licznik `busy`); od Pythona 3.12
+cProfile i tak nie pozwala na dwa aktywne naraz.
+"""
+from __future__ import annotations
+
+import cProfile
+import heapq
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_ENABLED = os.getenv("DORA_PROFILE", "0").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_TOP_N = int(os.getenv("DORA_PROFILE_TOP_N", "20"))
+PROFILE_SAMPLE_RATE = float(os.getenv("DORA_PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_FUNCS = int(os.getenv("DORA_PROFILE_FUNCS", "25"))
+
+FuncRow = Tuple[str, int, float, float]     # (funkcja, wywołania, tottime s, cumtime s)
+
+
+def _func_label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":                         # wbudowane: ('~', 0, "<built-in method ...>")
+        return name
+    parts = filename.replace("\\", "/").split("/")
+    short = "/".join(parts[-2:]) if "site-packages" not in parts else "/".join(
+        parts[parts.index("site-packages") + 1:][-3:])
+    return f"{short}:{line}({name})"
+
+def _top_functions(prof: cProfile.Profile, limit: int) -> List[FuncRow]:
+    stats = pstats.Stats(prof).stats        # {func: (cc, nc, tt, ct, callers)}
+    rows = [(_func_label(f), nc, tt, ct) for f, (cc, nc, tt, ct, _) in stats.items()]
+    rows.sort(key=lambda r: r[3], reverse=True)
+    return rows[:limit]
+
+
+@dataclass
+class Capture:
+    page: str
+    action: str
+    wall_ms: float
+    cpu_ms: float
+    created_at: str
+    functions: List[FuncRow] = field(default_factory=list)
+
+    @property
+    def tag(self) -> str:
+        return f"{self.page} / {self.action}"
+
+    def summary(self) -> Dict[str, Any]:
+        return {"kiedy": self.created_at[11:19], "strona / akcja": self.tag,
+                "czas [ms]": round(self.wall_ms, 1), "CPU [ms]": round(self.cpu_ms, 1)}
+
+    def stats_text(self, limit: int = 15) -> str:
+        """Tabela w stylu pstats (najdroższe funkcje wg cumtime)."""
+        lines = [f"{'ncalls':>8} {'tottime':>9} {'cumtime':>9}  function"]
+        for name, nc, tt, ct in self.functions[:limit]:
+            lines.append(f"{nc:>8} {tt:>9.4f} {ct:>9.4f}  {name}")
+        return "\n".join(lines)
+
+
+class Profiler:
+    """Przechwycenia cProfile: top-N najwolniejszych + liczniki per etykieta."""
+
+    def __init__(self, enabled: Optional[bool] = None, top_n: Optional[int] = None,
+                 sample_rate: Optional[float] = None, funcs: Optional[int] = None):
+        self.enabled = PROFILE_ENABLED if enabled is None else enabled
+        self.top_n = PROFILE_TOP_N if top_n is None else top_n
+        self.sample_rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.funcs = PROFILE_FUNCS if funcs is None else funcs
+
+        self.stats: Counter = Counter()                 # captured / sampled_out / busy
+        self.per_tag: Dict[str, List[float]] = {}       # etykieta -> [liczba, suma ms, max ms]
+        self._heap: List[Tuple[float, int, Capture]] = []
+        self._seq = itertools.count()
+        self._busy = threading.Lock()                   # jeden aktywny cProfile w procesie
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def capture(self, page: str, action: str = "rerun") -> Iterator[None]:
+        """
+        Profiluje blok. Wewnątrz innego przechwycenia w tym wątku tylko
+        nadaje mu akcję; wyłączony profiler nic nie robi.
+        """
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            current["action"] = action
+            yield
+            return
+        if not self.enabled:
+            yield
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.stats["sampled_out"] += 1
+            yield
+            return
+        if not self._busy.acquire(blocking=False):
+            self.stats["busy"] += 1
+            yield
+            return
+
+        self._local.current = meta = {"action": action}
+        prof = cProfile.Profile()
+        t0, c0 = time.perf_counter(), time.thread_time()
+        try:
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+        finally:
+            wall = (time.perf_counter() - t0) * 1000.0
+            cpu = (time.thread_time() - c0) * 1000.0
+            self._local.current = None
+            self._busy.release()
+            self._record(page, meta["action"], wall, cpu, prof)
+
+    def _record(self, page: str, action: str, wall_ms: float, cpu_ms: float, prof: cProfile.Profile) -> None:
+        tag = f"{page} / {action}"
+        with self._lock:
+            self.stats["captured"] += 1
+            agg = self.per_tag.setdefault(tag, [0, 0.0, 0.0])
+            agg[0] += 1
+            agg[1] += wall_ms
+            agg[2] = max(agg[2], wall_ms)
+            if len(self._heap) >= self.top_n and wall_ms <= self._heap[0][0]:
+                return                                  # szybsze niż najwolniejsze N – bez pstats
+        cap = Capture(page, action, wall_ms, cpu_ms, datetime.now(timezone.utc).isoformat(),
+                      _top_functions(prof, self.funcs))
+        with self._lock:
+            item = (wall_ms, next(self._seq), cap)
+            if len(self._heap) < self.top_n:
+                heapq.heappush(self._heap, item)
+            elif wall_ms > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def slowest(self) -> List[Capture]:
+        """Zapamiętane przechwycenia, najwolniejsze najpierw."""
+        with self._lock:
+            return [c for _, _, c in sorted(self._heap, key=lambda i: i[0], reverse=True)]
+
+    def tag_summary(self) -> List[Dict[str, Any]]:
+        """Liczba, średni i maksymalny czas per strona / akcja (wszystkie przechwycenia)."""
+        with self._lock:
+            items = sorted(self.per_tag.items(), key=lambda kv: kv[1][1], reverse=True)
+            return [{"strona / akcja": tag, "liczba": n, "średnio [ms]": round(total / n, 1),
+                     "max [ms]": round(mx, 1)} for tag, (n, total, mx) in items]
+
+    def hot_functions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Funkcje zsumowane po zapamiętanych przechwyceniach (tottime – czas własny)."""
+        agg: Dict[str, List[float]] = {}
+        for cap in self.slowest():
+            for name, nc, tt, ct in cap.functions:
+                row = agg.setdefault(name, [0, 0.0, 0.0])
+                row[0] += nc
+                row[1] += tt
+                row[2] += ct
+        rows = sorted(agg.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+        return [{"funkcja": name, "wywołania": int(nc), "własny [ms]": round(tt * 1000, 1),
+                 "łączny [ms]": round(ct * 1000, 1)} for name, (nc, tt, ct) in rows]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+            self.per_tag.clear()
+            self.stats.clear()
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+def get_profiler() -> Profiler:
+    """Profiler procesu (leniwie; stan włączenia z DORA_PROFILE)."""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler()
+        return _profiler
+
+def configure_profiler(profiler: Optional[Profiler]) -> None:
+    """Podmiana profilera (testy); None = nowy z env przy następnym użyciu."""
+    global _profiler
+    with _profiler_lock:
+        _profiler = profiler
@@ -0,0 +1,126 @@
+# app/dora_audit/ranking.py
+# -*- coding: utf-8 -*-
+"""
+Percentyl wyniku na tle wszystkich wysłanych sesji tej samej wersji ankiety.
+
+Rozkład wersji to posortowana tablica wyników trzymana we współdzielonym
+cache; id już policzonych sesji leżą w osobnym wpisie, czytanym tylko przy
+wysyłce. Ładowany raz (RPC version_score_distribution,
+migracja 0012 – omija RLS i zwraca tylko wyniki), stronami
+po LOAD_PAGE_SIZE, bo odpowiedź PostgREST jest obcięta do limitu wierszy. Potem
+każda wysyłka dopisuje wynik przyrostowo (bisect.insort). Wyświetlenie strony
+to deserializacja jednej tablicy float (kopia bajtów, bez obiektu na wynik) i
+dwa wyszukiwania binarne – bez skanowania survey_sessions.
+
+Bez funkcji w bazie percentyla nie ma: zwykły select widzi przez RLS tylko
+własne sesje użytkownika, a taki „percentyl” byłby mylący.
+
+Repliki na innych hostach widzą nowe wysyłki najpóźniej po RANKING_TTL_S.
+"""
+from __future__ import annotations
+
+import bisect
+import os
+from array import array
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .cache import get_shared_cache, ranking_ns
+from .core import missing_function, qexec
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+RANKING_TTL_S = float(os.getenv("RANKING_TTL_S", "600"))
+LOAD_PAGE_SIZE = 1000       # domyślny limit wierszy PostgREST (db-max-rows)
+
+_SCORES = "scores"
+_IDS = "session_ids"
+
+
+@dataclass
+class ScoreDistribution:
+    """Posortowane wyniki wysłanych sesji jednej wersji."""
+    scores: array = field(default_factory=lambda: array("d"))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "ScoreDistribution":
+        by_id = {str(r["id"]): float(r["score"]) for r in rows if r.get("score") is not None}
+        return cls(array("d", sorted(by_id.values())))
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def add(self, score: float) -> None:
+        bisect.insort(self.scores, float(score))
+
+    def percentile(self, score: float) -> Optional[float]:
+        """
+        Percentyl 0..100: odsetek wyników niższych, remisy liczone w połowie.
+        None, gdy brak wysyłek.
+        """
+        n = len(self.scores)
+        if not n:
+            return None
+        below = bisect.bisect_left(self.scores, score)
+        ties = bisect.bisect_right(self.scores, score) - below
+        return round(100.0 * (below + ties / 2.0) / n, 1)
+
+
+def load_rows(client: Client, version_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Wszystkie (id, score) wysłanych sesji wersji, stronami; None, gdy baza nie ma funkcji."""
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        try:
+            page = qexec(client.rpc("version_score_distribution", {"p_version_id": version_id})
+                               .range(start, start + LOAD_PAGE_SIZE - 1))
+        except RuntimeError as e:
+            if missing_function(e):
+                return None
+            raise
+        rows.extend(page)
+        if len(page) < LOAD_PAGE_SIZE:
+            return rows
+        start += LOAD_PAGE_SIZE
+
+def get_distribution(client: Client, version_id: str) -> Optional[ScoreDistribution]:
+    """Rozkład z cache (przy zimnym – z bazy, razem z wpisem id sesji); None bez funkcji w bazie."""
+    cache, ns = get_shared_cache(), ranking_ns(version_id)
+
+    def _load() -> Optional[ScoreDistribution]:
+        rows = load_rows(client, version_id)
+        if rows is None:
+            return None
+        cache.set(ns, _IDS, {str(r["id"]) for r in rows}, ttl=RANKING_TTL_S)
+        return ScoreDistribution.from_rows(rows)
+    return cache.get_or_load(ns, _SCORES, _load, ttl=RANKING_TTL_S)
+
+def record_submission(version_id: str, session_id: str, score: float) -> None:
+    """Po wysyłce: dopisz wynik do rozkładu w cache (jeśli jest załadowany) – raz na sesję."""
+    cache, ns = get_shared_cache(), ranking_ns(version_id)
+
+    def _add_id(ids: Set[str]) -> Optional[Set[str]]:
+        if session_id in ids:
+            return None
+        ids.add(session_id)
+        return ids
+    if cache.update(ns, _IDS, _add_id) is None:
+        return      # rozkład nie jest w cache albo ta wysyłka już jest policzona
+
+    def _add(dist: ScoreDistribution) -> ScoreDistribution:
+        dist.add(score)
+        return dist
+    cache.update(ns, _SCORES, _add)
+
+def percentile_for(client: Client, version_id: str, score: float) -> Optional[Tuple[Optional[float], int]]:
+    """(percentyl albo None, liczba wysłanych sesji wersji); None, gdy percentyla nie da się policzyć."""
+    dist = get_distribution(client, version_id)
+    if dist is None:
+        return None
+    return dist.percentile(score), len(dist)
+
+def percentile_caption(pct: Optional[float], n: int) -> str:
+    if pct is None:
+        return "Brak wysłanych ankiet tej wersji do porównania."
+    return f"Percentyl {pct:.0f} na tle wysłanych ankiet tej wersji (n={n})."
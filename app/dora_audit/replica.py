@@ -0,0 +1,164 @@
+# app/dora_audit/replica.py
+# -*- coding: utf-8 -*-
+"""
+Opcjonalna replika tylko do odczytu dla eksportów, list i analityki.
+
+SUPABASE_REPLICA_URL (i opcjonalnie SUPABASE_REPLICA_KEY, domyślnie klucz
+anon) włącza routing: ciężkie odczyty raportowe – eksport wersji, lista
+whitelisty, „Moje podejścia”, przeglądarka sesji, trendy – idą przez
+ReadRouter.for_read(), a wszystkie zapisy i zwykłe odczyty ścieżki ankiety
+zostają na głównej bazie. Bez zmiennej for_read() zwraca główną bazę.
+
+Dwie ochrony przed nieświeżymi danymi:
+  * opóźnienie repliki (rpc replica_lag_seconds, migracja 0011) sprawdzane
+    co najwyżej raz na REPLICA_POLL_S; powyżej REPLICA_MAX_LAG_S albo przy
+    błędzie odczyty wracają na główną bazę,
+  * read-your-writes: po zapisie użytkownika (note_write) jego odczyty idą na
+    główną bazę przez REPLICA_PIN_S – co najmniej REPLICA_MAX_LAG_S +
+    REPLICA_POLL_S, więc po powrocie na replikę zapis już tam jest.
+
+Replika nie ma własnego auth – odczyt z tokenem użytkownika dostaje osobnego
+klienta PostgREST z tym tokenem (session_for, wspólna pula połączeń), żeby
+obowiązywały te same polityki RLS. Wspólny klient repliki (sprawdzanie
+opóźnienia, odczyty bez tokenu – CLI) nigdy nie dostaje tokenu użytkownika,
+więc równoległe sesje i zadania w tle nie widzą cudzej sesji. Tak samo
+session_client_from_env daje klienta głównej bazy z tokenem jednego
+użytkownika – dla pracy w tle (autozapis), której nie wolno iść przez wspólny
+klient aplikacji, bo jego sesję zmienia każdy rerun każdej karty.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from .core import client_from_env, qexec
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+REPLICA_URL = os.getenv("SUPABASE_REPLICA_URL", "").strip()
+REPLICA_KEY = os.getenv("SUPABASE_REPLICA_KEY", "").strip()
+REPLICA_MAX_LAG_S = float(os.getenv("DORA_REPLICA_MAX_LAG_S", "10"))
+REPLICA_POLL_S = float(os.getenv("DORA_REPLICA_POLL_S", "5"))
+REPLICA_PIN_S = float(os.getenv("DORA_REPLICA_PIN_S", "60"))
+
+_MAX_PINS = 10_000
+
+_http: Optional[Any] = None         # httpx.Client – pula połączeń klientów per token
+_http_lock = threading.Lock()
+
+
+class ReadRouter:
+    """Wybór klienta do odczytu: replika, gdy jest świeża i użytkownik niczego przed chwilą nie zapisał."""
+
+    def __init__(self, primary: Client, replica: Optional[Client] = None,
+                 max_lag_s: Optional[float] = None, poll_s: Optional[float] = None,
+                 pin_s: Optional[float] = None, clock: Callable[[], float] = time.monotonic,
+                 session_for: Optional[Callable[[str], Client]] = None):
+        self.primary = primary
+        self.replica = replica
+        self.session_for = session_for      # token -> osobny klient repliki z sesją użytkownika
+        self.max_lag_s = REPLICA_MAX_LAG_S if max_lag_s is None else max_lag_s
+        self.poll_s = REPLICA_POLL_S if poll_s is None else poll_s
+        self.pin_s = max(REPLICA_PIN_S if pin_s is None else pin_s, self.max_lag_s + self.poll_s)
+        self.stats: Counter = Counter()     # replica / stale / pinned / error
+        self._clock = clock
+        self._lag: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self._pins: Dict[str, float] = {}   # email -> do kiedy czyta z głównej bazy
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica is not None
+
+    def lag(self) -> Optional[float]:
+        """Opóźnienie repliki w sekundach (z cache na poll_s); None = nie udało się sprawdzić."""
+        now = self._clock()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.poll_s:
+                return self._lag
+        try:
+            lag: Optional[float] = float(qexec(self.replica.rpc("replica_lag_seconds", {})) or 0.0)
+        except (RuntimeError, TypeError, ValueError):
+            lag = None
+            self.stats["error"] += 1
+        with self._lock:
+            self._lag, self._checked_at = lag, now
+        return lag
+
+    def note_write(self, email: Optional[str]) -> None:
+        """Zapis użytkownika: jego odczyty zostają na głównej bazie przez pin_s."""
+        if not self.enabled or not email:
+            return
+        now = self._clock()
+        with self._lock:
+            if len(self._pins) >= _MAX_PINS:
+                self._pins = {e: t for e, t in self._pins.items() if t > now}
+            self._pins[email] = now + self.pin_s
+
+    def for_read(self, email: Optional[str] = None, token: Optional[str] = None) -> Client:
+        """
+        Klient dla odczytu raportowego; token – sesja użytkownika dla RLS na
+        replice (nowy klient na wywołanie, bez session_for – główna baza).
+        """
+        if not self.enabled or (token and self.session_for is None):
+            return self.primary
+        if email:
+            with self._lock:
+                until = self._pins.get(email)
+            if until is not None and until > self._clock():
+                self.stats["pinned"] += 1
+                return self.primary
+        lag = self.lag()
+        if lag is None or lag > self.max_lag_s:
+            self.stats["stale"] += 1
+            return self.primary
+        self.stats["replica"] += 1
+        return self.session_for(token) if token else self.replica
+
+
+def _http_client():
+    global _http
+    with _http_lock:
+        if _http is None:
+            import httpx
+            _http = httpx.Client(follow_redirects=True)
+        return _http
+
+def replica_client_from_env(token: Optional[str] = None) -> Optional[Client]:
+    """
+    Klient repliki z SUPABASE_REPLICA_URL; None, gdy repliki nie skonfigurowano.
+    Z tokenem – osobny klient PostgREST z sesją tego użytkownika (table / rpc).
+    """
+    if not REPLICA_URL:
+        return None
+    key = REPLICA_KEY or os.getenv("SUPABASE_ANON_KEY", "").strip()
+    if token:
+        return _postgrest_client(REPLICA_URL, key, token)
+    from supabase import create_client
+    return create_client(REPLICA_URL, key)
+
+def session_client_from_env(token: str) -> Client:
+    """Klient PostgREST głównej bazy (SUPABASE_URL) z sesją jednego użytkownika (table / rpc)."""
+    url = os.getenv("SUPABASE_URL", "").strip()
+    key = os.getenv("SUPABASE_ANON_KEY", "").strip()
+    if not url or not key:
+        raise RuntimeError("Brak SUPABASE_URL / SUPABASE_ANON_KEY w środowisku.")
+    return _postgrest_client(url, key, token)
+
+def _postgrest_client(url: str, key: str, token: str) -> Client:
+    from postgrest import SyncPostgrestClient
+    from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+    return SyncPostgrestClient(
+        f"{url.rstrip('/')}/rest/v1",
+        headers={**DEFAULT_POSTGREST_CLIENT_HEADERS, "apikey": key, "Authorization": f"Bearer {token}"},
+        http_client=_http_client(),
+    )
+
+def read_client_from_env() -> Client:
+    """Klient do odczytów wsadowych (CLI export): replika, gdy skonfigurowana i świeża."""
+    return ReadRouter(client_from_env(), replica_client_from_env()).for_read()
@@ -0,0 +1,128 @@
+# app/dora_audit/sessions.py
+# -*- coding: utf-8 -*-
+"""
+Przeglądarka sesji dla admina: filtry po stronie serwera + stronicowanie keyset.
+
+Filtry: wersja, status, zakres wyniku, pasmo RAG (progi wybranej wersji
+zamienione na zakres wyniku), zakres dat (created_at albo submitted_at) i
+prefiks adresu. Sortowanie: najnowsze najpierw, (created_at, id) malejąco;
+kursor następnej strony to para z ostatniego wiersza:
+
+    created_at <= c AND (created_at < c OR id < i)
+
+więc strona N kosztuje tyle samo co strona 1 (bez offsetu). Liczba wyników
+to count="estimated" z PostgREST – dokładna dla małych zbiorów, z planera dla
+dużych – liczona raz dla zestawu filtrów. Indeksy: migracja 0005.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .core import qexec
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+PAGE_SIZE = 50
+BANDS = ("Green", "Amber", "Red")
+STATUSES = ("draft", "submitted")
+DATE_FIELDS = ("created_at", "submitted_at")
+
+_COLUMNS = "id, survey_version_id, user_email, status, score, created_at, submitted_at"
+
+Cursor = Tuple[str, str]            # (created_at, id) ostatniego wiersza strony
+
+
+@dataclass(frozen=True)
+class SessionFilter:
+    version_id: Optional[str] = None
+    status: Optional[str] = None
+    score_min: Optional[float] = None
+    score_max: Optional[float] = None
+    band: Optional[str] = None                  # Green / Amber / Red – wymaga version_id
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None              # włącznie
+    date_field: str = "created_at"
+    email_prefix: str = ""
+
+    def key(self) -> Tuple[Any, ...]:
+        """Klucz zestawu filtrów (reset stronicowania / licznika po zmianie)."""
+        return tuple(asdict(self).values())
+
+
+def band_range(band: str, thr_green: float, thr_amber: float) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Pasmo RAG jako zakres wyniku [min, max) – te same progi co core.result_badge.
+    Górna granica jest wyłączna (None = bez granicy).
+    """
+    if band == "Green":
+        return float(thr_green), None
+    if band == "Amber":
+        return float(thr_amber), float(thr_green)
+    if band == "Red":
+        return None, float(thr_amber)
+    raise ValueError(f"Nieznane pasmo RAG: {band!r}")
+
+def _quote(value: str) -> str:
+    # wartości w filtrze or=(...) z ':' / '.' / ',' muszą być w cudzysłowie
+    return '"' + str(value).replace('"', '') + '"'
+
+def _filtered(client: Client, f: SessionFilter, columns: str, count: Optional[str] = None,
+              version: Optional[Dict[str, Any]] = None):
+    if f.status and f.status not in STATUSES:
+        raise ValueError(f"Nieznany status: {f.status!r}")
+    if f.date_field not in DATE_FIELDS:
+        raise ValueError(f"Nieznane pole daty: {f.date_field!r}")
+    q = client.table("survey_sessions").select(columns, count=count)
+    if f.version_id:
+        q = q.eq("survey_version_id", f.version_id)
+    if f.status:
+        q = q.eq("status", f.status)
+    if f.score_min is not None:
+        q = q.gte("score", f.score_min)
+    if f.score_max is not None:
+        q = q.lte("score", f.score_max)
+    if f.band:
+        if not version:
+            raise ValueError("Filtr pasma RAG wymaga wybranej wersji (progi są per wersja).")
+        lo, hi = band_range(f.band, version.get("threshold_green", 80), version.get("threshold_amber", 60))
+        if lo is not None:
+            q = q.gte("score", lo)
+        if hi is not None:
+            q = q.lt("score", hi)
+    if f.date_from:
+        q = q.gte(f.date_field, f.date_from.isoformat())
+    if f.date_to:
+        q = q.lt(f.date_field, (f.date_to + timedelta(days=1)).isoformat())
+    prefix = (f.email_prefix or "").strip().lower()
+    if prefix:
+        q = q.like("user_email", prefix.replace("%", "").replace("_", r"\_") + "%")
+    return q
+
+def search_sessions(client: Client, f: SessionFilter, after: Optional[Cursor] = None,
+                    limit: int = PAGE_SIZE, version: Optional[Dict[str, Any]] = None
+                    ) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    """
+    Jedna strona wyników (najnowsze najpierw). version – wiersz wersji z progami
+    (potrzebny tylko dla filtra band). Zwraca (wiersze, kursor następnej strony albo None).
+    """
+    q = _filtered(client, f, _COLUMNS, version=version)
+    if after:
+        created_at, sid = after
+        q = q.lte("created_at", created_at).or_(f"created_at.lt.{_quote(created_at)},id.lt.{_quote(sid)}")
+    rows = qexec(q.order("created_at", desc=True).order("id", desc=True).limit(limit + 1))
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1]["created_at"], rows[-1]["id"])
+    return rows, None
+
+def estimate_count(client: Client, f: SessionFilter, version: Optional[Dict[str, Any]] = None) -> int:
+    """Szacunkowa liczba wyników (count="estimated", bez pobierania wierszy)."""
+    q = _filtered(client, f, "id", count="estimated", version=version).limit(1)
+    try:
+        resp = q.execute()
+    except Exception as e:
+        raise RuntimeError(f"DB error: {getattr(e, 'message', str(e))}") from e
+    return resp.count or 0
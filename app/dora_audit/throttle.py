@@ -0,0 +1,131 @@
+# app/dora_audit/throttle.py
+# -*- coding: utf-8 -*-
+"""
+Ograniczanie zapisów ankiety (szkic, wysyłka, autozapis).
+
+Dwa poziomy:
+  * token bucket per użytkownik – WRITE_BURST zapisów od razu, potem
+    WRITE_RATE_PER_MIN na minutę; nadmiar od razu dostaje WriteThrottled
+    z czasem, po którym warto spróbować ponownie,
+  * limit zapisów w toku na proces (WRITE_MAX_IN_FLIGHT) i jeden zapis w
+    toku na użytkownika – kolejne czekają w kolejce najwyżej
+    WRITE_QUEUE_TIMEOUT_S.
+
+Jeden zapis na użytkownika sprawia, że kilku klikających w kółko nie zajmie
+wszystkich miejsc – pozostali czekają co najwyżej na jeden zapis z każdej
+„głośnej” sesji. Limity są per proces (replika); przy N replikach baza widzi
+maksymalnie N × WRITE_MAX_IN_FLIGHT równoległych zapisów.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+WRITE_RATE_PER_MIN = float(os.getenv("WRITE_RATE_PER_MIN", "30"))
+WRITE_BURST = int(os.getenv("WRITE_BURST", "10"))
+WRITE_MAX_IN_FLIGHT = int(os.getenv("WRITE_MAX_IN_FLIGHT", "8"))
+WRITE_QUEUE_TIMEOUT_S = float(os.getenv("WRITE_QUEUE_TIMEOUT_S", "15"))
+
+_MAX_BUCKETS = 10_000           # LRU kubełków – nieaktywni użytkownicy wypadają
+
+
+class WriteThrottled(RuntimeError):
+    """Zapis odrzucony przez limit; retry_after – sugerowana przerwa w sekundach."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate_per_s: float, burst: int, now: float):
+        self.rate = rate_per_s
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.stamp = now
+
+    def take(self, now: float, n: float = 1.0) -> float:
+        """Pobiera n żetonów; 0.0 = OK, inaczej liczba sekund do dostępności."""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class WriteLimiter:
+    """Token bucket per użytkownik + globalny limit zapisów w toku z kolejką."""
+
+    def __init__(self, rate_per_min: Optional[float] = None, burst: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, queue_timeout_s: Optional[float] = None,
+                 per_user_in_flight: int = 1, clock: Callable[[], float] = time.monotonic):
+        # None = wartość z modułu w chwili tworzenia (env albo podmiana w testach)
+        self.rate_per_s = (WRITE_RATE_PER_MIN if rate_per_min is None else rate_per_min) / 60.0
+        self.burst = WRITE_BURST if burst is None else burst
+        self.max_in_flight = WRITE_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.queue_timeout_s = WRITE_QUEUE_TIMEOUT_S if queue_timeout_s is None else queue_timeout_s
+        self.per_user_in_flight = per_user_in_flight
+        self.clock = clock
+
+        self.stats: Counter = Counter()     # admitted / rate_limited / timed_out / queued
+        self.in_flight = 0
+        self._user_in_flight: Dict[str, int] = {}
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._cond = threading.Condition()
+
+    def _take_token(self, user: str) -> None:
+        now = self.clock()
+        bucket = self._buckets.get(user)
+        if bucket is None:
+            bucket = self._buckets[user] = TokenBucket(self.rate_per_s, self.burst, now)
+            if len(self._buckets) > _MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(user)
+        wait = bucket.take(now)
+        if wait:
+            self.stats["rate_limited"] += 1
+            raise WriteThrottled(f"Za dużo zapisów w krótkim czasie – spróbuj ponownie za {wait:.0f} s.",
+                                 retry_after=wait)
+
+    def _free(self, user: str) -> bool:
+        return (self.in_flight < self.max_in_flight
+                and self._user_in_flight.get(user, 0) < self.per_user_in_flight)
+
+    @contextmanager
+    def slot(self, user: str, rate_limited: bool = True) -> Iterator[None]:
+        """
+        Miejsce na jeden zapis. rate_limited=False (autozapis w tle, już
+        zdebouncowany) pomija kubełek, ale czeka w tej samej kolejce.
+        """
+        with self._cond:
+            if rate_limited:
+                self._take_token(user)
+            if not self._free(user):
+                self.stats["queued"] += 1
+                deadline = time.monotonic() + self.queue_timeout_s
+                while not self._free(user):
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        self.stats["timed_out"] += 1
+                        raise WriteThrottled("Serwer jest teraz obciążony – zapis nie zmieścił się w kolejce. "
+                                             "Spróbuj ponownie za chwilę.", retry_after=self.queue_timeout_s)
+                    self._cond.wait(left)
+            self.in_flight += 1
+            self._user_in_flight[user] = self._user_in_flight.get(user, 0) + 1
+            self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                n = self._user_in_flight.pop(user) - 1
+                if n:
+                    self._user_in_flight[user] = n
+                self._cond.notify_all()
@@ -0,0 +1,304 @@
+# app/dora_audit/trends.py
+# -*- coding: utf-8 -*-
+"""
+Trendy dojrzałości między wersjami ankiety (per pytanie i per sekcja).
+
+Każdy upload tworzy nową wersję, a id pytań mogą się w niej zmienić.
+Opcjonalna mapa w survey_versions.question_map (migracja 0008) mówi, którym
+pytaniem wcześniejszej wersji jest pytanie tej wersji: {"q_nowe": "q_stare"}.
+Pytania bez wpisu zachowują swoje id. Z map (po kolei od najstarszej wersji)
+powstaje klucz trendu – id pytania z najstarszej wersji, w której wystąpiło –
+wspólny dla wszystkich jego wcieleń.
+
+Agregaty to sumy punktów, maksimum i liczba odpowiedzi per (wersja, klucz)
+i (wersja, sekcja). Pełne przeliczenie to jeden przebieg pandas po
+wszystkich odpowiedziach wysłanych sesji (punktacja single / multi / scale
+złączeniami zamiast pętli po wierszach). Wynik leży we współdzielonym cache;
+wysyłka (record_submission, bez zapytań do bazy) liczy sumy swojej sesji poza
+transakcją cache i dopisuje tylko je – do listy zaległych przyrostów, scalanej
+przy odczycie – oraz id sesji do osobnego zbioru (idempotencja), więc nie
+przepisuje całych agregatów pod blokadą pliku cache. Zmiana mapy, import
+i archiwizacja unieważniają wpisy (bump) – następny odczyt przelicza całość.
+
+Pytania nieodpowiedziane (także ukryte regułą show_if) nie liczą się ani do
+punktów, ani do maksimum.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from .cache import NS_TRENDS, get_shared_cache
+from .core import max_score, qexec
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+TRENDS_TTL_S = float(os.getenv("DORA_TRENDS_TTL_S", "3600"))
+SESSIONS_PAGE_SIZE = 1000           # domyślny limit wierszy PostgREST
+ANSWERS_CHUNK = 100                 # sesji na zapytanie o odpowiedzi (in_)
+
+_KEY = "aggregates"
+_IDS = "session_ids"
+_PENDING = "pending"
+NO_SECTION = "—"
+
+Sums = Dict[Tuple[str, str], List[float]]      # (version_id, klucz) -> [punkty, maksimum, odpowiedzi]
+
+
+# =============================================================================
+#  Mapa pytań między wersjami
+# =============================================================================
+def trend_keys(versions: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """
+    {version_id: {question_id: klucz trendu}} dla wersji (dowolna kolejność –
+    liczy się numer wersji). question_map wskazuje id z dowolnej wcześniejszej wersji.
+    """
+    known: Dict[str, str] = {}
+    out: Dict[str, Dict[str, str]] = {}
+    for v in sorted(versions, key=lambda r: r.get("version") or 0):
+        mapping = v.get("question_map") or {}
+        keys: Dict[str, str] = {}
+        for q in (v.get("content") or {}).get("questions", []) or []:
+            qid = q.get("id")
+            if not qid:
+                continue
+            src = mapping.get(qid, qid)
+            keys[qid] = known.get(src, src)
+        known.update(keys)
+        out[v["id"]] = keys
+    return out
+
+def validate_question_map(mapping: Dict[str, str], version: Dict[str, Any],
+                          earlier: List[Dict[str, Any]]) -> None:
+    """ValueError, gdy mapa wskazuje pytania spoza tej wersji albo nieznane we wcześniejszych."""
+    if not isinstance(mapping, dict) or not all(isinstance(k, str) and isinstance(v, str)
+                                                for k, v in mapping.items()):
+        raise ValueError("Mapa musi być obiektem JSON {\"id_w_tej_wersji\": \"id_we_wcześniejszej\"}.")
+    own = {q.get("id") for q in (version.get("content") or {}).get("questions", []) or []}
+    bad = sorted(set(mapping) - own)
+    if bad:
+        raise ValueError(f"Pytania spoza wersji v{version.get('version')}: {', '.join(bad)}")
+    older = {q.get("id") for v in earlier for q in (v.get("content") or {}).get("questions", []) or []}
+    unknown = sorted(set(mapping.values()) - older)
+    if unknown:
+        raise ValueError(f"Pytania nieznane we wcześniejszych wersjach: {', '.join(unknown)}")
+
+def save_question_map(client: Client, version_id: str, mapping: Dict[str, str]) -> None:
+    qexec(client.table("survey_versions").update({"question_map": mapping}).eq("id", version_id))
+    get_shared_cache().bump(NS_TRENDS, client)
+
+
+# =============================================================================
+#  Punktacja wektorowa
+# =============================================================================
+def _question_frames(versions: List[Dict[str, Any]],
+                     keys: Dict[str, Dict[str, str]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    meta, options = [], []
+    for v in versions:
+        for q in (v.get("content") or {}).get("questions", []) or []:
+            qid = q.get("id")
+            if not qid:
+                continue
+            meta.append({"version_id": v["id"], "question_id": qid, "key": keys[v["id"]][qid],
+                         "section": str(q.get("section") or NO_SECTION), "type": q.get("type"),
+                         "min": float(q.get("min", 1) or 0), "step": float(q.get("score_per_step", 0) or 0),
+                         "max_points": max_score(q)})
+            options += [{"version_id": v["id"], "question_id": qid, "label": o.get("label"),
+                         "opt_score": float(o.get("score", 0))} for o in q.get("options", [])]
+    meta_df = pd.DataFrame(meta, columns=["version_id", "question_id", "key", "section", "type",
+                                          "min", "step", "max_points"])
+    opt_df = pd.DataFrame(options, columns=["version_id", "question_id", "label", "opt_score"])
+    return meta_df, opt_df
+
+def score_frame(answers: pd.DataFrame, meta: pd.DataFrame, options: pd.DataFrame) -> pd.DataFrame:
+    """
+    answers: session_id, version_id, question_id, value -> punkty per odpowiedź
+    (kolumny: session_id, version_id, key, section, points, max_points). Bez pętli po wierszach.
+    """
+    cols = ["session_id", "version_id", "key", "section", "points", "max_points"]
+    a = answers[answers["value"].map(lambda v: v not in (None, "", []))]
+    a = a.merge(meta, on=["version_id", "question_id"], how="inner")
+    if a.empty:
+        return pd.DataFrame(columns=cols)
+
+    single = a[a["type"] == "single"].merge(options, left_on=["version_id", "question_id", "value"],
+                                            right_on=["version_id", "question_id", "label"], how="left")
+    single = single.assign(points=single["opt_score"].fillna(0.0))
+
+    multi = a[a["type"] == "multi"].explode("value")
+    multi = multi.merge(options, left_on=["version_id", "question_id", "value"],
+                        right_on=["version_id", "question_id", "label"], how="left")
+    multi = (multi.assign(points=multi["opt_score"].fillna(0.0))
+                  .groupby(["session_id", "version_id", "question_id", "key", "section", "max_points"],
+                           as_index=False)["points"].sum())
+
+    scale = a[a["type"] == "scale"]
+    scale = scale.assign(points=((pd.to_numeric(scale["value"], errors="coerce") - scale["min"])
+                                 * scale["step"]).clip(lower=0).fillna(0.0))
+
+    parts = [df[cols] for df in (single, multi, scale) if not df.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=cols)
+
+def _sums(scored: pd.DataFrame, by: str) -> Sums:
+    g = scored.groupby(["version_id", by]).agg(points=("points", "sum"), max_points=("max_points", "sum"),
+                                               n=("points", "size"))
+    return {(vid, k): [float(r.points), float(r.max_points), float(r.n)] for (vid, k), r in g.iterrows()}
+
+
+# =============================================================================
+#  Agregaty (cache) i tabele trendów
+# =============================================================================
+@dataclass
+class TrendAggregates:
+    versions: Dict[str, int] = field(default_factory=dict)          # version_id -> numer wersji
+    keys: Dict[str, Dict[str, str]] = field(default_factory=dict)   # version_id -> qid -> klucz
+    labels: Dict[str, str] = field(default_factory=dict)            # klucz -> treść (najnowsza wersja)
+    by_question: Sums = field(default_factory=dict)
+    by_section: Sums = field(default_factory=dict)
+    sessions: int = 0                                               # wysłane sesje w sumach
+
+    def add(self, scored: pd.DataFrame, sessions: int) -> None:
+        _accumulate(self.by_question, _sums(scored, "key"))
+        _accumulate(self.by_section, _sums(scored, "section"))
+        self.sessions += sessions
+
+    def merge(self, delta: "TrendDelta") -> None:
+        """Przyrost jednej wysyłki (id pytań tej wersji -> klucze trendu)."""
+        keys = self.keys[delta.version_id]
+        _accumulate(self.by_question, {(vid, keys.get(qid, qid)): v for (vid, qid), v in delta.by_question.items()})
+        _accumulate(self.by_section, delta.by_section)
+        self.sessions += 1
+
+    def _table(self, sums: Sums, label: str) -> pd.DataFrame:
+        if not sums:
+            return pd.DataFrame()
+        df = pd.DataFrame([(k, f"v{self.versions.get(vid, '?')}", self.versions.get(vid, 0),
+                            100.0 * p / m if m else None, n) for (vid, k), (p, m, n) in sums.items()],
+                          columns=[label, "wersja", "nr", "wynik [%]", "odpowiedzi"])
+        order = df.sort_values("nr")["wersja"].drop_duplicates().tolist()
+        table = df.pivot_table(index=label, columns="wersja", values="wynik [%]", aggfunc="first")
+        return table.reindex(columns=order).round(1)
+
+    def question_table(self) -> pd.DataFrame:
+        """Wiersze: klucz trendu (z treścią), kolumny: wersje, wartości: średni % punktów."""
+        table = self._table(self.by_question, "pytanie")
+        if not table.empty:
+            table.index = [f"{k} – {self.labels[k]}" if self.labels.get(k) else k for k in table.index]
+        return table
+
+    def section_table(self) -> pd.DataFrame:
+        return self._table(self.by_section, "sekcja")
+
+
+@dataclass
+class TrendDelta:
+    """Sumy jednej wysłanej sesji – by_question po id pytań jej wersji."""
+    version_id: str
+    by_question: Sums
+    by_section: Sums
+
+def _accumulate(target: Sums, sums: Sums) -> None:
+    for k, (p, m, n) in sums.items():
+        acc = target.setdefault(k, [0.0, 0.0, 0.0])
+        acc[0] += p
+        acc[1] += m
+        acc[2] += n
+
+
+def load_versions(client: Client) -> List[Dict[str, Any]]:
+    """Wszystkie wersje z treścią i mapą pytań, rosnąco."""
+    return qexec(client.table("survey_versions")
+                       .select("id, version, content, question_map")
+                       .order("version")) or []
+
+def _load_answers(client: Client) -> pd.DataFrame:
+    """Odpowiedzi wszystkich wysłanych sesji (sesje stronami po id, odpowiedzi porcjami in_)."""
+    frames, after = [], None
+    while True:
+        q = (client.table("survey_sessions").select("id, survey_version_id")
+                   .eq("status", "submitted").order("id").limit(SESSIONS_PAGE_SIZE))
+        if after:
+            q = q.gt("id", after)
+        sessions = qexec(q) or []
+        if not sessions:
+            break
+        version_of = {s["id"]: s["survey_version_id"] for s in sessions}
+        ids = list(version_of)
+        for i in range(0, len(ids), ANSWERS_CHUNK):
+            rows = qexec(client.table("survey_answers").select("session_id, question_id, answer")
+                               .in_("session_id", ids[i:i + ANSWERS_CHUNK])) or []
+            if rows:
+                df = pd.DataFrame(rows)
+                frames.append(pd.DataFrame({
+                    "session_id": df["session_id"],
+                    "version_id": df["session_id"].map(version_of),
+                    "question_id": df["question_id"],
+                    "value": df["answer"].map(lambda a: (a or {}).get("value")),
+                }))
+        if len(sessions) < SESSIONS_PAGE_SIZE:
+            break
+        after = sessions[-1]["id"]
+    if not frames:
+        return pd.DataFrame(columns=["session_id", "version_id", "question_id", "value"])
+    return pd.concat(frames, ignore_index=True)
+
+def compute_aggregates(versions: List[Dict[str, Any]], answers: pd.DataFrame) -> TrendAggregates:
+    """Pełne przeliczenie (bez bazy): wersje z question_map + odpowiedzi wysłanych sesji."""
+    keys = trend_keys(versions)
+    agg = TrendAggregates(versions={v["id"]: v.get("version") for v in versions}, keys=keys)
+    for v in sorted(versions, key=lambda r: r.get("version") or 0):
+        for q in (v.get("content") or {}).get("questions", []) or []:
+            if q.get("id"):
+                agg.labels[keys[v["id"]][q["id"]]] = q.get("text") or ""
+    meta, options = _question_frames(versions, keys)
+    agg.add(score_frame(answers, meta, options), answers["session_id"].nunique())
+    return agg
+
+def load_aggregates(client: Client) -> TrendAggregates:
+    return compute_aggregates(load_versions(client), _load_answers(client))
+
+def get_aggregates(client: Client) -> TrendAggregates:
+    """Agregaty z cache (albo pełne przeliczenie) ze scalonymi przyrostami wysyłek."""
+    cache = get_shared_cache()
+
+    def _load() -> TrendAggregates:
+        answers = _load_answers(client)
+        agg = compute_aggregates(load_versions(client), answers)
+        cache.set(NS_TRENDS, _IDS, set(answers["session_id"]), ttl=TRENDS_TTL_S)
+        cache.set(NS_TRENDS, _PENDING, [], ttl=TRENDS_TTL_S)
+        return agg
+    agg = cache.get_or_load(NS_TRENDS, _KEY, _load, ttl=TRENDS_TTL_S, client=client)
+    pending: List[TrendDelta] = cache.get(NS_TRENDS, _PENDING) or []
+    if any(d.version_id not in agg.keys for d in pending):
+        cache.bump(NS_TRENDS, client)       # wysyłka wersji spoza agregatów – pełne przeliczenie
+        return cache.get_or_load(NS_TRENDS, _KEY, _load, ttl=TRENDS_TTL_S, client=client)
+    for d in pending:
+        agg.merge(d)
+    return agg
+
+def record_submission(version: Dict[str, Any], session_id: str, answers_payload: Dict[str, Any]) -> None:
+    """
+    Po wysyłce: dopisz sumy sesji do zaległych przyrostów agregatów w cache
+    (jeśli są załadowane) – raz na sesję. Punktacja przed transakcjami cache.
+    """
+    answers = pd.DataFrame([{"session_id": session_id, "version_id": version["id"], "question_id": qid,
+                             "value": (p or {}).get("value")} for qid, p in answers_payload.items()],
+                           columns=["session_id", "version_id", "question_id", "value"])
+    own_ids = {version["id"]: {q["id"]: q["id"] for q in (version.get("content") or {}).get("questions", []) or []
+                               if q.get("id")}}
+    scored = score_frame(answers, *_question_frames([version], own_ids))
+    delta = TrendDelta(version["id"], _sums(scored, "key"), _sums(scored, "section"))
+    cache = get_shared_cache()
+
+    def _add_id(ids: Set[str]) -> Optional[Set[str]]:
+        if session_id in ids:
+            return None
+        ids.add(session_id)
+        return ids
+    if cache.update(NS_TRENDS, _IDS, _add_id) is None:
+        return      # agregaty nie są w cache albo ta wysyłka już jest policzona
+    cache.update(NS_TRENDS, _PENDING, lambda pending: pending + [delta])
@@ -0,0 +1,196 @@
+# app/dora_audit/whitelist.py
+# -*- coding: utf-8 -*-
+"""
+Whitelist (allowed_emails): wyszukiwanie po stronie serwera i zbiorczy import.
+
+Widok admina pobiera tylko jedną stronę wyników (keyset po `email`), filtrowaną
+w bazie po prefiksie adresu, domenie i fladze admina – pod indeksy z
+migracji 0002.
+
+Import z pliku CSV/TXT: adresy są normalizowane i deduplikowane lokalnie,
+porównywane z bazą (tylko adresy z pliku, porcjami `in_`), a zapis idzie
+porcjami upsertów zamiast jednego round-tripu na adres. Import nigdy nie
+odbiera roli admina.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from .core import qexec
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_SOURCE = "import"
+PAGE_SIZE = 50
+
+_EMAIL_RE = re.compile(r"^[^@\s,;<>]+@[^@\s,;<>]+\.[^@\s,;<>]+$")
+_ADMIN_ROLES = {"admin", "administrator", "true", "1", "yes", "tak"}
+
+def normalize_email(raw: str) -> Optional[str]:
+    """'  Jan.Kowalski@Firma.PL ' / 'mailto:…' / '<…>' -> 'jan.kowalski@firma.pl'; None gdy niepoprawny."""
+    email = (raw or "").strip().strip("<>\"'").strip()
+    if email.lower().startswith("mailto:"):
+        email = email[7:]
+    email = email.lower()
+    return email if _EMAIL_RE.match(email) else None
+
+def whitelist_page(client: Client, query: str = "", admins_only: bool = False,
+                   after: Optional[str] = None,
+                   limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Jedna strona whitelisty posortowana po email (keyset: `email > after`).
+    query: 'jan' -> prefiks adresu (LIKE 'jan%'), '@firma.pl' -> dokładna domena.
+    Zwraca (wiersze, kursor następnej strony albo None).
+    """
+    q = (client.table("allowed_emails")
+               .select("email, created_at, source, is_admin"))
+    term = (query or "").strip().lower()
+    if term.startswith("@"):
+        q = q.eq("domain", term[1:])
+    elif term:
+        # % i _ to metaznaki LIKE – adresy ich nie potrzebują w prefiksie
+        q = q.like("email", term.replace("%", "").replace("_", r"\_") + "%")
+    if admins_only:
+        q = q.eq("is_admin", True)
+    if after:
+        q = q.gt("email", after)
+    rows = qexec(q.order("email").limit(limit + 1))
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]["email"]
+    return rows, None
+
+def _is_admin_role(role: Optional[str]) -> bool:
+    return (role or "").strip().lower() in _ADMIN_ROLES
+
+def parse_whitelist_file(name: str, raw: bytes,
+                         default_admin: bool = False) -> Tuple[Dict[str, bool], List[str]]:
+    """
+    Zwraca ({email: is_admin}, [niepoprawne wpisy]).
+    CSV: kolumna `email` (+ opcjonalnie `role` / `is_admin`) albo bez nagłówka: email[,rola].
+    TXT: jeden adres w linii, opcjonalnie z rolą po przecinku/średniku/spacji.
+    Duplikaty łączone; rola admin wygrywa.
+    """
+    text = raw.decode("utf-8-sig", errors="replace")
+    rows: Iterable[Tuple[str, Optional[str]]]
+
+    if name.lower().endswith(".csv"):
+        reader = list(csv.reader(io.StringIO(text)))
+        header = [h.strip().lower() for h in (reader[0] if reader else [])]
+        if "email" in header:
+            e_idx = header.index("email")
+            r_idx = next((header.index(c) for c in ("role", "is_admin", "admin") if c in header), None)
+            rows = [(r[e_idx] if e_idx < len(r) else "",
+                     r[r_idx] if r_idx is not None and r_idx < len(r) else None)
+                    for r in reader[1:]]
+        else:
+            rows = [(r[0] if r else "", r[1] if len(r) > 1 else None) for r in reader]
+    else:
+        rows = []
+        for line in text.splitlines():
+            parts = re.split(r"[,;\s]+", line.strip(), maxsplit=1)
+            rows.append((parts[0], parts[1] if len(parts) > 1 else None))
+
+    entries: Dict[str, bool] = {}
+    invalid: List[str] = []
+    for raw_email, role in rows:
+        if not (raw_email or "").strip():
+            continue
+        email = normalize_email(raw_email)
+        if not email:
+            invalid.append(raw_email.strip())
+            continue
+        admin = _is_admin_role(role) if role not in (None, "") else default_admin
+        entries[email] = entries.get(email, False) or admin
+    return entries, invalid
+
+
+@dataclass
+class WhitelistImportPlan:
+    """Wynik porównania pliku z bazą (dry-run) – i lista zmian do zapisania."""
+    added_users: List[str] = field(default_factory=list)
+    added_admins: List[str] = field(default_factory=list)
+    promoted: List[str] = field(default_factory=list)     # istniejący user -> admin
+    unchanged: List[str] = field(default_factory=list)
+    invalid: List[str] = field(default_factory=list)
+
+    @property
+    def added(self) -> List[str]:
+        return self.added_users + self.added_admins
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "added_admins": len(self.added_admins),
+            "promoted": len(self.promoted),
+            "unchanged": len(self.unchanged),
+            "invalid": len(self.invalid),
+        }
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def fetch_existing(client: Client, emails: List[str],
+                   chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, bool]:
+    """{email: is_admin} dla adresów z pliku, które już są na whiteliście."""
+    existing: Dict[str, bool] = {}
+    for chunk in _chunks(emails, chunk_size):
+        rows = qexec(
+            client.table("allowed_emails")
+                  .select("email, is_admin")
+                  .in_("email", chunk)
+        )
+        for r in rows:
+            existing[r["email"]] = bool(r.get("is_admin"))
+    return existing
+
+def plan_import(entries: Dict[str, bool], existing: Dict[str, bool],
+                invalid: Optional[List[str]] = None) -> WhitelistImportPlan:
+    plan = WhitelistImportPlan(invalid=list(invalid or []))
+    for email in sorted(entries):
+        want_admin = entries[email]
+        if email not in existing:
+            (plan.added_admins if want_admin else plan.added_users).append(email)
+        elif want_admin and not existing[email]:
+            plan.promoted.append(email)
+        else:
+            plan.unchanged.append(email)
+    return plan
+
+def apply_import(client: Client, plan: WhitelistImportPlan,
+                 chunk_size: int = IMPORT_CHUNK_SIZE) -> int:
+    """Zapisuje plan porcjami; zwraca liczbę wykonanych zapytań."""
+    calls = 0
+    # nowe adresy – upsert (bezpieczny przy równoległym dodaniu tego samego adresu)
+    for emails, admin in ((plan.added_users, False), (plan.added_admins, True)):
+        for chunk in _chunks(emails, chunk_size):
+            rows = [{"email": e, "source": IMPORT_SOURCE, **({"is_admin": True} if admin else {})}
+                    for e in chunk]
+            qexec(client.table("allowed_emails").upsert(rows, on_conflict="email"))
+            calls += 1
+    # awanse – tylko flaga, bez nadpisywania `source`
+    for chunk in _chunks(plan.promoted, chunk_size):
+        qexec(
+            client.table("allowed_emails")
+                  .update({"is_admin": True})
+                  .in_("email", chunk)
+        )
+        calls += 1
+    return calls
+
+def import_whitelist(client: Client, name: str, raw: bytes, default_admin: bool = False,
+                     dry_run: bool = True, chunk_size: int = IMPORT_CHUNK_SIZE) -> WhitelistImportPlan:
+    """Parsowanie + diff z bazą + (bez dry_run) zapis porcjami."""
+    entries, invalid = parse_whitelist_file(name, raw, default_admin=default_admin)
+    existing = fetch_existing(client, list(entries), chunk_size=chunk_size)
+    plan = plan_import(entries, existing, invalid)
+    if not dry_run:
+        apply_import(client, plan, chunk_size=chunk_size)
+    return plan
@@ -0,0 +1,318 @@
+# loadtest/harness.py
+# -*- coding: utf-8 -*-
+"""
+Test obciążeniowy app/app.py: N wirtualnych audytorów (sesje streamlit.testing
+AppTest) na lokalnym zastępniku bazy (loadtest/localdb.py, MemoryClient).
+
+Każdy użytkownik przechodzi scenariusz (otwarcie panelu, nowa ankieta,
+odpowiedzi, szkic, wysyłka, podgląd sesji, panel admina). Raport:
+percentyle czasu rerunu, CPU, RSS i liczba round-tripów do bazy na akcję.
+
+    python loadtest/harness.py loadtest/scenarios/smoke.json
+    python loadtest/harness.py loadtest/scenarios/season.json --users 40 --json report.json
+
+Scenariusz (JSON) jest w pełni deterministyczny dla danego `seed`.
+
+AppTest podmienia na czas rerunu globalny (dla procesu) Runtime Streamlit, więc
+reruny różnych użytkowników są serializowane blokadą. Użytkownicy przeplatają
+się wątkami (`concurrency`), a czas oczekiwania na blokadę jest raportowany
+osobno (`queue`) – to odpowiednik kolejki do GIL w jednym procesie serwera.
+Zapisy w tle (autozapis szkiców) i baza działają w pełni równolegle.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+APP_PATH = ROOT / "app" / "app.py"
+sys.path.insert(0, str(APP_PATH.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))     # localdb – także przy imporcie z tests/
+
+DEFAULTS: Dict[str, Any] = {
+    "name": "scenario",
+    "seed": 1,
+    "users": 4,
+    "admins": 0,
+    "concurrency": 4,
+    "iterations": 1,
+    "questions": 20,
+    "answers_per_step": 3,
+    "autosave": True,
+    "db_latency_ms": 0,
+    "think_time_ms": 0,
+    "timeout_s": 60,
+    "flow": ["open_panel", "take_survey", "answer", "save_draft", "answer", "submit", "view_session"],
+    "admin_flow": ["open_panel", "admin_panel"],
+}
+
+def load_scenario(path: Optional[str], **overrides: Any) -> Dict[str, Any]:
+    sc = dict(DEFAULTS)
+    if path:
+        sc.update(json.loads(Path(path).read_text(encoding="utf-8")))
+    sc.update({k: v for k, v in overrides.items() if v is not None})
+    return sc
+
+# =============================================================================
+#  Zastępnik bazy z danymi scenariusza
+# =============================================================================
+def _questions(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    qs = []
+    for i in range(1, n + 1):
+        kind = rng.choice(["single", "single", "multi", "scale"])
+        q: Dict[str, Any] = {"id": f"q{i}", "type": kind, "text": f"Pytanie kontrolne {i}"}
+        if kind in ("single", "multi"):
+            q["options"] = [{"label": f"Opcja {k}", "score": k * 5} for k in range(4)]
+        else:
+            q.update({"min": 1, "max": 5, "step": 1, "score_per_step": 5})
+        qs.append(q)
+    return qs
+
+def build_backend(sc: Dict[str, Any]):
+    from localdb import MemoryClient
+
+    rng = random.Random(sc["seed"])
+    users = [f"user{i}@load.test" for i in range(sc["users"])]
+    admins = [f"admin{i}@load.test" for i in range(sc["admins"])]
+    db = MemoryClient({
+        "surveys": [{"id": "survey-1", "name": "DORA Audit"}],
+        "survey_versions": [{
+            "id": "version-1", "survey_id": "survey-1", "version": 1, "is_active": True,
+            "content": {"title": "DORA Audit (load)", "questions": _questions(sc["questions"], rng)},
+            "threshold_green": 80, "threshold_amber": 60,
+            "created_by": "loadtest", "created_at": "2026-01-01T00:00:00+00:00",
+        }],
+        "allowed_emails": [{"email": e, "is_admin": False, "source": "loadtest"} for e in users]
+                        + [{"email": e, "is_admin": True, "source": "loadtest"} for e in admins],
+    }, latency_s=sc["db_latency_ms"] / 1000.0)
+    return db, users, admins
+
+# =============================================================================
+#  Pomiary
+# =============================================================================
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, round(p / 100.0 * (len(s) - 1))))
+    return s[k]
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[Dict[str, float]]] = defaultdict(list)
+        self.errors: Dict[str, List[str]] = defaultdict(list)
+
+    def add(self, action: str, **sample: float) -> None:
+        with self._lock:
+            self.samples[action].append(sample)
+
+    def error(self, action: str, message: str) -> None:
+        with self._lock:
+            self.errors[action].append(message)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for action, rows in self.samples.items():
+            lat = [r["latency_ms"] for r in rows]
+            out[action] = {
+                "n": len(rows),
+                "p50_ms": round(_pct(lat, 50), 1),
+                "p90_ms": round(_pct(lat, 90), 1),
+                "p99_ms": round(_pct(lat, 99), 1),
+                "max_ms": round(max(lat), 1),
+                "queue_p90_ms": round(_pct([r["queue_ms"] for r in rows], 90), 1),
+                "cpu_ms_avg": round(sum(r["cpu_ms"] for r in rows) / len(rows), 1),
+                "db_calls_avg": round(sum(r["db_calls"] for r in rows) / len(rows), 2),
+                "rss_mb_max": round(max(r["rss_mb"] for r in rows), 1),
+                "errors": len(self.errors.get(action, [])),
+            }
+        return out
+
+# =============================================================================
+#  Wirtualny użytkownik
+# =============================================================================
+_RERUN_LOCK = threading.Lock()
+
+class VirtualUser:
+    def __init__(self, email: str, db, sc: Dict[str, Any], rec: Recorder, rng: random.Random):
+        from streamlit.testing.v1 import AppTest
+        from localdb import token_for
+
+        self.email, self.db, self.sc, self.rec, self.rng = email, db, sc, rec, rng
+        self.at = AppTest.from_file(str(APP_PATH), default_timeout=sc["timeout_s"])
+        self.at.session_state["access_token"] = token_for(email)
+
+    # --- akcje (każda kończy się jednym lub kilkoma rerunami) ------------------
+    def _button(self, label: str):
+        for b in self.at.button:
+            if b.label == label:
+                return b
+        raise LookupError(f"brak przycisku {label!r}")
+
+    def open_panel(self):
+        self.at.run()
+
+    def take_survey(self):
+        self._button("➕ Rozpocznij nową ankietę").click().run()
+        if not self.sc["autosave"]:
+            self.at.toggle(key="autosave_enabled").set_value(False).run()
+
+    def answer(self):
+        widgets = ([("radio", w) for w in self.at.radio if w.key and w.key.startswith("q_")]
+                   + [("multiselect", w) for w in self.at.multiselect if w.key and w.key.startswith("q_")]
+                   + [("slider", w) for w in self.at.slider if w.key and w.key.startswith("q_")])
+        for kind, w in self.rng.sample(widgets, min(self.sc["answers_per_step"], len(widgets))):
+            if kind == "radio":
+                w.set_value(self.rng.choice(list(w.options)))
+            elif kind == "multiselect":
+                w.set_value(self.rng.sample(list(w.options), self.rng.randint(0, len(w.options))))
+            else:
+                w.set_value(self.rng.randint(int(w.min), int(w.max)))
+            if self.sc["autosave"]:
+                self.at.run()      # bez st.form każda zmiana to rerun
+
+    def save_draft(self):
+        self._button("Zapisz szkic").click().run()
+
+    def submit(self):
+        self._button("Wyślij ankietę").click().run()
+
+    def view_session(self):
+        self.at.run()          # powrót do panelu po wyniku
+        self._button("Podgląd").click().run()
+
+    def admin_panel(self):
+        self.at.sidebar.radio[0].set_value("Panel administracyjny").run()
+
+    # --- pętla scenariusza -----------------------------------------------------
+    def play(self, flow: List[str]) -> None:
+        for _ in range(self.sc["iterations"]):
+            for action in flow:
+                q0 = time.perf_counter()
+                with _RERUN_LOCK:
+                    before_calls = self.db.calls(self.email)
+                    cpu0, t0 = time.process_time(), time.perf_counter()
+                    try:
+                        getattr(self, action)()
+                        failed = [e.value for e in self.at.exception]
+                    except Exception as e:   # brak przycisku, timeout AppTest itp.
+                        failed = [f"{type(e).__name__}: {e}"]
+                    latency = (time.perf_counter() - t0) * 1000.0
+                    cpu_ms = (time.process_time() - cpu0) * 1000.0
+                    db_calls = self.db.calls(self.email) - before_calls
+                self.rec.add(action,
+                             latency_ms=latency,
+                             queue_ms=(t0 - q0) * 1000.0,
+                             cpu_ms=cpu_ms,
+                             db_calls=db_calls,
+                             rss_mb=_rss_mb())
+                for msg in failed:
+                    self.rec.error(action, str(msg))
+                if failed:
+                    return         # dalsze kroki zależą od stanu – kończymy tego użytkownika
+                if self.sc["think_time_ms"]:
+                    time.sleep(self.rng.uniform(0.5, 1.5) * self.sc["think_time_ms"] / 1000.0)
+
+# =============================================================================
+#  Uruchomienie
+# =============================================================================
+def run(sc: Dict[str, Any]) -> Dict[str, Any]:
+    # środowisko aplikacji – przed pierwszym importem app.py / dora_audit
+    os.environ.setdefault("SUPABASE_URL", "http://localdb")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "localdb")
+    os.environ.setdefault("STREAMLIT_BROWSER_GATHER_USAGE_STATS", "false")
+    os.environ["AUTOSAVE_ENABLED"] = "1" if sc["autosave"] else "0"
+
+    import logging
+    import tempfile
+    import supabase
+    from dora_audit.cache import SharedCache, configure_shared_cache
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)   # ostrzeżenia bare mode AppTest
+    db, users, admins = build_backend(sc)
+    supabase.create_client = lambda *_a, **_k: db          # app.py: from supabase import create_client
+    cache_dir = tempfile.mkdtemp(prefix="dora-load-")
+    configure_shared_cache(SharedCache(os.path.join(cache_dir, "cache.sqlite3")))
+
+    rec = Recorder()
+    rng = random.Random(sc["seed"])
+    players = [(VirtualUser(e, db, sc, rec, random.Random(rng.random())), sc["flow"]) for e in users]
+    players += [(VirtualUser(e, db, sc, rec, random.Random(rng.random())), sc["admin_flow"]) for e in admins]
+
+    cpu0, t0, rss0 = time.process_time(), time.perf_counter(), _rss_mb()
+    with ThreadPoolExecutor(max_workers=max(1, sc["concurrency"])) as pool:
+        list(pool.map(lambda p: p[0].play(p[1]), players))
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    actions = rec.summary()
+    return {
+        "scenario": sc,
+        "totals": {
+            "wall_s": round(wall, 2),
+            "cpu_s": round(cpu, 2),
+            "cpu_util_pct": round(100.0 * cpu / wall, 1) if wall else 0.0,
+            "rss_mb_start": round(rss0, 1),
+            "rss_mb_end": round(_rss_mb(), 1),
+            "rss_mb_peak": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+            "reruns_per_s": round(sum(a["n"] for a in actions.values()) / wall, 2) if wall else 0.0,
+            "db_calls": db.calls(),
+            "db_calls_background": db.calls("-"),
+        },
+        "actions": actions,
+        "errors": {k: v[:5] for k, v in rec.errors.items()},
+    }
+
+def format_report(report: Dict[str, Any]) -> str:
+    sc, tot = report["scenario"], report["totals"]
+    lines = [
+        f"Scenariusz: {sc['name']}  users={sc['users']} admins={sc['admins']} "
+        f"concurrency={sc['concurrency']} questions={sc['questions']} autosave={sc['autosave']}",
+        f"Czas: {tot['wall_s']} s  CPU: {tot['cpu_s']} s ({tot['cpu_util_pct']}%)  "
+        f"RSS: {tot['rss_mb_start']} → {tot['rss_mb_end']} MB (peak {tot['rss_mb_peak']})  "
+        f"reruny/s: {tot['reruns_per_s']}  DB: {tot['db_calls']} (w tle: {tot['db_calls_background']})",
+        "",
+        f"{'akcja':<14}{'n':>5}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'queue':>9}{'cpu':>8}{'db/akcję':>10}{'rss':>8}{'err':>5}",
+    ]
+    for action, a in report["actions"].items():
+        lines.append(f"{action:<14}{a['n']:>5}{a['p50_ms']:>9}{a['p90_ms']:>9}{a['p99_ms']:>9}"
+                     f"{a['max_ms']:>9}{a['queue_p90_ms']:>9}{a['cpu_ms_avg']:>8}{a['db_calls_avg']:>10}{a['rss_mb_max']:>8}{a['errors']:>5}")
+    for action, msgs in report["errors"].items():
+        lines.append(f"! {action}: {msgs[0]}")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Test obciążeniowy DORA Audit (AppTest + lokalna baza).")
+    p.add_argument("scenario", nargs="?", help="plik JSON scenariusza (loadtest/scenarios/)")
+    p.add_argument("--users", type=int)
+    p.add_argument("--concurrency", type=int)
+    p.add_argument("--seed", type=int)
+    p.add_argument("--json", help="zapisz pełny raport JSON do pliku")
+    args = p.parse_args(argv)
+
+    report = run(load_scenario(args.scenario, users=args.users, concurrency=args.concurrency, seed=args.seed))
+    print(format_report(report))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
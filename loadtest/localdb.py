@@ -0,0 +1,532 @@
+# loadtest/localdb.py
+# -*- coding: utf-8 -*-
+"""
+Lokalny zastępnik Supabase (PostgREST + auth) trzymający tabele w pamięci.
+
+Tylko do testów (tests/) i testów obciążeniowych (loadtest/) – nie jest częścią
+pakietu dora_audit. Obsługuje podzbiór API
+supabase-py v2, którego używa aplikacja – table().select/insert/upsert/update/
+delete + filtry eq/neq/gt/gte/lt/lte/like/ilike/in_/is_/or_ (płaskie), order, limit, range,
+single/maybe_single, rpc() – i zlicza każde execute() per użytkownik, tabelę
+i operację.
+
+Uwierzytelnianie: token dostępu `token:<email>` oznacza zalogowanego <email>.
+Bieżący token jest per wątek (ContextVar), bo Streamlit wykonuje każdą sesję
+we własnym wątku, a supa() współdzieli jednego klienta; odczyty z wyprzedzeniem
+(dora_audit.prefetch) niosą go w kopii kontekstu.
+"""
+from __future__ import annotations
+
+import contextvars
+import copy
+import fnmatch
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TOKEN_PREFIX = "token:"
+
+# klucze unikalne używane przez upserty aplikacji (on_conflict) i domyślne id
+_PRIMARY_KEYS: Dict[str, Tuple[str, ...]] = {
+    "allowed_emails": ("email",),
+    "user_dashboard": ("user_email",),
+    "archived_sessions": ("session_id",),
+    "survey_answers": ("session_id", "question_id"),
+}
+
+# klucze obce "on delete cascade" (migracja 0001): tabela -> [(tabela zależna, kolumna)]
+_CASCADES: Dict[str, List[Tuple[str, str]]] = {
+    "survey_sessions": [("survey_answers", "session_id")],
+}
+
+def token_for(email: str) -> str:
+    """Token dostępu rozpoznawany przez MemoryAuth."""
+    return f"{TOKEN_PREFIX}{email}"
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _split_or(filters: str) -> List[str]:
+    parts, buf, quoted = [], "", False
+    for ch in filters:
+        if ch == '"':
+            quoted = not quoted
+        if ch == "," and not quoted:
+            parts.append(buf)
+            buf = ""
+        else:
+            buf += ch
+    return parts + [buf] if buf else parts
+
+
+class LocalDbError(Exception):
+    """Odpowiednik APIError z PostgREST (ma .message)."""
+
+    def __init__(self, message: str, code: str = "PGRST"):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class _Response:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class MemoryQuery:
+    """Builder zapytań w stylu postgrest-py; wykonanie dopiero w execute()."""
+
+    def __init__(self, client: "MemoryClient", table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns: Optional[List[str]] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[Tuple[str, ...]] = None
+        self._ignore_duplicates = False
+        self._returning: Optional[str] = None
+        self._filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._single: Optional[str] = None
+        self._count: Optional[str] = None
+        self._matched = 0
+
+    # --- operacje --------------------------------------------------------------
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None) -> "MemoryQuery":
+        cols = ",".join(columns) if columns else "*"
+        self._columns = None if cols.strip() == "*" else [c.strip() for c in cols.split(",") if c.strip()]
+        self._count = count
+        return self
+
+    def insert(self, json: Any, returning: Any = None, **kwargs) -> "MemoryQuery":
+        self._op, self._payload = "insert", json
+        self._returning = getattr(returning, "value", returning)
+        return self
+
+    def upsert(self, json: Any, on_conflict: str = "", ignore_duplicates: bool = False,
+               returning: Any = None, **kwargs) -> "MemoryQuery":
+        self._op, self._payload = "upsert", json
+        self._returning = getattr(returning, "value", returning)
+        self._on_conflict = tuple(c.strip() for c in on_conflict.split(",") if c.strip()) or None
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, json: Dict[str, Any], **kwargs) -> "MemoryQuery":
+        self._op, self._payload = "update", json
+        return self
+
+    def delete(self, **kwargs) -> "MemoryQuery":
+        self._op = "delete"
+        return self
+
+    # --- filtry ----------------------------------------------------------------
+    def _f(self, fn: Callable[[Dict[str, Any]], bool]) -> "MemoryQuery":
+        self._filters.append(fn)
+        return self
+
+    def eq(self, col, val):  return self._f(lambda r: r.get(col) == val)
+    def neq(self, col, val): return self._f(lambda r: r.get(col) != val)
+    def gt(self, col, val):  return self._f(lambda r: r.get(col) is not None and r.get(col) > val)
+    def gte(self, col, val): return self._f(lambda r: r.get(col) is not None and r.get(col) >= val)
+    def lt(self, col, val):  return self._f(lambda r: r.get(col) is not None and r.get(col) < val)
+    def lte(self, col, val): return self._f(lambda r: r.get(col) is not None and r.get(col) <= val)
+    def in_(self, col, values):
+        vals = set(values)
+        return self._f(lambda r: r.get(col) in vals)
+
+    def is_(self, col, val):
+        want = None if str(val).lower() == "null" else val
+        return self._f(lambda r: r.get(col) is want or r.get(col) == want)
+
+    def like(self, col, pattern):
+        pat = pattern.replace("%", "*").replace("\\_", "_")
+        return self._f(lambda r: r.get(col) is not None and fnmatch.fnmatchcase(str(r.get(col)), pat))
+
+    def ilike(self, col, pattern):
+        pat = pattern.replace("%", "*").replace("\\_", "_").lower()
+        return self._f(lambda r: r.get(col) is not None and fnmatch.fnmatchcase(str(r.get(col)).lower(), pat))
+
+    def or_(self, filters: str, **kwargs) -> "MemoryQuery":
+        """Płaska lista PostgREST `kol.op.wartość,...` (wartość opcjonalnie w cudzysłowie)."""
+        preds = [self._or_pred(part) for part in _split_or(filters)]
+        return self._f(lambda r: any(p(r) for p in preds))
+
+    @staticmethod
+    def _or_pred(part: str) -> Callable[[Dict[str, Any]], bool]:
+        col, op, val = part.split(".", 2)
+        val = val[1:-1] if len(val) >= 2 and val[0] == val[-1] == '"' else val
+        cmp = {"eq": lambda a: a == val, "neq": lambda a: a != val,
+               "lt": lambda a: a < val, "lte": lambda a: a <= val,
+               "gt": lambda a: a > val, "gte": lambda a: a >= val}[op]
+        return lambda r: r.get(col) is not None and cmp(str(r.get(col)))
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> "MemoryQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> "MemoryQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs) -> "MemoryQuery":
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self) -> "MemoryQuery":
+        self._single = "single"
+        return self
+
+    def maybe_single(self) -> "MemoryQuery":
+        self._single = "maybe"
+        return self
+
+    # --- wykonanie -------------------------------------------------------------
+    def execute(self) -> _Response:
+        return self._client._execute(self)
+
+
+class MemoryAuth:
+    """auth.* z supabase-py: sesja = token `token:<email>` (per wątek)."""
+
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+
+    def set_session(self, access_token: str, refresh_token: Optional[str] = None):
+        if not (access_token or "").startswith(TOKEN_PREFIX):
+            raise LocalDbError("Invalid token")
+        self._client._token.set(access_token)
+        return SimpleNamespace(session=SimpleNamespace(access_token=access_token, refresh_token=refresh_token))
+
+    def set_auth(self, access_token: str):
+        return self.set_session(access_token, None)
+
+    def get_user(self):
+        token = self._client._token.get()
+        if not token:
+            return None
+        email = token[len(TOKEN_PREFIX):]
+        return SimpleNamespace(user=SimpleNamespace(email=email, exp=None))
+
+    def exchange_code_for_session(self, params: Dict[str, str]):
+        code = params.get("auth_code", "")
+        return self.set_session(token_for(code), "refresh")
+
+    def sign_out(self):
+        self._client._token.set(None)
+
+
+class MemoryClient:
+    """
+    Klient zgodny (w potrzebnym zakresie) z supabase.Client.
+    `stats` liczy execute() per (email | '-', tabela, operacja).
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 latency_s: float = 0.0, max_rows: Optional[int] = None):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {k: list(v) for k, v in (tables or {}).items()}
+        self.functions: Dict[str, Callable[..., Any]] = dict(SQL_FUNCTIONS)
+        self.latency_s = latency_s
+        self.max_rows = max_rows                # db-max-rows PostgREST: limit wierszy jednej odpowiedzi
+        self.replica_lag_s = 0.0                # replica_lag_seconds() – drugi klient jako replika w testach
+        self.stats: Counter = Counter()
+        self.auth = MemoryAuth(self)
+        self._token: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+            f"localdb_token_{id(self)}", default=None)
+        self._lock = threading.RLock()
+
+    # --- API supabase-py -------------------------------------------------------
+    def table(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> "_RpcCall":
+        return _RpcCall(self, fn, params or {})
+
+    # --- pomocnicze ------------------------------------------------------------
+    def session(self, token: str) -> "MemoryClient":
+        """Osobny klient na tych samych danych ze stałym tokenem (jak klient PostgREST per token repliki)."""
+        view = copy.copy(self)
+        view._token = contextvars.ContextVar(f"localdb_token_{id(view)}", default=token)
+        view.auth = MemoryAuth(view)
+        return view
+
+    def current_email(self) -> str:
+        token = self._token.get()
+        return token[len(TOKEN_PREFIX):] if token else "-"
+
+    def calls(self, email: Optional[str] = None) -> int:
+        """Liczba round-tripów (wszystkich albo jednego użytkownika)."""
+        with self._lock:
+            return sum(n for (who, _t, _op), n in self.stats.items() if email is None or who == email)
+
+    def _record(self, table: str, op: str) -> None:
+        with self._lock:
+            self.stats[(self.current_email(), table, op)] += 1
+
+    def _pause(self) -> None:
+        if self.latency_s:
+            import time
+            time.sleep(self.latency_s)
+
+    def _execute(self, q: MemoryQuery) -> _Response:
+        self._record(q._table, q._op)
+        self._pause()
+        with self._lock:
+            rows = self.tables.setdefault(q._table, [])
+            if q._op == "select":
+                out = self._select(rows, q)
+            elif q._op == "insert":
+                out = self._insert(rows, q)
+            elif q._op == "upsert":
+                out = self._upsert(rows, q)
+            elif q._op == "update":
+                out = []
+                for r in rows:
+                    if all(f(r) for f in q._filters):
+                        r.update(copy.deepcopy(q._payload))
+                        out.append(r)
+            else:  # delete
+                out = [r for r in rows if all(f(r) for f in q._filters)]
+                self.tables[q._table] = [r for r in rows if not all(f(r) for f in q._filters)]
+                gone = {r["id"] for r in out}
+                for child, column in _CASCADES.get(q._table, []):
+                    if child in self.tables:
+                        self.tables[child] = [r for r in self.tables[child] if r.get(column) not in gone]
+            count = (q._matched if q._op == "select" else len(out)) if q._count else None
+            if q._returning == "minimal":       # Prefer: return=minimal – bez wierszy w odpowiedzi
+                out = []
+            out = [self._project(r, q._columns) for r in out]
+        if q._single:
+            if len(out) != 1:
+                if q._single == "maybe" and not out:
+                    return _Response(None)
+                raise LocalDbError("JSON object requested, multiple (or no) rows returned", "PGRST116")
+            return _Response(out[0], count)
+        return _Response(out, count)
+
+    def _select(self, rows: List[Dict[str, Any]], q: MemoryQuery) -> List[Dict[str, Any]]:
+        out = [r for r in rows if all(f(r) for f in q._filters)]
+        q._matched = len(out)       # count="exact" jak w PostgREST – przed limit/range
+        for col, desc in reversed(q._order):
+            out.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+        out = out[q._offset:]
+        if q._limit is not None:
+            out = out[:q._limit]
+        return self._cap(out)
+
+    def _cap(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return rows if self.max_rows is None else rows[:self.max_rows]
+
+    def _defaults(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = copy.deepcopy(row)
+        if table not in _PRIMARY_KEYS or "id" in row:
+            row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", _now_iso())
+        return row
+
+    def _insert(self, rows: List[Dict[str, Any]], q: MemoryQuery) -> List[Dict[str, Any]]:
+        payload = q._payload if isinstance(q._payload, list) else [q._payload]
+        out = []
+        for item in payload:
+            new = self._defaults(q._table, item)
+            key = _PRIMARY_KEYS.get(q._table, ("id",))
+            if any(all(r.get(k) == new.get(k) for k in key) for r in rows):
+                raise LocalDbError(f"duplicate key value violates unique constraint on {q._table}", "23505")
+            rows.append(new)
+            out.append(new)
+        return out
+
+    def _upsert(self, rows: List[Dict[str, Any]], q: MemoryQuery) -> List[Dict[str, Any]]:
+        payload = q._payload if isinstance(q._payload, list) else [q._payload]
+        key = q._on_conflict or _PRIMARY_KEYS.get(q._table, ("id",))
+        out = []
+        for item in payload:
+            existing = next((r for r in rows if all(r.get(k) == item.get(k) for k in key)), None)
+            if existing is None:
+                new = self._defaults(q._table, item)
+                rows.append(new)
+                out.append(new)
+            elif not q._ignore_duplicates:
+                existing.update(copy.deepcopy(item))
+                out.append(existing)
+        return out
+
+    @staticmethod
+    def _project(row: Dict[str, Any], columns: Optional[List[str]]) -> Dict[str, Any]:
+        if columns is None:
+            return copy.deepcopy(row)
+        return {c: copy.deepcopy(row.get(c)) for c in columns}
+
+
+# =============================================================================
+#  Odpowiedniki funkcji z supabase_sql/migrations (rpc)
+# =============================================================================
+def _bump_cache_generation(db: MemoryClient, p_namespace: str) -> int:
+    rows = db.tables.setdefault("app_cache_generations", [])
+    row = next((r for r in rows if r["namespace"] == p_namespace), None)
+    if row is None:
+        row = {"namespace": p_namespace, "generation": 0}
+        rows.append(row)
+    row["generation"] += 1
+    row["updated_at"] = _now_iso()
+    return row["generation"]
+
+def _version_score_distribution(db: MemoryClient, p_version_id: str) -> List[Dict[str, Any]]:
+    rows = [{"id": r["id"], "score": float(r["score"])}
+            for r in db.tables.get("survey_sessions", [])
+            if r.get("survey_version_id") == p_version_id
+            and r.get("status") == "submitted" and r.get("score") is not None]
+    return sorted(rows, key=lambda r: (r["score"], r["id"]))
+
+def _claim_submission_outbox(db: MemoryClient, p_limit: int, p_lease_s: int) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    due = sorted((r for r in db.tables.get("submission_outbox", [])
+                  if r.get("status") == "pending" and r["next_attempt_at"] <= now.isoformat()),
+                 key=lambda r: r["next_attempt_at"])[:p_limit]
+    lease = (now + timedelta(seconds=p_lease_s)).isoformat()
+    for r in due:
+        r["next_attempt_at"] = lease
+    return copy.deepcopy(due)
+
+def _import_survey_sessions(db: MemoryClient, p_sessions: List[Dict[str, Any]],
+                            p_answers: List[Dict[str, Any]]) -> int:
+    sessions = db.tables.setdefault("survey_sessions", [])
+    by_id = {r["id"]: r for r in sessions}
+    for item in p_sessions:
+        row = by_id.get(item["id"])
+        if row is None:
+            row = db._defaults("survey_sessions", item)
+            sessions.append(row)
+            by_id[row["id"]] = row
+        else:
+            row.update(copy.deepcopy(item))
+    answers = db.tables.setdefault("survey_answers", [])
+    by_key = {(r["session_id"], r["question_id"]): r for r in answers}
+    for item in p_answers:
+        row = by_key.get((item["session_id"], item["question_id"]))
+        if row is None:
+            row = db._defaults("survey_answers", item)
+            answers.append(row)
+            by_key[(row["session_id"], row["question_id"])] = row
+        else:
+            row["answer"] = copy.deepcopy(item["answer"])
+    return len(p_sessions)
+
+def _migrate_drafts(db: MemoryClient, p_version_id: str, p_sessions: List[Dict[str, Any]],
+                    p_answers: List[Dict[str, Any]]) -> int:
+    scores = {r["id"]: r["score"] for r in p_sessions}
+    moved = set()
+    for row in db.tables.get("survey_sessions", []):
+        if row["id"] in scores and row.get("status") == "draft":
+            row.update(survey_version_id=p_version_id, score=scores[row["id"]])
+            moved.add(row["id"])
+    answers = db.tables.setdefault("survey_answers", [])
+    answers[:] = [r for r in answers if r["session_id"] not in moved]
+    answers.extend(db._defaults("survey_answers", item) for item in p_answers if item["session_id"] in moved)
+    return len(moved)
+
+def _is_replay(db: MemoryClient, row: Dict[str, Any], p_session: Dict[str, Any],
+               p_answers: List[Dict[str, Any]]) -> bool:
+    if p_session.get("status") != "submitted" or row.get("status") != "submitted":
+        return False
+    if any(row.get(k) != p_session.get(k) for k in ("user_email", "survey_version_id", "score")):
+        return False
+    stored = {a["question_id"]: a["answer"] for a in db.tables.get("survey_answers", [])
+              if a["session_id"] == row["id"]}
+    return all(stored.get(item["question_id"]) == item["answer"] for item in p_answers)
+
+def _save_survey_session(db: MemoryClient, p_session: Dict[str, Any], p_answers: List[Dict[str, Any]],
+                         p_event: Optional[Dict[str, Any]] = None) -> bool:
+    sessions = db.tables.setdefault("survey_sessions", [])
+    row = next((r for r in sessions if r["id"] == p_session["id"]), None)
+    if row is None:
+        sessions.append(db._defaults("survey_sessions", p_session))
+    elif row.get("status") == "submitted" or row.get("user_email") != p_session.get("user_email"):
+        return _is_replay(db, row, p_session, p_answers)
+    elif row.get("survey_version_id") != p_session.get("survey_version_id") and not any(
+            v["id"] == p_session.get("survey_version_id") and v.get("is_active")
+            for v in db.tables.get("survey_versions", [])):
+        return False
+    else:
+        row.update(copy.deepcopy({k: v for k, v in p_session.items() if k != "user_email"}))
+    answers = db.tables.setdefault("survey_answers", [])
+    by_key = {(r["session_id"], r["question_id"]): r for r in answers}
+    for item in p_answers:
+        existing = by_key.get((item["session_id"], item["question_id"]))
+        if existing is None:
+            answers.append(db._defaults("survey_answers", item))
+        else:
+            existing["answer"] = copy.deepcopy(item["answer"])
+    outbox = db.tables.setdefault("submission_outbox", [])
+    if p_event is not None and p_session.get("status") == "submitted" and not any(
+            r["id"] == p_event["id"] for r in outbox):
+        outbox.append(db._defaults("submission_outbox", {
+            **p_event, "session_id": p_session["id"], "user_email": p_session["user_email"]}))
+    return True
+
+def _record_dashboard_submit(db: MemoryClient, p_email: str, p_session_id: str, p_score: float,
+                             p_band: Optional[str], p_at: str, p_version: Optional[int],
+                             p_history_len: int) -> bool:
+    row = next((r for r in db.tables.get("user_dashboard", []) if r["user_email"] == p_email), None)
+    if row is None or any(h.get("id") == p_session_id for h in row.get("history") or []):
+        return False
+    history = sorted([*(row.get("history") or []),
+                      {"id": p_session_id, "at": p_at, "score": p_score, "band": p_band, "v": p_version}],
+                     key=lambda h: h.get("at") or "")
+    row["history"] = history[-p_history_len:]
+    row["attempts"] = int(row.get("attempts") or 0) + 1
+    if not row.get("latest_at") or p_at >= row["latest_at"]:
+        row.update(latest_session_id=p_session_id, latest_score=p_score, latest_band=p_band, latest_at=p_at)
+    if row.get("best_score") is None or p_score > float(row["best_score"]):
+        row.update(best_session_id=p_session_id, best_score=p_score, best_band=p_band)
+    if row.get("open_draft_id") == p_session_id:
+        row["open_draft_id"] = None
+    row["updated_at"] = datetime.now(timezone.utc).isoformat()
+    return True
+
+def _replica_lag_seconds(db: MemoryClient) -> float:
+    return db.replica_lag_s
+
+SQL_FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "bump_cache_generation": _bump_cache_generation,
+    "version_score_distribution": _version_score_distribution,
+    "claim_submission_outbox": _claim_submission_outbox,
+    "import_survey_sessions": _import_survey_sessions,
+    "migrate_drafts": _migrate_drafts,
+    "save_survey_session": _save_survey_session,
+    "replica_lag_seconds": _replica_lag_seconds,
+    "record_dashboard_submit": _record_dashboard_submit,
+}
+
+
+class _RpcCall:
+    def __init__(self, client: MemoryClient, fn: str, params: Dict[str, Any]):
+        self._client, self._fn, self._params = client, fn, params
+        self._offset, self._limit = 0, None
+
+    def range(self, start: int, end: int, **kwargs) -> "_RpcCall":
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def execute(self) -> _Response:
+        self._client._record(f"rpc:{self._fn}", "rpc")
+        self._client._pause()
+        fn = self._client.functions.get(self._fn)
+        if fn is None:
+            raise LocalDbError(f"function {self._fn} does not exist", "42883")
+        with self._client._lock:
+            out = fn(self._client, **self._params)
+        if isinstance(out, list):       # funkcja zwracająca tabelę – range i db-max-rows jak w PostgREST
+            out = out[self._offset:]
+            if self._limit is not None:
+                out = out[:self._limit]
+            out = self._client._cap(out)
+        return _Response(out)
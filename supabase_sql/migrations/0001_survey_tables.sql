@@ -0,0 +1,61 @@
+-- 0001: tabele używane przez app/app.py i dora_audit – whitelista i ankiety.
+-- Migracje uruchamia `python -m dora_audit migrate` (kolejno, każda raz – tabela schema_migrations).
+
+-- Whitelista (strona Checkout dopisuje adresy – supabase_sql/allowed_emails.sql;
+-- tu z rolą admina, od której zależą polityki RLS kolejnych migracji).
+create table if not exists public.allowed_emails (
+  email      text primary key,
+  created_at timestamptz default now(),
+  source     text default 'checkout'
+);
+alter table public.allowed_emails add column if not exists is_admin boolean not null default false;
+-- domena jako kolumna generowana – wyszukiwanie '@firma.pl' bez skanu całej tabeli
+alter table public.allowed_emails
+  add column if not exists domain text generated always as (split_part(email, '@', 2)) stored;
+
+alter table public.allowed_emails enable row level security;
+drop policy if exists "read own email" on public.allowed_emails;
+create policy "read own email" on public.allowed_emails
+for select to authenticated using ( email = auth.jwt() ->> 'email' );
+
+create table if not exists public.surveys (
+  id         uuid primary key default gen_random_uuid(),
+  name       text not null,
+  created_at timestamptz not null default now(),
+  constraint surveys_name_key unique (name)
+);
+
+-- content: {"title": ..., "questions": [...]} (parse_uploaded_file)
+create table if not exists public.survey_versions (
+  id              uuid primary key default gen_random_uuid(),
+  survey_id       uuid not null references public.surveys(id) on delete cascade,
+  version         integer not null,
+  content         jsonb not null,
+  threshold_green integer not null default 80,
+  threshold_amber integer not null default 60,
+  is_active       boolean not null default false,
+  created_by      text,
+  created_at      timestamptz not null default now(),
+  -- next_version_number / list_versions: order by version desc w obrębie ankiety
+  constraint survey_versions_survey_id_version_key unique (survey_id, version)
+);
+
+create table if not exists public.survey_sessions (
+  id                uuid primary key default gen_random_uuid(),
+  survey_version_id uuid not null references public.survey_versions(id),
+  user_email        text not null,
+  status            text not null default 'draft' check (status in ('draft', 'submitted')),
+  score             double precision,
+  created_at        timestamptz not null default now(),
+  submitted_at      timestamptz
+);
+
+create table if not exists public.survey_answers (
+  id          uuid primary key default gen_random_uuid(),
+  session_id  uuid not null references public.survey_sessions(id) on delete cascade,
+  question_id text not null,
+  answer      jsonb not null default '{}'::jsonb,
+  created_at  timestamptz not null default now(),
+  -- upsert(on_conflict="session_id,question_id"); obsługuje też odczyt odpowiedzi sesji
+  constraint survey_answers_session_question_key unique (session_id, question_id)
+);
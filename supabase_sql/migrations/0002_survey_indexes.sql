@@ -0,0 +1,29 @@
+-- 0002: indeksy pod wzorce zapytań aplikacji (sprawdzane EXPLAIN w tests/test_migrations.py).
+
+-- render_my_attempts / csv_user_sessions: where user_email = ? order by created_at desc limit 50
+create index if not exists survey_sessions_user_created_idx
+  on public.survey_sessions (user_email, created_at desc);
+
+-- admin_csv_all_sessions_for_version: where survey_version_id = ? order by created_at
+create index if not exists survey_sessions_version_created_idx
+  on public.survey_sessions (survey_version_id, created_at);
+
+-- load_active_version: where survey_id = ? and is_active – co najwyżej jedna aktywna wersja.
+-- set_active_version najpierw zdejmuje flagę ze wszystkich wersji, potem ustawia wybraną.
+create unique index if not exists survey_versions_one_active_idx
+  on public.survey_versions (survey_id) where is_active;
+
+-- Panel admina: lista wersji order by created_at desc
+create index if not exists survey_versions_created_idx
+  on public.survey_versions (created_at desc);
+
+-- Whitelista w panelu admina (dora_audit.whitelist.whitelist_page, keyset po email):
+--   prefiks adresu:  email like 'jan%'          -> text_pattern_ops
+--   domena:          domain = 'firma.pl' order by email
+--   tylko admini:    is_admin order by email    -> indeks częściowy
+create index if not exists allowed_emails_email_prefix_idx
+  on public.allowed_emails (email text_pattern_ops);
+create index if not exists allowed_emails_domain_email_idx
+  on public.allowed_emails (domain, email);
+create index if not exists allowed_emails_admins_idx
+  on public.allowed_emails (email) where is_admin;
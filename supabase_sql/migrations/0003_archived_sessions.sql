@@ -0,0 +1,20 @@
+-- 0003: indeks sesji przeniesionych do archiwum (dora_audit.archive).
+-- Treść sesji i odpowiedzi leży w plikach gzip JSONL (archive_key); tu tylko to,
+-- czego potrzebuje lista „Moje podejścia” i odczyt pojedynczej sesji.
+create table if not exists public.archived_sessions (
+  session_id        uuid primary key,
+  survey_version_id uuid not null,
+  user_email        text not null,
+  status            text not null,
+  score             double precision,
+  created_at        timestamptz not null,
+  submitted_at      timestamptz,
+  archive_key       text not null,
+  archived_at       timestamptz not null default now()
+);
+
+create index if not exists archived_sessions_user_created_idx
+  on public.archived_sessions (user_email, created_at desc);
+
+create index if not exists archived_sessions_version_idx
+  on public.archived_sessions (survey_version_id);
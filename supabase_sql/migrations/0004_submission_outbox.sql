@@ -0,0 +1,59 @@
+-- 0004: outbox zdarzeń dla webhooków (dora_audit.outbox).
+-- Submit dopisuje wiersz; dyspozytor dzierżawi porcje przez claim_submission_outbox
+-- (next_attempt_at przesunięte o lease), wysyła i oznacza delivered / kolejną próbę.
+create table if not exists public.submission_outbox (
+  id              uuid primary key,          -- uuid5(typ, session_id): stałe przy ponowieniu
+  event_type      text not null,
+  session_id      uuid not null,
+  user_email      text not null,
+  payload         jsonb not null,
+  status          text not null default 'pending'
+                  check (status in ('pending', 'delivered', 'failed')),
+  attempts        int not null default 0,
+  next_attempt_at timestamptz not null default now(),
+  last_error      text,
+  created_at      timestamptz not null default now(),
+  delivered_at    timestamptz
+);
+
+-- kolejka dyspozytora: tylko zaległe, po terminie próby
+create index if not exists submission_outbox_due_idx
+  on public.submission_outbox (next_attempt_at) where status = 'pending';
+-- panel admina: ostatnie zdarzenia / liczniki per status
+create index if not exists submission_outbox_status_created_idx
+  on public.submission_outbox (status, created_at desc);
+
+alter table public.submission_outbox enable row level security;
+
+drop policy if exists "insert own event" on public.submission_outbox;
+create policy "insert own event" on public.submission_outbox
+for insert to authenticated with check ( user_email = auth.jwt() ->> 'email' );
+
+drop policy if exists "admins manage events" on public.submission_outbox;
+create policy "admins manage events" on public.submission_outbox
+for all to authenticated using (
+  exists (select 1 from public.allowed_emails a
+          where a.email = auth.jwt() ->> 'email' and a.is_admin)
+);
+
+create or replace function public.claim_submission_outbox(p_limit int, p_lease_s int)
+returns setof public.submission_outbox
+language sql
+volatile
+security definer
+set search_path = public
+as $$
+  update public.submission_outbox o
+     set next_attempt_at = now() + make_interval(secs => p_lease_s)
+   where o.id in (
+     select id from public.submission_outbox
+      where status = 'pending' and next_attempt_at <= now()
+      order by next_attempt_at
+      limit p_limit
+      for update skip locked
+   )
+  returning o.*;
+$$;
+
+revoke all on function public.claim_submission_outbox(int, int) from public;
+grant execute on function public.claim_submission_outbox(int, int) to service_role;
@@ -0,0 +1,22 @@
+-- 0005: indeksy przeglądarki sesji admina (dora_audit.sessions).
+-- Kolejność zawsze: created_at desc, id desc (keyset); filtry równościowe z przodu.
+
+-- bez filtrów / tylko daty
+create index if not exists survey_sessions_created_id_idx
+  on public.survey_sessions (created_at desc, id desc);
+
+-- wersja (+ status) – najczęstszy punkt wejścia; zakres wyniku filtrowany na indeksie
+create index if not exists survey_sessions_version_status_created_idx
+  on public.survey_sessions (survey_version_id, status, created_at desc, id desc);
+
+-- sam status (np. wszystkie szkice)
+create index if not exists survey_sessions_status_created_idx
+  on public.survey_sessions (status, created_at desc, id desc);
+
+-- prefiks adresu: user_email like 'jan%'
+create index if not exists survey_sessions_email_prefix_idx
+  on public.survey_sessions (user_email text_pattern_ops);
+
+-- zakres dat wysyłki
+create index if not exists survey_sessions_submitted_idx
+  on public.survey_sessions (submitted_at desc) where submitted_at is not null;
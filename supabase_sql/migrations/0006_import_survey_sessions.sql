@@ -0,0 +1,42 @@
+-- 0006: zbiorczy import historycznych sesji (dora_audit.bulk_import).
+-- Jedna porcja = jedno wywołanie = jedna transakcja: sesje i ich odpowiedzi
+-- zapisują się razem albo wcale. Upserty po kluczach (id sesji to uuid5 z
+-- importu), więc powtórzenie porcji po przerwaniu niczego nie dubluje.
+-- security invoker: obowiązują polityki RLS wywołującego (CLI – service role).
+create or replace function public.import_survey_sessions(p_sessions jsonb, p_answers jsonb)
+returns int
+language plpgsql
+volatile
+security invoker
+set search_path = public
+as $$
+declare
+  n int;
+begin
+  insert into public.survey_sessions as s
+         (id, survey_version_id, user_email, status, score, created_at, submitted_at)
+  select r.id, r.survey_version_id, r.user_email, r.status, r.score,
+         coalesce(r.created_at, now()), r.submitted_at
+    from jsonb_to_recordset(p_sessions) as r(
+           id uuid, survey_version_id uuid, user_email text, status text,
+           score double precision, created_at timestamptz, submitted_at timestamptz)
+  on conflict (id) do update
+     set user_email   = excluded.user_email,
+         status       = excluded.status,
+         score        = excluded.score,
+         created_at   = excluded.created_at,
+         submitted_at = excluded.submitted_at;
+  get diagnostics n = row_count;
+
+  insert into public.survey_answers as a (session_id, question_id, answer)
+  select r.session_id, r.question_id, r.answer
+    from jsonb_to_recordset(p_answers) as r(session_id uuid, question_id text, answer jsonb)
+  on conflict (session_id, question_id) do update
+     set answer = excluded.answer;
+
+  return n;
+end;
+$$;
+
+revoke all on function public.import_survey_sessions(jsonb, jsonb) from public;
+grant execute on function public.import_survey_sessions(jsonb, jsonb) to authenticated, service_role;
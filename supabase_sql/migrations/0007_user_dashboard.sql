@@ -0,0 +1,84 @@
+-- 0007: podsumowanie użytkownika dla strony startowej (dora_audit.dashboard).
+-- Jeden wiersz na adres, utrzymywany przez aplikację przy wysyłce
+-- (record_dashboard_submit) i utworzeniu szkicu; brak wiersza = odbudowa z
+-- survey_sessions przy następnym odczycie.
+create table if not exists public.user_dashboard (
+  user_email        text primary key,
+  attempts          int not null default 0,           -- wysłane sesje
+  latest_session_id uuid,
+  latest_score      double precision,
+  latest_band       text,
+  latest_at         timestamptz,
+  best_session_id   uuid,
+  best_score        double precision,
+  best_band         text,
+  open_draft_id     uuid,
+  history           jsonb not null default '[]'::jsonb,  -- [{id, at, score, band, v}] – ostatnie N, rosnąco
+  updated_at        timestamptz not null default now()
+);
+
+alter table public.user_dashboard enable row level security;
+
+drop policy if exists "own dashboard" on public.user_dashboard;
+create policy "own dashboard" on public.user_dashboard
+for all to authenticated
+using ( user_email = auth.jwt() ->> 'email' )
+with check ( user_email = auth.jwt() ->> 'email' );
+
+drop policy if exists "admins manage dashboards" on public.user_dashboard;
+create policy "admins manage dashboards" on public.user_dashboard
+for all to authenticated using (
+  exists (select 1 from public.allowed_emails a
+          where a.email = auth.jwt() ->> 'email' and a.is_admin)
+);
+
+-- Dopisanie wysyłki jednym UPDATE – równoległe wysyłki (dwie karty, repliki
+-- aplikacji) nie nadpisują się nawzajem. Idempotentne po id sesji (ponowiona
+-- wysyłka nie liczy się drugi raz). Brak wiersza = nic nie robi (false);
+-- load_summary() odbuduje go z survey_sessions, które już zawierają wysyłkę.
+create or replace function public.record_dashboard_submit(
+  p_email text, p_session_id uuid, p_score double precision, p_band text,
+  p_at text, p_version int, p_history_len int)
+returns boolean
+language plpgsql
+volatile
+security invoker
+set search_path = public
+as $$
+declare
+  n int;
+  entry jsonb := jsonb_build_object('id', p_session_id, 'at', p_at, 'score', p_score,
+                                    'band', p_band, 'v', p_version);
+begin
+  update public.user_dashboard d
+     set history = (select coalesce(jsonb_agg(last_n.h order by last_n.h->>'at'), '[]'::jsonb)
+                      from (select e.h
+                              from jsonb_array_elements(d.history || jsonb_build_array(entry)) as e(h)
+                             order by e.h->>'at' desc
+                             limit p_history_len) as last_n),
+         attempts          = d.attempts + 1,
+         latest_session_id = case when d.latest_at is null or p_at::timestamptz >= d.latest_at
+                                  then p_session_id else d.latest_session_id end,
+         latest_score      = case when d.latest_at is null or p_at::timestamptz >= d.latest_at
+                                  then p_score else d.latest_score end,
+         latest_band       = case when d.latest_at is null or p_at::timestamptz >= d.latest_at
+                                  then p_band else d.latest_band end,
+         latest_at         = greatest(d.latest_at, p_at::timestamptz),
+         best_session_id   = case when d.best_score is null or p_score > d.best_score
+                                  then p_session_id else d.best_session_id end,
+         best_score        = case when d.best_score is null or p_score > d.best_score
+                                  then p_score else d.best_score end,
+         best_band         = case when d.best_score is null or p_score > d.best_score
+                                  then p_band else d.best_band end,
+         open_draft_id     = nullif(d.open_draft_id, p_session_id),
+         updated_at        = now()
+   where d.user_email = p_email
+     and not d.history @> jsonb_build_array(jsonb_build_object('id', p_session_id));
+  get diagnostics n = row_count;
+  return n > 0;
+end;
+$$;
+
+revoke all on function public.record_dashboard_submit(text, uuid, double precision, text, text, int, int) from public;
+grant execute on function public.record_dashboard_submit(text, uuid, double precision, text, text, int, int)
+  to authenticated, service_role;
@@ -0,0 +1,5 @@
+-- 0008: mapa pytań między wersjami ankiety (dora_audit.trends).
+-- {"id_pytania_w_tej_wersji": "id_pytania_we_wcześniejszej_wersji"}; pytania bez
+-- wpisu zachowują swoje id. Pusta mapa = id przechodzą bez zmian.
+alter table public.survey_versions
+  add column if not exists question_map jsonb not null default '{}'::jsonb;
@@ -0,0 +1,41 @@
+-- 0009: przeniesienie otwartych szkiców do nowej wersji ankiety
+-- (dora_audit.draft_migration). Mapowanie odpowiedzi i punktacja liczą się po
+-- stronie aplikacji (reguły show_if); jedna porcja = jedno wywołanie = jedna
+-- transakcja. Szkic wysłany w międzyczasie (status <> 'draft') jest pomijany –
+-- jego odpowiedzi zostają nietknięte. Zwraca liczbę przeniesionych sesji.
+-- security invoker: obowiązują polityki RLS wywołującego (CLI – service role).
+create or replace function public.migrate_drafts(p_version_id uuid, p_sessions jsonb, p_answers jsonb)
+returns int
+language plpgsql
+volatile
+security invoker
+set search_path = public
+as $$
+declare
+  moved uuid[];
+begin
+  with upd as (
+    update public.survey_sessions s
+       set survey_version_id = p_version_id,
+           score             = r.score
+      from jsonb_to_recordset(p_sessions) as r(id uuid, score double precision)
+     where s.id = r.id
+       and s.status = 'draft'
+    returning s.id
+  )
+  select coalesce(array_agg(id), '{}') into moved from upd;
+
+  delete from public.survey_answers a
+   where a.session_id = any(moved);
+
+  insert into public.survey_answers (session_id, question_id, answer)
+  select r.session_id, r.question_id, r.answer
+    from jsonb_to_recordset(p_answers) as r(session_id uuid, question_id text, answer jsonb)
+   where r.session_id = any(moved);
+
+  return cardinality(moved);
+end;
+$$;
+
+revoke all on function public.migrate_drafts(uuid, jsonb, jsonb) from public;
+grant execute on function public.migrate_drafts(uuid, jsonb, jsonb) to authenticated, service_role;
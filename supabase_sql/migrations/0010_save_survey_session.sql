@@ -0,0 +1,82 @@
+-- 0010: idempotentny zapis sesji ankiety z aplikacji (dora_audit.core.save_session).
+-- Id sesji nadaje formularz przy otwarciu, więc szkic i wysyłka to upserty po
+-- id – ponowienie (rerun, zerwane połączenie) nie tworzy drugiej sesji. Sesja
+-- i odpowiedzi zapisują się w jednej transakcji. security invoker: obowiązują
+-- polityki RLS wywołującego.
+--
+-- false (nic nie zmienione) zwraca zapis na sesję wysłaną albo cudzą (inny
+-- user_email) oraz zmiana wersji szkicu na wersję nieaktywną – autozapis
+-- formularza otwartego przed aktywacją nowej wersji nie cofnie szkicu
+-- przeniesionego przez dora_audit.draft_migration. Wyjątek: ponowiona wysyłka
+-- (pierwsza próba zapisana, odpowiedź zgubiona) tej samej sesji z tym samym
+-- wynikiem, wersją i odpowiedziami zwraca true bez zapisu – aplikacja dokańcza
+-- kroki po wysyłce, które są idempotentne po id sesji.
+--
+-- p_event (dora_audit.outbox.submission_event) przy wysyłce: wiersz
+-- submission_outbox (migracja 0004) powstaje w tej samej transakcji co sesja –
+-- wysłana ankieta zawsze ma swoje zdarzenie webhooka. null = webhooki wyłączone.
+create or replace function public.save_survey_session(p_session jsonb, p_answers jsonb,
+                                                      p_event jsonb default null)
+returns boolean
+language plpgsql
+volatile
+security invoker
+set search_path = public
+as $$
+declare
+  n int;
+  sid uuid := (p_session->>'id')::uuid;
+begin
+  insert into public.survey_sessions as s
+         (id, survey_version_id, user_email, status, score, submitted_at)
+  select r.id, r.survey_version_id, r.user_email, r.status, r.score, r.submitted_at
+    from jsonb_to_record(p_session) as r(
+           id uuid, survey_version_id uuid, user_email text, status text,
+           score double precision, submitted_at timestamptz)
+  on conflict (id) do update
+     set survey_version_id = excluded.survey_version_id,
+         status            = excluded.status,
+         score             = excluded.score,
+         submitted_at      = excluded.submitted_at
+   where s.status <> 'submitted'
+     and s.user_email = excluded.user_email
+     and (s.survey_version_id = excluded.survey_version_id
+          or exists (select 1 from public.survey_versions v
+                      where v.id = excluded.survey_version_id and v.is_active));
+  get diagnostics n = row_count;
+  if n = 0 then
+    return p_session->>'status' = 'submitted'
+       and exists (
+             select 1
+               from public.survey_sessions s
+              where s.id = sid
+                and s.status = 'submitted'
+                and s.user_email = p_session->>'user_email'
+                and s.survey_version_id = (p_session->>'survey_version_id')::uuid
+                and s.score is not distinct from (p_session->>'score')::double precision)
+       and not exists (
+             select 1
+               from jsonb_to_recordset(p_answers) as r(question_id text, answer jsonb)
+               left join public.survey_answers a
+                      on a.session_id = sid and a.question_id = r.question_id
+              where a.answer is distinct from r.answer);
+  end if;
+
+  insert into public.survey_answers as a (session_id, question_id, answer)
+  select sid, r.question_id, r.answer
+    from jsonb_to_recordset(p_answers) as r(question_id text, answer jsonb)
+  on conflict (session_id, question_id) do update
+     set answer = excluded.answer;
+
+  if p_event is not null and p_session->>'status' = 'submitted' then
+    insert into public.submission_outbox (id, event_type, session_id, user_email, payload)
+    select (p_event->>'id')::uuid, p_event->>'event_type', sid, p_session->>'user_email', p_event->'payload'
+    on conflict (id) do nothing;
+  end if;
+
+  return true;
+end;
+$$;
+
+revoke all on function public.save_survey_session(jsonb, jsonb, jsonb) from public;
+grant execute on function public.save_survey_session(jsonb, jsonb, jsonb) to authenticated, service_role;
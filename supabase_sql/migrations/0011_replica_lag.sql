@@ -0,0 +1,22 @@
+-- 0011: opóźnienie repliki tylko do odczytu (dora_audit.replica.ReadRouter).
+-- Uruchomiona na replice zwraca liczbę sekund od ostatniej odtworzonej
+-- transakcji; 0, gdy replika nadąża (odebrany WAL = odtworzony WAL) albo gdy
+-- to nie jest replika. Aplikacja przy opóźnieniu powyżej
+-- DORA_REPLICA_MAX_LAG_S (albo błędzie tej funkcji) czyta z głównej bazy.
+-- Migrację trzeba zastosować na głównej bazie – replika dostaje ją z WAL.
+create or replace function public.replica_lag_seconds()
+returns double precision
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+  select case
+           when not pg_is_in_recovery() then 0
+           when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+           else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+         end::double precision;
+$$;
+
+revoke all on function public.replica_lag_seconds() from public;
+grant execute on function public.replica_lag_seconds() to anon, authenticated, service_role;
@@ -0,0 +1,22 @@
+-- 0012: rozkład wyników wersji ankiety dla percentyli (dora_audit.ranking).
+-- security definer: użytkownik z RLS widzi tylko własne sesje, a percentyl
+-- potrzebuje wszystkich wysłanych – funkcja zwraca wyłącznie id i wynik.
+-- Wynik podlega limitowi wierszy PostgREST (db-max-rows), więc aplikacja czyta
+-- go stronami (.range); kolejność (score, id) jest stała między stronami.
+create or replace function public.version_score_distribution(p_version_id uuid)
+returns table (id uuid, score double precision)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select s.id, s.score::double precision
+  from public.survey_sessions s
+  where s.survey_version_id = p_version_id
+    and s.status = 'submitted'
+    and s.score is not null
+  order by s.score, s.id;
+$$;
+
+revoke all on function public.version_score_distribution(uuid) from public;
+grant execute on function public.version_score_distribution(uuid) to authenticated;
@@ -0,0 +1,22 @@
+-- 0013: licznik generacji cache (dora_audit.cache) – kanał unieważnień między replikami.
+-- bump_cache_generation() podbija licznik przestrzeni nazw ('versions', 'whitelist', 'exports:<id>');
+-- repliki odpytują wiersz co DORA_CACHE_POLL_S (domyślnie 1 s).
+create table if not exists public.app_cache_generations (
+  namespace  text primary key,
+  generation bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create or replace function public.bump_cache_generation(p_namespace text)
+returns bigint
+language sql
+as $$
+  insert into public.app_cache_generations as g (namespace, generation)
+  values (p_namespace, 1)
+  on conflict (namespace) do update
+    set generation = g.generation + 1,
+        updated_at = now()
+  returning generation;
+$$;
+
+alter table public.app_cache_generations disable row level security;
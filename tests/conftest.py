@@ -0,0 +1,129 @@
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+# pakiet dora_audit leży obok app.py (app/dora_audit) – bez instalacji;
+# baza w pamięci (localdb) – w loadtest/, poza pakietem aplikacji
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+LOADTEST_DIR = APP_DIR.parent / "loadtest"
+for _path in (APP_DIR, LOADTEST_DIR):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+# testy nie powinny dzielić cache z działającą aplikacją (dora_audit.cache)
+os.environ.setdefault("DORA_CACHE_PATH", "off")
+
+
+# =============================================================================
+#  app.py na lokalnej bazie w pamięci (loadtest/localdb.py) + budżety zapytań
+# =============================================================================
+APP_PATH = APP_DIR / "app.py"
+USER = "user@firma.pl"
+ADMIN = "admin@firma.pl"
+
+QUESTIONS = [
+    {"id": "q1", "type": "single", "text": "Czy istnieje rejestr aktywów ICT?",
+     "options": [{"label": "Nie", "score": 0}, {"label": "Częściowo", "score": 5}, {"label": "Tak", "score": 10}]},
+    {"id": "q2", "type": "multi", "text": "Które testy odporności wykonujecie?",
+     "options": [{"label": "DR", "score": 5}, {"label": "TLPT", "score": 10}]},
+    {"id": "q3", "type": "scale", "text": "Dojrzałość zarządzania incydentami",
+     "min": 1, "max": 5, "step": 1, "score_per_step": 2},
+    {"id": "q4", "type": "single", "text": "Czy umowy z dostawcami ICT mają klauzule wyjścia?",
+     "options": [{"label": "Nie", "score": 0}, {"label": "Tak", "score": 10}]},
+]
+
+def seed_tables():
+    """Ankieta z aktywną wersją, whitelista (user + admin) i jedna wysłana sesja usera (+ jego podsumowanie)."""
+    return {
+        "surveys": [{"id": "survey-1", "name": "DORA Audit"}],
+        "survey_versions": [{
+            "id": "version-1", "survey_id": "survey-1", "version": 1, "is_active": True,
+            "content": {"title": "DORA Audit", "questions": QUESTIONS},
+            "threshold_green": 80, "threshold_amber": 60,
+            "created_by": ADMIN, "created_at": "2026-01-01T00:00:00+00:00",
+        }],
+        "allowed_emails": [
+            {"email": USER, "is_admin": False, "source": "seed"},
+            {"email": ADMIN, "is_admin": True, "source": "seed"},
+        ],
+        "survey_sessions": [{
+            "id": "session-1", "survey_version_id": "version-1", "user_email": USER,
+            "status": "submitted", "score": 62.5,
+            "created_at": "2026-02-01T10:00:00+00:00", "submitted_at": "2026-02-01T10:05:00+00:00",
+        }],
+        "user_dashboard": [{
+            "user_email": USER, "attempts": 1,
+            "latest_session_id": "session-1", "latest_score": 62.5, "latest_band": "Amber",
+            "latest_at": "2026-02-01T10:05:00+00:00",
+            "best_session_id": "session-1", "best_score": 62.5, "best_band": "Amber",
+            "open_draft_id": None,
+            "history": [{"id": "session-1", "at": "2026-02-01T10:05:00+00:00", "score": 62.5,
+                         "band": "Amber", "v": 1}],
+        }],
+        "survey_answers": [
+            {"id": "a1", "session_id": "session-1", "question_id": "q1", "answer": {"type": "single", "value": "Tak"}, "score": 10},
+            {"id": "a2", "session_id": "session-1", "question_id": "q2", "answer": {"type": "multi", "value": ["DR"]}, "score": 5},
+            {"id": "a3", "session_id": "session-1", "question_id": "q3", "answer": {"type": "scale", "value": 3}, "score": 4},
+            {"id": "a4", "session_id": "session-1", "question_id": "q4", "answer": {"type": "single", "value": "Nie"}, "score": 0},
+        ],
+    }
+
+@pytest.fixture
+def app_db(monkeypatch, tmp_path):
+    """Zasiana MemoryClient podpięty pod supa() w app.py (create_client i klienci per token podmienieni)."""
+    import streamlit as st
+    import supabase
+    from dora_audit import exports, profiling, replica
+    from localdb import MemoryClient
+
+    db = MemoryClient(seed_tables())
+    monkeypatch.setenv("SUPABASE_URL", "http://localdb")
+    monkeypatch.setenv("SUPABASE_ANON_KEY", "localdb")
+    monkeypatch.setenv("AUTOSAVE_ENABLED", "0")      # formularz – bez zapisów w tle
+    monkeypatch.setattr(supabase, "create_client", lambda *_a, **_k: db)
+    monkeypatch.setattr(replica, "session_client_from_env", db.session)   # klient z tokenem sesji
+    st.cache_resource.clear()                        # supa() z poprzedniego testu
+    scheduler = exports.ExportScheduler(tmp_path / "exports", workers=1)
+    exports.configure_export_scheduler(scheduler)    # eksporty w tle – katalog testu
+    profiling.configure_profiler(profiling.Profiler(enabled=False))
+    yield db
+    st.cache_resource.clear()
+    scheduler.shutdown()
+    exports.configure_export_scheduler(None)
+    profiling.configure_profiler(None)
+
+@pytest.fixture
+def app_as(app_db):
+    """app_as(email) -> AppTest zalogowany jako email (jeszcze nie uruchomiony)."""
+    from streamlit.testing.v1 import AppTest
+    from localdb import token_for
+
+    def _make(email: str = USER):
+        at = AppTest.from_file(str(APP_PATH), default_timeout=30)
+        at.session_state["access_token"] = token_for(email)
+        return at
+    return _make
+
+@pytest.fixture
+def query_budget(app_db):
+    """
+    with query_budget(5, "panel użytkownika"): ...
+    Liczy round-tripy do bazy (każde execute(), czyli każde qexec) w bloku
+    i oblewa test po przekroczeniu budżetu – z rozbiciem na tabelę/operację.
+    """
+    @contextmanager
+    def _budget(limit: int, label: str):
+        before = Counter(app_db.stats)
+        yield
+        spent = Counter(app_db.stats)
+        spent.subtract(before)
+        spent = +spent
+        total = sum(spent.values())
+        if total > limit:
+            lines = "\n".join(f"  {n:>3} × {table}.{op}" for (_who, table, op), n in spent.most_common())
+            pytest.fail(f"{label}: {total} zapytań do bazy, budżet {limit}\n{lines}")
+    return _budget
@@ -0,0 +1,77 @@
+import gzip
+import json
+
+from conftest import USER, seed_tables
+
+from dora_audit import archive
+from localdb import MemoryClient
+
+
+def _db():
+    tables = seed_tables()
+    # druga, wycofana wersja z dwiema sesjami
+    tables["survey_versions"].append(dict(tables["survey_versions"][0], id="version-0", version=0, is_active=False))
+    for sid in ("old-1", "old-2"):
+        tables["survey_sessions"].append({"id": sid, "survey_version_id": "version-0", "user_email": USER,
+                                          "status": "submitted", "score": 40.0,
+                                          "created_at": "2025-01-01T00:00:00+00:00"})
+        tables["survey_answers"].append({"id": f"a-{sid}", "session_id": sid, "question_id": "q1",
+                                         "answer": {"type": "single", "value": "Nie"}})
+    return MemoryClient(tables)
+
+
+def test_retired_versions_move_to_compressed_files(tmp_path):
+    db, store = _db(), archive.LocalArchiveStore(str(tmp_path))
+
+    dry = archive.archive_sessions(db, store, retired=True, dry_run=True)
+    assert dry.summary() == {"sessions": 2, "answers": 2, "files": 0, "dry_run": True}
+    assert len(db.tables["survey_sessions"]) == 3
+
+    report = archive.archive_sessions(db, store, retired=True, batch_size=1)
+    assert (report.sessions, report.answers, len(report.files)) == (2, 2, 2)
+    assert [s["id"] for s in db.tables["survey_sessions"]] == ["session-1"]      # aktywna wersja zostaje
+    assert {a["session_id"] for a in db.tables["survey_answers"]} == {"session-1"}
+    assert {r["session_id"] for r in db.tables["archived_sessions"]} == {"old-1", "old-2"}
+
+    line = gzip.decompress((tmp_path / report.files[0]).read_bytes()).decode().splitlines()[0]
+    assert json.loads(line)["answers"][0]["question_id"] == "q1"
+
+    session, answers, version = archive.load_archived_session(db, "old-2", store=store)
+    assert session["score"] == 40.0 and answers[0]["answer"]["value"] == "Nie"
+    assert version["id"] == "version-0" and version["content"]["questions"]
+    assert archive.load_archived_session(db, "missing", store=store) == (None, [], None)
+
+def test_rerun_after_interrupted_delete_keeps_the_first_file(tmp_path):
+    db, store = _db(), archive.LocalArchiveStore(str(tmp_path))
+    sessions = [dict(r) for r in db.tables["survey_sessions"] if r["id"].startswith("old-")]
+    answers = [dict(r) for r in db.tables["survey_answers"] if r["session_id"].startswith("old-")]
+    first = archive.archive_sessions(db, store, retired=True)
+    keys = {r["session_id"]: r["archive_key"] for r in db.tables["archived_sessions"]}
+
+    db.tables["survey_sessions"] += sessions          # zadanie przerwane po indeksie, przed usunięciem
+    db.tables["survey_answers"] += answers
+    rerun = archive.archive_sessions(db, store, retired=True)
+    assert rerun.files == [] and len(first.files) == 1
+    assert {r["session_id"]: r["archive_key"] for r in db.tables["archived_sessions"]} == keys
+    assert [s["id"] for s in db.tables["survey_sessions"]] == ["session-1"]
+    assert {a["session_id"] for a in db.tables["survey_answers"]} == {"session-1"}    # kaskada z sesji
+    assert archive.load_archived_session(db, "old-1", store=store)[1][0]["answer"]["value"] == "Nie"
+
+def test_retention_window_covers_active_version(tmp_path):
+    db, store = _db(), archive.LocalArchiveStore(str(tmp_path))
+    report = archive.archive_sessions(db, store, retired=False, older_than_days=0)
+    assert report.sessions == 3 and db.tables["survey_sessions"] == []
+    assert [r["session_id"] for r in archive.list_archived_sessions(db, USER)] == ["session-1", "old-1", "old-2"]
+
+def test_archived_session_opens_read_only_in_app(app_as, app_db, tmp_path, monkeypatch):
+    store = archive.LocalArchiveStore(str(tmp_path))
+    archive.archive_sessions(app_db, store, retired=False, older_than_days=0)
+    monkeypatch.setattr(archive, "ARCHIVE_URL", str(tmp_path))
+
+    at = app_as(USER)
+    at.run()
+    at.checkbox(key="show_archived").check().run()
+    next(b for b in at.button if b.key == "view_arch_session-1").click().run()
+    assert not at.exception
+    assert any("tylko do odczytu" in i.value for i in at.info)
+    assert "Tak" in at.dataframe[0].value["Odpowiedź"].tolist()
@@ -0,0 +1,109 @@
+import pytest
+
+from conftest import USER, seed_tables
+from dora_audit.autosave import REFUSED, DraftAutosaver
+from localdb import LocalDbError, MemoryClient, token_for
+
+SID = "5b0a6d7e-0000-4000-8000-0000000000a5"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def db():
+    return MemoryClient(seed_tables())
+
+def _saver(db, clock, **kw):
+    version = db.tables["survey_versions"][0]
+    saver = DraftAutosaver(db, version, USER, SID, debounce_s=2.0, clock=clock, background=False, **kw)
+    saver.queue({"q1": {"type": "single", "value": "Nie"}})        # prefill – stan wyjściowy
+    return saver
+
+def _answers(db):
+    return {a["question_id"]: a["answer"]["value"] for a in db.tables["survey_answers"] if a["session_id"] == SID}
+
+def _saves(db):
+    return db.stats[("-", "rpc:save_survey_session", "rpc")]
+
+
+def test_edits_are_debounced_and_merged_into_one_save(db):
+    clock = Clock()
+    saver = _saver(db, clock)
+    assert saver.next_flush_in() is None
+    for t, value in ((0.0, "Częściowo"), (1.5, "Tak")):
+        clock.now = t
+        assert saver.queue({"q1": {"type": "single", "value": value}}) == 1
+    clock.now = 3.0
+    assert saver.next_flush_in() == pytest.approx(0.5) and not saver.tick()
+    clock.now = 3.5
+    assert saver.tick() and saver.flushes == 1
+    assert _saves(db) == 1 and _answers(db) == {"q1": "Tak"}
+    assert saver.next_flush_in() is None
+
+def test_failures_requeue_with_backoff_then_give_up(db):
+    clock = Clock()
+    saver = _saver(db, clock, max_failures=3)
+    real = db.functions["save_survey_session"]
+    def denied(client, **params):
+        raise LocalDbError("permission denied for table survey_sessions", "42501")
+    db.functions["save_survey_session"] = denied
+
+    saver.queue({"q1": {"type": "single", "value": "Tak"}})
+    clock.now = 2.0
+    assert not saver.tick() and saver.pending_count == 1
+    assert saver.next_flush_in() == 2.0                             # 1. błąd: debounce
+    saver.queue({"q1": {"type": "single", "value": "Częściowo"}})  # nowsza edycja wygrywa z buforem
+    clock.now = 4.0
+    assert not saver.tick() and saver.next_flush_in() == 4.0       # 2. błąd: odstęp ×2
+
+    db.functions["save_survey_session"] = real                      # chwilowy błąd minął
+    clock.now = 8.0
+    assert saver.tick() and saver.failures == 0 and _answers(db) == {"q1": "Częściowo"}
+
+    db.functions["save_survey_session"] = denied                    # trwały błąd – limit prób
+    saver.queue({"q1": {"type": "single", "value": "Nie"}})
+    for _ in range(3):
+        clock.now += 60
+        saver.tick()
+    assert saver.closed and "wstrzymany po 3" in saver.last_error
+    assert saver.next_flush_in() is None
+    assert saver.queue({"q1": {"type": "single", "value": "Tak"}}) == 0
+    assert _saves(db) == 6
+
+def test_flush_keeps_the_owner_session_when_the_shared_client_switches(db):
+    clock = Clock()
+    saver = _saver(db.session(token_for(USER)), clock)               # klient z sesją właściciela szkicu
+    saver.queue({"q1": {"type": "single", "value": "Tak"}})
+    db.auth.set_session(token_for("inny@firma.pl"))                  # rerun innej karty na wspólnym kliencie
+    clock.now = 2.0
+    assert saver.tick()
+    assert db.stats[(USER, "rpc:save_survey_session", "rpc")] == 1
+    assert not db.stats[("inny@firma.pl", "rpc:save_survey_session", "rpc")]
+
+def test_refused_save_stops_autosave(db):
+    clock = Clock()
+    db.tables["survey_sessions"].append({"id": SID, "survey_version_id": "version-1", "user_email": USER,
+                                         "status": "submitted", "score": 10.0})
+    saver = _saver(db, clock)
+    saver.queue({"q1": {"type": "single", "value": "Tak"}})
+    clock.now = 2.0
+    assert not saver.tick()
+    assert saver.closed and saver.last_error == REFUSED
+    assert saver.next_flush_in() is None and _saves(db) == 1
+
+def test_app_gives_the_autosaver_its_own_session(app_as, app_db, monkeypatch):
+    from dora_audit import replica
+    monkeypatch.setattr(replica, "session_client_from_env", app_db.session)
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    at.toggle(key="autosave_enabled").set_value(True).run()
+    assert not at.exception, [e.value for e in at.exception]
+    saver = at.session_state["draft_autosaver"]
+    assert saver.client is not app_db and saver.client.current_email() == USER
+    saver.close()
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import QUESTIONS, seed_tables
+from dora_audit import bulk_import, core
+from dora_audit.bulk_import import import_history
+from dora_audit.cli import main
+from localdb import MemoryClient
+
+VERSION = seed_tables()["survey_versions"][0]
+HEADER = ["session_id", "user_email", "status", "score", "submitted_at", "q1", "q2", "q3", "q4"]
+
+
+def _csv(rows, header=HEADER):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(header)
+    w.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+def _history(n):
+    return _csv([[f"old-{i}", f"User{i}@Firma.pl", "submitted", "", f"2023-0{1 + i % 9}-01 10:00:00",
+                  ("Tak", "Częściowo", "Nie")[i % 3], "DR|TLPT" if i % 2 else "", str(1 + i % 5), "Tak"]
+                 for i in range(n)])
+
+@pytest.fixture
+def db():
+    tables = seed_tables()
+    tables["survey_sessions"], tables["survey_answers"] = [], []
+    return MemoryClient(tables)
+
+
+def test_import_scores_rows_and_round_trips_through_export(db, tmp_path):
+    report = import_history(db, VERSION, _history(7), chunk_size=3, checkpoint_dir=tmp_path)
+    assert report.summary()["imported"] == 7 and report.chunks == 3 and report.done
+    sessions = db.tables["survey_sessions"]
+    assert {s["user_email"] for s in sessions} == {f"user{i}@firma.pl" for i in range(7)}
+    assert len(db.tables["survey_answers"]) == 7 * len(QUESTIONS)
+    first = next(s for s in sessions if s["user_email"] == "user1@firma.pl")
+    # Częściowo 5 + DR|TLPT 15 + skala 2 → 2 pkt + Tak 10
+    assert first["score"] == 32.0 and first["submitted_at"] == "2023-02-01T10:00:00+00:00"
+
+    _, exported = core.admin_csv_all_sessions_for_version(db, VERSION["id"])
+    lines = exported.decode().splitlines()
+    assert lines[0].split(",")[5:] == HEADER[5:] and len(lines) == 8
+    assert sum("DR|TLPT" in line for line in lines) == 3
+
+def test_failed_import_resumes_from_checkpoint(db, tmp_path, monkeypatch):
+    raw = _history(10)
+    real, calls = bulk_import._write_chunk, []
+
+    def flaky(client, sessions, answers):
+        calls.append(len(sessions))
+        if len(calls) == 2:
+            raise RuntimeError("DB error: connection reset")
+        real(client, sessions, answers)
+    monkeypatch.setattr(bulk_import, "_write_chunk", flaky)
+    with pytest.raises(RuntimeError):
+        import_history(db, VERSION, raw, chunk_size=4, checkpoint_dir=tmp_path)
+    assert len(db.tables["survey_sessions"]) == 4
+
+    report = import_history(db, VERSION, raw, chunk_size=4, checkpoint_dir=tmp_path)
+    assert report.resumed_from == 4 and report.imported == 6 and calls == [4, 4, 4, 2]
+    assert len(db.tables["survey_sessions"]) == 10
+
+    again = import_history(db, VERSION, raw, chunk_size=4, checkpoint_dir=tmp_path)
+    assert again.imported == 0
+    import_history(db, VERSION, raw, chunk_size=4, checkpoint_dir=tmp_path, resume=False)
+    assert len(db.tables["survey_sessions"]) == 10                  # uuid5 + upsert – bez duplikatów
+    assert len(db.tables["survey_answers"]) == 10 * len(QUESTIONS)
+
+def test_mapping_validation_and_dry_run(db, tmp_path):
+    raw = _csv([["", "jan@firma.pl", "", "", "2024-05-01T08:00:00Z", "Tak", "DR|XYZ", "9", "x"],
+                ["", "bez-maila", "submitted", "", "", "Tak", "", "", ""]],
+               header=["session_id", "user_email", "status", "score", "submitted_at",
+                       "Rejestr", "Q2", "q3", "komentarz"])
+    with pytest.raises(ValueError):
+        import_history(db, VERSION, raw, mapping={"Rejestr": "q99"}, checkpoint_dir=tmp_path)
+
+    report = import_history(db, VERSION, raw, mapping={"Rejestr": "q1"}, checkpoint_dir=tmp_path, dry_run=True)
+    assert report.unmapped_columns == ["komentarz"] and report.missing_questions == ["q4"]
+    assert report.invalid_rows == [(2, "niepoprawny adres: 'bez-maila'")]
+    assert dict(report.unknown_values) == {"q2": 1, "q3": 1}
+    assert report.imported == 1 and not db.tables["survey_sessions"] and not list(tmp_path.iterdir())
+
+def test_cli_falls_back_to_upserts_without_rpc(db, tmp_path, monkeypatch, capsys):
+    db.functions.pop("import_survey_sessions")
+    monkeypatch.setattr(core, "client_from_env", lambda: db)
+    (tmp_path / "h.csv").write_bytes(_history(3))
+    assert main(["import-history", str(tmp_path / "h.csv"), VERSION["id"],
+                 "--checkpoint-dir", str(tmp_path / "ckpt")]) == 0
+    assert json.loads(capsys.readouterr().out)["imported"] == 3
+    assert len(db.tables["survey_sessions"]) == 3
@@ -0,0 +1,94 @@
+from dora_audit.cache import NullCache, SharedCache
+
+
+class _Rows:
+    def __init__(self, data):
+        self.data = data
+
+class _Query:
+    def __init__(self, db, ns=None):
+        self.db, self.ns = db, ns
+    def select(self, *_):
+        return self
+    def eq(self, _col, ns):
+        self.ns = ns
+        return self
+    def limit(self, _):
+        return self
+    def execute(self):
+        self.db.reads += 1
+        gen = self.db.gens.get(self.ns)
+        return _Rows([{"generation": gen}] if gen is not None else [])
+
+class _Rpc:
+    def __init__(self, db, ns):
+        self.db, self.ns = db, ns
+    def execute(self):
+        self.db.gens[self.ns] = self.db.gens.get(self.ns, 0) + 1
+        return _Rows(self.db.gens[self.ns])
+
+class FakeCounterDb:
+    """Stand-in dla tabeli app_cache_generations + rpc bump_cache_generation."""
+    def __init__(self):
+        self.gens, self.reads = {}, 0
+    def table(self, _name):
+        return _Query(self)
+    def rpc(self, _fn, params):
+        return _Rpc(self, params["p_namespace"])
+
+
+def test_replicas_on_one_host_share_entries_and_bumps(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    a, b = SharedCache(path), SharedCache(path)
+    calls = []
+    assert a.get_or_load("versions", "active", lambda: calls.append(1) or {"v": 1}) == {"v": 1}
+    assert b.get_or_load("versions", "active", lambda: calls.append(1) or {"v": 2}) == {"v": 1}
+    assert len(calls) == 1
+
+    a.bump("versions")
+    assert b.get("versions", "active") is None
+    assert b.get_or_load("versions", "active", lambda: {"v": 2}) == {"v": 2}
+
+def test_none_is_not_cached(tmp_path):
+    c = SharedCache(str(tmp_path / "c.sqlite3"))
+    assert c.get_or_load("whitelist", "x@y", lambda: None) is None
+    assert c.get_or_load("whitelist", "x@y", lambda: {"email": "x@y"}) == {"email": "x@y"}
+
+def test_remote_counter_invalidates_other_host_within_poll_window(tmp_path):
+    db = FakeCounterDb()
+    host_a = SharedCache(str(tmp_path / "a.sqlite3"), poll_s=0.0)
+    host_b = SharedCache(str(tmp_path / "b.sqlite3"), poll_s=0.0)
+    host_b.set("versions", "active", {"v": 1}, generation=host_b.generation("versions", db))
+    assert host_b.get("versions", "active", db) == {"v": 1}
+
+    host_a.bump("versions", db)          # np. _set_active_version na innym hoście
+    assert host_b.get("versions", "active", db) is None
+
+def test_failed_remote_bump_does_not_hide_later_bumps(tmp_path):
+    db = FakeCounterDb()
+    host_a = SharedCache(str(tmp_path / "a.sqlite3"), poll_s=0.0)
+    host_b = SharedCache(str(tmp_path / "b.sqlite3"), poll_s=0.0)
+    host_b.generation("versions", db)
+
+    class Down(FakeCounterDb):
+        def rpc(self, _fn, _params):
+            raise RuntimeError("DB error: connection refused")
+    for _ in range(3):
+        host_b.bump("versions", Down())  # lokalny licznik „wyprzedza” Postgresa
+    host_b.set("versions", "active", {"v": 1})
+    assert host_b.get("versions", "active", db) == {"v": 1}
+
+    host_a.bump("versions", db)
+    assert host_b.get("versions", "active", db) is None
+
+def test_remote_poll_is_throttled(tmp_path):
+    db = FakeCounterDb()
+    c = SharedCache(str(tmp_path / "c.sqlite3"), poll_s=60.0)
+    for _ in range(5):
+        c.get("versions", "active", db)
+    assert db.reads == 1
+
+def test_null_cache_always_loads():
+    c = NullCache()
+    assert c.get_or_load("versions", "active", lambda: 1) == 1
+    assert c.get("versions", "active") is None
@@ -0,0 +1,34 @@
+import json
+
+from dora_audit.cli import main
+
+
+VERSION = {
+    "threshold_green": 80,
+    "threshold_amber": 60,
+    "content": {"questions": [
+        {"id": "q1", "type": "single", "options": [{"label": "Tak", "score": 50}, {"label": "Nie", "score": 0}]},
+        {"id": "q2", "type": "multi", "options": [{"label": "A", "score": 20}, {"label": "B", "score": 15}]},
+    ]},
+}
+
+def test_score_from_answer_map(tmp_path, capsys):
+    (tmp_path / "v.json").write_text(json.dumps(VERSION))
+    (tmp_path / "a.json").write_text(json.dumps({"q1": "Tak", "q2": ["A", "B"]}))
+    assert main(["score", str(tmp_path / "v.json"), str(tmp_path / "a.json")]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert out == {"score": 85.0, "label": "Green"}
+
+def test_score_from_answer_rows(tmp_path, capsys):
+    (tmp_path / "v.json").write_text(json.dumps(VERSION["content"]))
+    rows = [{"question_id": "q1", "answer": {"type": "single", "value": "Nie"}},
+            {"question_id": "q2", "answer": {"type": "multi", "value": ["B"]}}]
+    (tmp_path / "a.json").write_text(json.dumps(rows))
+    assert main(["score", str(tmp_path / "v.json"), str(tmp_path / "a.json")]) == 0
+    assert json.loads(capsys.readouterr().out) == {"score": 15.0, "label": "Red"}
+
+def test_db_command_without_env_fails_cleanly(monkeypatch, capsys):
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+    monkeypatch.delenv("SUPABASE_ANON_KEY", raising=False)
+    assert main(["pdf", "abc"]) == 1
+    assert "SUPABASE_URL" in capsys.readouterr().err
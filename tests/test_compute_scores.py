@@ -1,12 +1,5 @@
 
-import types
-import importlib.util
-from pathlib import Path
-
-app_path = Path(__file__).resolve().parents[1] / "app" / "app.py"
-spec = importlib.util.spec_from_file_location("app_module", app_path)
-app = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(app)
+from dora_audit import core as app
 
 def test_compute_scores_basic():
     import pandas as pd
@@ -16,8 +9,13 @@ def test_compute_scores_basic():
         {"section": "SEC2", "question_id": "Q3", "question_text": "C?", "weight": 2.0, "answer": "Partial"},
         {"section": "SEC2", "question_id": "Q4", "question_text": "D?", "weight": 1.0, "answer": "N.A."},
     ])
-    assert hasattr(app, "compute_scores"), "compute_scores() not found in app.py"
+    assert hasattr(app, "compute_scores"), "compute_scores() not found in dora_audit.core"
     result = app.compute_scores(df, weights_map={"Yes":1.0,"Partial":0.5,"No":0.0,"N.A.":None})
     assert "total" in result and "by_section" in result
     assert 0.0 <= result["total"] <= 100.0
     assert set(result["by_section"].keys()) == {"SEC1","SEC2"}
+
+def test_core_does_not_import_streamlit():
+    import subprocess, sys
+    code = "import sys, dora_audit.cli; assert 'streamlit' not in sys.modules and 'supabase' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=app.__file__.rsplit("dora_audit", 1)[0], check=True)
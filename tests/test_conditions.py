@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from conftest import USER
+
+from dora_audit.conditions import ConditionGraph, compile_rules
+from dora_audit.core import build_pdf_for_session, compute_total_score, max_total_score
+
+QS = [
+    {"id": "q1", "type": "single", "options": [{"label": "Nie", "score": 0}, {"label": "Tak", "score": 10}]},
+    {"id": "q2", "type": "multi", "show_if": {"question": "q1", "equals": "Tak"},
+     "options": [{"label": "DR", "score": 5}, {"label": "TLPT", "score": 10}]},
+    {"id": "q3", "type": "scale", "min": 1, "max": 5, "score_per_step": 5,
+     "show_if": {"question": "q2", "contains": "TLPT"}},
+    {"id": "q4", "type": "single", "options": [{"label": "A", "score": 4}],
+     "show_if": {"any": [{"question": "q3", "gte": 4}, {"not": {"question": "q1", "answered": True}}]}},
+]
+
+def test_hidden_question_hides_its_dependents():
+    g = ConditionGraph(QS)
+    assert g.visible({"q1": "Tak", "q2": ["TLPT"], "q3": 5}) == {"q1", "q2", "q3", "q4"}
+    # q1=Nie ukrywa q2, a odpowiedź ukrytego q2 nie odsłania q3 (łańcuch)
+    assert g.visible({"q1": "Nie", "q2": ["TLPT"], "q3": 5}) == {"q1"}
+    assert g.visible({}) == {"q1", "q4"}
+
+def test_incremental_update_matches_full_evaluation():
+    g, rng = ConditionGraph(QS), random.Random(3)
+    values = {}
+    visible = g.visible(values)
+    for _ in range(200):
+        qid = rng.choice(["q1", "q2", "q3"])
+        values[qid] = {"q1": rng.choice(["Tak", "Nie", None]),
+                       "q2": rng.choice([[], ["DR"], ["TLPT"]]),
+                       "q3": rng.randint(1, 5)}[qid]
+        visible = g.update(visible, values, [qid])
+        assert visible == g.visible(values)
+    assert g.affected(["q1"]) == {"q2", "q3", "q4"} and g.affected(["q4"]) == set()
+
+@pytest.mark.parametrize("bad", [
+    [{"id": "a", "show_if": {"question": "b", "equals": 1}}, {"id": "b", "show_if": {"question": "a", "equals": 1}}],
+    [{"id": "a", "show_if": {"question": "zzz", "equals": 1}}],
+    [{"id": "a"}, {"id": "b", "show_if": {"question": "a"}}],
+])
+def test_invalid_rules_are_rejected(bad):
+    with pytest.raises(ValueError):
+        ConditionGraph(bad)
+
+def test_score_and_denominator_skip_hidden_questions():
+    filled = {"q1": {"value": "Nie"}, "q2": {"value": ["DR", "TLPT"]}, "q3": {"value": 5}}
+    assert compute_total_score(QS, filled) == 0.0
+    assert max_total_score(QS, filled) == 10.0
+    filled["q1"] = {"value": "Tak"}
+    assert compute_total_score(QS, filled) == 10 + 15 + 20
+    assert max_total_score(QS, filled) == 10 + 15 + 20 + 4
+    assert compile_rules(QS) is compile_rules([dict(q) for q in QS])     # kompilacja raz na wersję
+
+def test_pdf_lists_only_visible_questions(monkeypatch):
+    import reportlab.platypus
+
+    tables, table = [], reportlab.platypus.Table
+    monkeypatch.setattr(reportlab.platypus, "Table", lambda rows, **kw: tables.append(rows) or table(rows, **kw))
+    answers = [{"question_id": qid, "answer": {"value": v}} for qid, v in
+               (("q1", "Nie"), ("q2", ["DR", "TLPT"]), ("q3", 5), ("q4", "A"))]
+    session = {"id": "session-1", "status": "submitted", "score": compute_total_score(
+        QS, {a["question_id"]: a["answer"] for a in answers})}
+    assert build_pdf_for_session({"version": 1, "content": {"questions": QS}}, session, answers, 80, 60)
+    qa = tables[-1][1:]
+    assert [r[0] for r in qa] == [1] and sum(r[3] for r in qa) == session["score"]     # q2–q4 ukryte przez q1=Nie
+
+def test_conditional_question_appears_after_answer(app_as, app_db):
+    version = app_db.tables["survey_versions"][0]
+    qs = version["content"]["questions"] = list(version["content"]["questions"])     # bez zmiany QUESTIONS z conftest
+    qs.append({"id": "q5", "type": "single", "text": "Jak często testujecie plan ciągłości?",
+               "show_if": {"question": "q4", "equals": "Tak"},
+               "options": [{"label": "Rzadko", "score": 0}, {"label": "Co rok", "score": 10}]})
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    at.toggle(key="autosave_enabled").set_value(True).run()
+    assert "q_single_q5" not in [r.key for r in at.radio]
+    at.radio(key="q_single_q4").set_value("Tak").run()
+    assert not at.exception
+    assert "q_single_q5" in [r.key for r in at.radio]
@@ -0,0 +1,86 @@
+from conftest import USER, seed_tables
+from dora_audit import dashboard
+from localdb import MemoryClient
+
+VERSION = seed_tables()["survey_versions"][0]
+
+
+def _submitted(sid, score, at):
+    return {"id": sid, "survey_version_id": "version-1", "status": "submitted", "score": score,
+            "created_at": at, "submitted_at": at}
+
+
+def test_summary_tracks_latest_best_and_bounded_history(monkeypatch):
+    monkeypatch.setattr(dashboard, "HISTORY_LEN", 3)
+    sessions = [_submitted(f"s{i}", score, f"2026-0{i + 1}-01T10:00:00+00:00")
+                for i, score in enumerate((40.0, 90.0, 65.0, 20.0))]
+    sessions.append({"id": "d1", "status": "draft", "created_at": "2026-06-01T00:00:00+00:00"})
+    summary = dashboard.build_summary(USER, sessions, {"version-1": VERSION})
+
+    assert summary["attempts"] == 4 and summary["open_draft_id"] == "d1"
+    assert (summary["latest_session_id"], summary["latest_band"]) == ("s3", "Red")
+    assert (summary["best_session_id"], summary["best_score"], summary["best_band"]) == ("s1", 90.0, "Green")
+    assert [h["id"] for h in summary["history"]] == ["s1", "s2", "s3"]
+
+    d1 = {"id": "d1", "score": 70.0, "submitted_at": "2026-07-01T00:00:00+00:00"}
+    assert dashboard.apply_submission(summary, d1, VERSION)
+    assert not dashboard.apply_submission(summary, d1, VERSION)          # ponowienie – bez zmian
+    assert summary["attempts"] == 5 and summary["open_draft_id"] is None
+    assert summary["latest_band"] == "Amber" and summary["best_session_id"] == "s1"
+
+def test_missing_row_is_rebuilt_once():
+    tables = seed_tables()
+    tables.pop("user_dashboard")
+    db = MemoryClient(tables)
+    summary = dashboard.load_summary(db, USER)
+    assert summary["latest_score"] == 62.5 and summary["latest_band"] == "Amber"
+    assert len(db.tables["user_dashboard"]) == 1
+
+    before = db.calls()
+    assert dashboard.load_summary(db, USER)["attempts"] == 1
+    assert db.calls() - before == 1                                       # jeden wiersz, bez odbudowy
+
+def test_record_submit_updates_the_row_in_sql():
+    db = MemoryClient(seed_tables())
+    s2 = {"id": "session-2", "score": 90.0, "submitted_at": "2026-03-01T10:00:00+00:00"}
+    assert dashboard.record_submit(db, USER, s2, VERSION)
+    assert not dashboard.record_submit(db, USER, s2, VERSION)            # ponowienie – bez zmian
+    assert not db.stats[(USER, "user_dashboard", "select")]              # bez odczytu i upsertu w aplikacji
+    row = db.tables["user_dashboard"][0]
+    assert row["attempts"] == 2 and (row["best_session_id"], row["best_band"]) == ("session-2", "Green")
+
+    db.tables["user_dashboard"].clear()                                  # brak wiersza – tylko odbudowa
+    db.tables["survey_sessions"].append({**s2, "survey_version_id": "version-1", "user_email": USER,
+                                         "status": "submitted", "created_at": s2["submitted_at"]})
+    assert not dashboard.record_submit(db, USER, s2, VERSION) and not db.tables["user_dashboard"]
+    assert dashboard.load_summary(db, USER)["attempts"] == 2
+
+    db.functions.pop("record_dashboard_submit")                          # baza bez funkcji z migracji 0007
+    s3 = {"id": "session-3", "score": 10.0, "submitted_at": "2026-04-01T10:00:00+00:00"}
+    assert dashboard.record_submit(db, USER, s3, VERSION)
+    assert db.tables["user_dashboard"][0]["attempts"] == 3
+
+def test_landing_page_renders_from_summary(app_as, app_db):
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label == "➕ Rozpocznij nową ankietę").click().run()
+    at.radio(key="q_single_q1").set_value("Tak")
+    next(b for b in at.button if b.label == "Zapisz szkic").click().run()
+    row = app_db.tables["user_dashboard"][0]
+    draft_id = row["open_draft_id"]
+    assert draft_id and row["attempts"] == 1
+
+    at.run()
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert not at.exception
+    row = app_db.tables["user_dashboard"][0]
+    assert row["attempts"] == 2 and row["open_draft_id"] is None
+    assert row["latest_session_id"] == draft_id and len(row["history"]) == 2
+
+    landing = app_as(USER)
+    landing.run()
+    assert not landing.exception
+    assert {m.label: m.value for m in landing.metric}["Wysłane podejścia"] == "2"
+    assert len([b for b in landing.button if (b.key or "").startswith("view_")]) == 2
+    assert not app_db.stats[(USER, "survey_sessions", "select")]        # lista podejść też z podsumowania
+    assert landing.get("vega_lite_chart")                                 # wykres z history, bez zapytań
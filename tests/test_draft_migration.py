@@ -0,0 +1,108 @@
+import copy
+
+import pytest
+
+from conftest import ADMIN, QUESTIONS, USER, seed_tables
+from dora_audit.core import save_session
+from dora_audit.draft_migration import migrate_drafts
+from localdb import MemoryClient
+
+V2_QUESTIONS = [
+    dict(QUESTIONS[0], id="assets"),                                   # q1 pod nowym id (question_map)
+    dict(QUESTIONS[1], options=[{"label": "DR", "score": 5}, {"label": "Scenariusze", "score": 5}]),
+    dict(QUESTIONS[2], max=3),
+    {"id": "q5", "type": "single", "text": "Nowe pytanie", "options": [{"label": "Tak", "score": 10}]},
+]
+
+def _seed():
+    tables = seed_tables()
+    tables["survey_versions"].append({
+        "id": "version-2", "survey_id": "survey-1", "version": 2, "is_active": False,
+        "content": {"title": "DORA Audit", "questions": copy.deepcopy(V2_QUESTIONS)},
+        "question_map": {"assets": "q1"}, "threshold_green": 80, "threshold_amber": 60,
+    })
+    for sid, email, answers in [
+        ("draft-1", USER, {"q1": "Tak", "q2": ["DR", "TLPT"], "q3": 2, "q4": "Tak"}),
+        ("draft-2", "inny@firma.pl", {"q1": None, "q3": 5}),
+    ]:
+        tables["survey_sessions"].append({"id": sid, "survey_version_id": "version-1", "user_email": email,
+                                          "status": "draft", "score": 0.0, "created_at": "2026-03-01T00:00:00+00:00"})
+        tables["survey_answers"] += [{"id": f"{sid}-{qid}", "session_id": sid, "question_id": qid,
+                                      "answer": {"type": "x", "value": v}} for qid, v in answers.items()]
+    return tables
+
+def _answers(db, sid):
+    return {a["question_id"]: a["answer"]["value"] for a in db.tables["survey_answers"] if a["session_id"] == sid}
+
+@pytest.fixture
+def db():
+    return MemoryClient(_seed())
+
+
+@pytest.mark.parametrize("rpc", [True, False])
+def test_drafts_move_to_new_version_with_rescore_and_report(db, rpc):
+    if not rpc:
+        db.functions.pop("migrate_drafts")              # baza sprzed 0009 – ścieżka z upsertami
+    target = next(v for v in db.tables["survey_versions"] if v["id"] == "version-2")
+    report = migrate_drafts(db, target, chunk_size=1)
+
+    assert report.summary() == {"drafts": 2, "migrated": 2, "answers": 3, "chunks": 2,
+                                "unmappable": 3, "dry_run": False}
+    sessions = {s["id"]: s for s in db.tables["survey_sessions"]}
+    assert sessions["draft-1"]["survey_version_id"] == "version-2"
+    assert sessions["draft-1"]["score"] == 10 + 5 + 2
+    assert sessions["session-1"]["survey_version_id"] == "version-1"            # wysłane bez zmian
+    assert _answers(db, "draft-1") == {"assets": "Tak", "q2": ["DR"], "q3": 2}
+    assert _answers(db, "draft-2") == {}
+    assert len(_answers(db, "session-1")) == 4
+    reasons = {(r["session_id"], r["question_id"]): r["reason"] for r in report.unmappable}
+    assert reasons == {("draft-1", "q2"): "brak opcji: TLPT",
+                       ("draft-1", "q4"): "brak pytania w nowej wersji",
+                       ("draft-2", "q3"): "wartość 5 poza skalą"}
+
+def test_explicit_map_dry_run_and_submitted_race(db):
+    target = next(v for v in db.tables["survey_versions"] if v["id"] == "version-2")
+    before = copy.deepcopy(db.tables)
+    report = migrate_drafts(db, target, mapping={"assets": "q1", "q5": "q4"}, dry_run=True)
+    assert report.migrated == 0 and report.answers == 4 and report.unmappable_count == 2
+    assert db.tables == before
+    with pytest.raises(ValueError):
+        migrate_drafts(db, target, mapping={"q5": "nie-ma"})
+
+    # szkic wysłany między odczytem a zapisem porcji – funkcja go pomija
+    real = db.functions["migrate_drafts"]
+    def racing(client, **params):
+        next(s for s in client.tables["survey_sessions"] if s["id"] == "draft-2")["status"] = "submitted"
+        return real(client, **params)
+    db.functions["migrate_drafts"] = racing
+    report = migrate_drafts(db, target)
+    assert report.drafts == 2 and report.migrated == 1
+    assert _answers(db, "draft-2") == {"q1": None, "q3": 5}
+
+def test_stale_autosave_cannot_move_a_migrated_draft_back(db):
+    for v in db.tables["survey_versions"]:
+        v["is_active"] = v["id"] == "version-2"
+    migrate_drafts(db, next(v for v in db.tables["survey_versions"] if v["id"] == "version-2"))
+    draft = {"survey_version_id": "version-1", "user_email": USER, "status": "draft",
+             "score": 0.0, "submitted_at": None}
+    # formularz otwarty przed aktywacją – autozapis ze starą wersją i starymi id pytań
+    assert not save_session(db, dict(draft, id="draft-1"),
+                            [{"session_id": "draft-1", "question_id": "q1", "answer": {"type": "single", "value": "Nie"}}])
+    assert next(s for s in db.tables["survey_sessions"] if s["id"] == "draft-1")["survey_version_id"] == "version-2"
+    assert _answers(db, "draft-1") == {"assets": "Tak", "q2": ["DR"], "q3": 2}
+
+    # wznowienie nieprzeniesionego szkicu w aktywnej ankiecie nadal zmienia jego wersję
+    db.tables["survey_sessions"].append(dict(draft, id="draft-3"))
+    assert save_session(db, dict(draft, id="draft-3", survey_version_id="version-2"), [])
+
+def test_activation_in_admin_panel_migrates_drafts(app_as, app_db):
+    app_db.tables.update({k: v for k, v in _seed().items() if k in ("survey_versions", "survey_sessions",
+                                                                     "survey_answers")})
+    at = app_as(ADMIN)
+    at.run()
+    at.sidebar.radio[0].set_value("Panel administracyjny").run()
+    next(b for b in at.button if b.key == "set_active_version-2").click().run()
+    assert not at.exception, [e.value for e in at.exception]
+    assert any("Przeniesiono szkice: 2 z 2" in s.value for s in at.success)
+    assert any("Nieprzeniesione odpowiedzi: 3" in w.value for w in at.warning)
+    assert _answers(app_db, "draft-1") == {"assets": "Tak", "q2": ["DR"], "q3": 2}
@@ -0,0 +1,96 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import ADMIN, USER, seed_tables
+from dora_audit import exports
+from dora_audit.core import admin_csv_all_sessions_for_version
+from dora_audit.exports import ExportScheduler, export_version_files
+from localdb import MemoryClient, token_for
+
+
+@pytest.fixture
+def db():
+    tables = seed_tables()
+    tables["survey_sessions"] += [{
+        "id": f"s{i:03d}", "survey_version_id": "version-1", "user_email": f"u{i}@firma.pl",
+        "status": "submitted", "score": float(i),
+        "created_at": f"2026-03-01T10:00:0{i % 3}+00:00",      # remisy created_at – keyset po id
+        "submitted_at": "2026-03-01T10:05:00+00:00",
+    } for i in range(23)]
+    tables["survey_answers"] += [
+        {"session_id": f"s{i:03d}", "question_id": "q2", "answer": {"type": "multi", "value": ["DR", "TLPT"]}}
+        for i in range(23)
+    ]
+    return MemoryClient(tables)
+
+
+def test_files_match_synchronous_export(db, tmp_path):
+    seen = []
+    export_version_files(db, "version-1", tmp_path, progress=lambda d, t: seen.append((d, t)), page_size=5)
+    sessions_csv, answers_csv = admin_csv_all_sessions_for_version(db, "version-1")
+    # ta sama zawartość; kolejność wierszy – created_at (synchronicznie) vs created_at, id (keyset)
+    for name, expected in (("sessions.csv", sessions_csv), ("answers_wide.csv", answers_csv)):
+        got = (tmp_path / name).read_bytes().decode().splitlines()
+        want = expected.decode().splitlines()
+        assert got[0] == want[0] and sorted(got[1:]) == sorted(want[1:])
+    assert seen[0] == (0, 24) and seen[-1] == (24, 24) and len(seen) == 6
+
+def test_scheduler_runs_cancels_and_limits(db, tmp_path, monkeypatch):
+    sched = ExportScheduler(tmp_path, workers=1, max_per_owner=1, page_size=5)
+    gate = threading.Event()
+    real = exports._answers_for
+    monkeypatch.setattr(exports, "_answers_for", lambda *a: (gate.wait(5), real(*a))[1])
+
+    job = sched.submit(db, ADMIN, "version-1", "v1")
+    assert sched.submit(db, ADMIN, "version-1", "v1").id == job.id          # bez duplikatu
+    with pytest.raises(RuntimeError):
+        sched.submit(db, ADMIN, "version-2", "v2")                           # limit na właściciela
+    assert sched.cancel(job.id, ADMIN)
+    gate.set()
+    assert sched.wait(job.id, timeout=10).status == "cancelled"
+    assert not (tmp_path / job.id / "sessions.csv").exists()
+
+    job = sched.submit(db, ADMIN, "version-1", "v1")
+    done = sched.wait(job.id, timeout=10)
+    assert done.status == "done" and done.progress == 1.0
+    assert sched.artifact(done, "answers_wide.csv").read_text().count("DR|TLPT") == 23
+    assert [j.status for j in sched.jobs_for(ADMIN)] == ["done", "cancelled"]
+    sched.shutdown()
+
+def test_stale_running_job_is_reported_failed(tmp_path):
+    sched = ExportScheduler(tmp_path, workers=1)
+    old = (datetime.now(timezone.utc) - timedelta(hours=2)).isoformat()
+    (tmp_path / "j1").mkdir()
+    (tmp_path / "j1" / "job.json").write_text(json.dumps({
+        "id": "j1", "owner": ADMIN, "version_id": "version-1", "version_label": "v1",
+        "status": "running", "created_at": old, "updated_at": old}))
+    job = sched.jobs_for(ADMIN)[0]
+    assert job.status == "failed" and not job.active
+    assert sched.purge(older_than_days=0) == 1
+    sched.shutdown()
+
+def test_admin_downloads_finished_export(app_as):
+    at = app_as(ADMIN)
+    at.run()
+    at.sidebar.radio[0].set_value("Panel administracyjny").run()
+    next(b for b in at.button if b.label.startswith("Zleć eksport")).click().run()
+    sched = exports.get_export_scheduler()
+    sched.wait(sched.jobs_for(ADMIN)[0].id, timeout=10)
+    at.run()
+    assert not at.exception
+    labels = [e.proto.label for e in at.get("download_button")]
+    assert labels == ["sessions.csv", "answers_wide.csv"]
+
+def test_export_job_reads_with_the_admin_session(app_as, app_db):
+    at = app_as(ADMIN)
+    at.run()
+    at.sidebar.radio[0].set_value("Panel administracyjny").run()
+    next(b for b in at.button if b.label.startswith("Zleć eksport")).click().run()
+    app_db.auth.set_session(token_for(USER))                  # rerun innej karty na wspólnym kliencie
+    sched = exports.get_export_scheduler()
+    assert sched.wait(sched.jobs_for(ADMIN)[0].id, timeout=10).status == "done"
+    assert app_db.stats[(ADMIN, "survey_answers", "select")]
+    assert not any(who != ADMIN and table == "survey_answers" for who, table, _op in app_db.stats)
@@ -0,0 +1,118 @@
+import pytest
+
+from conftest import USER, seed_tables
+from dora_audit import trends
+from dora_audit.core import save_session
+from localdb import LocalDbError, MemoryClient
+
+SID = "5b0a6d7e-0000-4000-8000-000000000001"
+
+def _session(status="draft", email=USER, score=10.0):
+    return {"id": SID, "survey_version_id": "version-1", "user_email": email, "status": status,
+            "score": score, "submitted_at": "2026-03-01T10:00:00Z" if status == "submitted" else None}
+
+def _answers(value):
+    return [{"session_id": SID, "question_id": "q1", "answer": {"type": "single", "value": value}}]
+
+
+@pytest.mark.parametrize("rpc", [True, False])
+def test_retried_saves_write_one_session(rpc):
+    db = MemoryClient(seed_tables())
+    if not rpc:
+        db.functions.pop("save_survey_session")         # baza sprzed 0010 – dwa upserty
+    for _ in range(3):                                  # rerun / ponowienie po zerwanym połączeniu
+        assert save_session(db, _session(), _answers("Nie"))
+    assert save_session(db, _session("submitted", score=20.0), _answers("Tak"))
+    rows = [s for s in db.tables["survey_sessions"] if s["id"] == SID]
+    assert len(rows) == 1 and rows[0]["status"] == "submitted" and rows[0]["score"] == 20.0
+    assert [a["answer"]["value"] for a in db.tables["survey_answers"] if a["session_id"] == SID] == ["Tak"]
+
+def test_submitted_or_foreign_session_is_left_alone():
+    db = MemoryClient(seed_tables())
+    assert save_session(db, _session("submitted"), _answers("Tak"))
+    calls = db.calls()
+    assert not save_session(db, _session("draft", score=0.0), _answers("Nie"))        # stara karta
+    assert not save_session(db, _session("draft", email="obcy@firma.pl"), _answers("Nie"))
+    assert db.calls() == calls + 2                                                     # jedno wywołanie na zapis
+    assert not save_session(db, _session("submitted", score=0.0), _answers("Nie"))      # inna treść
+    assert save_session(db, _session("submitted"), _answers("Tak"))    # ponowienie tej samej wysyłki
+    row = next(s for s in db.tables["survey_sessions"] if s["id"] == SID)
+    assert row["status"] == "submitted" and row["user_email"] == USER
+    assert [a["answer"]["value"] for a in db.tables["survey_answers"] if a["session_id"] == SID] == ["Tak"]
+
+def test_only_a_missing_function_falls_back_to_upserts():
+    db = MemoryClient(seed_tables())
+    assert save_session(db, _session("submitted"), _answers("Tak"))
+    def denied(client, **params):
+        raise LocalDbError("permission denied for function save_survey_session", "42501")
+    db.functions["save_survey_session"] = denied
+    with pytest.raises(RuntimeError, match="permission denied"):
+        save_session(db, _session("draft", score=0.0), _answers("Nie"))
+    assert next(s for s in db.tables["survey_sessions"] if s["id"] == SID)["status"] == "submitted"
+
+def test_form_keeps_one_session_id_across_saves_and_submit(app_as, app_db):
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    form_id = at.session_state["form_session_id"]
+    for _ in range(2):
+        next(b for b in at.button if b.label == "Zapisz szkic").click().run()
+        assert not at.exception, [e.value for e in at.exception]
+    at.radio(key="q_single_q1").set_value("Tak")
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert not at.exception, [e.value for e in at.exception]
+
+    mine = [s for s in app_db.tables["survey_sessions"] if s["user_email"] == USER]
+    assert len(mine) == 2                                           # zasiana + ta jedna
+    assert next(s for s in mine if s["id"] == form_id)["status"] == "submitted"
+    assert "form_session_id" not in at.session_state
+
+def test_submit_retried_after_lost_response_succeeds(app_as, app_db):
+    real = app_db.functions["save_survey_session"]
+    def commit_then_drop(client, **params):
+        real(client, **params)
+        app_db.functions["save_survey_session"] = real
+        raise LocalDbError("connection reset by peer")
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    at.radio(key="q_single_q1").set_value("Tak")
+    app_db.functions["save_survey_session"] = commit_then_drop
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert any("connection reset" in e.value for e in at.error)
+
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert not at.error, [e.value for e in at.error]
+    assert any("Odpowiedzi zapisane" in s.value for s in at.success)
+    assert sum(s["status"] == "submitted" for s in app_db.tables["survey_sessions"]) == 2
+
+def test_failed_bookkeeping_after_submit_only_warns(app_as, app_db, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(trends, "record_submission", broken)
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    at.radio(key="q_single_q1").set_value("Tak")
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert not at.error, [e.value for e in at.error]
+    assert any("Odpowiedzi zapisane" in s.value for s in at.success)
+    assert any("database is locked" in w.value for w in at.warning)
+    assert "form_session_id" not in at.session_state
+
+def test_questions_without_id_are_saved_under_positional_ids(app_as, app_db):
+    version = app_db.tables["survey_versions"][0]
+    version["content"] = {**version["content"],
+                          "questions": [{k: v for k, v in q.items() if k != "id"}
+                                        for q in version["content"]["questions"]]}
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    at.radio(key="q_single_q1").set_value("Tak")
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert not at.exception, [e.value for e in at.exception]
+    form_id = next(s["id"] for s in app_db.tables["survey_sessions"] if s["id"] != "session-1")
+    saved = {a["question_id"]: a["answer"]["value"] for a in app_db.tables["survey_answers"]
+             if a["session_id"] == form_id}
+    assert set(saved) == {f"q{i}" for i in range(1, len(version["content"]["questions"]) + 1)}
+    assert saved["q1"] == "Tak"
@@ -0,0 +1,43 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from dora_audit.cache import configure_shared_cache
+from dora_audit.core import qexec
+from localdb import LocalDbError, MemoryClient, token_for
+
+HARNESS = Path(__file__).resolve().parents[1] / "loadtest" / "harness.py"
+
+
+def test_memory_client_counts_calls_per_user():
+    db = MemoryClient({"allowed_emails": [{"email": "a@x.pl", "is_admin": False}]})
+    db.auth.set_session(token_for("a@x.pl"))
+    assert qexec(db.table("allowed_emails").select("email").eq("email", "a@x.pl")) == [{"email": "a@x.pl"}]
+    qexec(db.table("allowed_emails").upsert([{"email": "a@x.pl", "is_admin": True}], on_conflict="email"))
+    assert db.tables["allowed_emails"] == [{"email": "a@x.pl", "is_admin": True}]
+    assert db.calls("a@x.pl") == 2 and db.calls("b@x.pl") == 0
+    with pytest.raises(LocalDbError):
+        db.table("allowed_emails").insert({"email": "a@x.pl"}).execute()
+
+
+def test_harness_smoke_scenario(monkeypatch):
+    import supabase
+
+    spec = importlib.util.spec_from_file_location("loadtest_harness", HARNESS)
+    harness = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(harness)
+
+    monkeypatch.setattr(supabase, "create_client", supabase.create_client)
+    monkeypatch.setenv("AUTOSAVE_ENABLED", "1")
+    sc = harness.load_scenario(None, users=2, admins=1, concurrency=2, questions=4, answers_per_step=2)
+    try:
+        report = harness.run(sc)
+    finally:
+        configure_shared_cache(None)
+
+    assert report["errors"] == {}
+    assert set(report["actions"]) >= {"open_panel", "take_survey", "answer", "submit", "view_session", "admin_panel"}
+    assert report["actions"]["submit"]["n"] == 2
+    assert report["totals"]["db_calls"] > 0
+    assert "p99" in harness.format_report(report)
@@ -0,0 +1,201 @@
+"""
+Migracje schematu: kolejność plików i (z prawdziwym Postgresem) plany zapytań
+oraz funkcje SQL wywoływane przez aplikację.
+
+Testy na Postgresie uruchamiają się tylko z DORA_TEST_DATABASE_URL wskazującym
+na jednorazową bazę (np. usługa postgres w CI) – migracje są na niej stosowane,
+a dane testowe wycofywane rollbackiem. Pozostałe testy używają bazy w pamięci
+(loadtest/localdb.py), której odpowiedniki funkcji muszą dawać te same wyniki.
+"""
+import json
+import os
+import uuid
+
+import pytest
+
+from dora_audit import migrate
+
+DB_URL = os.getenv("DORA_TEST_DATABASE_URL", "")
+
+
+def test_migration_files_are_numbered_and_unique():
+    versions = [v for v, _ in migrate.list_migrations()]
+    assert versions == sorted(versions) and versions[0] == "0001"
+    sql = "\n".join(p.read_text(encoding="utf-8") for _, p in migrate.list_migrations())
+    for name in ("survey_sessions_user_created_idx", "survey_sessions_version_created_idx",
+                 "survey_answers_session_question_key", "survey_versions_one_active_idx",
+                 "allowed_emails_domain_email_idx",
+                 # funkcje wołane przez aplikację – baza z samego `migrate` musi je mieć
+                 "function public.version_score_distribution", "function public.bump_cache_generation",
+                 "function public.save_survey_session", "function public.record_dashboard_submit"):
+        assert name in sql
+
+def test_bad_migration_name_is_rejected(tmp_path):
+    (tmp_path / "0001_ok.sql").write_text("select 1;")
+    (tmp_path / "fix.sql").write_text("select 1;")
+    with pytest.raises(ValueError):
+        migrate.list_migrations(tmp_path)
+
+
+# =============================================================================
+#  EXPLAIN na prawdziwym Postgresie
+# =============================================================================
+# czysty Postgres (CI) nie ma ról i schematu auth z Supabase – polityki RLS i granty migracji ich wymagają
+SUPABASE_BASICS = """
+do $$
+begin
+  if not exists (select 1 from pg_roles where rolname = 'anon') then create role anon nologin; end if;
+  if not exists (select 1 from pg_roles where rolname = 'authenticated') then create role authenticated nologin; end if;
+  if not exists (select 1 from pg_roles where rolname = 'service_role') then create role service_role nologin; end if;
+  if to_regprocedure('auth.jwt()') is null then
+    create schema if not exists auth;
+    create function auth.jwt() returns jsonb language sql stable
+      as 'select coalesce(nullif(current_setting(''request.jwt.claims'', true), ''''), ''{}'')::jsonb';
+  end if;
+end $$;
+"""
+
+@pytest.fixture(scope="module")
+def pg():
+    if not DB_URL:
+        pytest.skip("DORA_TEST_DATABASE_URL nie ustawione")
+    psycopg = pytest.importorskip("psycopg")
+    with psycopg.connect(DB_URL, autocommit=True, cursor_factory=psycopg.ClientCursor) as conn:
+        conn.execute(SUPABASE_BASICS)
+        migrate.migrate(conn)
+        assert migrate.pending(conn) == []
+        yield conn
+
+@pytest.fixture
+def seeded(pg):
+    """Ankieta, 3 wersje, 3000 sesji po 10 odpowiedzi – wycofywane po teście."""
+    with pg.transaction(force_rollback=True):
+        survey = pg.execute("insert into surveys(name) values (%s) returning id",
+                            (f"explain-{uuid.uuid4()}",)).fetchone()[0]
+        versions = [pg.execute(
+            "insert into survey_versions(survey_id, version, content, is_active) "
+            "values (%s, %s, '{}'::jsonb, %s) returning id", (survey, n, n == 3)).fetchone()[0]
+            for n in (1, 2, 3)]
+        pg.execute("""
+            insert into survey_sessions(survey_version_id, user_email, status, score, created_at)
+            select (%s::uuid[])[1 + i %% 3], 'user' || (i %% 500) || '@firma.pl',
+                   'submitted', i %% 100, now() - i * interval '1 minute'
+            from generate_series(1, 3000) i
+        """, (versions,))
+        pg.execute("""
+            insert into survey_answers(session_id, question_id, answer)
+            select s.id, 'q' || q, '{"value": 1}'::jsonb
+            from survey_sessions s cross join generate_series(1, 10) q
+        """)
+        pg.execute("analyze survey_sessions; analyze survey_answers; analyze survey_versions")
+        # wyłączony seq scan: plan wybierze indeks, o ile jakikolwiek pasuje do zapytania
+        pg.execute("set local enable_seqscan = off")
+        yield {"survey": survey, "version": versions[2],
+               "session": pg.execute("select id from survey_sessions limit 1").fetchone()[0]}
+
+def _index_names(plan):
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for sub in plan.get("Plans", []):
+        names |= _index_names(sub)
+    return names
+
+def _plan(pg, sql, params):
+    return pg.execute("explain (format json) " + sql, params).fetchone()[0][0]["Plan"]
+
+@pytest.mark.parametrize("sql, key, index", [
+    ("select id, status, score, created_at, submitted_at from survey_sessions "
+     "where user_email = %s order by created_at desc limit 50",
+     "email", "survey_sessions_user_created_idx"),
+    ("select id, user_email, status, score, created_at, submitted_at from survey_sessions "
+     "where survey_version_id = %s order by created_at",
+     "version", "survey_sessions_version_created_idx"),
+    ("select question_id, answer from survey_answers where session_id = %s order by question_id",
+     "session", "survey_answers_session_question_key"),
+    ("select * from survey_versions where survey_id = %s and is_active",
+     "survey", "survey_versions_one_active_idx"),
+    ("select version from survey_versions where survey_id = %s order by version desc limit 1",
+     "survey", "survey_versions_survey_id_version_key"),
+    # przeglądarka sesji admina (dora_audit.sessions)
+    ("select id, user_email, status, score, created_at from survey_sessions "
+     "where survey_version_id = %s and status = 'submitted' and score < 60 "
+     "order by created_at desc, id desc limit 51",
+     "version", "survey_sessions_version_status_created_idx"),
+    ("select id, user_email, status, score, created_at from survey_sessions "
+     "where user_email like %s order by created_at desc, id desc limit 51",
+     "prefix", "survey_sessions_email_prefix_idx"),
+])
+def test_app_queries_use_indexes(pg, seeded, sql, key, index):
+    params = {"email": ("user7@firma.pl",), "prefix": ("user499%",), "version": (seeded["version"],),
+              "session": (seeded["session"],), "survey": (seeded["survey"],)}[key]
+    plan = _plan(pg, sql, params)
+    assert index in _index_names(plan), plan
+
+def test_one_active_version_per_survey(pg, seeded):
+    psycopg = pytest.importorskip("psycopg")
+    with pytest.raises(psycopg.errors.UniqueViolation):
+        with pg.transaction():
+            pg.execute("update survey_versions set is_active = true where survey_id = %s", (seeded["survey"],))
+
+
+# =============================================================================
+#  Funkcje SQL (te same przypadki, co odpowiedniki w loadtest/localdb.py)
+# =============================================================================
+@pytest.fixture
+def versions(pg):
+    """Ankieta z wersją nieaktywną i aktywną – wycofywane po teście."""
+    with pg.transaction(force_rollback=True):
+        survey = pg.execute("insert into surveys(name) values (%s) returning id",
+                            (f"rpc-{uuid.uuid4()}",)).fetchone()[0]
+        old, new = [str(pg.execute(
+            "insert into survey_versions(survey_id, version, content, is_active) "
+            "values (%s, %s, '{}'::jsonb, %s) returning id", (survey, n, n == 2)).fetchone()[0])
+            for n in (1, 2)]
+        yield {"old": old, "new": new}
+
+def _save(pg, session, answers):
+    return pg.execute("select save_survey_session(%s::jsonb, %s::jsonb)",
+                      (json.dumps(session), json.dumps(answers))).fetchone()[0]
+
+def test_save_survey_session_replay_and_version_guard(pg, versions):
+    sid = str(uuid.uuid4())
+    sent = {"id": sid, "survey_version_id": versions["new"], "user_email": "rpc@firma.pl",
+            "status": "submitted", "score": 10.0, "submitted_at": "2026-03-01T10:00:00+00:00"}
+    answers = [{"session_id": sid, "question_id": "q1", "answer": {"type": "single", "value": "Tak"}}]
+    assert _save(pg, sent, answers)
+    assert _save(pg, sent, answers)                                      # ponowiona wysyłka
+    assert not _save(pg, {**sent, "score": 0.0}, answers)                # inna treść – odmowa
+
+    draft = {**sent, "id": str(uuid.uuid4()), "survey_version_id": versions["old"],
+             "status": "draft", "submitted_at": None}
+    assert _save(pg, draft, [])
+    assert _save(pg, {**draft, "survey_version_id": versions["new"]}, [])     # na aktywną – tak
+    assert not _save(pg, draft, [])                                      # z powrotem na starą – nie
+
+def test_save_survey_session_writes_the_outbox_event_once(pg, versions):
+    sid, eid = str(uuid.uuid4()), str(uuid.uuid4())
+    sent = {"id": sid, "survey_version_id": versions["new"], "user_email": "rpc@firma.pl",
+            "status": "submitted", "score": 10.0, "submitted_at": "2026-03-01T10:00:00+00:00"}
+    event = {"id": eid, "event_type": "session.submitted", "payload": {"session_id": sid}}
+    call = "select save_survey_session(%s::jsonb, '[]'::jsonb, %s::jsonb)"
+    with pg.transaction(force_rollback=True):
+        for _ in range(2):                                               # ponowiona wysyłka
+            assert pg.execute(call, (json.dumps(sent), json.dumps(event))).fetchone()[0]
+        rows = pg.execute("select session_id::text, status from submission_outbox where id = %s",
+                          (eid,)).fetchall()
+        assert rows == [(sid, "pending")]
+
+def test_record_dashboard_submit_is_idempotent(pg, versions):
+    with pg.transaction(force_rollback=True):
+        email, sid = f"rpc-{uuid.uuid4()}@firma.pl", str(uuid.uuid4())
+        args = (email, sid, 90.0, "Green", "2026-03-01T10:00:00+00:00", 2, 20)
+        call = "select record_dashboard_submit(%s, %s, %s, %s, %s, %s, %s)"
+        assert not pg.execute(call, args).fetchone()[0]                  # brak wiersza – odbudowa w aplikacji
+        pg.execute("insert into user_dashboard(user_email, open_draft_id) values (%s, %s)", (email, sid))
+        assert pg.execute(call, args).fetchone()[0]
+        assert not pg.execute(call, args).fetchone()[0]                  # ponowienie – bez zmian
+        row = pg.execute("select attempts, best_score, latest_band, open_draft_id, history "
+                         "from user_dashboard where user_email = %s", (email,)).fetchone()
+        assert row[:4] == (1, 90.0, "Green", None)
+        assert [h["id"] for h in row[4]] == [sid]
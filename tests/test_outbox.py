@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from conftest import ADMIN, USER, seed_tables
+from dora_audit import outbox
+from dora_audit.core import save_session
+from localdb import LocalDbError, MemoryClient
+
+TOKEN = "sekret"
+VERSION = {"id": "version-1", "version": 1}
+
+
+class _Stub:
+    """Lokalny odbiorca webhooków: zapisuje żądania, odpowiada kodem `status`."""
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests.append((dict(self.headers), body))
+                self.send_response(stub.status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    s = _Stub()
+    monkeypatch.setattr(outbox, "WEBHOOK_URL", s.url)
+    yield s
+    s.close()
+
+def _session(sid):
+    return {"id": sid, "user_email": USER, "score": 70.0, "submitted_at": "2026-03-01T10:00:00Z"}
+
+def _rows(db):
+    return db.tables.get("submission_outbox", [])
+
+
+def test_enqueue_is_idempotent_per_session(stub):
+    db = MemoryClient()
+    sent, table = [], db.table
+    db.table = lambda name: sent.append(table(name)) or sent[-1]
+    eid = outbox.enqueue_submission(db, _session("s1"), VERSION, "AMBER")
+    assert outbox.enqueue_submission(db, _session("s1"), VERSION, "AMBER") == eid
+    assert len(_rows(db)) == 1 and _rows(db)[0]["status"] == "pending"
+    assert all(q._returning == "minimal" for q in sent)     # użytkownik nie ma polityki SELECT na outboxie
+
+def test_disabled_without_url(monkeypatch):
+    monkeypatch.setattr(outbox, "WEBHOOK_URL", "")
+    db = MemoryClient()
+    assert outbox.enqueue_submission(db, _session("s1"), VERSION) is None
+    assert not _rows(db)
+
+@pytest.mark.parametrize("rpc", [True, False])
+def test_submit_writes_its_event_with_the_session(stub, rpc):
+    db = MemoryClient(seed_tables())
+    if not rpc:
+        db.functions.pop("save_survey_session")         # baza sprzed 0010 – osobne upserty
+    sid = "5b0a6d7e-0000-4000-8000-000000000002"
+    session = {**_session(sid), "survey_version_id": "version-1", "status": "submitted"}
+    event = outbox.submission_event(session, VERSION, "AMBER")
+    for _ in range(2):                                   # ponowiona wysyłka – to samo zdarzenie
+        assert save_session(db, session, [], event)
+    assert [(r["id"], r["session_id"], r["status"]) for r in _rows(db)] == [(event["id"], sid, "pending")]
+    if rpc:                                              # odmowa zapisu (cudza sesja) – bez zdarzenia
+        foreign = {**session, "id": "5b0a6d7e-0000-4000-8000-000000000003", "user_email": "obcy@firma.pl"}
+        assert save_session(db, {**foreign, "status": "draft"}, [])
+        assert not save_session(db, {**foreign, "user_email": USER}, [], outbox.submission_event(foreign, VERSION))
+        assert len(_rows(db)) == 1
+
+def test_dispatch_delivers_signed_batch(stub):
+    db = MemoryClient()
+    for sid in ("s1", "s2", "s3"):
+        outbox.enqueue_submission(db, _session(sid), VERSION, "AMBER")
+
+    d = outbox.WebhookDispatcher(db, url=stub.url, token=TOKEN, batch_size=2)
+    assert d.drain() == 3
+    assert len(stub.requests) == 2                       # porcje 2 + 1
+    headers, body = stub.requests[0]
+    assert outbox.verify(body, headers["X-Dora-Timestamp"], headers["X-Dora-Signature"], TOKEN)
+    events = json.loads(body)["events"]
+    assert events[0]["type"] == "session.submitted" and events[0]["data"]["label"] == "AMBER"
+    assert {r["status"] for r in _rows(db)} == {"delivered"}
+    assert outbox.status_counts(db) == {"pending": 0, "delivered": 3, "failed": 0}
+
+def test_claim_falls_back_only_when_the_function_is_missing(stub):
+    db = MemoryClient()
+    outbox.enqueue_submission(db, _session("s1"), VERSION)
+    def unavailable(client, **params):
+        raise LocalDbError("canceling statement due to statement timeout", "57014")
+    db.functions["claim_submission_outbox"] = unavailable
+    with pytest.raises(RuntimeError):
+        outbox.claim_due(db)
+    db.functions.pop("claim_submission_outbox")
+    assert [r["status"] for r in outbox.claim_due(db)] == ["pending"]
+
+def test_run_forever_delivers_until_stopped(stub):
+    db = MemoryClient()
+    outbox.enqueue_submission(db, _session("s1"), VERSION)
+    d = outbox.WebhookDispatcher(db, url=stub.url, token=TOKEN, poll_s=0.01)
+    worker = threading.Thread(target=d.run_forever, daemon=True)     # jak `webhooks` w CLI
+    worker.start()
+    deadline = time.monotonic() + 5
+    while not d.stats["delivered"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    d.stop()
+    worker.join(1)
+    assert d.stats["delivered"] == 1 and not worker.is_alive()
+
+def test_failures_back_off_then_fail(stub):
+    stub.status = 503
+    db = MemoryClient()
+    outbox.enqueue_submission(db, _session("s1"), VERSION)
+    d = outbox.WebhookDispatcher(db, url=stub.url, token=TOKEN, max_attempts=2)
+
+    assert d.dispatch_once() == 0
+    row = _rows(db)[0]
+    assert row["status"] == "pending" and row["attempts"] == 1 and row["last_error"] == "HTTP 503"
+    assert d.dispatch_once() == 0                        # próba odłożona (backoff)
+    assert len(stub.requests) == 1
+
+    row["next_attempt_at"] = "2000-01-01T00:00:00+00:00"
+    d.dispatch_once()
+    assert row["status"] == "failed" and row["attempts"] == 2
+
+    stub.status = 200
+    assert outbox.retry_failed(db) == 1
+    assert d.dispatch_once() == 1 and row["status"] == "delivered"
+
+def test_submit_enqueues_and_admin_sees_status(stub, app_db, app_as):
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label == "➕ Rozpocznij nową ankietę").click().run()
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert not at.exception
+    assert len(_rows(app_db)) == 1
+
+    deadline = time.monotonic() + 5                      # dyspozytor w tle (notify po wysyłce)
+    while _rows(app_db)[0]["status"] != "delivered" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert _rows(app_db)[0]["status"] == "delivered"
+    assert json.loads(stub.requests[0][1])["events"][0]["data"]["user_email"] == USER
+
+    admin = app_as(ADMIN)
+    admin.run()
+    admin.sidebar.radio[0].set_value("Panel administracyjny").run()
+    assert not admin.exception
+    assert any(m.label == "Dostarczone" and m.value == "1" for m in admin.metric)
@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import ADMIN, seed_tables
+from localdb import MemoryClient, token_for
+from dora_audit.prefetch import Prefetch
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=True)
+
+def _read(db, table):
+    return lambda: db.table(table).select("*").execute().data
+
+
+def test_reads_run_concurrently_as_the_caller(pool):
+    db = MemoryClient(seed_tables(), latency_s=0.2)
+    db.auth.set_session(token_for(ADMIN))
+    shared = _read(db, "survey_versions")
+    t0 = time.perf_counter()
+    pre = Prefetch({"a": _read(db, "surveys"), "b": _read(db, "allowed_emails"),
+                    "c": shared, "d": shared}, pool=pool)
+    results = [pre.take(k, lambda: None) for k in "abcd"]
+    assert time.perf_counter() - t0 < 0.35                  # najwolniejsze zapytanie, nie suma trzech
+    assert results[2] is results[3] and len(results[1]) == 2
+    assert db.calls(ADMIN) == 3                             # wspólny loader = jedno zapytanie, sesja wywołującego
+
+def test_take_is_one_shot_and_reraises(pool):
+    def boom():
+        raise RuntimeError("DB error: timeout")
+    pre = Prefetch({"x": lambda: 1, "bad": boom}, pool=pool)
+    assert pre.take("x", lambda: 2) == 1
+    assert pre.take("x", lambda: 2) == 2                    # rerun fragmentu – świeży odczyt
+    with pytest.raises(RuntimeError, match="timeout"):
+        pre.take("bad", lambda: None)
+    assert Prefetch().take("y", lambda: 3) == 3
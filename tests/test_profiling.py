@@ -0,0 +1,69 @@
+import threading
+import time
+
+from conftest import ADMIN, USER
+from dora_audit import profiling
+from dora_audit.profiling import Profiler
+
+
+def _busy(ms):
+    end = time.perf_counter() + ms / 1000
+    while time.perf_counter() < end:
+        sum(range(200))
+
+
+def test_disabled_captures_nothing():
+    p = Profiler(enabled=False)
+    with p.capture("Moje ankiety"):
+        _busy(1)
+    assert not p.slowest() and not p.stats
+
+def test_keeps_only_slowest_and_tags_nested_actions():
+    p = Profiler(enabled=True, top_n=2)
+    for ms in (1, 30, 5, 15):
+        with p.capture("Moje ankiety"):
+            if ms == 30:
+                with p.capture("Moje ankiety", "pdf"):     # akcja w trakcie reruna = etykieta
+                    _busy(ms)
+            else:
+                _busy(ms)
+    slow = p.slowest()
+    assert [c.tag for c in slow] == ["Moje ankiety / pdf", "Moje ankiety / rerun"]
+    assert slow[0].wall_ms > slow[1].wall_ms >= 15
+    assert any("_busy" in name for name, *_ in slow[0].functions)
+    assert "cumtime" in slow[0].stats_text()
+    assert {r["strona / akcja"]: r["liczba"] for r in p.tag_summary()} == \
+        {"Moje ankiety / rerun": 3, "Moje ankiety / pdf": 1}
+    assert p.stats["captured"] == 4
+
+def test_concurrent_capture_is_skipped():
+    p = Profiler(enabled=True)
+    inside, release = threading.Event(), threading.Event()
+
+    def other():
+        with p.capture("Panel administracyjny"):
+            inside.set()
+            release.wait(5)
+    t = threading.Thread(target=other)
+    t.start()
+    inside.wait(5)
+    with p.capture("Moje ankiety"):
+        pass
+    release.set()
+    t.join()
+    assert p.stats["busy"] == 1 and [c.page for c in p.slowest()] == ["Panel administracyjny"]
+
+def test_admin_toggle_profiles_reruns(app_as):
+    admin = app_as(ADMIN)
+    admin.run()
+    admin.sidebar.radio[0].set_value("Panel administracyjny").run()
+    next(t for t in admin.toggle if t.label.startswith("Profiluj")).set_value(True).run()
+    assert profiling.get_profiler().enabled
+
+    user = app_as(USER)
+    user.run()
+    admin.run()
+    assert not admin.exception
+    tags = {c.tag for c in profiling.get_profiler().slowest()}
+    assert {"Moje ankiety / rerun", "Panel administracyjny / rerun"} <= tags
+    assert admin.code and "cumtime" in admin.code[0].value
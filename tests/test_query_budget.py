@@ -0,0 +1,80 @@
+"""
+Budżety round-tripów do bazy per strona / akcja app.py.
+
+Liczby są kontraktem: zmiana, która dokłada zapytanie w ścieżce renderowania,
+musi świadomie podbić budżet w tym pliku. Cache współdzielony jest wyłączony
+(conftest), więc budżety opisują zimny start każdego rerunu.
+
+Stały koszt rerunu zalogowanego użytkownika: allowed_emails ×2 (dostęp +
+is_admin) i aktywna wersja (surveys + survey_versions). Akcje z st.rerun()
+(start ankiety, podgląd, CSV) płacą go dwa razy. Percentyl (wysyłka, podgląd)
+to jedno rpc version_score_distribution – przy ciepłym cache zero. Strona
+startowa czyta tylko wiersz user_dashboard – także listę podejść (pełna lista z
+survey_sessions dopiero na życzenie); wysyłka zapisuje sesję z odpowiedziami
+jednym rpc save_survey_session, a podsumowanie jednym rpc record_dashboard_submit. Panel admina
+czyta listę wersji raz dla przeglądarki sesji i eksportu (odczyty równolegle,
+dora_audit.prefetch); same sesje dopiero po „Szukaj”.
+"""
+from conftest import ADMIN, USER
+
+def _click(at, label):
+    next(b for b in at.button if b.label == label).click().run()
+    assert not at.exception, [e.value for e in at.exception]
+
+def _open(at):
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+
+
+def test_user_panel_budget(app_as, query_budget):
+    at = app_as(USER)
+    with query_budget(5, "panel użytkownika"):
+        _open(at)
+
+def test_take_survey_budget(app_as, query_budget):
+    at = app_as(USER)
+    _open(at)
+    with query_budget(6, "otwarcie ankiety"):
+        _click(at, "➕ Rozpocznij nową ankietę")
+
+def test_submit_budget(app_as, app_db, query_budget):
+    at = app_as(USER)
+    _open(at)
+    _click(at, "➕ Rozpocznij nową ankietę")
+    at.radio(key="q_single_q1").set_value("Tak")
+    with query_budget(10, "wysyłka ankiety"):
+        _click(at, "Wyślij ankietę")
+    assert sum(s["status"] == "submitted" for s in app_db.tables["survey_sessions"]) == 2
+
+def test_session_view_budget(app_as, query_budget):
+    at = app_as(USER)
+    _open(at)
+    with query_budget(13, "podgląd sesji"):
+        _click(at, "Podgląd")
+
+def test_user_exports_budget(app_as, query_budget):
+    at = app_as(USER)
+    _open(at)
+    with query_budget(8, "eksport CSV sesji"):
+        _click(at, "CSV")
+    with query_budget(7, "eksport listy sesji"):
+        _click(at, "Pobierz listę moich sesji (CSV)")
+
+def test_admin_panel_budget(app_as, query_budget):
+    at = app_as(ADMIN)
+    _open(at)
+    with query_budget(9, "panel administracyjny"):
+        at.sidebar.radio[0].set_value("Panel administracyjny").run()
+        assert not at.exception
+
+def test_admin_exports_budget(app_as, query_budget):
+    from dora_audit.exports import get_export_scheduler
+
+    at = app_as(ADMIN)
+    _open(at)
+    at.sidebar.radio[0].set_value("Panel administracyjny").run()
+    with query_budget(14, "eksport admina (zadanie w tle)"):
+        _click(at, "Zleć eksport (sessions.csv + answers_wide.csv)")
+        scheduler = get_export_scheduler()
+        job = scheduler.jobs_for(ADMIN)[0]
+        assert scheduler.wait(job.id, timeout=10).status == "done"
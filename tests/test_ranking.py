@@ -0,0 +1,49 @@
+from dora_audit import ranking
+from dora_audit.cache import SharedCache, configure_shared_cache
+from localdb import MemoryClient
+from dora_audit.ranking import ScoreDistribution, percentile_for, record_submission
+
+
+def _sessions(*scores, version="v1"):
+    return [{"id": f"s{i}", "survey_version_id": version, "status": "submitted", "score": sc}
+            for i, sc in enumerate(scores)]
+
+def test_percentile_uses_midrank_for_ties():
+    dist = ScoreDistribution.from_rows(_sessions(10, 20, 20, 40))
+    assert dist.percentile(5) == 0.0
+    assert dist.percentile(20) == 50.0       # 1 niższy + połowa z 2 remisów
+    assert dist.percentile(100) == 100.0
+    assert ScoreDistribution().percentile(50) is None
+
+def test_add_keeps_scores_sorted():
+    dist = ScoreDistribution.from_rows(_sessions(30, 10) + _sessions(30))     # s0 dwa razy (przesunięta strona)
+    dist.add(20)
+    assert list(dist.scores) == [10.0, 20.0, 30.0]
+
+def test_distribution_is_read_past_the_row_cap(monkeypatch):
+    monkeypatch.setattr(ranking, "LOAD_PAGE_SIZE", 2)
+    db = MemoryClient({"survey_sessions": _sessions(50, 40, 30, 20, 10)}, max_rows=2)
+    assert percentile_for(db, "v1", 45) == (80.0, 5)
+    assert db.calls() == 3
+
+    db.functions.pop("version_score_distribution")     # RLS pokazałby tylko własne sesje – bez percentyla
+    assert percentile_for(db, "v1", 45) is None
+
+def test_submission_updates_cached_distribution_without_reload(tmp_path):
+    db = MemoryClient({"survey_sessions": _sessions(10, 20, 30) + _sessions(99, version="v2")})
+    configure_shared_cache(SharedCache(str(tmp_path / "cache.sqlite3")))
+    try:
+        assert percentile_for(db, "v1", 25) == (66.7, 3)
+        calls = db.calls()
+
+        db.tables["survey_sessions"].append({"id": "s9", "survey_version_id": "v1",
+                                             "status": "submitted", "score": 40})
+        record_submission("v1", "s9", 40)
+        record_submission("v1", "s9", 40)     # ponowienie wysyłki nie dubluje wyniku
+        assert percentile_for(db, "v1", 25) == (50.0, 4)
+        assert db.calls() == calls            # bez ponownego skanu sesji
+
+        record_submission("v3", "x", 50)      # wersja bez rozkładu w cache – nic do zrobienia
+        assert percentile_for(db, "v3", 50) == (None, 0)
+    finally:
+        configure_shared_cache(None)
@@ -0,0 +1,83 @@
+import pytest
+
+from conftest import ADMIN, USER, seed_tables
+from dora_audit import replica as replica_mod
+from localdb import MemoryClient, token_for
+from dora_audit.replica import ReadRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def dbs():
+    """Główna baza + replika (osobny MemoryClient – dane tylko z chwili kopii)."""
+    return MemoryClient(seed_tables()), MemoryClient(seed_tables())
+
+
+def test_fresh_replica_serves_reads_until_it_lags(dbs):
+    primary, replica = dbs
+    clock = Clock()
+    router = ReadRouter(primary, replica, max_lag_s=10, poll_s=5, clock=clock)
+    assert router.for_read(ADMIN) is replica
+
+    replica.replica_lag_s = 30.0
+    clock.now = 4
+    assert router.for_read(ADMIN) is replica                    # opóźnienie z cache do poll_s
+    clock.now = 5
+    assert router.for_read(ADMIN) is primary
+    replica.functions.pop("replica_lag_seconds")                # replika bez migracji 0011 / niedostępna
+    clock.now = 10
+    assert router.for_read(ADMIN) is primary
+    assert router.stats == {"replica": 2, "stale": 2, "error": 1}
+    assert replica.calls() == 3                                 # jedno sprawdzenie na okno poll_s
+
+def test_each_token_gets_its_own_replica_client(dbs):
+    primary, replica = dbs
+    router = ReadRouter(primary, replica, session_for=replica.session)
+    user = router.for_read(USER, token_for(USER))
+    admin = router.for_read(ADMIN, token_for(ADMIN))             # np. eksport w tle admina
+    assert (user.current_email(), admin.current_email()) == (USER, ADMIN)
+    assert router.for_read().current_email() == "-"             # bez tokenu – nie dziedziczy cudzej sesji
+    assert ReadRouter(primary, replica).for_read(USER, token_for(USER)) is primary
+
+def test_writer_reads_own_writes_from_primary(dbs):
+    primary, replica = dbs
+    clock = Clock()
+    router = ReadRouter(primary, replica, max_lag_s=10, poll_s=5, pin_s=60, clock=clock)
+    router.note_write(USER)
+    assert router.for_read(USER) is primary
+    assert router.for_read(ADMIN) is replica
+    clock.now = 61
+    assert router.for_read(USER) is replica
+    assert ReadRouter(primary, replica, max_lag_s=10, poll_s=5, pin_s=1).pin_s == 15
+
+    plain = ReadRouter(primary)                                 # bez SUPABASE_REPLICA_URL
+    plain.note_write(USER)
+    assert plain.for_read(USER) is primary and not plain.stats
+
+def test_attempts_list_uses_replica_but_sees_fresh_submit(app_as, app_db, monkeypatch):
+    replica = MemoryClient(seed_tables())
+    monkeypatch.setattr(replica_mod, "replica_client_from_env",
+                        lambda token=None: replica.session(token) if token else replica)
+    at = app_as(USER)
+    at.run()
+    assert not replica.stats[(USER, "survey_sessions", "select")]     # strona startowa – z podsumowania
+    at.toggle(key="show_all_attempts").set_value(True).run()
+    assert replica.stats[(USER, "survey_sessions", "select")] == 1
+    assert not app_db.stats[(USER, "survey_sessions", "select")]
+
+    next(b for b in at.button if b.label.startswith("➕")).click().run()
+    at.radio(key="q_single_q1").set_value("Tak")
+    next(b for b in at.button if b.label == "Wyślij ankietę").click().run()
+    assert not at.exception, [e.value for e in at.exception]
+    at.session_state["taking_survey"] = False
+    at.run()
+    at.toggle(key="show_all_attempts").set_value(True).run()
+    assert replica.stats[(USER, "survey_sessions", "select")] == 1
+    # replika jeszcze bez nowej sesji – lista po wysyłce czytana z głównej bazy
+    assert len([b for b in at.button if (b.key or "").startswith("view_")]) == 2
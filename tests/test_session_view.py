@@ -0,0 +1,53 @@
+from conftest import USER
+
+from dora_audit import cache as cache_mod
+from dora_audit.core import session_answer_rows
+
+QS = [
+    {"id": "q1", "type": "single", "text": "Plan ciągłości?",
+     "options": [{"label": "Nie", "score": 0}, {"label": "Tak", "score": 10}]},
+    {"id": "q2", "type": "multi", "text": "Testy", "show_if": {"question": "q1", "equals": "Tak"},
+     "options": [{"label": "DR", "score": 5}, {"label": "TLPT", "score": 10}]},
+    {"id": "q3", "type": "scale", "text": "Dojrzałość", "min": 1, "max": 5, "score_per_step": 5},
+]
+
+def _answers(values):
+    return [{"question_id": qid, "answer": {"value": v}} for qid, v in values.items()]
+
+
+def test_rows_skip_hidden_questions_and_carry_points():
+    version = {"content": {"questions": QS}}
+    rows = session_answer_rows(version, _answers({"q1": "Tak", "q2": ["DR", "TLPT"], "q3": 3}))
+    assert rows == [
+        {"Nr": 1, "Pytanie": "Plan ciągłości?", "Odpowiedź": "Tak", "Punkty": 10.0, "Maks.": 10.0},
+        {"Nr": 2, "Pytanie": "Testy", "Odpowiedź": "DR, TLPT", "Punkty": 15.0, "Maks.": 15.0},
+        {"Nr": 3, "Pytanie": "Dojrzałość", "Odpowiedź": "3", "Punkty": 10.0, "Maks.": 20.0},
+    ]
+    rows = session_answer_rows(version, _answers({"q1": "Nie"}))
+    assert [(r["Nr"], r["Odpowiedź"]) for r in rows] == [(1, "Nie"), (3, "—")]
+
+def test_large_preview_is_one_table_built_once(app_as, app_db, tmp_path, monkeypatch):
+    qs = app_db.tables["survey_versions"][0]["content"]["questions"]
+    for i in range(300):
+        qs.append({"id": f"x{i}", "type": "single", "text": f"Pytanie {i}",
+                   "options": [{"label": "Tak", "score": 1}, {"label": "Nie", "score": 0}]})
+        app_db.tables["survey_answers"].append(
+            {"id": f"ax{i}", "session_id": "session-1", "question_id": f"x{i}",
+             "answer": {"type": "single", "value": "Tak"}, "score": 1})
+    cache_mod.configure_shared_cache(cache_mod.SharedCache(str(tmp_path / "cache.sqlite3")))
+    built = []
+    from dora_audit import core
+    monkeypatch.setattr(core, "session_answer_rows",
+                        lambda *a: built.append(1) or session_answer_rows(*a))     # app.py importuje przy każdym runie
+    try:
+        at = app_as(USER)
+        at.run()
+        for _ in range(2):
+            next(b for b in at.button if b.label == "Podgląd").click().run()
+            assert not at.exception, [e.value for e in at.exception]
+            assert len(at.dataframe) == 2                  # odpowiedzi + pivot
+            assert len(at.markdown) < 40 and len(at.caption) < 20
+        assert any("Pytań: 304" in c.value for c in at.caption)
+        assert built == [1]                                 # druga wizyta z cache
+    finally:
+        cache_mod.configure_shared_cache(None)
@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+
+from conftest import ADMIN, USER, seed_tables
+from localdb import MemoryClient
+from dora_audit.sessions import SessionFilter, band_range, estimate_count, search_sessions
+
+VERSION = seed_tables()["survey_versions"][0]      # progi 80 / 60
+
+
+@pytest.fixture
+def db():
+    tables = seed_tables()
+    tables["survey_sessions"] = [{
+        "id": f"s{i:03d}", "survey_version_id": "version-1",
+        "user_email": f"user{i % 4}@firma.pl",
+        "status": "draft" if i % 5 == 0 else "submitted",
+        "score": float(i),
+        # co drugi wiersz ma ten sam czas – keyset musi rozstrzygać po id
+        "created_at": f"2026-03-{1 + i // 10:02d}T10:00:0{(i // 2) % 5}+00:00",
+        "submitted_at": None,
+    } for i in range(100)]
+    return MemoryClient(tables)
+
+def _all_pages(db, flt, limit=7, version=None):
+    out, cursor = [], None
+    while True:
+        rows, cursor = search_sessions(db, flt, after=cursor, limit=limit, version=version)
+        out += rows
+        if cursor is None:
+            return out
+
+
+def test_keyset_pages_cover_all_rows_once(db):
+    rows = _all_pages(db, SessionFilter())
+    assert len(rows) == 100 and len({r["id"] for r in rows}) == 100
+    keys = [(r["created_at"], r["id"]) for r in rows]
+    assert keys == sorted(keys, reverse=True)
+
+def test_filters_and_count(db):
+    flt = SessionFilter(version_id="version-1", status="submitted", score_min=10, score_max=19,
+                        email_prefix="USER1")
+    rows = _all_pages(db, flt)
+    assert {r["id"] for r in rows} == {"s013", "s017"}
+    assert estimate_count(db, flt) == 2
+
+def test_band_uses_version_thresholds(db):
+    assert band_range("Amber", 80, 60) == (60.0, 80.0)
+    red = _all_pages(db, SessionFilter(version_id="version-1", band="Red"), version=VERSION)
+    assert len(red) == 60 and max(r["score"] for r in red) < 60
+    with pytest.raises(ValueError):
+        search_sessions(db, SessionFilter(band="Red"))
+
+def test_date_range_is_inclusive(db):
+    rows = _all_pages(db, SessionFilter(date_from=date(2026, 3, 2), date_to=date(2026, 3, 2)))
+    assert {r["id"] for r in rows} == {f"s{i:03d}" for i in range(10, 20)}
+
+def test_admin_browser_opens_session(app_as):
+    at = app_as(ADMIN)
+    at.run()
+    at.sidebar.radio[0].set_value("Panel administracyjny").run()
+    next(t for t in at.text_input if t.label == "E-mail (prefiks)").set_value("user@")
+    next(b for b in at.button if b.label == "Szukaj").click().run()
+    assert not at.exception
+    assert any("ok. 1 sesji" in c.value for c in at.caption)
+    next(b for b in at.button if b.label == "Otwórz").click().run()
+    assert not at.exception
+    assert any(f"**Użytkownik:** {USER}" in m.value for m in at.markdown)
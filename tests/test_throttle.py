@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from conftest import USER
+from dora_audit import throttle
+from dora_audit.throttle import WriteLimiter, WriteThrottled
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_burst_then_refill():
+    clock = _Clock()
+    lim = WriteLimiter(rate_per_min=60, burst=3, max_in_flight=4, clock=clock)
+    for _ in range(3):
+        with lim.slot("a"):
+            pass
+    with pytest.raises(WriteThrottled) as e:
+        with lim.slot("a"):
+            pass
+    assert e.value.retry_after == pytest.approx(1.0)
+    with lim.slot("b"):                                  # inni użytkownicy bez zmian
+        pass
+    clock.now += 1.0
+    with lim.slot("a"):
+        pass
+    assert lim.stats["rate_limited"] == 1
+
+def test_background_writes_skip_bucket():
+    lim = WriteLimiter(rate_per_min=60, burst=1, max_in_flight=4)
+    for _ in range(5):
+        with lim.slot("a", rate_limited=False):
+            pass
+    assert lim.stats["admitted"] == 5
+
+def test_global_cap_and_one_write_per_user():
+    lim = WriteLimiter(rate_per_min=6000, burst=100, max_in_flight=2, queue_timeout_s=5)
+    peak, per_user_peak = [0], {}
+    busy = {}
+    guard = threading.Lock()
+
+    def write(user):
+        with lim.slot(user):
+            with guard:
+                busy[user] = busy.get(user, 0) + 1
+                peak[0] = max(peak[0], lim.in_flight)
+                per_user_peak[user] = max(per_user_peak.get(user, 0), busy[user])
+            time.sleep(0.02)
+            with guard:
+                busy[user] -= 1
+
+    threads = [threading.Thread(target=write, args=(u,)) for u in ["a"] * 4 + ["b", "c", "d"]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] <= 2
+    assert per_user_peak["a"] == 1
+    assert lim.stats["admitted"] == 7 and lim.stats["queued"] > 0
+
+def test_queue_timeout():
+    lim = WriteLimiter(rate_per_min=6000, burst=100, max_in_flight=1, queue_timeout_s=0.05)
+    with lim.slot("a"):
+        with pytest.raises(WriteThrottled):
+            with lim.slot("b"):
+                pass
+    assert lim.stats["timed_out"] == 1 and lim.in_flight == 0
+
+def test_app_rejects_burst_of_draft_saves(app_as, app_db, monkeypatch):
+    monkeypatch.setattr(throttle, "WRITE_BURST", 1)
+    monkeypatch.setattr(throttle, "WRITE_RATE_PER_MIN", 0.1)
+    at = app_as(USER)
+    at.run()
+    next(b for b in at.button if b.label == "➕ Rozpocznij nową ankietę").click().run()
+    next(b for b in at.button if b.label == "Zapisz szkic").click().run()
+    assert any("Możesz wrócić do szkicu" in m.value for m in at.success)
+    at.run()                                             # formularz wznowionego szkicu
+    next(b for b in at.button if b.label == "Zapisz szkic").click().run()
+    assert not at.exception
+    assert any("Za dużo zapisów" in w.value for w in at.warning)
+    assert sum(s["status"] == "draft" for s in app_db.tables["survey_sessions"]) == 1
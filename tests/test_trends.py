@@ -0,0 +1,105 @@
+import random
+
+import pandas as pd
+
+from conftest import ADMIN, QUESTIONS
+from dora_audit import trends
+from dora_audit.cache import SharedCache, configure_shared_cache
+from dora_audit.core import compute_total_score
+from localdb import MemoryClient
+
+V1 = {"id": "version-1", "version": 1,
+      "content": {"questions": [dict(q, section="Aktywa" if q["id"] in ("q1", "q4") else "Testy")
+                                for q in QUESTIONS]}}
+# v2: q1 przemianowane na asset_register (mapa), reszta bez zmian
+V2 = {"id": "version-2", "version": 2, "question_map": {"asset_register": "q1"},
+      "content": {"questions": [dict(q, id="asset_register") if q["id"] == "q1" else q
+                                for q in V1["content"]["questions"]]}}
+
+
+def _random_answers(rng, questions):
+    out = {}
+    for q in questions:
+        if q["type"] == "multi":
+            value = rng.sample([o["label"] for o in q["options"]], rng.randint(0, 2))
+        elif q["type"] == "scale":
+            value = rng.randint(1, 5)
+        else:
+            value = rng.choice([o["label"] for o in q["options"]] + [None])
+        out[q["id"]] = {"type": q["type"], "value": value}
+    return out
+
+def _tables(n, rng):
+    sessions, answers = [], []
+    for i in range(n):
+        version = (V1, V2)[i % 2]
+        sid = f"s{i:03d}"
+        sessions.append({"id": sid, "survey_version_id": version["id"], "status": "submitted",
+                         "user_email": f"u{i}@firma.pl"})
+        answers += [{"session_id": sid, "question_id": qid, "answer": payload}
+                    for qid, payload in _random_answers(rng, version["content"]["questions"]).items()]
+    return {"survey_versions": [V1, V2], "survey_sessions": sessions, "survey_answers": answers}
+
+
+def test_trend_keys_follow_question_map_chain():
+    v3 = {"id": "version-3", "version": 3, "content": {"questions": [{"id": "asset_register"}, {"id": "q9"}]}}
+    keys = trends.trend_keys([v3, V2, V1])
+    assert keys["version-2"]["asset_register"] == "q1"
+    assert keys["version-3"] == {"asset_register": "q1", "q9": "q9"}
+
+def test_vectorized_points_match_row_scoring():
+    db = MemoryClient(_tables(60, random.Random(7)))
+    answers = trends._load_answers(db)
+    meta, options = trends._question_frames([V1, V2], trends.trend_keys([V1, V2]))
+    per_session = trends.score_frame(answers, meta, options).groupby("session_id")["points"].sum()
+    for s in db.tables["survey_sessions"]:
+        questions = (V1 if s["survey_version_id"] == "version-1" else V2)["content"]["questions"]
+        filled = {a["question_id"]: a["answer"] for a in db.tables["survey_answers"]
+                  if a["session_id"] == s["id"]}
+        assert per_session.get(s["id"], 0.0) == compute_total_score(questions, filled)
+
+def test_incremental_submission_matches_full_recompute(tmp_path):
+    rng = random.Random(11)
+    db = MemoryClient(_tables(20, rng))
+    configure_shared_cache(SharedCache(str(tmp_path / "cache.sqlite3")))
+    try:
+        before = trends.get_aggregates(db)
+        assert list(before.section_table().columns) == ["v1", "v2"]
+        assert "q1" in before.question_table().index[0]                   # asset_register liczone jako q1
+
+        payload = _random_answers(rng, V2["content"]["questions"])
+        db.tables["survey_sessions"].append({"id": "new", "survey_version_id": "version-2", "status": "submitted"})
+        db.tables["survey_answers"] += [{"session_id": "new", "question_id": qid, "answer": p}
+                                        for qid, p in payload.items()]
+        calls = db.calls()
+        trends.record_submission(V2, "new", payload)
+        trends.record_submission(V2, "new", payload)                      # ponowienie – bez dublowania
+        cached = trends.get_aggregates(db)
+        assert db.calls() == calls and cached.sessions == before.sessions + 1
+
+        full = trends.compute_aggregates([V1, V2], trends._load_answers(db))
+        pd.testing.assert_frame_equal(cached.question_table(), full.question_table())
+        pd.testing.assert_frame_equal(cached.section_table(), full.section_table())
+    finally:
+        configure_shared_cache(None)
+
+def test_submission_of_a_version_outside_the_aggregates_triggers_a_recompute(tmp_path):
+    rng = random.Random(12)
+    db = MemoryClient(_tables(5, rng))
+    v3 = {**V2, "id": "version-3", "version": 3, "question_map": {}}
+    configure_shared_cache(SharedCache(str(tmp_path / "cache.sqlite3")))
+    try:
+        trends.get_aggregates(db)
+        db.tables["survey_versions"].append(v3)                           # nowy upload po załadowaniu
+        trends.record_submission(v3, "new", _random_answers(rng, v3["content"]["questions"]))
+        assert "version-3" in trends.get_aggregates(db).versions
+    finally:
+        configure_shared_cache(None)
+
+def test_admin_sees_trends(app_as):
+    at = app_as(ADMIN)
+    at.run()
+    at.sidebar.radio[0].set_value("Panel administracyjny").run()
+    next(t for t in at.toggle if t.label.startswith("Pokaż trendy")).set_value(True).run()
+    assert not at.exception
+    assert any("v1" in df.value.columns for df in at.dataframe)
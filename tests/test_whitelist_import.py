@@ -0,0 +1,77 @@
+from dora_audit.whitelist import (
+    apply_import, import_whitelist, normalize_email, parse_whitelist_file, plan_import,
+)
+
+
+class _Rows:
+    def __init__(self, data):
+        self.data = data
+
+class _Query:
+    def __init__(self, db):
+        self.db, self.op, self.payload, self.emails = db, "select", None, []
+    def select(self, *_):
+        return self
+    def in_(self, _col, values):
+        self.emails = list(values)
+        return self
+    def upsert(self, rows, on_conflict=None):
+        self.op, self.payload = "upsert", rows
+        return self
+    def update(self, values):
+        self.op, self.payload = "update", values
+        return self
+    def execute(self):
+        self.db.calls.append((self.op, len(self.payload) if self.op == "upsert" else len(self.emails)))
+        if self.op == "select":
+            return _Rows([{"email": e, "is_admin": self.db.rows[e]} for e in self.emails if e in self.db.rows])
+        if self.op == "upsert":
+            for r in self.payload:
+                self.db.rows.setdefault(r["email"], r.get("is_admin", False))
+        else:
+            for e in self.emails:
+                self.db.rows[e] = self.payload["is_admin"]
+        return _Rows([])
+
+class FakeAllowedEmails:
+    def __init__(self, rows):
+        self.rows, self.calls = dict(rows), []
+    def table(self, _name):
+        return _Query(self)
+
+
+def test_normalize_email():
+    assert normalize_email("  Jan.Kowalski@Firma.PL ") == "jan.kowalski@firma.pl"
+    assert normalize_email("mailto:a@b.pl") == "a@b.pl"
+    assert normalize_email("<a@b.pl>") == "a@b.pl"
+    assert normalize_email("not-an-email") is None
+
+def test_parse_csv_with_roles_dedupes_and_admin_wins():
+    raw = b"email,role\nA@x.pl,user\na@x.pl,admin\nb@x.pl,\nbroken,user\n"
+    entries, invalid = parse_whitelist_file("staff.csv", raw)
+    assert entries == {"a@x.pl": True, "b@x.pl": False}
+    assert invalid == ["broken"]
+
+def test_parse_txt_uses_default_role():
+    entries, _ = parse_whitelist_file("staff.txt", b"a@x.pl\n\nb@x.pl admin\n", default_admin=True)
+    assert entries == {"a@x.pl": True, "b@x.pl": True}
+
+def test_plan_never_demotes():
+    plan = plan_import({"new@x.pl": False, "boss@x.pl": True, "adm@x.pl": False, "same@x.pl": False},
+                       {"boss@x.pl": False, "adm@x.pl": True, "same@x.pl": False})
+    assert plan.added_users == ["new@x.pl"]
+    assert plan.promoted == ["boss@x.pl"]
+    assert sorted(plan.unchanged) == ["adm@x.pl", "same@x.pl"]
+
+def test_import_3000_staff_in_chunked_round_trips():
+    db = FakeAllowedEmails({"u0@x.pl": False})
+    raw = ("email\n" + "\n".join(f"u{i}@x.pl" for i in range(3000))).encode()
+
+    plan = import_whitelist(db, "staff.csv", raw, dry_run=True)
+    assert plan.summary()["added"] == 2999 and plan.summary()["unchanged"] == 1
+    assert len(db.rows) == 1                         # dry-run nic nie zapisuje
+
+    db.calls.clear()
+    apply_import(db, plan, chunk_size=500)
+    assert [op for op, _ in db.calls] == ["upsert"] * 6
+    assert len(db.rows) == 3000
@@ -0,0 +1,58 @@
+from dora_audit.whitelist import whitelist_page
+
+
+class _Rows:
+    def __init__(self, data):
+        self.data = data
+
+class RecordingQuery:
+    """Zapisuje wywołania buildera PostgREST; execute() filtruje listę w pamięci."""
+    def __init__(self, rows):
+        self.rows, self.calls = rows, []
+    def table(self, _name):
+        return self
+    def __getattr__(self, name):
+        def _call(*args, **kwargs):
+            self.calls.append((name,) + args)
+            return self
+        return _call
+    def execute(self):
+        out = sorted(self.rows, key=lambda r: r["email"])
+        for name, *args in self.calls:
+            if name == "like":
+                out = [r for r in out if r["email"].startswith(args[1].rstrip("%").replace("\\", ""))]
+            elif name == "eq" and args[0] == "domain":
+                out = [r for r in out if r["email"].split("@")[1] == args[1]]
+            elif name == "eq" and args[0] == "is_admin":
+                out = [r for r in out if r["is_admin"]]
+            elif name == "gt":
+                out = [r for r in out if r["email"] > args[1]]
+            elif name == "limit":
+                out = out[:args[0]]
+        return _Rows(out)
+
+ROWS = [{"email": f"u{i:03d}@{'a' if i % 2 else 'b'}.pl", "is_admin": i % 10 == 0} for i in range(120)]
+
+
+def test_keyset_pages_cover_all_rows_once():
+    seen, cursor = [], None
+    while True:
+        q = RecordingQuery(ROWS)
+        rows, cursor = whitelist_page(q, after=cursor, limit=50)
+        seen += [r["email"] for r in rows]
+        assert ("order", "email") in q.calls
+        if cursor is None:
+            break
+    assert seen == sorted(r["email"] for r in ROWS)
+
+def test_domain_and_admin_filters_are_server_side():
+    q = RecordingQuery(ROWS)
+    rows, _ = whitelist_page(q, "@A.pl", admins_only=True, limit=100)
+    assert ("eq", "domain", "a.pl") in q.calls and ("eq", "is_admin", True) in q.calls
+    assert rows == []          # admini mają parzyste i -> domena b.pl
+
+def test_prefix_search_uses_like():
+    q = RecordingQuery(ROWS)
+    rows, cursor = whitelist_page(q, " U01", limit=100)
+    assert ("like", "email", "u01%") in q.calls
+    assert len(rows) == 10 and cursor is None